@@ -77,8 +77,7 @@ class CLI(LineReceiver):
                     self.print_main_menu()
             elif self.menu_level == self.MENU_MODULE_LIST:
                 try:
-                    modules = self.module_community.get_modules_from_catalog()
-                    if len(modules) - 1 < int(line) < -1:
+                    if self.module_community.count_modules_in_catalog() - 1 < int(line) < -1:
                         raise ValueError
 
                     if int(line) == -1:
@@ -124,14 +123,12 @@ class CLI(LineReceiver):
         msg(self._colorize('\n' + self.header, 'pink'))
         msg(self._colorize('version 0.1', 'green'))
 
-        modules = self.module_community.get_modules_from_catalog()
-
-        msg(self._colorize(str(len(modules)) + " modules found:", 'blue'))
+        msg(self._colorize(str(self.module_community.count_modules_in_catalog()) + " modules found:", 'blue'))
 
         msg(self._colorize("[-1] ", 'blue') + self._colorize("Return to previous menu", 'green'))
 
-        for module in modules:
-            msg(self._colorize("[" + str(modules.index(module)) + "] ", 'blue') + self._colorize(str(module), 'green'))
+        for index, module in enumerate(self.module_community.iter_modules_from_catalog()):
+            msg(self._colorize("[" + str(index) + "] ", 'blue') + self._colorize(str(module), 'green'))
 
     def print_module_menu(self):
         os.system('clear')
@@ -179,13 +176,14 @@ class CLI(LineReceiver):
         self.print_module_list_menu()
 
     def show_module(self, line):
-        modules = self.module_community.get_modules_from_catalog()
         index = int(line)
+        module = next(self.module_community.iter_modules_from_catalog(limit=1, offset=index), None)
 
-        msg("Number of modules retrieved: " + str(len(modules)))
+        if module is None:
+            raise IndexError
 
         self.menu_level = self.MENU_MODULE
-        self.context = modules[index]  # type: Module
+        self.context = module  # type: Module
         self.print_module_menu()
 
     def download_module(self, line):
@@ -1,4 +1,5 @@
 import json
+from operator import methodcaller
 from binascii import unhexlify
 
 from twisted.web import http
@@ -16,8 +17,9 @@ class ModuleCacheEndpoint(ModuleEndpoint):
         return ModuleCacheCreatorEndpoint(self.ipv8, path)
 
     def render_GET(self, request):
-        module_identifiers = [module.to_dict() for module in self.get_module_overlay().persistence.get_modules_from_cache()]
-        return json.dumps({'module_identifiers': module_identifiers})
+        deferred = self.get_module_overlay().run_query(methodcaller("get_modules_from_cache"))
+        return self.render_deferred(request, deferred, lambda module_identifiers: json.dumps(
+            {'module_identifiers': [module.to_dict() for module in module_identifiers]}))
 
 
 class ModuleCacheCreatorEndpoint(ModuleEndpoint):
@@ -39,9 +41,12 @@ class ModuleCacheContentHashEndpoint(ModuleEndpoint):
         self._identifier = ModuleIdentifier(creator, content_hash)
 
     def render_GET(self, request):
-        if not self.get_module_overlay().persistence.has_module_in_cache(self._identifier):
-            request.setResponseCode(http.NOT_FOUND)
-            return json.dumps({"error": "module not found in cache"})
+        def render(module_identifier):
+            if module_identifier is None:
+                request.setResponseCode(http.NOT_FOUND)
+                return json.dumps({"error": "module not found in cache"})
 
-        module_identifiers = self.get_module_overlay().persistence.get_module_from_cache(self._identifier).to_dict()
-        return json.dumps({'module_identifiers': module_identifiers})
+            return json.dumps({'module_identifiers': module_identifier.to_dict()})
+
+        deferred = self.get_module_overlay().run_query(methodcaller("get_module_from_cache", self._identifier))
+        return self.render_deferred(request, deferred, render)
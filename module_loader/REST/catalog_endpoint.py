@@ -1,10 +1,12 @@
 import json
+from operator import methodcaller
 from binascii import unhexlify
 
 from twisted.web import http
 
 from module_loader.REST.root_endpoint import ModuleEndpoint
 from module_loader.community.module.core.module_identifier import ModuleIdentifier
+from module_loader.community.module.storage import CATALOG_ORDERS
 
 
 class ModuleCatalogEndpoint(ModuleEndpoint):
@@ -16,8 +18,22 @@ class ModuleCatalogEndpoint(ModuleEndpoint):
         return ModuleCatalogCreatorEndpoint(self.ipv8, path)
 
     def render_GET(self, request):
-        modules = [module.to_dict() for module in self.get_module_overlay().persistence.get_modules_from_catalog()]
-        return json.dumps({'modules': modules})
+        order_by = request.args['order_by'][0] if 'order_by' in request.args else None
+        order_by = request.args['sort'][0] if 'sort' in request.args else order_by
+        try:
+            limit = int(request.args['limit'][0]) if 'limit' in request.args else None
+            offset = int(request.args['offset'][0]) if 'offset' in request.args else 0
+        except ValueError:
+            request.setResponseCode(http.BAD_REQUEST)
+            return json.dumps({"error": "limit and offset must be integers"})
+
+        if order_by not in CATALOG_ORDERS:
+            request.setResponseCode(http.BAD_REQUEST)
+            return json.dumps({"error": "unknown catalog order"})
+
+        deferred = self.get_module_overlay().run_query(methodcaller("iter_catalog", order_by, limit, offset))
+        return self.render_deferred(request, deferred,
+                                    lambda modules: json.dumps({'modules': [module.to_dict() for module in modules]}))
 
 
 class ModuleCatalogCreatorEndpoint(ModuleEndpoint):
@@ -39,9 +55,12 @@ class ModuleCatalogContentHashEndpoint(ModuleEndpoint):
         self._identifier = ModuleIdentifier(creator, content_hash)
 
     def render_GET(self, request):
-        if not self.get_module_overlay().persistence.has_module_in_catalog(self._identifier):
-            request.setResponseCode(http.NOT_FOUND)
-            return json.dumps({"error": "module not found in library"})
+        def render(module):
+            if module is None:
+                request.setResponseCode(http.NOT_FOUND)
+                return json.dumps({"error": "module not found in library"})
+
+            return json.dumps({'modules': module.to_dict()})
 
-        modules = self.get_module_overlay().persistence.get_module_from_catalog(self._identifier).to_dict()
-        return json.dumps({'modules': modules})
+        deferred = self.get_module_overlay().run_query(methodcaller("get_module_from_catalog", self._identifier))
+        return self.render_deferred(request, deferred, render)
@@ -1,4 +1,5 @@
 import json
+from operator import methodcaller
 from binascii import unhexlify
 
 from twisted.web import http
@@ -15,8 +16,9 @@ class ModuleLibraryEndpoint(ModuleEndpoint):
         return ModuleLibraryCreatorEndpoint(self.ipv8, path)
 
     def render_GET(self, request):
-        module_identifiers = [module.to_dict() for module in self.get_module_overlay().persistence.get_modules_from_library()]
-        return json.dumps({'module_identifiers': module_identifiers})
+        deferred = self.get_module_overlay().run_query(methodcaller("get_modules_from_library"))
+        return self.render_deferred(request, deferred, lambda module_identifiers: json.dumps(
+            {'module_identifiers': [module.to_dict() for module in module_identifiers]}))
 
 
 class ModuleLibraryCreatorEndpoint(ModuleEndpoint):
@@ -36,9 +38,12 @@ class ModuleLibraryContentHashEndpoint(ModuleEndpoint):
         self._identifier = ModuleIdentifier(creator, content_hash)
 
     def render_GET(self, request):
-        if not self.get_module_overlay().persistence.has_module_in_library(self._identifier):
-            request.setResponseCode(http.NOT_FOUND)
-            return json.dumps({"error": "module not found in library"})
+        def render(module_identifier):
+            if module_identifier is None:
+                request.setResponseCode(http.NOT_FOUND)
+                return json.dumps({"error": "module not found in library"})
 
-        module_identifiers = self.get_module_overlay().persistence.get_module_from_library(self._identifier).to_dict()
-        return json.dumps({'module_identifiers': module_identifiers})
+            return json.dumps({'module_identifiers': module_identifier.to_dict()})
+
+        deferred = self.get_module_overlay().run_query(methodcaller("get_module_from_library", self._identifier))
+        return self.render_deferred(request, deferred, render)
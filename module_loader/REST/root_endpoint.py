@@ -1,5 +1,8 @@
-from twisted.web import resource
+import json
+
+from twisted.web import http, resource
 from twisted.web.resource import _computeAllowedMethods
+from twisted.web.server import NOT_DONE_YET
 
 
 class ModuleRootEndpoint(resource.Resource):
@@ -20,6 +23,8 @@ class ModuleRootEndpoint(resource.Resource):
         self.putChild('downloads', ModuleDownloadsEndpoint(self.ipv8))
         from module_loader.REST.run_endpoint import ModuleRunEndpoint
         self.putChild('run', ModuleRunEndpoint(self.ipv8))
+        from module_loader.REST.search_endpoint import ModuleSearchEndpoint
+        self.putChild('search', ModuleSearchEndpoint(self.ipv8))
 
 
 class ModuleEndpoint(resource.Resource):
@@ -33,6 +38,32 @@ class ModuleEndpoint(resource.Resource):
             if isinstance(overlay, ModuleCommunity):
                 return overlay
 
+    def render_deferred(self, request, deferred, render):
+        """
+        Finish the request once a persistence interaction is done, so the reactor isn't blocked while it runs.
+
+        :param request: The request being rendered
+        :param deferred: Deferred firing with the result of the interaction
+        :param render: function turning the result into the response body
+        :return: NOT_DONE_YET
+        """
+        disconnected = []
+        request.notifyFinish().addErrback(lambda _: disconnected.append(True))
+
+        def on_result(result):
+            if not disconnected:
+                request.write(render(result))
+                request.finish()
+
+        def on_failure(failure):
+            if not disconnected:
+                request.setResponseCode(http.INTERNAL_SERVER_ERROR)
+                request.write(json.dumps({"error": failure.getErrorMessage()}))
+                request.finish()
+
+        deferred.addCallbacks(on_result, on_failure)
+        return NOT_DONE_YET
+
     def render_OPTIONS(self, request):
         """
         This methods renders the HTTP OPTIONS method used for returning available HTTP methods and Cross-Origin Resource
@@ -0,0 +1,32 @@
+import json
+from operator import methodcaller
+
+from twisted.web import http
+
+from module_loader.REST.root_endpoint import ModuleEndpoint
+
+# Constants
+SEARCH_PAGE_SIZE = 20  # number of search results returned when no limit is provided
+
+
+class ModuleSearchEndpoint(ModuleEndpoint):
+
+    def __init__(self, ipv8):
+        ModuleEndpoint.__init__(self, ipv8)
+
+    def render_GET(self, request):
+        if 'q' not in request.args:
+            request.setResponseCode(http.BAD_REQUEST)
+            return json.dumps({"error": "missing search query"})
+
+        query = request.args['q'][0].decode('utf-8', 'replace')
+        try:
+            limit = int(request.args['limit'][0]) if 'limit' in request.args else SEARCH_PAGE_SIZE
+            offset = int(request.args['offset'][0]) if 'offset' in request.args else 0
+        except ValueError:
+            request.setResponseCode(http.BAD_REQUEST)
+            return json.dumps({"error": "limit and offset must be integers"})
+
+        deferred = self.get_module_overlay().run_query(methodcaller("search_catalog", query, limit, offset))
+        return self.render_deferred(request, deferred, lambda modules: json.dumps(
+            {'modules': [module.to_dict() for module in modules], 'limit': limit, 'offset': offset}))
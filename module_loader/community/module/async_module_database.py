@@ -0,0 +1,136 @@
+from __future__ import absolute_import
+
+# Default library imports
+import logging
+from operator import methodcaller
+import types
+
+# Third party imports
+from twisted.internet import reactor
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
+# Project imports
+from module_loader.community.module.storage import ModuleStorage
+
+
+class AsyncModuleDatabase(object):
+    """
+    Asynchronous facade for the module persistence layer. All calls run on a dedicated database thread and return
+    Deferreds that fire on the reactor thread. Queries on the read replica run on a separate reader thread, so they
+    don't queue behind writes.
+    """
+
+    def __init__(self, database):
+        """
+        Start the database thread
+
+        :param database: The persistence layer to run on the database thread
+        :type database: ModuleStorage
+        :raises ValueError: if the persistence layer answers replica queries on its own connection
+        """
+        super(AsyncModuleDatabase, self).__init__()
+
+        # The reader thread and the reactor would share the connection of the database thread, and read its
+        # uncommitted writes
+        if database.replica is database:
+            raise ValueError("Asynchronous persistence needs a storage with a separate read connection")
+
+        self.database = database  # type: ModuleStorage
+
+        # Logging
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        # Write-behind schedules its flushes on the reactor, every interaction commits on the database thread instead
+        if self.database._write_behind_interval is not None:
+            self._logger.warning("persistence: Write-behind interval of %s seconds is not used, every interaction "
+                                 "commits on the database thread", self.database._write_behind_interval)
+        self.database.set_write_behind(None)
+
+        self._threadpool = ThreadPool(minthreads=1, maxthreads=1, name="module-database")
+        self._threadpool.start()
+
+        self._reader_threadpool = ThreadPool(minthreads=1, maxthreads=1, name="module-database-reader")
+        self._reader_threadpool.start()
+
+    def run_interaction(self, interaction, *args, **kwargs):
+        """
+        Run a function on the database thread within a single transaction
+
+        :param interaction: function called with the persistence layer as first argument, followed by args and kwargs
+        :return: Deferred firing with the result of the function
+        """
+        return deferToThreadPool(reactor, self._threadpool, self._interaction, interaction, *args, **kwargs)
+
+    def run_query(self, query, *args, **kwargs):
+        """
+        Run a function on the reader thread against the read replica
+
+        :param query: function called with the read replica as first argument, followed by args and kwargs
+        :return: Deferred firing with the result of the function
+        """
+        return deferToThreadPool(reactor, self._reader_threadpool, self._query, query, *args, **kwargs)
+
+    def run_task(self, task, *args, **kwargs):
+        """
+        Run a function on the database thread outside of a transaction, for maintenance that can't run within one
+
+        :param task: function called with the persistence layer as first argument, followed by args and kwargs
+        :return: Deferred firing with the result of the function
+        """
+        return deferToThreadPool(reactor, self._threadpool, task, self.database, *args, **kwargs)
+
+    def _query(self, query, *args, **kwargs):
+        """
+        Run a function against the read replica, generators are consumed so no query runs outside the reader thread
+
+        :param query: function called with the read replica as first argument, followed by args and kwargs
+        :return: result of the function
+        """
+        result = query(self.database.replica, *args, **kwargs)
+
+        if isinstance(result, types.GeneratorType):
+            result = list(result)
+
+        return result
+
+    def _interaction(self, interaction, *args, **kwargs):
+        """
+        Run a function within a transaction, generators are consumed so no query runs outside the database thread
+
+        :param interaction: function called with the persistence layer as first argument, followed by args and kwargs
+        :return: result of the function
+        """
+        with self.database.transaction():
+            result = interaction(self.database, *args, **kwargs)
+
+            if isinstance(result, types.GeneratorType):
+                result = list(result)
+
+        return result
+
+    def __getattr__(self, name):
+        """
+        Proxy the methods of the persistence layer, each call runs as a separate interaction
+
+        :param name: Name of the ModuleStorage method
+        :type name: str
+        :return: function returning a Deferred
+        """
+        if not callable(getattr(self.database, name, None)):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return self.run_interaction(methodcaller(name, *args, **kwargs))
+
+        return call
+
+    def stop(self):
+        """
+        Finish all queued interactions and queries and stop the database threads
+
+        :return: None
+        """
+        self._logger.info("persistence: Stopping database threads")
+        self._reader_threadpool.stop()
+        self._threadpool.stop()
@@ -1,15 +1,58 @@
 from __future__ import absolute_import
 
+from binascii import hexlify, unhexlify
+
 from ipv8.attestation.trustchain.block import TrustChainBlock
 
+from module_loader.community.module.core.module_identifier import CREATOR_DIGEST_SIZE, get_creator_digest
+
 # Constants
 MODULE_BLOCK_TYPE_VOTE = 'module_vote'
 MODULE_BLOCK_TYPE_VOTE_KEY_CREATOR = 'creator'
 MODULE_BLOCK_TYPE_VOTE_KEY_CONTENT_HASH = 'content_hash'
 MODULE_BLOCK_TYPE_VOTE_KEY_NAME = 'name'
+MODULE_BLOCK_TYPE_VOTE_KEY_VERSION = 'v'
+MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_CREATOR = 'c'
+MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_INFO_HASH = 'h'
+MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_NAME = 'n'
+MODULE_BLOCK_TYPE_VOTE_BATCH = 'module_vote_batch'
+MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_CREATORS = 'creators'
+MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_VOTES = 'votes'
+MODULE_BLOCK_TYPES_VOTE = [MODULE_BLOCK_TYPE_VOTE, MODULE_BLOCK_TYPE_VOTE_BATCH]  # block types that carry votes
+MODULE_VOTE_BATCH_MAX_SIZE = 250  # maximum number of votes in a batch vote block, keeps the block within a UDP packet
+MODULE_VOTE_VERSION_FULL = 1  # every vote carries the creator key, the hex info hash and the name of the module
+MODULE_VOTE_VERSION_COMPACT = 2  # binary info hash and creator key digest, the first vote on a module has key and name
+MODULE_VOTE_VERSIONS = [MODULE_VOTE_VERSION_FULL, MODULE_VOTE_VERSION_COMPACT]
+INFO_HASH_SIZE = 20  # size in bytes of a binary info hash
+
+
+class PreverifiedCrypto(object):
+    """
+    Crypto of a block of which the signature was verified before it is validated, so validation doesn't verify it again
+    """
+
+    def __init__(self, crypto):
+        super(PreverifiedCrypto, self).__init__()
+
+        self.crypto = crypto
+
+    def key_from_public_bin(self, string):
+        return None
+
+    def is_valid_signature(self, public_key, msg, signature):
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self.crypto, name)
 
 
 class ModuleBlock(TrustChainBlock):
+    def __init__(self, *args, **kwargs):
+        super(ModuleBlock, self).__init__(*args, **kwargs)
+
+        # Set while trustchain validates a block of which the signature was verified in a batch before
+        self.signature_verified = False
+
     # TODO: Add create 'module_created' block and let random peers cross sign it
     @staticmethod
     def has_fields(needles, haystack):
@@ -25,11 +68,25 @@ class ModuleBlock(TrustChainBlock):
                 return False
         return True
 
+    def update_block_invariant(self, database, result):
+        if not self.signature_verified:
+            return super(ModuleBlock, self).update_block_invariant(database, result)
+
+        # Swaps the crypto that TrustChainBlock.update_block_invariant of pyipv8 1.6 verifies the signature with
+        crypto, self.crypto = self.crypto, PreverifiedCrypto(self.crypto)
+        try:
+            return super(ModuleBlock, self).update_block_invariant(database, result)
+        finally:
+            self.crypto = crypto
+
     def is_valid_vote_block(self):
-        required_fields = [MODULE_BLOCK_TYPE_VOTE_KEY_CREATOR, MODULE_BLOCK_TYPE_VOTE_KEY_CONTENT_HASH,
-                           MODULE_BLOCK_TYPE_VOTE_KEY_NAME]
         if self.type != MODULE_BLOCK_TYPE_VOTE:
             return False
+        if self.transaction.get(MODULE_BLOCK_TYPE_VOTE_KEY_VERSION) == MODULE_VOTE_VERSION_COMPACT:
+            return self.is_valid_compact_vote_block()
+
+        required_fields = [MODULE_BLOCK_TYPE_VOTE_KEY_CREATOR, MODULE_BLOCK_TYPE_VOTE_KEY_CONTENT_HASH,
+                           MODULE_BLOCK_TYPE_VOTE_KEY_NAME]
         if not ModuleBlock.has_fields(required_fields, self.transaction):
             return False
         if len(self.transaction) != len(required_fields):
@@ -42,3 +99,216 @@ class ModuleBlock(TrustChainBlock):
             return False
 
         return True
+
+    def is_valid_compact_vote_block(self):
+        required_fields = [MODULE_BLOCK_TYPE_VOTE_KEY_VERSION, MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_CREATOR,
+                           MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_INFO_HASH]
+        if self.type != MODULE_BLOCK_TYPE_VOTE:
+            return False
+        if not ModuleBlock.has_fields(required_fields, self.transaction):
+            return False
+
+        # The name is only in the first vote on a module, which carries the full creator key
+        has_name = MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_NAME in self.transaction
+        if len(self.transaction) != len(required_fields) + has_name:
+            return False
+
+        required_types = [(MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_CREATOR, bytes),
+                          (MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_INFO_HASH, bytes)]
+        if has_name:
+            required_types.append((MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_NAME, str))
+
+        if not ModuleBlock.has_required_types(required_types, self.transaction):
+            return False
+
+        return ModuleBlock.is_valid_compact_vote(self.transaction[MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_CREATOR],
+                                                self.transaction[MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_INFO_HASH],
+                                                has_name)
+
+    @staticmethod
+    def is_valid_compact_vote(creator, info_hash, has_name):
+        if len(info_hash) != INFO_HASH_SIZE:
+            return False
+        if len(creator) < CREATOR_DIGEST_SIZE:
+            return False
+        if has_name and ModuleBlock.is_creator_digest(creator):
+            return False
+        return True
+
+    def is_valid_vote_batch_block(self):
+        if self.type != MODULE_BLOCK_TYPE_VOTE_BATCH:
+            return False
+
+        version = self.transaction.get(MODULE_BLOCK_TYPE_VOTE_KEY_VERSION, MODULE_VOTE_VERSION_FULL)
+        required_fields = [MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_CREATORS, MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_VOTES]
+        if version == MODULE_VOTE_VERSION_COMPACT:
+            required_fields.append(MODULE_BLOCK_TYPE_VOTE_KEY_VERSION)
+        elif version != MODULE_VOTE_VERSION_FULL:
+            return False
+
+        if not ModuleBlock.has_fields(required_fields, self.transaction):
+            return False
+        if len(self.transaction) != len(required_fields):
+            return False
+
+        # Lists in a transaction are decoded as tuples
+        required_types = [(MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_CREATORS, (list, tuple)),
+                          (MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_VOTES, (list, tuple))]
+
+        if not ModuleBlock.has_required_types(required_types, self.transaction):
+            return False
+
+        creators = self.transaction[MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_CREATORS]
+        votes = self.transaction[MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_VOTES]
+        if not creators or not votes or len(votes) > MODULE_VOTE_BATCH_MAX_SIZE:
+            return False
+        if not all(isinstance(creator, bytes) for creator in creators) or len(set(creators)) != len(creators):
+            return False
+
+        # A full vote is a (creator index, content hash, name) triple. A compact vote is a (creator index, info hash)
+        # pair, followed by the name in the first vote on a module. A module is voted on once per block.
+        modules = set()
+        for vote in votes:
+            if not isinstance(vote, (list, tuple)):
+                return False
+            if version == MODULE_VOTE_VERSION_FULL and len(vote) != 3:
+                return False
+            if version == MODULE_VOTE_VERSION_COMPACT and len(vote) not in (2, 3):
+                return False
+
+            creator_index, content_hash = vote[0], vote[1]
+            if not isinstance(creator_index, int) or isinstance(creator_index, bool) or \
+                    not 0 <= creator_index < len(creators):
+                return False
+            if not all(isinstance(field, str) for field in vote[1:]):
+                return False
+            if version == MODULE_VOTE_VERSION_COMPACT and \
+                    not ModuleBlock.is_valid_compact_vote(creators[creator_index], content_hash, len(vote) == 3):
+                return False
+
+            modules.add((creator_index, content_hash))
+
+        return len(modules) == len(votes)
+
+    def is_valid_module_vote_block(self):
+        """
+        Check if the block is a valid single vote block or batch vote block, in either vote encoding
+
+        :return: True if the block is a valid vote block of either type, otherwise False
+        """
+        if self.type == MODULE_BLOCK_TYPE_VOTE_BATCH:
+            return self.is_valid_vote_batch_block()
+
+        return self.is_valid_vote_block()
+
+    @staticmethod
+    def is_creator_digest(creator):
+        """
+        Check if the creator of a compact vote is a digest of the creator key rather than the key itself
+
+        :param creator: The creator of the vote
+        :type creator: bytes
+        :return: True if the creator is a digest, otherwise False
+        """
+        return len(creator) == CREATOR_DIGEST_SIZE
+
+    def get_votes(self):
+        """
+        Get the votes in a single vote block or batch vote block. The creator of a compact vote is the digest of the
+        creator key unless it's the first vote on the module, the name is None if the vote doesn't carry it.
+
+        :return: list of (creator, content hash, name) tuples, empty if the block isn't a valid vote block
+        """
+        if not self.is_valid_module_vote_block():
+            return []
+
+        transaction = self.transaction
+        if self.type == MODULE_BLOCK_TYPE_VOTE:
+            if transaction.get(MODULE_BLOCK_TYPE_VOTE_KEY_VERSION) == MODULE_VOTE_VERSION_COMPACT:
+                return [(transaction[MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_CREATOR],
+                         hexlify(transaction[MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_INFO_HASH]),
+                         transaction.get(MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_NAME))]
+
+            return [(transaction[MODULE_BLOCK_TYPE_VOTE_KEY_CREATOR],
+                     transaction[MODULE_BLOCK_TYPE_VOTE_KEY_CONTENT_HASH],
+                     transaction[MODULE_BLOCK_TYPE_VOTE_KEY_NAME])]
+
+        creators = transaction[MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_CREATORS]
+        votes = transaction[MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_VOTES]
+        if transaction.get(MODULE_BLOCK_TYPE_VOTE_KEY_VERSION) == MODULE_VOTE_VERSION_COMPACT:
+            return [(creators[vote[0]], hexlify(vote[1]), vote[2] if len(vote) == 3 else None) for vote in votes]
+
+        return [(creators[creator_index], content_hash, name) for creator_index, content_hash, name in votes]
+
+    @staticmethod
+    def create_vote_transaction(module, version=MODULE_VOTE_VERSION_FULL):
+        """
+        Create the transaction of a single vote block. A compact vote carries the creator key and the name only if it's
+        the first vote on the module, otherwise voters know the module and resolve the creator digest in their catalog.
+
+        :param module: The module to vote on
+        :type module: Module
+        :param version: The vote encoding
+        :type version: int
+        :return: the transaction
+        """
+        if version == MODULE_VOTE_VERSION_FULL:
+            return {
+                MODULE_BLOCK_TYPE_VOTE_KEY_CREATOR: module.id.creator,
+                MODULE_BLOCK_TYPE_VOTE_KEY_CONTENT_HASH: module.id.content_hash,
+                MODULE_BLOCK_TYPE_VOTE_KEY_NAME: module.name,
+            }
+
+        if not module.votes:
+            return {
+                MODULE_BLOCK_TYPE_VOTE_KEY_VERSION: MODULE_VOTE_VERSION_COMPACT,
+                MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_CREATOR: module.id.creator,
+                MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_INFO_HASH: unhexlify(module.id.content_hash),
+                MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_NAME: module.name,
+            }
+
+        return {
+            MODULE_BLOCK_TYPE_VOTE_KEY_VERSION: MODULE_VOTE_VERSION_COMPACT,
+            MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_CREATOR: get_creator_digest(module.id.creator),
+            MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_INFO_HASH: unhexlify(module.id.content_hash),
+        }
+
+    @staticmethod
+    def create_vote_batch_transaction(modules, version=MODULE_VOTE_VERSION_FULL):
+        """
+        Create the transaction of a batch vote block, the creators are stored once and referenced by the votes. In the
+        compact encoding a creator is stored as a digest unless the batch has the first vote on one of its modules.
+
+        :param modules: The modules to vote on, at most MODULE_VOTE_BATCH_MAX_SIZE
+        :type modules: [Module]
+        :param version: The vote encoding
+        :type version: int
+        :return: the transaction
+        """
+        compact = version == MODULE_VOTE_VERSION_COMPACT
+
+        creators = []
+        creator_indexes = {}
+        for module in modules:
+            if module.id.creator not in creator_indexes:
+                creator_indexes[module.id.creator] = len(creators)
+                creators.append(get_creator_digest(module.id.creator) if compact else module.id.creator)
+            if compact and not module.votes:
+                creators[creator_indexes[module.id.creator]] = module.id.creator
+
+        votes = []
+        for module in modules:
+            if not compact:
+                votes.append([creator_indexes[module.id.creator], module.id.content_hash, module.name])
+            elif not module.votes:
+                votes.append([creator_indexes[module.id.creator], unhexlify(module.id.content_hash), module.name])
+            else:
+                votes.append([creator_indexes[module.id.creator], unhexlify(module.id.content_hash)])
+
+        transaction = {
+            MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_CREATORS: creators,
+            MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_VOTES: votes,
+        }
+        if compact:
+            transaction[MODULE_BLOCK_TYPE_VOTE_KEY_VERSION] = MODULE_VOTE_VERSION_COMPACT
+        return transaction
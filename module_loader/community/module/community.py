@@ -2,30 +2,51 @@ from __future__ import absolute_import
 
 # Default library imports
 from binascii import unhexlify, hexlify
+from collections import OrderedDict
 import logging
+from operator import methodcaller
 import os
+import random
+import struct
 import sys
+import time
+import types
 
 # Third party imports
 from ipv8.attestation.trustchain.block import TrustChainBlock
 from ipv8.attestation.trustchain.community import TrustChainCommunity
 from ipv8.attestation.trustchain.listener import BlockListener
 from ipv8.community import Community
+from ipv8.lazy_community import lazy_wrapper
+from ipv8.messaging.payload_headers import BinMemberAuthenticationPayload, GlobalTimeDistributionPayload
 from ipv8.peer import Peer
 from ipv8_service import IPv8
 from twisted.application.service import MultiService
-from twisted.internet import reactor
+from twisted.internet.defer import fail, gatherResults, maybeDeferred, succeed
 from twisted.internet.task import LoopingCall
 
 # Project imports
 from module_loader import util
-from module_loader.community.module.block import ModuleBlock, MODULE_BLOCK_TYPE_VOTE, MODULE_BLOCK_TYPE_VOTE_KEY_CREATOR, \
-    MODULE_BLOCK_TYPE_VOTE_KEY_CONTENT_HASH, MODULE_BLOCK_TYPE_VOTE_KEY_NAME
+from module_loader.community.module.block import ModuleBlock, MODULE_BLOCK_TYPE_VOTE, MODULE_BLOCK_TYPE_VOTE_BATCH, \
+    MODULE_BLOCK_TYPES_VOTE, MODULE_VOTE_BATCH_MAX_SIZE, MODULE_VOTE_VERSION_FULL
 from module_loader.community.module.core.module import Module
-from module_loader.community.module.core.module_identifier import ModuleIdentifier
-from module_loader.community.module.module_database import ModuleDatabase
+from module_loader.community.module.core.module_identifier import ModuleIdentifier, get_creator_digest
+from module_loader.community.module.async_module_database import AsyncModuleDatabase
+from module_loader.community.module.crawler import ChainCrawler, CrawlScheduler, CRAWL_BUDGET, CRAWL_MAX_IN_FLIGHT, \
+    CRAWL_SCHEDULE_INTERVAL
+from module_loader.community.module.hybrid_module_database import HybridModuleDatabase
+from module_loader.community.module.ingestion import BlockIngestionQueue
+from module_loader.community.module.lag_monitor import ReactorLagMonitor
+from module_loader.community.module.maintenance import MaintenanceJob, MaintenanceScheduler, MAINTENANCE_TIME_BUDGET
+from module_loader.community.module.module_index import InvertibleBloomLookupTable, ScalableBloomFilter
+from module_loader.community.module.payload import CatalogDifferencePayload, CatalogSketchPayload, \
+    ModuleAnnouncementPayload
+from module_loader.community.module.reconciliation import CatalogSyncRateLimiter, CatalogSyncSession, pack_elements, \
+    unpack_elements, CATALOG_SYNC_INTERVAL, CATALOG_SYNC_MAX_BLOCKS_SENT, CATALOG_SYNC_MAX_CELLS, CATALOG_SYNC_PAGE_SIZE
 from module_loader.community.module.execution.engine import ExecutionEngine
+from module_loader.community.module.storage import create_module_storage, ModuleStorage, STORAGE_BACKEND_SQLITE
 from module_loader.community.module.transport.bittorrent import BittorrentTransport
+from module_loader.community.module.verification import CrawlResponseVerifier, SignatureVerifier, VERIFY_PROCESSES
 from module_loader.event.bus import EventBus
 
 # Constants
@@ -34,6 +55,19 @@ MODULE_CACHE_DIR = "cache"  # module cache directory
 MODULE_LIBRARY_DIR = "package"  # module library directory
 MODULE_PACKAGE_DIR = "package"  # module package directory
 MODULE_TORRENT_DIR = "torrents"  # module torrent directory
+REACTOR_LAG_INTERVAL = 0.5  # interval in seconds between reactor lag samples
+PERSISTENCE_BACKUP_CHECK_INTERVAL = 1.0  # interval in seconds between checks if an in-memory database needs a backup
+VOTE_RECONCILE_INTERVAL = 300  # interval in seconds between reconciliations of new vote blocks with the catalog
+VOTE_RECONCILE_CHUNK_SIZE = 200  # maximum number of blocks of a chain reconciled in one transaction
+VOTE_FILTER_ERROR_RATE = 0.001  # false positive rate of the filter of known votes, the share of new votes looked up
+VOTE_FILTER_LOAD_PAGE_SIZE = 2000  # number of votes added to the filter of known votes per step while loading it
+VOTE_FILTER_KEY = struct.Struct(">HH")  # lengths of the voter and creator keys, prefixed to a filter key
+MODULE_ANNOUNCEMENT_MESSAGE = 1  # message identifier of module announcements
+CATALOG_SKETCH_MESSAGE = 2  # message identifier of catalog sketches
+CATALOG_DIFFERENCE_MESSAGE = 3  # message identifier of catalog differences
+ANNOUNCEMENT_FANOUT = 5  # number of peers a module announcement is sent to by each peer
+ANNOUNCEMENT_TTL = 4  # number of hops a module announcement travels
+ANNOUNCEMENT_CACHE_SIZE = 10000  # number of announced modules remembered until a vote on them adds them to the catalog
 
 
 class ModuleCommunity(Community, BlockListener):
@@ -77,15 +111,86 @@ class ModuleCommunity(Community, BlockListener):
         self.working_directory = kwargs.pop('working_directory', "./")  # type: str
         self.ipv8 = kwargs.pop('ipv8')  # type: IPv8
         self.master_service = kwargs.pop('service')  # type: MultiService
+        self.persistence_flush_interval = kwargs.pop('persistence_flush_interval', None)  # type: float
+        self.async_persistence_enabled = kwargs.pop('async_persistence', False)  # type: bool
+        self.storage_backend = kwargs.pop('storage_backend', STORAGE_BACKEND_SQLITE)  # type: str
+        self.storage_options = kwargs.pop('storage_options', {})  # type: dict
+        self.maintenance_time_budget = kwargs.pop('maintenance_time_budget', MAINTENANCE_TIME_BUDGET)  # type: float
+        self.vote_filter_error_rate = kwargs.pop('vote_filter_error_rate', VOTE_FILTER_ERROR_RATE)  # type: float
+        self.crawl_max_in_flight = kwargs.pop('crawl_max_in_flight', CRAWL_MAX_IN_FLIGHT)  # type: int
+        self.crawl_budget = kwargs.pop('crawl_budget', CRAWL_BUDGET)  # type: int
+        self.vote_version = kwargs.pop('vote_version', MODULE_VOTE_VERSION_FULL)  # type: int
+        self.verify_processes = kwargs.pop('verify_processes', VERIFY_PROCESSES)  # type: int
 
         # Logging
         self._logger = logging.getLogger(self.__class__.__name__)
 
         # Block listeners
-        self.trustchain.add_listener(self, [MODULE_BLOCK_TYPE_VOTE])
+        self.trustchain.add_listener(self, MODULE_BLOCK_TYPES_VOTE)
+
+        # Message handlers
+        self.add_message_handler(MODULE_ANNOUNCEMENT_MESSAGE, self.on_module_announcement)
+        self.add_message_handler(CATALOG_SKETCH_MESSAGE, self.on_catalog_sketch)
+        self.add_message_handler(CATALOG_DIFFERENCE_MESSAGE, self.on_catalog_difference)
+
+        # Announced modules we have seen by creator digest and content hash, oldest first. An announced module is added
+        # to the catalog by the first vote on it, which may leave out the name and creator key of the module.
+        self.announced_modules = OrderedDict()  # type: {(bytes, str): Module}
+        self.announcement_statistics = {
+            'sent': 0,
+            'received': 0,
+            'duplicates': 0,
+            'invalid': 0,
+            'forwarded': 0,
+            'added': 0,
+        }
+
+        # Catalog reconciliation we started, if any
+        self.catalog_sync = None  # type: CatalogSyncSession
+        self.catalog_sync_rate_limiter = CatalogSyncRateLimiter()  # type: CatalogSyncRateLimiter
+        self.catalog_sync_statistics = {
+            'started': 0,
+            'completed': 0,
+            'too_large': 0,
+            'sketches_sent': 0,
+            'sketch_bytes_sent': 0,
+            'sketches_received': 0,
+            'invalid_sketches': 0,
+            'unverified_sketches': 0,
+            'rate_limited_sketches': 0,
+            'busy': 0,
+            'decode_failures': 0,
+            'votes_requested': 0,
+            'votes_sent': 0,
+            'vote_bytes_sent': 0,
+            'votes_unavailable': 0,
+            'send_limit_reached': 0,
+        }
+
+        # Compact votes on modules that aren't in the catalog yet are kept in the persistence layer until it's added
+        self.vote_resolution_statistics = {
+            'unresolved': 0,
+            'resolved': 0,
+            'pending': 0,
+        }
+
+        # Modules this node is voting on, from the vote request until the vote block is signed and recorded
+        self.votes_in_flight = set()  # type: {ModuleIdentifier}
+
+        # Signatures of crawled vote blocks are verified in batches by worker processes, which are forked before the
+        # database threads and the transport start
+        self.signature_verifier = None  # type: SignatureVerifier
+        if self.verify_processes > 0:
+            self.signature_verifier = SignatureVerifier(self.verify_processes)
 
         # Database
-        self.persistence = ModuleDatabase(self.working_directory, MODULE_DATABASE_NAME)
+        self.persistence = create_module_storage(self.storage_backend, self.working_directory, MODULE_DATABASE_NAME,
+                                                 **self.storage_options)  # type: ModuleStorage
+        self.persistence.set_write_behind(self.persistence_flush_interval)
+        self.async_persistence = None  # type: AsyncModuleDatabase
+        if self.async_persistence_enabled:
+            self.async_persistence = AsyncModuleDatabase(self.persistence)
+        self.vote_resolution_statistics['pending'] = self.persistence.count_pending_votes()
 
         # Sub components
         self.transport = BittorrentTransport(self.working_directory)
@@ -99,12 +204,55 @@ class ModuleCommunity(Community, BlockListener):
         # Load namespaces into path for live module loading
         self._load_module_library_namespace()
 
+        # Received vote blocks are processed in batches
+        self.vote_ingestion = BlockIngestionQueue(self._ingest_vote_blocks)
+
+        # Long maintenance jobs run in chunks, so they don't block the reactor
+        self.maintenance = MaintenanceScheduler(self.maintenance_time_budget)
+
+        # Filter of known votes, so received votes we already have are dropped without a persistence interaction
+        self.vote_filter = ScalableBloomFilter(self.vote_filter_error_rate)
+        self.maintenance.run("vote_filter", self._load_vote_filter).addErrback(self._log_persistence_failure)
+
         # Task for verifying votes in the network
-        self.module_verify_task = self.register_task("module_verify", reactor.callLater(5, self._check_votes_in_catalog))
+        self.module_verify_task = self.register_task("module_verify", LoopingCall(self._check_votes_in_catalog),
+                                                     delay=5, interval=VOTE_RECONCILE_INTERVAL)
+
+        # Crawled vote blocks are verified by the worker processes before trustchain sees them, without the workers
+        # trustchain verifies them itself
+        self.crawl_verifier = None  # type: CrawlResponseVerifier
+        if self.signature_verifier:
+            self.crawl_verifier = CrawlResponseVerifier(self.trustchain, self.signature_verifier,
+                                                        MODULE_BLOCK_TYPES_VOTE)
+
+        # Neighbours that yield new votes are crawled more often, within the crawl budget
+        self.crawl_scheduler = CrawlScheduler(self.crawl_budget)
+
+        # Chains of neighbours are crawled from the highest sequence number crawled before, every range requested
+        # after the first one of a crawl is taken from the crawl budget
+        self.crawler = ChainCrawler(self.trustchain, self.run_persistence, self.crawl_max_in_flight,
+                                    may_request=self.crawl_scheduler.request)
 
         # Task for crawling neighbours for undiscovered modules
-        self.module_crawl_task = self.register_task("module_crawl", LoopingCall(self._crawl_vote_blocks), delay=20,
-                                                  interval=3600)
+        self.module_crawl_task = self.register_task("module_crawl", LoopingCall(self._crawl_vote_blocks),
+                                                  delay=CRAWL_SCHEDULE_INTERVAL, interval=CRAWL_SCHEDULE_INTERVAL)
+
+        # Task for reconciling the catalog with a random neighbour
+        self.catalog_sync_task = self.register_task("catalog_sync", LoopingCall(self._sync_catalog),
+                                                    delay=CATALOG_SYNC_INTERVAL, interval=CATALOG_SYNC_INTERVAL)
+
+        # Task for measuring how long the reactor thread is blocked
+        self.reactor_lag_monitor = ReactorLagMonitor(REACTOR_LAG_INTERVAL)
+        self.reactor_lag_task = self.register_task("reactor_lag", LoopingCall(self.reactor_lag_monitor.sample),
+                                                   delay=0, interval=REACTOR_LAG_INTERVAL)
+
+        # Task for backing up an in-memory database to disk
+        self._persistence_backup = None
+        if isinstance(self.persistence, HybridModuleDatabase):
+            self.persistence_backup_task = self.register_task("persistence_backup",
+                                                              LoopingCall(self._backup_persistence),
+                                                              delay=PERSISTENCE_BACKUP_CHECK_INTERVAL,
+                                                              interval=PERSISTENCE_BACKUP_CHECK_INTERVAL)
 
     # Util functions
     def _setup_working_directory_structure(self):
@@ -137,12 +285,161 @@ class ModuleCommunity(Community, BlockListener):
         module_library_directory = os.path.join(self.working_directory, MODULE_LIBRARY_DIR)
         sys.path.append(os.path.abspath(module_library_directory))
 
+    def run_persistence(self, interaction, *args, **kwargs):
+        """
+        Run a function against the persistence layer within a single transaction. With asynchronous persistence the
+        function runs on the database thread, otherwise it runs directly on the reactor thread.
+
+        :param interaction: function called with the persistence layer as first argument, followed by args and kwargs
+        :return: Deferred firing with the result of the function
+        """
+        if self.async_persistence:
+            return self.async_persistence.run_interaction(interaction, *args, **kwargs)
+
+        try:
+            with self.persistence.transaction():
+                result = interaction(self.persistence, *args, **kwargs)
+
+                if isinstance(result, types.GeneratorType):
+                    result = list(result)
+        except Exception:
+            return fail()
+
+        return succeed(result)
+
+    def run_query(self, query, *args, **kwargs):
+        """
+        Run a function against the read replica of the persistence layer, which only sees committed writes. With
+        asynchronous persistence the function runs on the reader thread, otherwise it runs directly on the reactor thread.
+
+        :param query: function called with the read replica as first argument, followed by args and kwargs
+        :return: Deferred firing with the result of the function
+        """
+        if self.async_persistence:
+            return self.async_persistence.run_query(query, *args, **kwargs)
+
+        try:
+            result = query(self.persistence.replica, *args, **kwargs)
+
+            if isinstance(result, types.GeneratorType):
+                result = list(result)
+        except Exception:
+            return fail()
+
+        return succeed(result)
+
+    def _log_persistence_failure(self, failure):
+        """
+        Log a failed persistence interaction
+
+        :param failure: The failure of the interaction
+        :type failure: Failure
+        :return: None
+        """
+        self._logger.error("module-community: Persistence interaction failed: %s", failure.getErrorMessage())
+
+    def _backup_persistence(self):
+        """
+        Back up the in-memory database to disk when a backup is due
+
+        :return: None
+        """
+        if self._persistence_backup is not None or not self.persistence.backup_due():
+            return
+
+        self._persistence_backup = maybeDeferred(self.persistence.backup)
+
+        def on_done(_):
+            self._persistence_backup = None
+
+        self._persistence_backup.addErrback(self._log_persistence_failure)
+        self._persistence_backup.addBoth(on_done)
+
+    def get_reactor_lag_statistics(self):
+        """
+        Get the measured reactor lag
+
+        :return: dictionary with the reactor lag statistics
+        """
+        return self.reactor_lag_monitor.get_statistics()
+
+    def get_maintenance_statistics(self):
+        """
+        Get the progress and reactor stall time of the maintenance jobs
+
+        :return: dictionary with the statistics of each maintenance job by name
+        """
+        return self.maintenance.get_statistics()
+
+    def get_ingestion_statistics(self):
+        """
+        Get the statistics of the processing of received vote blocks
+
+        :return: dictionary with the ingestion statistics
+        """
+        return self.vote_ingestion.get_statistics()
+
+    def get_vote_filter_statistics(self):
+        """
+        Get the size, false positive rate and hits of the filter of known votes
+
+        :return: dictionary with the vote filter statistics
+        """
+        return self.vote_filter.get_statistics()
+
+    def get_vote_resolution_statistics(self):
+        """
+        Get the statistics of the compact votes on modules that weren't in the catalog when they were received
+
+        :return: dictionary with the number of unresolved and resolved votes and of the votes that are still pending
+        """
+        return dict(self.vote_resolution_statistics)
+
+    def get_crawl_statistics(self):
+        """
+        Get the number of crawl requests, the received blocks and the bytes saved by the crawl cursors
+
+        :return: dictionary with the crawl statistics
+        """
+        statistics = self.crawler.get_statistics()
+        statistics.update(self.crawl_scheduler.get_statistics())
+        return statistics
+
+    def get_verification_statistics(self):
+        """
+        Get the statistics of the verification of the signatures of crawled vote blocks
+
+        :return: dictionary with the verification statistics, including the blocks verified per second per core, empty
+        if trustchain verifies the signatures
+        """
+        if not self.signature_verifier:
+            return {}
+
+        return self.signature_verifier.get_statistics()
+
+    def get_announcement_statistics(self):
+        """
+        Get the number of sent, received, duplicate, invalid and forwarded module announcements and the number of
+        announced modules that votes added to the catalog
+
+        :return: dictionary with the announcement statistics
+        """
+        return dict(self.announcement_statistics)
+
+    def get_catalog_sync_statistics(self):
+        """
+        Get the number of catalog reconciliations, the sketches and votes exchanged and their size in bytes
+
+        :return: dictionary with the catalog reconciliation statistics
+        """
+        return dict(self.catalog_sync_statistics)
+
     # Interface functions
     def create_module(self, name):
         """
         Create a module
 
-        :return: None
+        :return: Deferred firing when the persistence layer is updated
         """
         module_package_directory = os.path.join(self.working_directory, MODULE_PACKAGE_DIR, name)
 
@@ -155,6 +452,7 @@ class ModuleCommunity(Community, BlockListener):
         package = self.transport.create_module_package(name)
         info_hash = str(package['info_hash'])
         name = str(package['name'])
+        size = package['size']
 
         identifier = ModuleIdentifier(self.my_peer.public_key.key_to_bin(), info_hash)
         module = Module(identifier, name)
@@ -165,14 +463,17 @@ class ModuleCommunity(Community, BlockListener):
             self._logger.info("module-community: module (%s) already exists, not creating new one", module.id)
             return
 
-        self.persistence.add_module_to_catalog(module)
-        self.vote_module(module.id)
+        deferred = self.run_persistence(methodcaller("add_module_to_catalog", module))
+        deferred.addCallback(lambda _: self.announce_module(module, size))
+        deferred.addCallback(lambda _: self.vote_module(module.id))
+        deferred.addErrback(self._log_persistence_failure)
+        return deferred
 
     def create_module_test(self):
         """
         Create a test module
 
-        :return: None
+        :return: Deferred firing when the persistence layer is updated
         """
         info_hash = "0000000000000000000000000000000000000000"
         name = "test"
@@ -186,8 +487,11 @@ class ModuleCommunity(Community, BlockListener):
             self._logger.info("module-community: test module (%s) already exists, not creating new one", module.id)
             return
 
-        self.persistence.add_module_to_catalog(module)
-        self.vote_module(module.id)
+        deferred = self.run_persistence(methodcaller("add_module_to_catalog", module))
+        deferred.addCallback(lambda _: self.announce_module(module, 0))
+        deferred.addCallback(lambda _: self.vote_module(module.id))
+        deferred.addErrback(self._log_persistence_failure)
+        return deferred
 
     def download_module(self, module_identifier):
         """
@@ -195,7 +499,7 @@ class ModuleCommunity(Community, BlockListener):
 
         :param module_identifier: module identifier
         :type module_identifier: ModuleIdentifier
-        :return: None
+        :return: Deferred firing when the persistence layer is updated
         """
         if self.persistence.has_module_in_cache(module_identifier):
             self._logger.info("module-community: module (%s) already downloaded, not downloading again", module_identifier)
@@ -203,16 +507,18 @@ class ModuleCommunity(Community, BlockListener):
 
         self._logger.info("module-community: downloading module (%s)", module_identifier)
 
-        if not self.persistence.has_module_in_catalog(module_identifier):
-            self._logger.info("module-community: module (%s) not in catalog, not downloading", module_identifier)
-            return
-
-        module = self.persistence.get_module_from_catalog(module_identifier)
+        def on_module(module):
+            if not module:
+                self._logger.info("module-community: module (%s) not in catalog, not downloading", module_identifier)
+                return
 
-        if module:
             self.transport.download_module(module)
-            self.persistence.add_module_to_cache(module.id)
-            self.persistence.add_module_to_library(module.id)
+            return self.run_persistence(self._add_downloaded_module, module)
+
+        deferred = self.run_persistence(methodcaller("get_module_from_catalog", module_identifier))
+        deferred.addCallback(on_module)
+        deferred.addErrback(self._log_persistence_failure)
+        return deferred
 
     def get_module_from_catalog(self, module_identifier):
         """
@@ -223,7 +529,7 @@ class ModuleCommunity(Community, BlockListener):
         :return: The module requested or None if it doesn't exist
         """
         self._logger.info("module-community: Getting module (%s) from catalog", module_identifier)
-        return self.persistence.get_module_from_catalog(module_identifier)
+        return self.persistence.replica.get_module_from_catalog(module_identifier)
 
     def get_modules_from_catalog(self):
         """
@@ -232,7 +538,30 @@ class ModuleCommunity(Community, BlockListener):
         :return: All modules
         """
         self._logger.debug("module-community: Getting all modules from catalog")
-        return self.persistence.get_modules_from_catalog()
+        return self.persistence.replica.get_modules_from_catalog()
+
+    def iter_modules_from_catalog(self, order_by=None, limit=None, offset=0):
+        """
+        Iterate over a page of modules from the catalog
+
+        :param order_by: Catalog ordering, see ModuleStorage.iter_catalog
+        :type order_by: str
+        :param limit: Maximum number of modules to return, or None for all
+        :type limit: int
+        :param offset: Number of modules to skip
+        :type offset: int
+        :return: generator of modules
+        """
+        self._logger.debug("module-community: Iterating modules from catalog (limit: %s, offset: %d)", limit, offset)
+        return self.persistence.replica.iter_catalog(order_by, limit, offset)
+
+    def count_modules_in_catalog(self):
+        """
+        Count the modules in the catalog
+
+        :return: Number of modules in the catalog
+        """
+        return self.persistence.replica.count_modules_in_catalog()
 
     def run_module(self, module_identifier):
         """
@@ -240,7 +569,7 @@ class ModuleCommunity(Community, BlockListener):
 
         :param module_identifier: module identifier
         :type module_identifier: ModuleIdentifier
-        :return: None
+        :return: Deferred firing when the persistence layer is updated
         """
         self._logger.info("module-community: running module (%s)", module_identifier)
 
@@ -248,10 +577,37 @@ class ModuleCommunity(Community, BlockListener):
             self._logger.info("module-community: module (%s) not in library, not running", module_identifier)
             return
 
-        module = self.persistence.get_module_from_catalog(module_identifier)
+        def on_module(module):
+            if module:
+                self.execution_engine.run_module(module)
 
-        if module:
-            self.execution_engine.run_module(module)
+        deferred = self.run_persistence(methodcaller("get_module_from_catalog", module_identifier))
+        deferred.addCallback(on_module)
+        deferred.addErrback(self._log_persistence_failure)
+        return deferred
+
+    def announce_module(self, module, size):
+        """
+        Announce a module we created to a fanout of peers, which forward the announcement to their peers
+
+        :param module: module
+        :type module: Module
+        :param size: Size of the module in bytes
+        :type size: int
+        :return: None
+        """
+        creator = module.id.creator
+        info_hash = unhexlify(module.id.content_hash)
+
+        signed_data = ModuleAnnouncementPayload.get_signed_data(creator, info_hash, module.name, size)
+        signature = self.crypto.create_signature(self.my_peer.key, signed_data)
+        payload = ModuleAnnouncementPayload(creator, info_hash, module.name, size, signature, ANNOUNCEMENT_TTL)
+
+        self._logger.info("module-community: Announcing module (%s, %s)", module.id, module.name)
+
+        self._remember_announcement(module)
+        self.announcement_statistics['sent'] += 1
+        self._send_announcement(payload)
 
     def vote_module(self, module_identifier):
         """
@@ -259,27 +615,97 @@ class ModuleCommunity(Community, BlockListener):
 
         :param module_identifier: module identifier
         :type module_identifier: ModuleIdentifier
-        :return: None
+        :return: Deferred firing when the vote is recorded in the persistence layer
         """
-        if not self.persistence.has_module_in_catalog(module_identifier):
-            self._logger.info("module-community: module (%s) not in catalog, not voting", module_identifier)
-            return
-
-        if self.persistence.did_vote(self.my_peer.public_key.key_to_bin(), module_identifier):
+        if module_identifier in self.votes_in_flight or \
+                self.persistence.did_vote(self.my_peer.public_key.key_to_bin(), module_identifier):
             self._logger.info("module-community: Already voted on module (%s), not voting", module_identifier)
-            return
+            return succeed(None)
 
-        module = self.persistence.get_module_from_catalog(module_identifier)
+        # A second vote request while this one waits for the catalog or the signature doesn't sign a second block
+        self.votes_in_flight.add(module_identifier)
 
-        if module:
-            # Add vote to catalog and votes
-            self.persistence.add_vote_to_votes(self.my_peer.public_key.key_to_bin(), module.id)
-            self.persistence.add_vote_to_module_in_catalog(module.id)
+        def on_module(module):
+            if not module:
+                self._logger.info("module-community: module (%s) not in catalog, not voting", module_identifier)
+                return
 
             self._logger.info("module-community: Vote for module (%s, %s)", module.id, module.name)
-            self._sign_module(module)
+            return self._sign_module(module)
+
+        deferred = self.run_persistence(methodcaller("get_module_from_catalog", module_identifier))
+        deferred.addCallback(on_module)
+        deferred.addErrback(self._log_persistence_failure)
+        deferred.addBoth(self._end_votes_in_flight, [module_identifier])
+        return deferred
+
+    def vote_modules(self, module_identifiers):
+        """
+        Vote on the modules with provided module ids. The votes are signed in batch vote blocks, a block per
+        MODULE_VOTE_BATCH_MAX_SIZE votes, instead of a block per vote.
+
+        :param module_identifiers: module identifiers
+        :type module_identifiers: [ModuleIdentifier]
+        :return: Deferred firing when the votes are recorded in the persistence layer
+        """
+        public_key = self.my_peer.public_key.key_to_bin()
+
+        # Modules another vote request is voting on already are left out, the rest are in flight until signed
+        module_identifiers = [module_identifier for module_identifier in OrderedDict.fromkeys(module_identifiers)
+                              if module_identifier not in self.votes_in_flight]
+        self.votes_in_flight.update(module_identifiers)
+
+        def get_modules(persistence):
+            modules = []
+            for module_identifier in module_identifiers:
+                if persistence.did_vote(public_key, module_identifier):
+                    self._logger.info("module-community: Already voted on module (%s), not voting", module_identifier)
+                    continue
+
+                module = persistence.get_module_from_catalog(module_identifier)
+                if not module:
+                    self._logger.info("module-community: module (%s) not in catalog, not voting", module_identifier)
+                    continue
+
+                modules.append(module)
+            return modules
+
+        def on_modules(modules):
+            return gatherResults([self._sign_modules(modules[start:start + MODULE_VOTE_BATCH_MAX_SIZE])
+                                  for start in range(0, len(modules), MODULE_VOTE_BATCH_MAX_SIZE)], consumeErrors=True)
+
+        deferred = self.run_persistence(get_modules)
+        deferred.addCallback(on_modules)
+        deferred.addErrback(self._log_persistence_failure)
+        deferred.addBoth(self._end_votes_in_flight, module_identifiers)
+        return deferred
+
+    def _end_votes_in_flight(self, result, module_identifiers):
+        """
+        Internal callback for ending the vote requests on modules, once their votes are recorded or failed
+
+        :param result: The result of the vote request, passed on
+        :param module_identifiers: module identifiers
+        :type module_identifiers: [ModuleIdentifier]
+        :return: the result
+        """
+        self.votes_in_flight.difference_update(module_identifiers)
+        return result
 
     # Internal logic functions
+    def _add_downloaded_module(self, persistence, module):
+        """
+        Internal function for adding a downloaded module to the cache and library
+
+        :param persistence: The persistence layer
+        :type persistence: ModuleStorage
+        :param module: module
+        :type module: Module
+        :return: None
+        """
+        persistence.add_module_to_cache(module.id)
+        persistence.add_module_to_library(module.id)
+
     def should_sign(self, block):
         """
         Function to determine if a block sign request should be signed
@@ -291,7 +717,7 @@ class ModuleCommunity(Community, BlockListener):
         self._logger.debug("module-community: Received sign request for block (%s)", block.block_id)
 
         # Vote block
-        if block.type == MODULE_BLOCK_TYPE_VOTE:
+        if block.type in MODULE_BLOCK_TYPES_VOTE:
             return True
 
         return False
@@ -307,45 +733,692 @@ class ModuleCommunity(Community, BlockListener):
         self._logger.debug("module-community: Received block (%s)", block.block_id)
 
         # Vote block
-        if block.type == MODULE_BLOCK_TYPE_VOTE:
-            self._process_vote_block(block)
+        if block.type in MODULE_BLOCK_TYPES_VOTE:
+            self.vote_ingestion.push(block)
 
-    def _process_vote_block(self, block):
+    @lazy_wrapper(GlobalTimeDistributionPayload, ModuleAnnouncementPayload)
+    def on_module_announcement(self, peer, dist, payload):
         """
-        Internal function for processing vote blocks
+        Callback function for processing received module announcements. A new announcement signed by the creator of
+        the module is remembered until a vote block on the module adds it to the catalog, and is forwarded until its
+        TTL runs out. The TTL isn't signed, so it is capped at the TTL we announce modules with.
+
+        :param peer: The peer that sent the announcement
+        :type peer: Peer
+        :param dist: The global time of the message
+        :type dist: GlobalTimeDistributionPayload
+        :param payload: The announcement
+        :type payload: ModuleAnnouncementPayload
+        :return: None
+        """
+        self.announcement_statistics['received'] += 1
 
-        :param block: The block to be processed
+        module = Module(ModuleIdentifier(payload.creator, hexlify(payload.info_hash)), payload.name)
+
+        announced_module = self.announced_modules.get((get_creator_digest(module.id.creator), module.id.content_hash))
+        if announced_module is not None and announced_module.id == module.id:
+            self.announcement_statistics['duplicates'] += 1
+            return
+
+        try:
+            creator_key = self.crypto.key_from_public_bin(payload.creator)
+            valid = self.crypto.is_valid_signature(creator_key, payload.signed_data, payload.signature)
+        except Exception:
+            valid = False
+
+        if not valid:
+            self._logger.debug("module-community: Invalid module announcement received from %s", peer)
+            self.announcement_statistics['invalid'] += 1
+            return
+
+        self._remember_announcement(module)
+
+        deferred = self.run_persistence(self._add_announced_module, module)
+        deferred.addErrback(self._log_persistence_failure)
+
+        ttl = min(payload.ttl, ANNOUNCEMENT_TTL)
+        if ttl > 1:
+            self.announcement_statistics['forwarded'] += 1
+            payload.ttl = ttl - 1
+            self._send_announcement(payload, exclude=(peer.public_key.key_to_bin(), payload.creator))
+
+    def _remember_announcement(self, module):
+        """
+        Internal function for remembering an announced module, so later announcements of it are dropped and votes on it
+        can add it to the catalog
+
+        :param module: The announced module
+        :type module: Module
+        :return: None
+        """
+        self.announced_modules[(get_creator_digest(module.id.creator), module.id.content_hash)] = module
+
+        if len(self.announced_modules) > ANNOUNCEMENT_CACHE_SIZE:
+            self.announced_modules.popitem(last=False)
+
+    def _send_announcement(self, payload, exclude=()):
+        """
+        Internal function for sending a module announcement to a fanout of random peers
+
+        :param payload: The announcement
+        :type payload: ModuleAnnouncementPayload
+        :param exclude: Public keys of the peers that should not receive the announcement
+        :type exclude: (bytes)
+        :return: None
+        """
+        peers = [peer for peer in self.get_peers() if peer.public_key.key_to_bin() not in exclude]
+        if not peers:
+            return
+
+        packet = self._create_packet(MODULE_ANNOUNCEMENT_MESSAGE, payload)
+        for peer in random.sample(peers, min(len(peers), ANNOUNCEMENT_FANOUT)):
+            self.endpoint.send(peer.address, packet)
+
+    def _create_packet(self, message, payload):
+        """
+        Internal function for creating a signed message
+
+        :param message: The message identifier
+        :type message: int
+        :param payload: The payload of the message
+        :type payload: Payload
+        :return: the packet
+        """
+        auth = BinMemberAuthenticationPayload(self.my_peer.public_key.key_to_bin()).to_pack_list()
+        dist = GlobalTimeDistributionPayload(self.claim_global_time()).to_pack_list()
+        return self._ez_pack(self._prefix, message, [auth, dist, payload.to_pack_list()])
+
+    def _add_announced_module(self, persistence, module):
+        """
+        Internal function for adding an announced module to the catalog if compact votes on it were received before the
+        announcement and kept until the module is known. Otherwise the module waits for a vote block on it.
+
+        :param persistence: The persistence layer
+        :type persistence: ModuleStorage
+        :param module: module
+        :type module: Module
+        :return: True if the module was added, False if it was in the catalog already or has no votes yet
+        """
+        if persistence.has_module_in_catalog(module.id):
+            return False
+
+        votes = persistence.pop_pending_votes(get_creator_digest(module.id.creator), module.id.content_hash)
+        if not votes:
+            return False
+
+        self._logger.info("module-community: Adding announced module to catalog (%s, %s)", module.id, module.name)
+        persistence.add_module_to_catalog(module)
+        self.announcement_statistics['added'] += 1
+        self._record_pending_votes(persistence, module, votes)
+        return True
+
+    def _sync_catalog(self):
+        """
+        Reconcile the votes in the catalog with a random neighbour
+
+        :return: Deferred firing when the sketch of our votes is sent
+        """
+        if self.maintenance.is_running("catalog_sync"):
+            return succeed(None)
+
+        peers = self.get_peers()
+        if not peers:
+            return succeed(None)
+
+        peer = random.choice(peers)
+        self._logger.info("module-community: Reconciling catalog with peer %s", peer)
+
+        deferred = self.maintenance.run("catalog_sync", self._start_catalog_sync, peer)
+        deferred.addErrback(self._log_persistence_failure)
+        return deferred
+
+    def _start_catalog_sync(self, job, peer):
+        """
+        Internal maintenance job for starting a catalog reconciliation with a peer by sending it the sketch of our votes
+
+        :param job: The job statistics
+        :type job: MaintenanceJob
+        :param peer: The peer to reconcile with
+        :type peer: Peer
+        :return: generator of job chunks
+        """
+        elements = []
+        for step in self._read_vote_elements(job, elements):
+            yield step
+
+        self.catalog_sync = CatalogSyncSession(peer, elements)
+        self.catalog_sync_statistics['started'] += 1
+
+        for step in self._send_catalog_sketch(job, self.catalog_sync):
+            yield step
+
+    def _send_catalog_sketch(self, job, session):
+        """
+        Internal maintenance job for sending the sketch of our votes at the current size of the reconciliation
+
+        :param job: The job statistics
+        :type job: MaintenanceJob
+        :param session: The reconciliation
+        :type session: CatalogSyncSession
+        :return: generator of job chunks
+        """
+        sketch = session.create_sketch()
+        for step in self._fill_sketch(sketch, session.elements):
+            yield step
+
+        packet = self._create_packet(CATALOG_SKETCH_MESSAGE, CatalogSketchPayload(session.identifier, sketch.pack()))
+        self.endpoint.send(session.peer.address, packet)
+
+        self.catalog_sync_statistics['sketches_sent'] += 1
+        self.catalog_sync_statistics['sketch_bytes_sent'] += len(packet)
+
+    @lazy_wrapper(GlobalTimeDistributionPayload, CatalogSketchPayload)
+    def on_catalog_sketch(self, peer, dist, payload):
+        """
+        Callback function for processing received catalog sketches. The difference with our votes is decoded, the
+        votes we are missing are requested and the votes the peer is missing are sent to it. Only sketches of verified
+        peers are answered, within the sketch budget of the peer.
+
+        :param peer: The peer that sent the sketch
+        :type peer: Peer
+        :param dist: The global time of the message
+        :type dist: GlobalTimeDistributionPayload
+        :param payload: The sketch
+        :type payload: CatalogSketchPayload
+        :return: None
+        """
+        self.catalog_sync_statistics['sketches_received'] += 1
+
+        # The answer goes to the address of the sender, which has to be the address the peer was verified at
+        verified_peer = self.network.get_verified_by_public_key_bin(peer.public_key.key_to_bin())
+        if verified_peer is None or verified_peer.address != peer.address:
+            self.catalog_sync_statistics['unverified_sketches'] += 1
+            return
+
+        # Decoding a sketch means reading all votes, we only do it for one peer at a time
+        if self.maintenance.is_running("catalog_sync_reply"):
+            self.catalog_sync_statistics['busy'] += 1
+            return
+
+        try:
+            sketch = InvertibleBloomLookupTable.unpack(payload.sketch)
+        except ValueError:
+            sketch = None
+
+        if sketch is None or sketch.cell_count > CATALOG_SYNC_MAX_CELLS:
+            self._logger.debug("module-community: Invalid catalog sketch received from %s", peer)
+            self.catalog_sync_statistics['invalid_sketches'] += 1
+            return
+
+        if not self.catalog_sync_rate_limiter.allow(peer.public_key.key_to_bin()):
+            self.catalog_sync_statistics['rate_limited_sketches'] += 1
+            return
+
+        deferred = self.maintenance.run("catalog_sync_reply", self._reply_catalog_sync, peer, payload.identifier, sketch)
+        deferred.addErrback(self._log_persistence_failure)
+
+    def _reply_catalog_sync(self, job, peer, identifier, their_sketch):
+        """
+        Internal maintenance job for answering the sketch of a peer
+
+        :param job: The job statistics
+        :type job: MaintenanceJob
+        :param peer: The peer that sent the sketch
+        :type peer: Peer
+        :param identifier: Identifier of the reconciliation
+        :type identifier: int
+        :param their_sketch: The sketch of the votes of the peer
+        :type their_sketch: InvertibleBloomLookupTable
+        :return: generator of job chunks
+        """
+        elements = []
+        for step in self._read_vote_elements(job, elements):
+            yield step
+
+        sketch = InvertibleBloomLookupTable(their_sketch.cell_count)
+        for step in self._fill_sketch(sketch, elements):
+            yield step
+
+        ours, theirs, complete = sketch.subtract(their_sketch).decode()
+        if not complete:
+            self.catalog_sync_statistics['decode_failures'] += 1
+            ours, theirs = [], []
+
+        self._logger.info("module-community: Catalog difference with peer %s: %d votes to send, %d votes to receive "
+                          "(decoded: %s)", peer, len(ours), len(theirs), complete)
+
+        payload = CatalogDifferencePayload(identifier, complete, pack_elements(theirs))
+        self.endpoint.send(peer.address, self._create_packet(CATALOG_DIFFERENCE_MESSAGE, payload))
+
+        if ours:
+            for step in self._send_votes(job, peer, set(ours)):
+                yield step
+
+    @lazy_wrapper(GlobalTimeDistributionPayload, CatalogDifferencePayload)
+    def on_catalog_difference(self, peer, dist, payload):
+        """
+        Callback function for processing the answer to our catalog sketch. The votes the peer is missing are sent to
+        it, if it couldn't decode the difference a sketch twice as large is sent.
+
+        :param peer: The peer that sent the difference
+        :type peer: Peer
+        :param dist: The global time of the message
+        :type dist: GlobalTimeDistributionPayload
+        :param payload: The difference
+        :type payload: CatalogDifferencePayload
+        :return: None
+        """
+        session = self.catalog_sync
+        if session is None or session.identifier != payload.identifier or \
+                session.peer.public_key.key_to_bin() != peer.public_key.key_to_bin():
+            return
+
+        if not payload.complete:
+            if session.grow() and not self.maintenance.is_running("catalog_sync"):
+                self.maintenance.run("catalog_sync", self._send_catalog_sketch, session) \
+                    .addErrback(self._log_persistence_failure)
+                return
+
+            # The difference is left to the crawler
+            self._logger.info("module-community: Catalog difference with peer %s is too large to reconcile", peer)
+            self.catalog_sync_statistics['too_large'] += 1
+            self.catalog_sync = None
+            return
+
+        self.catalog_sync = None
+        self.catalog_sync_statistics['completed'] += 1
+
+        missing = set(unpack_elements(payload.missing))
+        self.catalog_sync_statistics['votes_requested'] += len(missing)
+
+        self._logger.info("module-community: Reconciled catalog with peer %s in %.2f s, sending %d votes", peer,
+                          time.time() - session.start_time, len(missing))
+
+        if missing:
+            self.maintenance.run("catalog_sync_send", self._send_votes, peer, missing) \
+                .addErrback(self._log_persistence_failure)
+
+    def _get_vote_element(self, public_key, identifier):
+        """
+        Internal function for getting the element of a vote in catalog sketches
+
+        :param public_key: Public key of the voter
+        :type public_key: bytes
+        :param identifier: module identifier
+        :type identifier: ModuleIdentifier
+        :return: 64-bit element
+        """
+        return InvertibleBloomLookupTable.hash(self._get_vote_filter_key(public_key, identifier.creator,
+                                                                         identifier.content_hash))
+
+    def _read_vote_elements(self, job, elements):
+        """
+        Internal maintenance job step for reading the elements of all recorded votes
+
+        :param job: The job statistics
+        :type job: MaintenanceJob
+        :param elements: List the elements are appended to
+        :type elements: [int]
+        :return: generator of job chunks
+        """
+        after = None
+        while True:
+            pages = []
+            yield self.run_query(methodcaller("iter_votes", CATALOG_SYNC_PAGE_SIZE, after)).addCallback(pages.append)
+
+            elements.extend(self._get_vote_element(public_key, identifier) for public_key, identifier in pages[0])
+
+            job.advance(len(pages[0]))
+            if len(pages[0]) < CATALOG_SYNC_PAGE_SIZE:
+                break
+
+            after = pages[0][-1]
+
+    @staticmethod
+    def _fill_sketch(sketch, elements):
+        """
+        Internal maintenance job step for adding elements to a sketch
+
+        :param sketch: The sketch
+        :type sketch: InvertibleBloomLookupTable
+        :param elements: The elements
+        :type elements: [int]
+        :return: generator of job chunks
+        """
+        for start in range(0, len(elements), CATALOG_SYNC_PAGE_SIZE):
+            for element in elements[start:start + CATALOG_SYNC_PAGE_SIZE]:
+                sketch.insert(element)
+            yield
+
+    def _send_votes(self, job, peer, elements):
+        """
+        Internal maintenance job for sending the vote blocks of the votes with the given elements to a peer, at most
+        CATALOG_SYNC_MAX_BLOCKS_SENT blocks. The votes that are left are sent in a later reconciliation.
+
+        :param job: The job statistics
+        :type job: MaintenanceJob
+        :param peer: The peer to send the votes to
+        :type peer: Peer
+        :param elements: The elements of the votes
+        :type elements: {int}
+        :return: generator of job chunks
+        """
+        voters = {}  # type: {ModuleIdentifier: {bytes}}
+
+        after = None
+        while True:
+            pages = []
+            yield self.run_query(methodcaller("iter_votes", CATALOG_SYNC_PAGE_SIZE, after)).addCallback(pages.append)
+
+            for public_key, identifier in pages[0]:
+                if self._get_vote_element(public_key, identifier) in elements:
+                    voters.setdefault(identifier, set()).add(public_key)
+
+            if len(pages[0]) < CATALOG_SYNC_PAGE_SIZE:
+                break
+
+            after = pages[0][-1]
+
+        # A batch vote block carries the votes on many modules, it is sent once
+        sent_blocks = set()
+        for identifier, public_keys in voters.items():
+            votes = []
+            yield self.run_persistence(methodcaller("get_votes_for_module", identifier)).addCallback(votes.append)
+
+            for vote in votes[0] or []:
+                if vote['voter'] not in public_keys:
+                    continue
+
+                block = self._get_vote_block(vote['voter'], vote['sequence_number'])
+                if block is None:
+                    self.catalog_sync_statistics['votes_unavailable'] += 1
+                    continue
+                if block.block_id in sent_blocks:
+                    continue
+
+                if len(sent_blocks) >= CATALOG_SYNC_MAX_BLOCKS_SENT:
+                    self._logger.info("module-community: Sent the maximum of %d vote blocks to peer %s",
+                                      CATALOG_SYNC_MAX_BLOCKS_SENT, peer)
+                    self.catalog_sync_statistics['send_limit_reached'] += 1
+                    return
+                sent_blocks.add(block.block_id)
+
+                self.trustchain.send_block(block, address=peer.address)
+                self.catalog_sync_statistics['votes_sent'] += 1
+                self.catalog_sync_statistics['vote_bytes_sent'] += len(block.pack())
+
+            job.advance(len(public_keys))
+
+    def _get_vote_block(self, public_key, sequence_number):
+        """
+        Internal function for getting the block of a vote from the trustchain database. Votes recorded before sequence
+        numbers were stored get theirs when the votes in the catalog are checked, until then their block isn't looked
+        up.
+
+        :param public_key: Public key of the voter
+        :type public_key: bytes
+        :param sequence_number: Sequence number of the vote block, 0 if it wasn't recorded
+        :type sequence_number: int
+        :return: the vote block, or None if it isn't in the trustchain database
+        """
+        if not sequence_number:
+            return None
+
+        block = self.trustchain.persistence.get(public_key, sequence_number)
+        if block is None or block.type not in MODULE_BLOCK_TYPES_VOTE:
+            return None
+
+        return block
+
+    def _ingest_vote_blocks(self, blocks):
+        """
+        Internal function for processing a batch of received vote blocks in a single transaction
+
+        :param blocks: The blocks to be processed
+        :type blocks: [ModuleBlock]
+        :return: Deferred firing when the blocks are processed
+        """
+        new_blocks = []
+        for block in blocks:
+            if not block.is_valid_module_vote_block():
+                self._logger.debug("module-community: Invalid vote block (%s) received!", block.block_id)
+                continue
+
+            # Blocks with only votes we already have are dropped
+            if self._is_known_vote_block(block):
+                continue
+
+            new_blocks.append(block)
+
+        if not new_blocks:
+            return succeed(None)
+
+        deferred = self.run_persistence(self._process_vote_blocks, new_blocks)
+        deferred.addCallback(lambda _: self._add_to_vote_filter(new_blocks))
+        deferred.addErrback(self._log_persistence_failure)
+        return deferred
+
+    @staticmethod
+    def _get_vote_filter_key(public_key, creator, content_hash):
+        """
+        Internal function for getting the key of a vote in the filter of known votes
+
+        :param public_key: Public key of the voter
+        :type public_key: bytes
+        :param creator: Public key of the creator of the module
+        :type creator: bytes
+        :param content_hash: Content hash of the module
+        :type content_hash: str
+        :return: key of the vote
+        """
+        return VOTE_FILTER_KEY.pack(len(public_key), len(creator)) + public_key + creator + content_hash
+
+    def _is_known_vote_block(self, block):
+        """
+        Internal function for checking if all votes of a vote block are recorded already. The filter of known votes
+        rules out new votes without a lookup. A vote the filter takes for a known one is looked up in the recorded
+        votes, so a false positive of the filter costs a lookup and never drops a vote.
+
+        :param block: The single vote block or batch vote block
+        :type block: ModuleBlock
+        :return: True if all votes of the block are recorded
+        """
+        for creator, content_hash, _ in block.get_votes():
+            if ModuleBlock.is_creator_digest(creator):
+                creator = self.persistence.resolve_creator(creator)
+                if creator is None:
+                    return False
+
+            if not self.vote_filter.contains(self._get_vote_filter_key(block.public_key, creator, content_hash)):
+                return False
+
+            if not self.persistence.did_vote(block.public_key, ModuleIdentifier(creator, content_hash)):
+                self.vote_filter.report_false_positive()
+                return False
+
+        return True
+
+    def _get_vote_block_filter_keys(self, block):
+        """
+        Internal function for getting the keys of the votes of a vote block in the filter of known votes
+
+        :param block: The single vote block or batch vote block
         :type block: ModuleBlock
+        :return: list of the keys of the votes, None for a compact vote of which the creator is unknown
+        """
+        keys = []
+        for creator, content_hash, _ in block.get_votes():
+            if ModuleBlock.is_creator_digest(creator):
+                creator = self.persistence.resolve_creator(creator)
+
+            keys.append(self._get_vote_filter_key(block.public_key, creator, content_hash)
+                        if creator is not None else None)
+        return keys
+
+    def _add_to_vote_filter(self, blocks):
+        """
+        Internal function for adding the votes of processed vote blocks to the filter of known votes
+
+        :param blocks: The processed vote blocks
+        :type blocks: [ModuleBlock]
+        :return: None
+        """
+        for block in blocks:
+            for key in self._get_vote_block_filter_keys(block):
+                if key is not None:
+                    self.vote_filter.add(key)
+
+    def _load_vote_filter(self, job):
+        """
+        Internal maintenance job for adding the recorded votes to the filter of known votes
+
+        :param job: The job statistics
+        :type job: MaintenanceJob
+        :return: generator of job chunks
+        """
+        after = None
+        while True:
+            pages = []
+            yield self.run_query(methodcaller("iter_votes", VOTE_FILTER_LOAD_PAGE_SIZE, after)) \
+                .addCallback(pages.append)
+
+            for public_key, identifier in pages[0]:
+                self.vote_filter.add(self._get_vote_filter_key(public_key, identifier.creator, identifier.content_hash))
+
+            job.advance(len(pages[0]))
+            if len(pages[0]) < VOTE_FILTER_LOAD_PAGE_SIZE:
+                break
+
+            after = pages[0][-1]
+
+    def _process_vote_blocks(self, persistence, blocks):
+        """
+        Internal function for processing vote blocks
+
+        :param persistence: The persistence layer
+        :type persistence: ModuleStorage
+        :param blocks: The blocks to be processed
+        :type blocks: [ModuleBlock]
         :return: None
         """
-        block_id = block.block_id
+        modules = set()
+
+        for block in blocks:
+            public_key = block.public_key  # type: bytes
+
+            # A single vote block carries one vote, a batch vote block many with the same timestamp and sequence number
+            for identifier, name in self._resolve_votes(persistence, block):
+                # Add module to catalog if it isn't known yet
+                if identifier not in modules:
+                    if not persistence.has_module_in_catalog(identifier):
+                        self._logger.info("module-community: Adding unknown module to catalog (%s, %s)", identifier,
+                                          name)
+                        self._add_module_to_catalog(persistence, Module(identifier, name))
+
+                    modules.add(identifier)
+
+                # Add vote to catalog and votes if it isn't known yet
+                if persistence.record_vote(public_key, identifier, block.timestamp, block.sequence_number):
+                    self._logger.info("module-community: Received vote (%s, %s)", identifier, name)
+
+    def _resolve_votes(self, persistence, block):
+        """
+        Internal function for resolving the votes of a vote block into module identifiers. A compact vote names the
+        creator by a digest of its key and leaves out the module name unless it's the first vote on the module, the
+        creator and module are looked up in the catalog and in the announced modules. Votes on other modules are kept in
+        the persistence layer until the module is added.
+
+        :param persistence: The persistence layer
+        :type persistence: ModuleStorage
+        :param block: The vote block
+        :type block: ModuleBlock
+        :return: list of (identifier, name) tuples of the resolved votes, the name is None if the vote doesn't carry it
+        """
+        votes = []
+        for creator, content_hash, name in block.get_votes():
+            creator_digest = None
+            if ModuleBlock.is_creator_digest(creator):
+                creator_digest, creator = creator, persistence.resolve_creator(creator)
+
+            identifier = ModuleIdentifier(creator, content_hash) if creator is not None else None
+            if name is None and (identifier is None or not persistence.has_module_in_catalog(identifier)):
+                creator_digest = creator_digest or get_creator_digest(creator)
 
-        self._logger.debug("module-community: Received vote block (%s)", block_id)
+                # An announcement of the module tells its creator key and name
+                announced_module = self.announced_modules.get((creator_digest, content_hash))
+                if announced_module is not None and (identifier is None or announced_module.id == identifier):
+                    votes.append((announced_module.id, announced_module.name))
+                    continue
 
-        if not block.is_valid_vote_block:
-            self._logger.debug("module-community: Invalid vote block (%s) received!", block_id)
+                self._add_unresolved_vote(persistence, creator_digest, content_hash, block)
+                continue
+
+            votes.append((identifier, name))
+
+        return votes
+
+    def _add_unresolved_vote(self, persistence, creator_digest, content_hash, block):
+        """
+        Internal function for keeping a compact vote on a module that isn't in the catalog yet. The votes of a block are
+        resolved again on every reconciliation until the module is added, a vote that is already kept isn't counted.
+
+        :param persistence: The persistence layer
+        :type persistence: ModuleStorage
+        :param creator_digest: Digest of the public key of the creator of the module
+        :type creator_digest: bytes
+        :param content_hash: Content hash of the module
+        :type content_hash: str
+        :param block: The vote block
+        :type block: ModuleBlock
+        :return: None
+        """
+        if not persistence.add_pending_vote(creator_digest, content_hash, block.public_key, block.timestamp,
+                                            block.sequence_number):
             return
 
-        public_key = block.public_key  # type: bytes
-        tx_dict = block.transaction  # type: dict
-        creator = tx_dict[MODULE_BLOCK_TYPE_VOTE_KEY_CREATOR]  # type: bytes
-        content_hash = tx_dict[MODULE_BLOCK_TYPE_VOTE_KEY_CONTENT_HASH]  # type: str
-        name = tx_dict[MODULE_BLOCK_TYPE_VOTE_KEY_NAME]  # type: str
+        self._logger.debug("module-community: Keeping vote of block (%s) on unknown module (%s.%s)", block.block_id,
+                           hexlify(creator_digest), content_hash)
+
+        self.vote_resolution_statistics['unresolved'] += 1
+        self.vote_resolution_statistics['pending'] += 1
+
+    def _add_module_to_catalog(self, persistence, module):
+        """
+        Internal function for adding a module to the catalog and recording the compact votes on it that were kept
 
-        identifier = ModuleIdentifier(creator, content_hash)
+        :param persistence: The persistence layer
+        :type persistence: ModuleStorage
+        :param module: module
+        :type module: Module
+        :return: None
+        """
+        persistence.add_module_to_catalog(module)
 
-        # Add module to catalog if it isn't known yet
-        if not self.persistence.has_module_in_catalog(identifier):
-            self._logger.info("module-community: Adding unknown module to catalog (%s, %s)", identifier, name)
+        creator_digest = get_creator_digest(module.id.creator)
+        if (creator_digest, module.id.content_hash) in self.announced_modules:
+            self.announcement_statistics['added'] += 1
 
-            module = Module(identifier, name)
-            self.persistence.add_module_to_catalog(module)
+        votes = persistence.pop_pending_votes(creator_digest, module.id.content_hash)
+        self._record_pending_votes(persistence, module, votes)
 
-        # Add vote to catalog and votes if it isn't known yet
-        if not self.persistence.did_vote(public_key, identifier):
-            self._logger.info("module-community: Received vote (%s, %s)", identifier, name)
-            self.persistence.add_vote_to_votes(public_key, identifier)
-            self.persistence.add_vote_to_module_in_catalog(identifier)
+    def _record_pending_votes(self, persistence, module, votes):
+        """
+        Internal function for recording the compact votes on a module that were kept until it was added to the catalog
+
+        :param persistence: The persistence layer
+        :type persistence: ModuleStorage
+        :param module: module
+        :type module: Module
+        :param votes: The kept votes, as (voter public key, block timestamp, sequence number) tuples
+        :type votes: [(bytes, int, int)]
+        :return: None
+        """
+        self.vote_resolution_statistics['pending'] -= len(votes)
+
+        for public_key, block_timestamp, sequence_number in votes:
+            if persistence.record_vote(public_key, module.id, block_timestamp, sequence_number):
+                self._logger.info("module-community: Received vote (%s, %s)", module.id, module.name)
+                self.vote_resolution_statistics['resolved'] += 1
 
     def _sign_module(self, module):
         """
@@ -353,92 +1426,236 @@ class ModuleCommunity(Community, BlockListener):
 
         :param module: module
         :type module: Module
-        :return: None
+        :return: Deferred firing when the vote is recorded
         """
         self._logger.debug("module-community: Signing module (%s, %s)", module.id, module.name)
 
-        tx_dict = {
-            MODULE_BLOCK_TYPE_VOTE_KEY_CREATOR: module.id.creator,
-            MODULE_BLOCK_TYPE_VOTE_KEY_CONTENT_HASH: module.id.content_hash,
-            MODULE_BLOCK_TYPE_VOTE_KEY_NAME: module.name,
-        }
+        tx_dict = ModuleBlock.create_vote_transaction(module, self.vote_version)
 
-        self.trustchain.self_sign_block(block_type=MODULE_BLOCK_TYPE_VOTE, transaction=tx_dict)
+        return self._sign_vote_block(MODULE_BLOCK_TYPE_VOTE, tx_dict)
 
-        self._logger.debug("module-community: Signed module (%s, %s)", module.id, module.name)
+    def _sign_modules(self, modules):
+        """
+        Internal function for signing modules in a single batch vote block
+
+        :param modules: modules, at most MODULE_VOTE_BATCH_MAX_SIZE
+        :type modules: [Module]
+        :return: Deferred firing when the votes are recorded
+        """
+        self._logger.debug("module-community: Signing %d modules", len(modules))
+
+        tx_dict = ModuleBlock.create_vote_batch_transaction(modules, self.vote_version)
+
+        return self._sign_vote_block(MODULE_BLOCK_TYPE_VOTE_BATCH, tx_dict)
+
+    def _sign_vote_block(self, block_type, tx_dict):
+        """
+        Internal function for signing a vote block and recording its votes right away, with the timestamp and
+        sequence number of the block. The block also reaches the ingestion queue, which finds its votes recorded.
+
+        :param block_type: MODULE_BLOCK_TYPE_VOTE or MODULE_BLOCK_TYPE_VOTE_BATCH
+        :type block_type: str
+        :param tx_dict: The vote transaction
+        :type tx_dict: dict
+        :return: Deferred firing when the votes are recorded
+        """
+        def on_signed(blocks):
+            block, _ = blocks
+            self._logger.debug("module-community: Signed vote block (%s)", block.block_id)
+            return self.run_persistence(self._process_vote_blocks, [block])
+
+        deferred = self.trustchain.sign_block(self.trustchain.my_peer, block_type=block_type, transaction=tx_dict)
+        deferred.addCallback(on_signed)
+        return deferred
 
     def _crawl_vote_blocks(self):
         """
-        Crawl network peers for unknown modules
+        Crawl the network peers the crawl scheduler picks for unknown modules
 
-        :return: None
+        :return: Deferred firing when the crawls are started
+        """
+        if self.maintenance.is_running("module_crawl"):
+            return succeed(None)
+
+        peers = self.crawl_scheduler.select(self.get_peers())
+        if not peers:
+            return succeed(None)
+
+        self._logger.info("module-community: Crawl %d network peers for unknown modules", len(peers))
+
+        return self.maintenance.run("module_crawl", self._crawl_peers, peers)
+
+    def _crawl_peers(self, job, peers):
         """
-        self._logger.info("module-community: Crawl network peers for unknown modules")
+        Internal maintenance job for crawling the chain of each peer above its crawl cursor. The crawler limits the
+        number of peers crawled at the same time, the result of each crawl is reported to the crawl scheduler.
+
+        :param job: The job statistics
+        :type job: MaintenanceJob
+        :param peers: The peers to crawl
+        :type peers: [Peer]
+        :return: generator of job chunks
+        """
+        job.set_total(len(peers))
+
+        for peer in peers:
+            def on_failure(failure, peer=peer):
+                self.crawl_scheduler.report(peer, 0)
+                self._log_persistence_failure(failure)
 
-        for peer in self.get_peers():
-            self.trustchain.crawl_chain(peer)
+            deferred = self.crawler.crawl(peer)
+            deferred.addCallbacks(lambda new_votes, peer=peer: self.crawl_scheduler.report(peer, new_votes), on_failure)
+            job.advance()
+            yield
 
     def _check_votes_in_catalog(self):
         """
-        Check if the votes in the catalog match the votes in trustchain
+        Check if the votes in the catalog match the votes in trustchain. Only the vote blocks added to trustchain since
+        the last check are reconciled, the checkpoint of every voter is stored in the persistence layer.
 
-        :return: None
+        :return: Deferred firing when the check is done
         """
         self._logger.info("module-community: Checking votes in catalog")
 
-        blocks = self.trustchain.persistence.get_blocks_with_type(MODULE_BLOCK_TYPE_VOTE)  # type: [TrustChainBlock]
+        deferred = self.maintenance.run("module_verify", self._reconcile_new_vote_blocks)
+        deferred.addCallback(lambda _: self._logger.info("module-community: Checking votes in catalog is done"))
+        deferred.addErrback(self._log_persistence_failure)
+        return deferred
+
+    def _reconcile_new_vote_blocks(self, job):
+        """
+        Internal maintenance job for reconciling the vote blocks after the checkpoint of every voter, a chunk per
+        transaction. The checkpoint only moves past blocks that follow it without a gap, a block after a gap in the
+        chain is reconciled once the gap is filled.
+
+        :param job: The job statistics
+        :type job: MaintenanceJob
+        :return: generator of job chunks
+        """
+        voters = self._get_vote_block_creators()
+        job.set_total(len(voters))
+
+        for public_key in voters:
+            checkpoints = []
+            yield self.run_persistence(methodcaller("get_vote_checkpoint", public_key)).addCallback(checkpoints.append)
+            checkpoint = checkpoints[0]
+
+            latest_block = self.trustchain.persistence.get_latest(public_key)
+            last_sequence_number = latest_block.sequence_number if latest_block else 0
+
+            # The trustchain database was replaced, start over
+            if checkpoint > last_sequence_number:
+                self._logger.info("module-community: Vote checkpoint (%d) of voter (%s) is beyond trustchain, "
+                                  "checking all votes", checkpoint, hexlify(public_key))
+                checkpoint = 0
+
+            # Votes recorded before vote history was kept only exist before the first checkpoint of the voter
+            add_vote_history = checkpoint == 0
+
+            while checkpoint < last_sequence_number:
+                blocks, new_checkpoint = self._get_vote_blocks_after(public_key, checkpoint, VOTE_RECONCILE_CHUNK_SIZE)
+                if new_checkpoint == checkpoint:
+                    break
+
+                deferred = self.run_persistence(self._reconcile_votes_in_catalog, blocks, public_key, new_checkpoint,
+                                                add_vote_history)
+                yield deferred.addCallback(lambda _, blocks=blocks: self._add_to_vote_filter(blocks))
+
+                checkpoint = new_checkpoint
 
-        votes = {}
-        voters = {}
+            job.advance()
 
+    def _get_vote_block_creators(self):
+        """
+        Internal function for getting the public keys of the peers with vote blocks in the trustchain database
+
+        :return: list of public keys
+        """
+        rows = self.trustchain.persistence.execute(u"SELECT DISTINCT public_key FROM blocks WHERE type IN (?, ?);",
+                                                   tuple(MODULE_BLOCK_TYPES_VOTE))
+        return [bytes(public_key) for public_key, in rows]
+
+    def _get_vote_blocks_after(self, public_key, checkpoint, limit):
+        """
+        Internal function for getting the vote blocks in the chain of a voter that follow a checkpoint without a gap.
+        Without a checkpoint the blocks follow the first block we have, older blocks may be removed from trustchain.
+
+        :param public_key: Public key of the voter
+        :type public_key: bytes
+        :param checkpoint: Highest sequence number in the chain of the voter that is reconciled, 0 if none is
+        :type checkpoint: int
+        :param limit: Maximum number of blocks of any type to look at
+        :type limit: int
+        :return: tuple of the vote blocks in chain order and the sequence number of the last block without a gap
+        """
+        persistence = self.trustchain.persistence
+
+        next_sequence_number = checkpoint + 1
+        if not checkpoint and not persistence.get(public_key, 1):
+            next_sequence_number = persistence.get_lowest_range_unknown(public_key)[1] + 1
+
+        blocks = persistence.crawl(public_key, next_sequence_number, next_sequence_number + limit - 1, limit)
+        blocks = sorted((block for block in blocks if block.public_key == public_key),
+                        key=lambda block: block.sequence_number)
+
+        vote_blocks = []
         for block in blocks:
-            public_key = block.public_key  # type: bytes
-            tx_dict = block.transaction  # type: dict
-            creator = tx_dict[MODULE_BLOCK_TYPE_VOTE_KEY_CREATOR]  # type: bytes
-            content_hash = tx_dict[MODULE_BLOCK_TYPE_VOTE_KEY_CONTENT_HASH]  # type: str
-            name = tx_dict[MODULE_BLOCK_TYPE_VOTE_KEY_NAME]  # type: str
-
-            identifier = ModuleIdentifier(creator, content_hash)
-
-            # Check votes database
-            if not self.persistence.did_vote(public_key, identifier):
-                self.persistence.add_vote_to_votes(public_key, identifier)
-
-            # Check number of votes
-            if identifier in votes:
-                votes[identifier] = votes[identifier] + 1
-            else:
-                votes[identifier] = 1
-
-            # Check double votes
-            public_key_hex = hexlify(public_key)
-            if public_key_hex not in voters:
-                voters[public_key_hex] = {}
-
-            voted_modules = voters[public_key_hex]
-            if identifier not in voted_modules:
-                voted_modules[identifier] = 1
-                voters[public_key_hex] = voted_modules
-            else:
-                self._logger.info("module-community: Double vote for module (%s) by peer (%s)", identifier, public_key_hex)
-
-        modules = self.persistence.get_modules_from_catalog()
-
-        # Compare and fix vote inconsistencies
-        for module in modules:
-            identifier = module.id
-            votes_in_catalog = module.votes
-
-            if identifier in votes and votes[identifier] != votes_in_catalog:
-                self._logger.info("module-community: Vote inconsistency for module (%s)", identifier)
-                self.persistence.update_module_in_catalog(identifier, votes[identifier])
+            if block.sequence_number != next_sequence_number:
+                break
 
-            votes.pop(identifier)
+            if block.type in MODULE_BLOCK_TYPES_VOTE:
+                vote_blocks.append(block)
+            checkpoint = block.sequence_number
+            next_sequence_number += 1
 
-        if len(votes) != 0:
-            self._logger.info("module-community: inconsistent vote db")
+        return vote_blocks, checkpoint
 
-        self._logger.info("module-community: Checking votes in catalog is done")
+    def _reconcile_votes_in_catalog(self, persistence, blocks, public_key, checkpoint, add_vote_history):
+        """
+        Internal function for fixing the votes in the catalog to match the provided vote blocks of a voter
+
+        :param persistence: The persistence layer
+        :type persistence: ModuleStorage
+        :param blocks: Vote blocks of the voter in trustchain
+        :type blocks: [ModuleBlock]
+        :param public_key: Public key of the voter
+        :type public_key: bytes
+        :param checkpoint: Sequence number of the block in the chain of the voter up to which it is reconciled
+        :type checkpoint: int
+        :param add_vote_history: Add the block timestamp and sequence number to votes recorded without them
+        :type add_vote_history: bool
+        :return: None
+        """
+        modules = {}
+
+        for block in blocks:
+            for identifier, name in self._resolve_votes(persistence, block):
+                # Check catalog database
+                if identifier not in modules and not persistence.has_module_in_catalog(identifier):
+                    self._logger.info("module-community: Missing module in catalog (%s, %s)", identifier, name)
+                    self._add_module_to_catalog(persistence, Module(identifier, name))
+                modules.setdefault(identifier, []).append((public_key, block.sequence_number))
+
+                # Check votes database
+                if not persistence.record_vote(public_key, identifier, block.timestamp, block.sequence_number) \
+                        and add_vote_history:
+                    persistence.add_vote_history(public_key, identifier, block.timestamp, block.sequence_number)
+
+        # Compare and fix vote inconsistencies of the modules that received votes
+        for identifier, block_votes in modules.items():
+            votes = persistence.get_votes_for_module(identifier)
+            if persistence.get_module_from_catalog(identifier).votes != len(votes):
+                self._logger.info("module-community: Vote inconsistency for module (%s)", identifier)
+                persistence.update_module_in_catalog(identifier, len(votes))
+
+            # Check double votes, a recorded vote of the voter that came from another block
+            sequence_numbers = {vote['voter']: vote['sequence_number'] for vote in votes}
+            for voter, sequence_number in block_votes:
+                if sequence_numbers.get(voter) not in (sequence_number, 0):
+                    self._logger.info("module-community: Double vote for module (%s) by peer (%s)", identifier,
+                                      hexlify(voter))
+
+        persistence.set_vote_checkpoint(public_key, checkpoint)
 
     def unload(self):
         """
@@ -448,6 +1665,22 @@ class ModuleCommunity(Community, BlockListener):
         """
         super(ModuleCommunity, self).unload()
 
+        # Stop maintenance jobs
+        self.maintenance.stop()
+
+        # Pass the crawled vote blocks that wait for verification on to trustchain and stop the worker processes
+        if self.crawl_verifier:
+            self.crawl_verifier.stop()
+        if self.signature_verifier:
+            self.signature_verifier.stop()
+
+        # Process the received vote blocks that are still queued
+        self.vote_ingestion.stop()
+
+        # Finish queued interactions before closing the persistence layer
+        if self.async_persistence:
+            self.async_persistence.stop()
+
         # Close the persistence layer
         self.persistence.close()
 
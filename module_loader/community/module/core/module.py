@@ -3,6 +3,8 @@ from module_loader.community.module.core.module_identifier import ModuleIdentifi
 
 class Module(object):
 
+    __slots__ = ['_module_identifier', '_name', '_votes']
+
     def __init__(self, module_identifier, name, votes=0):
         super(Module, self).__init__()
 
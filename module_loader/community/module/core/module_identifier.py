@@ -1,8 +1,25 @@
 from binascii import hexlify
+import hashlib
+
+# Constants
+CREATOR_DIGEST_SIZE = 8  # size in bytes of the digest that stands in for the public key of a creator
+
+
+def get_creator_digest(creator):
+    """
+    Get the short digest of the public key of a module creator
+
+    :param creator: Public key of the creator
+    :type creator: bytes
+    :return: the digest
+    """
+    return hashlib.sha1(creator).digest()[:CREATOR_DIGEST_SIZE]
 
 
 class ModuleIdentifier(object):
 
+    __slots__ = ['_creator', '_content_hash']
+
     def __init__(self, creator, content_hash):
         super(ModuleIdentifier, self).__init__()
 
@@ -0,0 +1,416 @@
+from __future__ import absolute_import
+
+# Default library imports
+from binascii import hexlify
+import logging
+from operator import methodcaller
+import time
+
+# Third party imports
+from twisted.internet.defer import DeferredSemaphore, succeed
+
+# Project imports
+from module_loader.community.module.block import MODULE_BLOCK_TYPES_VOTE
+
+# Constants
+CRAWL_RANGE_SIZE = 10  # number of blocks requested per crawl request, trustchain answers with at most 10 blocks
+CRAWL_MAX_IN_FLIGHT = 5  # maximum number of peers crawled at the same time
+CRAWL_SCHEDULE_INTERVAL = 5.0  # interval in seconds between two rounds of picking the peers to crawl
+CRAWL_BUDGET = 2  # default number of crawl requests per minute
+CRAWL_MIN_INTERVAL = 30.0  # minimum time in seconds between two crawls of a peer
+CRAWL_MAX_BACKOFF = 3600.0  # maximum time in seconds between two crawls of an unproductive peer
+CRAWL_YIELD_DECAY = 0.5  # weight of the previous yield of a peer when a crawl of it is done
+CRAWL_YIELD_PRIOR = 1.0  # yield added to every peer, so the crawl age ranks peers that yielded nothing
+
+
+class ChainCrawler(object):
+    """
+    Crawls the chains of peers incrementally. The highest sequence number crawled from each peer is stored in the
+    persistence layer, so a crawl only requests the blocks above it, one range at a time until the peer has no more.
+    The number of peers crawled at the same time is limited.
+    """
+
+    def __init__(self, trustchain, run_persistence, max_in_flight=CRAWL_MAX_IN_FLIGHT, range_size=CRAWL_RANGE_SIZE,
+                 may_request=None):
+        """
+        Initialize the crawler
+
+        :param trustchain: The trustchain community that sends the crawl requests
+        :type trustchain: TrustChainCommunity
+        :param run_persistence: function running an interaction against the persistence layer, returning a Deferred
+        :param max_in_flight: Maximum number of peers crawled at the same time
+        :type max_in_flight: int
+        :param range_size: Number of blocks requested per crawl request
+        :type range_size: int
+        :param may_request: function returning whether a crawl may request the next range, None to request all ranges
+        """
+        super(ChainCrawler, self).__init__()
+
+        self.trustchain = trustchain
+        self.run_persistence = run_persistence
+        self.max_in_flight = max_in_flight  # type: int
+        self.range_size = range_size  # type: int
+        self.may_request = may_request
+
+        self._semaphore = DeferredSemaphore(max_in_flight)
+        self._crawling = set()  # type: {bytes}
+
+        # Statistics
+        self.crawls = 0  # type: int
+        self.requests = 0  # type: int
+        self.in_flight = 0  # type: int
+        self.max_in_flight_reached = 0  # type: int
+        self.received_blocks = 0  # type: int
+        self.received_bytes = 0  # type: int
+        self.skipped_blocks = 0  # type: int
+        self.rejected_blocks = 0  # type: int
+        self.interrupted_crawls = 0  # type: int
+
+        # Logging
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def crawl(self, peer):
+        """
+        Crawl the blocks of a peer above its crawl cursor, waiting for a free slot first. A peer that is being crawled
+        already is not crawled again.
+
+        :param peer: The peer to crawl
+        :type peer: Peer
+        :return: Deferred firing with the number of votes in the blocks of the peer that were received
+        """
+        public_key = peer.public_key.key_to_bin()
+        if public_key in self._crawling:
+            return succeed(0)
+
+        self._crawling.add(public_key)
+
+        deferred = self._semaphore.run(self._crawl, peer, public_key)
+
+        def on_done(result):
+            self._crawling.discard(public_key)
+            return result
+
+        return deferred.addBoth(on_done)
+
+    def _crawl(self, peer, public_key):
+        """
+        Crawl the blocks of a peer above its crawl cursor
+
+        :param peer: The peer to crawl
+        :type peer: Peer
+        :param public_key: Public key of the peer
+        :type public_key: bytes
+        :return: Deferred firing with the number of votes in the blocks of the peer that were received
+        """
+        self.crawls += 1
+        self.in_flight += 1
+        self.max_in_flight_reached = max(self.max_in_flight_reached, self.in_flight)
+
+        deferred = self.run_persistence(methodcaller("get_crawl_cursor", public_key))
+        deferred.addCallback(self._start_crawl, peer, public_key)
+
+        def on_done(result):
+            self.in_flight -= 1
+            return result
+
+        return deferred.addBoth(on_done)
+
+    def _start_crawl(self, cursor, peer, public_key):
+        """
+        Start requesting ranges above the crawl cursor, blocks that are in the trustchain database without gaps are
+        skipped as well
+
+        :param cursor: The stored crawl cursor of the peer
+        :type cursor: int
+        :param peer: The peer to crawl
+        :type peer: Peer
+        :param public_key: Public key of the peer
+        :type public_key: bytes
+        :return: Deferred firing with the number of votes in the blocks of the peer that were received
+        """
+        cursor = max(cursor, self.trustchain.persistence.get_lowest_sequence_number_unknown(public_key) - 1)
+        self.skipped_blocks += cursor
+
+        return self._request_range(peer, public_key, cursor, 0)
+
+    def _request_range(self, peer, public_key, cursor, received):
+        """
+        Request the range of blocks above the cursor
+
+        :param peer: The peer to crawl
+        :type peer: Peer
+        :param public_key: Public key of the peer
+        :type public_key: bytes
+        :param cursor: Highest sequence number crawled from the peer
+        :type cursor: int
+        :param received: Number of votes of the peer received by this crawl so far
+        :type received: int
+        :return: Deferred firing with the number of votes in the blocks of the peer that were received
+        """
+        self.requests += 1
+
+        deferred = self.trustchain.send_crawl_request(peer, public_key, cursor + 1, cursor + self.range_size)
+        deferred.addCallback(self._on_range, peer, public_key, cursor, received)
+        return deferred
+
+    def _on_range(self, blocks, peer, public_key, cursor, received):
+        """
+        Store the new crawl cursor and request the next range if the peer returned a full range. The cursor only
+        advances over the blocks trustchain stored without gaps, so a block it rejected is requested again by the next
+        crawl of the peer.
+
+        :param blocks: The received blocks, including the blocks of other peers linked to the requested range
+        :type blocks: [TrustChainBlock]
+        :param peer: The peer to crawl
+        :type peer: Peer
+        :param public_key: Public key of the peer
+        :type public_key: bytes
+        :param cursor: Highest sequence number crawled from the peer before the request
+        :type cursor: int
+        :param received: Number of votes of the peer received by this crawl before the request
+        :type received: int
+        :return: Deferred firing with the number of votes in the blocks of the peer that were received
+        """
+        self.received_blocks += len(blocks)
+        self.received_bytes += sum(len(block.pack()) for block in blocks)
+
+        peer_blocks = sorted((block for block in blocks if block.public_key == public_key and
+                              block.sequence_number > cursor), key=lambda block: block.sequence_number)
+
+        stored_blocks = []
+        for block in peer_blocks:
+            if block.sequence_number != cursor + len(stored_blocks) + 1 or \
+                    not self.trustchain.persistence.contains(block):
+                break
+            stored_blocks.append(block)
+
+        if len(stored_blocks) < len(peer_blocks):
+            self.rejected_blocks += len(peer_blocks) - len(stored_blocks)
+            self._logger.debug("module-community: Crawl of peer %s stopped at block %d, which is not stored",
+                               hexlify(public_key)[-8:], cursor + len(stored_blocks) + 1)
+
+        if not stored_blocks:
+            return succeed(received)
+
+        new_cursor = stored_blocks[-1].sequence_number
+        received += sum(len(block.get_votes()) for block in stored_blocks if block.type in MODULE_BLOCK_TYPES_VOTE)
+
+        self._logger.debug("module-community: Crawled blocks %d to %d of peer %s", cursor + 1, new_cursor,
+                           hexlify(public_key)[-8:])
+
+        deferred = self.run_persistence(methodcaller("set_crawl_cursor", public_key, new_cursor))
+        if len(stored_blocks) < self.range_size:
+            return deferred.addCallback(lambda _: received)
+
+        if self.may_request is not None and not self.may_request():
+            # The next crawl of the peer continues from the stored cursor
+            self.interrupted_crawls += 1
+            return deferred.addCallback(lambda _: received)
+
+        return deferred.addCallback(lambda _: self._request_range(peer, public_key, new_cursor, received))
+
+    def get_statistics(self):
+        """
+        Get the crawl statistics. The bytes saved are an estimate of the traffic of the blocks below the crawl cursors,
+        which a crawl from the start of the chains would have received again.
+
+        :return: dictionary with the number of crawls, requests and received blocks and bytes, the number of peers
+        crawled at the same time, the received blocks that were not stored, the crawls stopped by the budget and the
+        estimated number of bytes saved
+        """
+        average_block_size = float(self.received_bytes) / self.received_blocks if self.received_blocks else 0.0
+
+        return {
+            'crawls': self.crawls,
+            'requests': self.requests,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'max_in_flight_reached': self.max_in_flight_reached,
+            'received_blocks': self.received_blocks,
+            'received_bytes': self.received_bytes,
+            'skipped_blocks': self.skipped_blocks,
+            'rejected_blocks': self.rejected_blocks,
+            'interrupted_crawls': self.interrupted_crawls,
+            'bytes_saved': int(self.skipped_blocks * average_block_size),
+        }
+
+
+class PeerCrawlState(object):
+    """
+    Crawl history of a peer, used to rank it against other peers
+    """
+
+    def __init__(self):
+        """
+        Initialize the crawl history of a peer that was never crawled
+        """
+        super(PeerCrawlState, self).__init__()
+
+        self.crawling = False  # type: bool
+        self.crawls = 0  # type: int
+        self.last_crawl_time = None  # type: float
+        self.next_crawl_time = 0.0  # type: float
+        self.vote_yield = 0.0  # type: float
+        self.unproductive_crawls = 0  # type: int
+
+
+class CrawlScheduler(object):
+    """
+    Decides which peers are crawled. Peers are ranked by the number of new votes their recent crawls yielded and by the
+    time since their last crawl. A peer whose crawl yields nothing is crawled again after an exponentially growing
+    backoff, and the crawl requests per minute are limited by a budget.
+    """
+
+    def __init__(self, budget=CRAWL_BUDGET, min_interval=CRAWL_MIN_INTERVAL, max_backoff=CRAWL_MAX_BACKOFF):
+        """
+        Initialize the scheduler
+
+        :param budget: Maximum number of crawl requests per minute
+        :type budget: int
+        :param min_interval: Minimum time in seconds between two crawls of a peer
+        :type min_interval: float
+        :param max_backoff: Maximum time in seconds between two crawls of an unproductive peer
+        :type max_backoff: float
+        """
+        super(CrawlScheduler, self).__init__()
+
+        self.budget = budget  # type: int
+        self.min_interval = min_interval  # type: float
+        self.max_backoff = max_backoff  # type: float
+
+        self.peers = {}  # type: {bytes: PeerCrawlState}
+
+        # Crawl requests that may still be sent, refilled at the budget rate up to a minute of budget
+        self.tokens = float(budget)  # type: float
+        self._last_refill_time = time.time()  # type: float
+
+        # Statistics
+        self.scheduled_crawls = 0  # type: int
+        self.productive_crawls = 0  # type: int
+        self.new_votes = 0  # type: int
+
+        # Logging
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def _refill(self):
+        """
+        Add the budget earned since the last refill
+
+        :return: None
+        """
+        now = time.time()
+        self.tokens = min(float(self.budget), self.tokens + (now - self._last_refill_time) * self.budget / 60.0)
+        self._last_refill_time = now
+
+    def request(self):
+        """
+        Take a crawl request from the budget, for a crawl that requests another range of a peer
+
+        :return: True if the budget has a request left, False otherwise
+        """
+        self._refill()
+
+        if self.tokens < 1:
+            return False
+
+        self.tokens -= 1
+        return True
+
+    def _get_priority(self, state, now):
+        """
+        Get the priority of crawling a peer now, peers that were never crawled go first
+
+        :param state: The crawl history of the peer
+        :type state: PeerCrawlState
+        :param now: The current time
+        :type now: float
+        :return: priority, higher is crawled earlier
+        """
+        if state.last_crawl_time is None:
+            return float("inf")
+
+        return (state.vote_yield + CRAWL_YIELD_PRIOR) * (now - state.last_crawl_time)
+
+    def select(self, peers):
+        """
+        Pick the peers to crawl now. Every crawl takes at least one crawl request, so no more peers are picked than
+        the budget has requests left and the first request of each crawl is taken from the budget. Further requests
+        of a crawl are taken with request.
+
+        :param peers: The peers that may be crawled
+        :type peers: [Peer]
+        :return: list of peers to crawl, by decreasing priority
+        """
+        self._refill()
+
+        now = time.time()
+        states = {}
+        for peer in peers:
+            public_key = peer.public_key.key_to_bin()
+            states[public_key] = self.peers.get(public_key) or PeerCrawlState()
+
+        # Forget the peers we are no longer connected to
+        self.peers = states
+
+        due = [peer for peer in peers if not states[peer.public_key.key_to_bin()].crawling and
+               states[peer.public_key.key_to_bin()].next_crawl_time <= now]
+        due.sort(key=lambda peer: self._get_priority(states[peer.public_key.key_to_bin()], now), reverse=True)
+
+        selected = due[:max(0, int(self.tokens))]
+        for peer in selected:
+            states[peer.public_key.key_to_bin()].crawling = True
+        self.tokens -= len(selected)
+
+        self.scheduled_crawls += len(selected)
+        return selected
+
+    def report(self, peer, new_votes):
+        """
+        Record the result of a crawl of a peer and schedule its next crawl
+
+        :param peer: The crawled peer
+        :type peer: Peer
+        :param new_votes: Number of new votes the crawl received, 0 if it failed
+        :type new_votes: int
+        :return: None
+        """
+        state = self.peers.get(peer.public_key.key_to_bin())
+        if state is None:
+            return
+
+        now = time.time()
+
+        state.crawling = False
+        state.crawls += 1
+        state.last_crawl_time = now
+        state.vote_yield = CRAWL_YIELD_DECAY * state.vote_yield + (1 - CRAWL_YIELD_DECAY) * new_votes
+
+        if new_votes:
+            self.productive_crawls += 1
+            self.new_votes += new_votes
+            state.unproductive_crawls = 0
+            state.next_crawl_time = now + self.min_interval
+        else:
+            state.unproductive_crawls += 1
+            backoff = self.min_interval * 2 ** min(state.unproductive_crawls, 32)
+            state.next_crawl_time = now + min(self.max_backoff, backoff)
+
+    def get_statistics(self):
+        """
+        Get the scheduling statistics
+
+        :return: dictionary with the number of known and backed off peers, the scheduled and productive crawls, the
+        new votes they yielded and the crawl requests left in the budget
+        """
+        now = time.time()
+
+        return {
+            'peers': len(self.peers),
+            'backed_off_peers': sum(1 for state in self.peers.values() if state.unproductive_crawls and
+                                    state.next_crawl_time > now),
+            'scheduled_crawls': self.scheduled_crawls,
+            'productive_crawls': self.productive_crawls,
+            'new_votes': self.new_votes,
+            'budget': self.budget,
+            'tokens': self.tokens,
+        }
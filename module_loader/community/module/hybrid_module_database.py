@@ -0,0 +1,188 @@
+from __future__ import absolute_import
+
+# Default library imports
+import os
+import sqlite3
+import time
+
+# Project imports
+from module_loader import util
+from module_loader.community.module.module_database import ModuleDatabase, DATABASE_DIRECTORY
+
+# Constants
+HYBRID_BACKUP_INTERVAL = 60.0  # Default time in seconds between backups of a changed database
+# Tables restored from a backup, module votes before the catalog so the vote trigger doesn't count restored votes twice.
+# The full-text index is filled by the catalog trigger.
+HYBRID_TABLES = ["option", "modules", "voters", "module_votes", "module_catalog", "module_cache", "module_library",
+                 "crawl_cursors", "vote_checkpoints", "pending_votes"]
+
+
+class HybridModuleDatabase(ModuleDatabase):
+    """
+    Persistence layer for module information that keeps the whole database in memory. Commits don't touch the disk,
+    instead the database is backed up to the on-disk database file periodically and when it is closed. The backup is an
+    ordinary module database, so a node can switch between the hybrid and the on-disk storage.
+    """
+
+    def __init__(self, working_directory, db_name, backup_interval=HYBRID_BACKUP_INTERVAL, max_data_loss=None):
+        """
+        Sets up the persistence layer and restores the last backup.
+
+        :param working_directory: Path to the working directory where the backup is stored
+        :type working_directory: str
+        :param db_name: The name of the database
+        :type db_name: str
+        :param backup_interval: Minimum time in seconds between two backups, or None to only back up on close
+        :type backup_interval: float
+        :param max_data_loss: Maximum time in seconds a committed write may go without backup, or None for no limit
+        :type max_data_loss: float
+        """
+        self.working_directory = working_directory  # type: str
+        self.backup_path = os.path.join(working_directory, DATABASE_DIRECTORY, u"{0}.db".format(db_name))  # type: str
+        self.backup_interval = backup_interval  # type: float
+        self.max_data_loss = max_data_loss  # type: float
+
+        # Time of the first commit that is not in a backup yet, None if the backup is up to date
+        self._unsaved_since = None  # type: float
+
+        # Backup statistics
+        self.backup_count = 0  # type: int
+        self.last_backup_time = time.time()  # type: float
+        self.last_backup_duration = 0.0  # type: float
+        self.max_backup_duration = 0.0  # type: float
+        self.last_backup_size = 0  # type: int
+
+        super(HybridModuleDatabase, self).__init__(u":memory:", db_name)
+
+        self._logger.info("persistence: module database backup path: %s", self.backup_path)
+
+    def open(self, initial_statements=True, prepare_visioning=True):
+        result = super(HybridModuleDatabase, self).open(initial_statements, prepare_visioning)
+
+        if os.path.isfile(self.backup_path):
+            self._restore()
+
+        return result
+
+    def _restore(self):
+        """
+        Load the backup into the in-memory database, a backup of an older version is upgraded first
+
+        :return: None
+        """
+        start_time = time.time()
+
+        connection = sqlite3.connect(self.backup_path)
+        try:
+            version = int(connection.execute(u"SELECT value FROM option WHERE key = 'database_version';").fetchone()[0])
+        finally:
+            connection.close()
+
+        if version < self.LATEST_DB_VERSION:
+            self._logger.info("persistence: Upgrading module database backup from version %d", version)
+            ModuleDatabase(self.working_directory, self.db_name).close()
+
+        self.execute(u"ATTACH DATABASE ? AS backup;", (self.backup_path,))
+        try:
+            for table in HYBRID_TABLES:
+                columns = ", ".join(row[1] for row in self.execute(u"PRAGMA backup.table_info({0});".format(table)))
+                self.execute(u"INSERT OR REPLACE INTO main.{0} ({1}) SELECT {1} FROM backup.{0};".format(table, columns))
+            self.commit()
+        finally:
+            self.execute(u"DETACH DATABASE backup;")
+
+        self._load_indexes()
+        self._load_trending_reference()
+        self._rebase_trending_if_needed(int(time.time() * 1000))
+        self.flush()
+
+        # The in-memory database equals the backup
+        self._unsaved_since = None
+
+        self._logger.info("persistence: Restored module database backup in %.2f s", time.time() - start_time)
+
+    def _commit_pending(self):
+        super(HybridModuleDatabase, self)._commit_pending()
+
+        if self._unsaved_since is None:
+            self._unsaved_since = time.time()
+
+    def backup_due(self):
+        """
+        Check if the database changed since the last backup and the backup interval or data loss window has passed
+
+        :return: True if the database should be backed up, otherwise False
+        """
+        if self._unsaved_since is None:
+            return False
+
+        now = time.time()
+        if self.backup_interval is not None and now - self.last_backup_time >= self.backup_interval:
+            return True
+
+        return self.max_data_loss is not None and now - self._unsaved_since >= self.max_data_loss
+
+    def backup(self):
+        """
+        Write the committed state of the in-memory database to the database file. The backup is written next to the
+        database file and renamed over it, so a crash during a backup keeps the previous one.
+
+        :return: None
+        """
+        self.flush()
+
+        self._logger.info("persistence: Backing up module database to %s", self.backup_path)
+
+        start_time = time.time()
+        unsaved_since, self._unsaved_since = self._unsaved_since, None
+
+        util.create_directory_if_not_exists(os.path.dirname(self.backup_path))
+        temporary_path = self.backup_path + u".tmp"
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+        try:
+            self.execute(u"VACUUM INTO ?;", (temporary_path,))
+
+            # VACUUM INTO doesn't sync the file it writes
+            with open(temporary_path, "rb") as backup_file:
+                os.fsync(backup_file.fileno())
+            os.rename(temporary_path, self.backup_path)
+        except Exception:
+            self._unsaved_since = unsaved_since
+            raise
+
+        duration = time.time() - start_time
+
+        self.backup_count += 1
+        self.last_backup_time = time.time()
+        self.last_backup_duration = duration
+        self.max_backup_duration = max(self.max_backup_duration, duration)
+        self.last_backup_size = os.path.getsize(self.backup_path)
+
+        self._logger.info("persistence: Backed up module database (%d bytes) in %.2f s", self.last_backup_size,
+                          duration)
+
+    def get_backup_statistics(self):
+        """
+        Get the statistics of the backups
+
+        :return: dictionary with the number of backups, the duration and size of the last backup and the age in seconds
+        of the oldest write that is not in a backup yet
+        """
+        return {
+            'backups': self.backup_count,
+            'last_backup_time': self.last_backup_time,
+            'last_backup_duration': self.last_backup_duration,
+            'max_backup_duration': self.max_backup_duration,
+            'last_backup_size': self.last_backup_size,
+            'unsaved_age': time.time() - self._unsaved_since if self._unsaved_since is not None else 0.0,
+        }
+
+    def close(self, commit=True):
+        if commit:
+            self.flush()
+            if self._unsaved_since is not None:
+                self.backup()
+
+        return super(HybridModuleDatabase, self).close(commit)
@@ -0,0 +1,161 @@
+from __future__ import absolute_import
+
+# Default library imports
+import logging
+import time
+
+# Third party imports
+from twisted.internet import reactor
+
+# Constants
+BLOCK_INGESTION_BATCH_SIZE = 500  # maximum number of blocks processed in one batch
+BLOCK_INGESTION_DELAY = 0.05  # maximum time in seconds a received block waits for its batch to fill up
+
+
+class BlockIngestionQueue(object):
+    """
+    Collects received blocks and hands them to the processing function in batches. A batch is processed once it is
+    full or once its oldest block waited for the maximum delay, and only one batch is processed at a time. Blocks
+    received twice before they are processed are only processed once.
+    """
+
+    def __init__(self, process_batch, batch_size=BLOCK_INGESTION_BATCH_SIZE, delay=BLOCK_INGESTION_DELAY):
+        """
+        Initialize the queue
+
+        :param process_batch: function called with a list of blocks, returning a Deferred firing when they are processed
+        :param batch_size: Maximum number of blocks in a batch
+        :type batch_size: int
+        :param delay: Maximum time in seconds a block waits for its batch to fill up
+        :type delay: float
+        """
+        super(BlockIngestionQueue, self).__init__()
+
+        self.process_batch = process_batch
+        self.batch_size = batch_size  # type: int
+        self.delay = delay  # type: float
+
+        # Queued blocks by (public key, sequence number), in order of arrival
+        self._blocks = {}  # type: {(bytes, int): TrustChainBlock}
+        self._order = []  # type: [(bytes, int)]
+
+        self._flush_call = None
+        self._processing = None
+
+        # Statistics
+        self.received_blocks = 0  # type: int
+        self.duplicate_blocks = 0  # type: int
+        self.processed_blocks = 0  # type: int
+        self.batches = 0  # type: int
+        self.last_batch_size = 0  # type: int
+        self.total_processing_time = 0.0  # type: float
+
+        # Logging
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def push(self, block):
+        """
+        Queue a received block
+
+        :param block: The received block
+        :type block: TrustChainBlock
+        :return: None
+        """
+        self.received_blocks += 1
+
+        key = (block.public_key, block.sequence_number)
+        if key in self._blocks:
+            self.duplicate_blocks += 1
+            return
+
+        self._blocks[key] = block
+        self._order.append(key)
+
+        if len(self._order) >= self.batch_size:
+            self.flush()
+        elif self._flush_call is None:
+            self._flush_call = reactor.callLater(self.delay, self.flush)
+
+    def _take_batch(self):
+        """
+        Remove the oldest batch of blocks from the queue
+
+        :return: list of blocks
+        """
+        keys, self._order = self._order[:self.batch_size], self._order[self.batch_size:]
+        return [self._blocks.pop(key) for key in keys]
+
+    def _cancel_flush(self):
+        """
+        Cancel the scheduled flush, if any
+
+        :return: None
+        """
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+
+    def flush(self):
+        """
+        Process the oldest batch of blocks, unless a batch is being processed already. The next batch is processed when
+        it is done.
+
+        :return: None
+        """
+        self._cancel_flush()
+
+        if self._processing is not None or not self._order:
+            return
+
+        batch = self._take_batch()
+        start_time = time.time()
+
+        def on_done(result):
+            self._processing = None
+
+            self.batches += 1
+            self.processed_blocks += len(batch)
+            self.last_batch_size = len(batch)
+            self.total_processing_time += time.time() - start_time
+
+            if len(self._order) >= self.batch_size:
+                self.flush()
+            elif self._order and self._flush_call is None:
+                self._flush_call = reactor.callLater(self.delay, self.flush)
+
+            return result
+
+        self._processing = self.process_batch(batch)
+        self._processing.addBoth(on_done)
+
+    def get_statistics(self):
+        """
+        Get the ingestion statistics
+
+        :return: dictionary with the number of received, duplicate, queued and processed blocks, the number of batches
+        and the number of blocks processed per second of processing time
+        """
+        return {
+            'received_blocks': self.received_blocks,
+            'duplicate_blocks': self.duplicate_blocks,
+            'queued_blocks': len(self._order),
+            'processed_blocks': self.processed_blocks,
+            'batches': self.batches,
+            'last_batch_size': self.last_batch_size,
+            'blocks_per_second': self.processed_blocks / self.total_processing_time
+            if self.total_processing_time else 0.0,
+        }
+
+    def stop(self):
+        """
+        Process all queued blocks in a final batch
+
+        :return: None
+        """
+        self._cancel_flush()
+
+        if self._order:
+            batch = [self._blocks[key] for key in self._order]
+            self._blocks, self._order = {}, []
+            self.process_batch(batch)
@@ -0,0 +1,59 @@
+from __future__ import absolute_import
+
+# Default library imports
+import time
+
+
+class ReactorLagMonitor(object):
+    """
+    Measures how late the reactor runs a periodic call, which is the time the reactor thread was blocked.
+    """
+
+    def __init__(self, interval):
+        """
+        Initialize the monitor
+
+        :param interval: Interval in seconds at which sample is called
+        :type interval: float
+        """
+        super(ReactorLagMonitor, self).__init__()
+
+        self.interval = interval  # type: float
+        self._last_sample_time = None  # type: float
+
+        # Statistics
+        self.samples = 0  # type: int
+        self.last_lag = 0.0  # type: float
+        self.max_lag = 0.0  # type: float
+        self.total_lag = 0.0  # type: float
+
+    def sample(self):
+        """
+        Record the lag since the previous sample, should be called every interval seconds by the reactor
+
+        :return: None
+        """
+        now = time.time()
+
+        if self._last_sample_time is not None:
+            lag = max(0.0, now - self._last_sample_time - self.interval)
+
+            self.samples += 1
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+
+        self._last_sample_time = now
+
+    def get_statistics(self):
+        """
+        Get the measured reactor lag
+
+        :return: dictionary with the number of samples and the last, maximum and average lag in seconds
+        """
+        return {
+            'samples': self.samples,
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag,
+            'average_lag': self.total_lag / self.samples if self.samples else 0.0,
+        }
@@ -0,0 +1,959 @@
+from __future__ import absolute_import
+
+# Default library imports
+import itertools
+import logging
+import os
+import struct
+import threading
+import time
+from binascii import hexlify
+
+# Third party imports
+try:
+    import lmdb
+except ImportError:
+    lmdb = None
+
+# Project imports
+from module_loader import util
+from module_loader.community.module.core.module import Module
+from module_loader.community.module.core.module_identifier import ModuleIdentifier
+from module_loader.community.module.snapshot import ModuleSnapshot
+from module_loader.community.module.storage import ModuleStorage, ModuleStorageQueries, get_search_words, \
+    matches_search_words, CATALOG_ORDER_NAME, CATALOG_ORDER_VOTES, CATALOG_ORDERS
+
+# Constants
+LMDB_DIRECTORY = u"lmdb"  # Database sub-directory
+LMDB_MAP_SIZE = 1 << 30  # Maximum size of the database in bytes, the file only grows as far as it is used
+LMDB_TABLES = ["modules", "voters", "cache", "catalog", "library", "votes", "module_votes", "crawl_cursors",
+               "vote_checkpoints", "pending_votes", "option"]  # Sub-databases
+
+# Record layouts. Ids are big-endian so the keys of a table are ordered by id, which is the order of insertion.
+ID = struct.Struct(">I")  # key of the modules, voters, cache, catalog and library tables
+VOTE_KEY = struct.Struct(">II")  # (voter id, module id) in the votes table, (module id, voter id) in module_votes
+VOTE_VALUE = struct.Struct(">QI")  # (block timestamp, sequence number)
+CATALOG_VALUE = struct.Struct(">Id")  # (votes, trending score) followed by the module name
+MODULE_VALUE = struct.Struct(">H")  # length of the creator public key, followed by the key and the content hash
+SEQUENCE_NUMBER_VALUE = struct.Struct(">I")  # crawl cursor or vote checkpoint, keyed by the public key of the peer
+# Pending votes are keyed by the creator digest and content hash of the module followed by the public key of the voter,
+# the value is a VOTE_VALUE
+
+
+class LMDBModuleQueries(ModuleStorageQueries):
+    """
+    Read queries on the LMDB tables, shared by the storage and its read replica. Subclasses provide the read transaction
+    the queries run in and the translation between module ids and identifiers.
+    """
+
+    # module cache
+    def get_module_from_cache(self, module_identifier):
+        self._logger.debug("persistence: Getting module (%s) from cache", module_identifier)
+
+        return self._get_module_identifier("cache", module_identifier)
+
+    def get_modules_from_cache(self):
+        self._logger.debug("persistence: Getting all modules from cache")
+
+        return list(self.iter_cache())
+
+    def iter_cache(self, limit=None, offset=0):
+        return (self._module_identifiers[ID.unpack(key)[0]] for key, _ in self._iter_table("cache", limit, offset))
+
+    # module catalog
+    def get_module_from_catalog(self, module_identifier):
+        self._logger.debug("persistence: Getting module (%s) from catalog", module_identifier)
+
+        module_id = self._get_module_id(module_identifier)
+        if module_id is None:
+            return None
+
+        value = self._read_txn().get(ID.pack(module_id), db=self._tables["catalog"])
+        if value is None:
+            return None
+
+        votes, _, name = self._decode_catalog_value(value)
+        return Module(self._module_identifiers[module_id], name, votes)
+
+    def get_modules_from_catalog(self):
+        self._logger.debug("persistence: Getting all modules from catalog")
+
+        return list(self.iter_catalog())
+
+    def iter_catalog(self, order_by=None, limit=None, offset=0):
+        """
+        Iterate over the modules in the catalog. Insertion order streams the catalog table, the other orderings sort
+        the catalog in memory, which is small compared to the votes.
+
+        :param order_by: One of CATALOG_ORDERS
+        :type order_by: str
+        :param limit: Maximum number of modules to return, or None for all
+        :type limit: int
+        :param offset: Number of modules to skip
+        :type offset: int
+        :return: generator of modules
+        :raises ValueError: if the ordering is unknown
+        """
+        if order_by not in CATALOG_ORDERS:
+            raise ValueError("Unknown catalog order: {0}".format(order_by))
+
+        if order_by is None:
+            return (self._decode_catalog_entry(key, value)[0]
+                    for key, value in self._iter_table("catalog", limit, offset))
+
+        if order_by == CATALOG_ORDER_VOTES:
+            sort_key = lambda entry: -entry[0].votes
+        elif order_by == CATALOG_ORDER_NAME:
+            sort_key = lambda entry: entry[0].name
+        else:
+            sort_key = lambda entry: -entry[1]
+
+        entries = sorted((self._decode_catalog_entry(key, value) for key, value in self._iter_table("catalog")),
+                         key=sort_key)
+        return (module for module, _ in self._slice(entries, limit, offset))
+
+    def count_modules_in_catalog(self):
+        return self._read_txn().stat(self._tables["catalog"])['entries']
+
+    def search_catalog(self, query, limit=None, offset=0):
+        """
+        Search the catalog by module name. Every word of the query has to match the start of a word in the name,
+        results are ranked by number of votes. The catalog is scanned, as it is small compared to the votes.
+
+        :param query: Search query
+        :type query: str
+        :param limit: Maximum number of modules to return, or None for all
+        :type limit: int
+        :param offset: Number of modules to skip
+        :type offset: int
+        :return: generator of modules
+        """
+        self._logger.debug("persistence: Searching catalog for (%s)", query)
+
+        query_words = get_search_words(query)
+        if not query_words:
+            return iter([])
+
+        matches = []
+        for key, value in self._iter_table("catalog"):
+            module, _ = self._decode_catalog_entry(key, value)
+            if matches_search_words(module.name, query_words):
+                matches.append(module)
+
+        matches.sort(key=lambda match: -match.votes)
+        return iter(self._slice(matches, limit, offset))
+
+    # module library
+    def get_module_from_library(self, module_identifier):
+        self._logger.debug("persistence: Getting module (%s) from library", module_identifier)
+
+        return self._get_module_identifier("library", module_identifier)
+
+    def get_modules_from_library(self):
+        self._logger.debug("persistence: Getting all modules from library")
+
+        return list(self.iter_library())
+
+    def iter_library(self, limit=None, offset=0):
+        return (self._module_identifiers[ID.unpack(key)[0]] for key, _ in self._iter_table("library", limit, offset))
+
+    # module votes
+    def iter_votes(self, limit=None, after=None):
+        """
+        Iterate over all votes in key order, a page starts with a cursor positioned right after the last vote of the
+        previous page
+
+        :param limit: Maximum number of votes to return, or None for all
+        :type limit: int
+        :param after: The last vote of the previous page as (voter public key, module identifier) tuple, or None to
+        start at the first vote
+        :type after: (bytes, ModuleIdentifier)
+        :return: generator of (voter public key, module identifier) tuples
+        :raises ValueError: if the vote to start after is unknown
+        """
+        start_key = None
+        if after is not None:
+            voter_id, module_id = self._get_voter_id(after[0]), self._get_module_id(after[1])
+            if voter_id is None or module_id is None:
+                raise ValueError("Unknown vote to start after")
+            start_key = VOTE_KEY.pack(voter_id, module_id)
+
+        return self._iter_vote_keys(start_key, limit)
+
+    def _iter_vote_keys(self, start_key, limit):
+        """
+        Stream the votes table from the first key after a key
+
+        :param start_key: Key to start after, or None to start at the first key
+        :type start_key: bytes
+        :param limit: Maximum number of votes to return, or None for all
+        :type limit: int
+        :return: generator of (voter public key, module identifier) tuples
+        """
+        cursor = self._read_txn().cursor(db=self._tables["votes"])
+        if start_key is None:
+            positioned = cursor.first()
+        else:
+            positioned = cursor.set_range(start_key)
+            if positioned and cursor.key() == start_key:
+                positioned = cursor.next()
+
+        if not positioned:
+            return
+
+        for key in itertools.islice(cursor.iternext(values=False), limit):
+            voter_id, module_id = VOTE_KEY.unpack(key)
+            yield self._voter_public_keys[voter_id], self._module_identifiers[module_id]
+
+    # record decoding
+    def _get_module_identifier(self, table, module_identifier):
+        """
+        Look up a module in a table keyed by module id
+
+        :param table: Name of the table
+        :type table: str
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: the shared module identifier, or None if the module isn't in the table
+        """
+        module_id = self._get_module_id(module_identifier)
+        if module_id is None:
+            return None
+
+        if self._read_txn().get(ID.pack(module_id), db=self._tables[table]) is None:
+            return None
+
+        return self._module_identifiers[module_id]
+
+    def _iter_table(self, table, limit=None, offset=0):
+        """
+        Stream the records of a table in key order within a single read transaction
+
+        :param table: Name of the table
+        :type table: str
+        :param limit: Maximum number of records to return, or None for all
+        :type limit: int
+        :param offset: Number of records to skip
+        :type offset: int
+        :return: generator of (key, value) tuples
+        """
+        cursor = self._read_txn().cursor(db=self._tables[table])
+        for record in self._slice(cursor.iternext(), limit, offset):
+            yield record
+
+    @staticmethod
+    def _slice(records, limit, offset):
+        """
+        Get a page of records
+
+        :param records: iterable of records
+        :param limit: Maximum number of records to return, or None for all
+        :type limit: int
+        :param offset: Number of records to skip
+        :type offset: int
+        :return: iterator over the page
+        """
+        return itertools.islice(records, offset, offset + limit if limit is not None else None)
+
+    @staticmethod
+    def _decode_catalog_value(value):
+        """
+        Decode a catalog record value
+
+        :param value: catalog record value
+        :type value: bytes
+        :return: (votes, trending score, name) tuple
+        """
+        votes, trending = CATALOG_VALUE.unpack_from(value)
+        return votes, trending, bytes(value[CATALOG_VALUE.size:])
+
+    def _decode_catalog_entry(self, key, value):
+        """
+        Decode a catalog record, identifiers are shared with the id translation cache
+
+        :param key: catalog record key
+        :type key: bytes
+        :param value: catalog record value
+        :type value: bytes
+        :return: (module, trending score) tuple
+        """
+        votes, trending, name = self._decode_catalog_value(value)
+        return Module(self._module_identifiers[ID.unpack(key)[0]], name, votes), trending
+
+
+class LMDBModuleDatabaseReplica(LMDBModuleQueries):
+    """
+    Read-only view on the LMDB module storage for presentation layers. Every query runs in its own read transaction,
+    which reads a consistent snapshot of the committed state without blocking the writer or being blocked by it.
+    """
+
+    def __init__(self, database):
+        """
+        Initialize the view
+
+        :param database: The storage to read from
+        :type database: LMDBModuleDatabase
+        """
+        super(LMDBModuleDatabaseReplica, self).__init__()
+
+        self._database = database  # type: LMDBModuleDatabase
+
+        # Logging
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def _tables(self):
+        return self._database._tables
+
+    @property
+    def _module_identifiers(self):
+        return self._database._module_identifiers
+
+    @property
+    def _voter_public_keys(self):
+        return self._database._voter_public_keys
+
+    def _get_module_id(self, module_identifier):
+        return self._database._get_module_id(module_identifier)
+
+    def _get_voter_id(self, voter_public_key):
+        return self._database._get_voter_id(voter_public_key)
+
+    def _read_txn(self):
+        return self._database._env.begin()
+
+    def close(self):
+        """
+        Close the view, the environment is closed by the storage
+
+        :return: None
+        """
+        pass
+
+
+class LMDBModuleDatabase(LMDBModuleQueries, ModuleStorage):
+    """
+    Persistence layer for module information in a memory-mapped LMDB key-value store. Membership checks are single
+    key lookups in the memory map, so unlike the SQLite backend nothing is loaded in memory but the module and voter
+    ids. All writes of a unit of work share one write transaction, which is committed on flush.
+    """
+
+    def __init__(self, working_directory, db_name):
+        """
+        Sets up the persistence layer.
+
+        :param working_directory: Path to the working directory where the state is stored
+        :type working_directory: str
+        :param db_name: The name of the database
+        :type db_name: str
+        :raises ImportError: if the lmdb package is not installed
+        :raises ValueError: if an in-memory database is requested
+        """
+        if lmdb is None:
+            raise ImportError("The LMDB storage backend requires the lmdb package")
+
+        if working_directory == u":memory:":
+            raise ValueError("The LMDB storage backend has no in-memory mode")
+
+        super(LMDBModuleDatabase, self).__init__()
+
+        # Logging
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        self.file_path = os.path.join(working_directory, LMDB_DIRECTORY, u"{0}.lmdb".format(db_name))  # type: str
+        self.db_name = db_name  # type: str
+
+        self._logger.info("persistence: module database path: %s", self.file_path)
+
+        self._env = None
+        self._tables = {}  # type: dict
+
+        # Write transaction of the current unit of work and the thread it belongs to
+        self._txn = None
+        self._txn_thread = None  # type: threading.Thread
+
+        # Id translation caches, loaded on open and kept in sync on every insert
+        self._module_ids = {}  # type: dict
+        self._module_identifiers = {}  # type: dict
+        self._voter_ids = {}  # type: dict
+        self._voter_public_keys = {}  # type: dict
+        self._next_module_id = 1  # type: int
+        self._next_voter_id = 1  # type: int
+
+        # Lookup statistics per table, as [lookups, hits]
+        self._lookups = {table: [0, 0] for table in ["cache", "catalog", "library", "votes"]}  # type: dict
+
+        self.open()
+
+    def open(self):
+        """
+        Open the environment, load the id translation caches and the trending reference time
+
+        :return: None
+        """
+        util.create_directory_if_not_exists(os.path.dirname(self.file_path))
+
+        self._env = lmdb.open(self.file_path, map_size=LMDB_MAP_SIZE, max_dbs=len(LMDB_TABLES))
+        self._tables = {table: self._env.open_db(table) for table in LMDB_TABLES}
+
+        self._load_ids()
+        self._load_trending_reference()
+        self._rebase_trending_if_needed(int(time.time() * 1000))
+
+        self.replica = LMDBModuleDatabaseReplica(self)  # type: LMDBModuleQueries
+
+    # transactions
+    def _write_txn(self):
+        """
+        Get the write transaction of the current unit of work, starting one if needed
+
+        :return: write transaction
+        """
+        if self._txn is None:
+            self._txn = self._env.begin(write=True)
+            self._txn_thread = threading.current_thread()
+
+        return self._txn
+
+    def _read_txn(self):
+        """
+        Get a transaction to read in. The thread that writes reads its own pending writes, other threads read the
+        committed state in a read transaction that ends when it is no longer referenced.
+
+        :return: transaction
+        """
+        if self._txn is not None and self._txn_thread is threading.current_thread():
+            return self._txn
+
+        return self._env.begin()
+
+    def _contains(self, table, key):
+        """
+        Check if a key is in a table and update the lookup statistics
+
+        :param table: Name of the table
+        :type table: str
+        :param key: key, or None if the module or voter is unknown
+        :type key: bytes
+        :return: True if the key is in the table, otherwise False
+        """
+        statistics = self._lookups[table]
+        statistics[0] += 1
+
+        if key is None:
+            return False
+
+        found = self._read_txn().get(key, db=self._tables[table]) is not None
+        if found:
+            statistics[1] += 1
+
+        return found
+
+    def _module_record_key(self, module_identifier):
+        """
+        Get the key of a module in the tables keyed by module id
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: key, or None if the module is unknown
+        """
+        module_id = self._get_module_id(module_identifier)
+        return ID.pack(module_id) if module_id is not None else None
+
+    # module cache
+    def add_module_to_cache(self, module_identifier):
+        self._logger.info("persistence: Adding module (%s) to cache", module_identifier)
+
+        module_id = self._get_module_id(module_identifier, create=True)
+        self._write_txn().put(ID.pack(module_id), b"", db=self._tables["cache"])
+        self._commit_write()
+
+    def has_module_in_cache(self, module_identifier):
+        self._logger.debug("persistence: Check for module (%s) in cache", module_identifier)
+
+        return self._contains("cache", self._module_record_key(module_identifier))
+
+    # module catalog
+    def add_module_to_catalog(self, module):
+        self._logger.info("persistence: Adding module (%s) to catalog", module)
+
+        module_id = self._get_module_id(module.id, create=True)
+
+        txn = self._write_txn()
+        votes, trending = self._count_votes(txn, module_id)
+        txn.put(ID.pack(module_id), CATALOG_VALUE.pack(votes, trending) + bytes(module.name),
+                db=self._tables["catalog"])
+        self._commit_write()
+
+    def has_module_in_catalog(self, module_identifier):
+        self._logger.debug("persistence: Check for module (%s) in catalog", module_identifier)
+
+        return self._contains("catalog", self._module_record_key(module_identifier))
+
+    def update_module_in_catalog(self, module_identifier, votes):
+        self._logger.debug("persistence: Update module (%s)", module_identifier)
+
+        module_id = self._get_module_id(module_identifier)
+        if module_id is None:
+            return
+
+        txn = self._write_txn()
+        value = txn.get(ID.pack(module_id), db=self._tables["catalog"])
+        if value is None:
+            return
+
+        _, trending, name = self._decode_catalog_value(value)
+        txn.put(ID.pack(module_id), CATALOG_VALUE.pack(votes, trending) + name, db=self._tables["catalog"])
+        self._commit_write()
+
+    def get_trending_score(self, module_identifier):
+        module_id = self._get_module_id(module_identifier)
+        if module_id is None:
+            return None
+
+        value = self._read_txn().get(ID.pack(module_id), db=self._tables["catalog"])
+        if value is None:
+            return None
+
+        return self._decode_catalog_value(value)[1] * self._trending_decay()
+
+    def _count_votes(self, txn, module_id):
+        """
+        Count the votes stored for a module
+
+        :param txn: transaction to read in
+        :param module_id: module id
+        :type module_id: int
+        :return: (number of votes, trending score) tuple
+        """
+        votes, trending = 0, 0.0
+        for _, (block_timestamp, _) in self._iter_votes(txn, "module_votes", module_id):
+            votes += 1
+            trending += self._trending_weight(block_timestamp)
+
+        return votes, trending
+
+    def _add_to_catalog_entry(self, txn, module_id, votes, trending):
+        """
+        Add to the vote counter and trending score of a module, if it is in the catalog
+
+        :param txn: write transaction
+        :param module_id: module id
+        :type module_id: int
+        :param votes: Number of votes to add
+        :type votes: int
+        :param trending: Trending weight to add
+        :type trending: float
+        :return: None
+        """
+        value = txn.get(ID.pack(module_id), db=self._tables["catalog"])
+        if value is None:
+            return
+
+        catalog_votes, catalog_trending, name = self._decode_catalog_value(value)
+        txn.put(ID.pack(module_id), CATALOG_VALUE.pack(catalog_votes + votes, catalog_trending + trending) + name,
+                db=self._tables["catalog"])
+
+    # module library
+    def add_module_to_library(self, module_identifier):
+        self._logger.info("persistence: Adding module (%s) to library", module_identifier)
+
+        module_id = self._get_module_id(module_identifier, create=True)
+        self._write_txn().put(ID.pack(module_id), b"", db=self._tables["library"])
+        self._commit_write()
+
+    def has_module_in_library(self, module_identifier):
+        self._logger.debug("persistence: Check for module (%s) in library", module_identifier)
+
+        return self._contains("library", self._module_record_key(module_identifier))
+
+    # module votes
+    def record_vote(self, voter_public_key, module_identifier, block_timestamp=0, sequence_number=0):
+        if self.did_vote(voter_public_key, module_identifier):
+            return False
+
+        self._logger.debug("persistence: Record vote (%s, %s)", hexlify(voter_public_key), module_identifier)
+
+        self._rebase_trending_if_needed(block_timestamp)
+
+        voter_id = self._get_voter_id(voter_public_key, create=True)
+        module_id = self._get_module_id(module_identifier, create=True)
+        value = VOTE_VALUE.pack(block_timestamp, sequence_number)
+
+        txn = self._write_txn()
+        txn.put(VOTE_KEY.pack(voter_id, module_id), value, db=self._tables["votes"])
+        txn.put(VOTE_KEY.pack(module_id, voter_id), value, db=self._tables["module_votes"])
+        self._add_to_catalog_entry(txn, module_id, 1, self._trending_weight(block_timestamp))
+        self._commit_write()
+
+        return True
+
+    def did_vote(self, voter_public_key, module_identifier):
+        self._logger.debug("persistence: Check for vote (%s, %s) in votes", hexlify(voter_public_key), module_identifier)
+
+        voter_id = self._get_voter_id(voter_public_key)
+        module_id = self._get_module_id(module_identifier)
+        key = VOTE_KEY.pack(voter_id, module_id) if voter_id is not None and module_id is not None else None
+
+        return self._contains("votes", key)
+
+    def get_votes_for_module(self, module_identifier):
+        self._logger.debug("persistence: Getting votes for module (%s)", module_identifier)
+
+        if not self.has_module_in_catalog(module_identifier):
+            return None
+
+        return [{
+            'voter': self._voter_public_keys[voter_id],
+            'identifier': module_identifier,
+            'timestamp': block_timestamp,
+            'sequence_number': sequence_number,
+        } for voter_id, (block_timestamp, sequence_number)
+            in self._iter_votes(self._read_txn(), "module_votes", self._get_module_id(module_identifier))]
+
+    def get_votes_for_peer(self, peer):
+        self._logger.debug("persistence: Getting votes for peer (%s)", hexlify(peer))
+
+        voter_id = self._get_voter_id(peer)
+        if voter_id is None:
+            return []
+
+        return [{
+            'voter': peer,
+            'identifier': self._module_identifiers[module_id],
+            'timestamp': block_timestamp,
+            'sequence_number': sequence_number,
+        } for module_id, (block_timestamp, sequence_number) in self._iter_votes(self._read_txn(), "votes", voter_id)]
+
+    def count_votes_without_history(self):
+        cursor = self._read_txn().cursor(db=self._tables["votes"])
+        return sum(1 for value in cursor.iternext(keys=False) if VOTE_VALUE.unpack(value)[0] == 0)
+
+    def add_vote_history(self, voter_public_key, module_identifier, block_timestamp, sequence_number):
+        voter_id = self._get_voter_id(voter_public_key)
+        module_id = self._get_module_id(module_identifier)
+        if voter_id is None or module_id is None or block_timestamp == 0:
+            return False
+
+        txn = self._write_txn()
+        value = txn.get(VOTE_KEY.pack(voter_id, module_id), db=self._tables["votes"])
+        if value is None or VOTE_VALUE.unpack(value)[0] != 0:
+            return False
+
+        self._rebase_trending_if_needed(block_timestamp)
+
+        value = VOTE_VALUE.pack(block_timestamp, sequence_number)
+        txn.put(VOTE_KEY.pack(voter_id, module_id), value, db=self._tables["votes"])
+        txn.put(VOTE_KEY.pack(module_id, voter_id), value, db=self._tables["module_votes"])
+        self._add_to_catalog_entry(txn, module_id, 0, self._trending_weight(block_timestamp))
+        self._commit_write()
+
+        return True
+
+    def _iter_votes(self, txn, table, first_id):
+        """
+        Iterate over the votes with the same first id, the voter id in the votes table or the module id in module_votes
+
+        :param txn: transaction to read in
+        :param table: votes or module_votes
+        :type table: str
+        :param first_id: voter id or module id
+        :type first_id: int
+        :return: generator of (second id, (block timestamp, sequence number)) tuples
+        """
+        cursor = txn.cursor(db=self._tables[table])
+        if not cursor.set_range(ID.pack(first_id)):
+            return
+
+        for key, value in cursor.iternext():
+            key_first_id, second_id = VOTE_KEY.unpack(key)
+            if key_first_id != first_id:
+                break
+
+            yield second_id, VOTE_VALUE.unpack(value)
+
+    # pending votes
+    def add_pending_vote(self, creator_digest, content_hash, voter_public_key, block_timestamp, sequence_number):
+        key = bytes(creator_digest) + bytes(content_hash) + bytes(voter_public_key)
+        value = VOTE_VALUE.pack(block_timestamp, sequence_number)
+        if not self._write_txn().put(key, value, overwrite=False, db=self._tables["pending_votes"]):
+            return False
+
+        self._commit_write()
+        return True
+
+    def pop_pending_votes(self, creator_digest, content_hash):
+        prefix = bytes(creator_digest) + bytes(content_hash)
+
+        txn = self._write_txn()
+        cursor = txn.cursor(db=self._tables["pending_votes"])
+        if not cursor.set_range(prefix):
+            return []
+
+        votes = []
+        while cursor.key().startswith(prefix):
+            votes.append((cursor.key()[len(prefix):],) + VOTE_VALUE.unpack(cursor.value()))
+            if not cursor.delete():
+                break
+
+        if votes:
+            self._commit_write()
+
+        return votes
+
+    def count_pending_votes(self):
+        return self._read_txn().stat(self._tables["pending_votes"])['entries']
+
+    # vote reconciliation
+    def get_vote_checkpoint(self, public_key):
+        value = self._read_txn().get(bytes(public_key), db=self._tables["vote_checkpoints"])
+        return SEQUENCE_NUMBER_VALUE.unpack(value)[0] if value is not None else 0
+
+    def set_vote_checkpoint(self, public_key, sequence_number):
+        self._write_txn().put(bytes(public_key), SEQUENCE_NUMBER_VALUE.pack(sequence_number),
+                              db=self._tables["vote_checkpoints"])
+        self._commit_write()
+
+    # crawl cursors
+    def get_crawl_cursor(self, public_key):
+        value = self._read_txn().get(bytes(public_key), db=self._tables["crawl_cursors"])
+        return SEQUENCE_NUMBER_VALUE.unpack(value)[0] if value is not None else 0
+
+    def set_crawl_cursor(self, public_key, sequence_number):
+        self._write_txn().put(bytes(public_key), SEQUENCE_NUMBER_VALUE.pack(sequence_number),
+                              db=self._tables["crawl_cursors"])
+        self._commit_write()
+
+    # snapshots
+    def export_snapshot(self, file_path):
+        self._logger.info("persistence: Exporting snapshot to %s", file_path)
+
+        snapshot = ModuleSnapshot(
+            modules=[(module_id, identifier.creator, identifier.content_hash)
+                     for module_id, identifier in sorted(self._module_identifiers.items())],
+            voters=sorted(self._voter_public_keys.items()),
+            catalog=[(ID.unpack(key)[0], self._decode_catalog_value(value)[2])
+                     for key, value in self._iter_table("catalog")],
+            cache=[ID.unpack(key)[0] for key, _ in self._iter_table("cache")],
+            library=[ID.unpack(key)[0] for key, _ in self._iter_table("library")],
+            votes=[VOTE_KEY.unpack(key) + VOTE_VALUE.unpack(value) for key, value in self._iter_table("votes")],
+        )
+
+        # Write to a temporary file first so an interrupted export never leaves a truncated snapshot behind
+        temporary_path = file_path + ".tmp"
+        with open(temporary_path, "wb") as snapshot_file:
+            snapshot_file.write(snapshot.encode())
+        os.rename(temporary_path, file_path)
+
+        return snapshot.get_statistics()
+
+    def import_snapshot(self, file_path):
+        self._logger.info("persistence: Importing snapshot from %s", file_path)
+
+        with open(file_path, "rb") as snapshot_file:
+            snapshot = ModuleSnapshot.decode(snapshot_file.read())
+
+        start_time = time.time()
+
+        with self.transaction():
+            # Translate the ids of the exporting database into local ids
+            module_ids = {module_id: self._get_module_id(ModuleIdentifier(public_key, content_hash), create=True)
+                          for module_id, public_key, content_hash in snapshot.modules}
+            voter_ids = {voter_id: self._get_voter_id(public_key, create=True)
+                         for voter_id, public_key in snapshot.voters}
+
+            txn = self._write_txn()
+
+            for table, snapshot_module_ids in [("cache", snapshot.cache), ("library", snapshot.library)]:
+                for module_id in snapshot_module_ids:
+                    txn.put(ID.pack(module_ids[module_id]), b"", overwrite=False, db=self._tables[table])
+
+            if snapshot.votes:
+                self._rebase_trending_if_needed(max(vote[2] for vote in snapshot.votes))
+
+            new_votes = {}
+            for voter_id, module_id, block_timestamp, sequence_number in snapshot.votes:
+                voter_id, module_id = voter_ids[voter_id], module_ids[module_id]
+                value = VOTE_VALUE.pack(block_timestamp, sequence_number)
+                if txn.put(VOTE_KEY.pack(voter_id, module_id), value, overwrite=False, db=self._tables["votes"]):
+                    txn.put(VOTE_KEY.pack(module_id, voter_id), value, db=self._tables["module_votes"])
+                    new_votes[module_id] = new_votes.get(module_id, 0) + 1
+
+            # New catalog entries count all their votes, existing ones count the new votes. Trending scores are computed
+            # once per module from all of its votes instead of once per imported vote.
+            for module_id, name in snapshot.catalog:
+                module_id = module_ids[module_id]
+                if txn.get(ID.pack(module_id), db=self._tables["catalog"]) is None:
+                    txn.put(ID.pack(module_id), CATALOG_VALUE.pack(0, 0.0) + bytes(name), db=self._tables["catalog"])
+                    new_votes[module_id] = None
+
+            for module_id, count in new_votes.items():
+                value = txn.get(ID.pack(module_id), db=self._tables["catalog"])
+                if value is None:
+                    continue
+
+                catalog_votes, _, name = self._decode_catalog_value(value)
+                votes, trending = self._count_votes(txn, module_id)
+                txn.put(ID.pack(module_id),
+                        CATALOG_VALUE.pack(votes if count is None else catalog_votes + count, trending) + name,
+                        db=self._tables["catalog"])
+
+            self._commit_write()
+
+        self._logger.info("persistence: Imported snapshot in %.2f s (%s)", time.time() - start_time,
+                          snapshot.get_statistics())
+
+        return snapshot.get_statistics()
+
+    # id translation
+    def _get_module_id(self, module_identifier, create=False):
+        """
+        Translate a module identifier into the integer id used to reference the module in the tables
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :param create: Whether to add the module when it has no id yet
+        :type create: bool
+        :return: module id, or None if the module is unknown and create is False
+        """
+        key = bytes(module_identifier.creator), str(module_identifier.content_hash)
+        module_id = self._module_ids.get(key)
+
+        if module_id is None and create:
+            module_id, self._next_module_id = self._next_module_id, self._next_module_id + 1
+            self._write_txn().put(ID.pack(module_id), MODULE_VALUE.pack(len(key[0])) + key[0] + key[1],
+                                  db=self._tables["modules"])
+            self._module_ids[key] = module_id
+            self._module_identifiers[module_id] = ModuleIdentifier(*key)
+            self._add_creator(key[0])
+
+        return module_id
+
+    def _get_voter_id(self, voter_public_key, create=False):
+        """
+        Translate a voter public key into the integer id used to reference the voter in the tables
+
+        :param voter_public_key: Public key of the voter
+        :type voter_public_key: bytes
+        :param create: Whether to add the voter when it has no id yet
+        :type create: bool
+        :return: voter id, or None if the voter is unknown and create is False
+        """
+        key = bytes(voter_public_key)
+        voter_id = self._voter_ids.get(key)
+
+        if voter_id is None and create:
+            voter_id, self._next_voter_id = self._next_voter_id, self._next_voter_id + 1
+            self._write_txn().put(ID.pack(voter_id), key, db=self._tables["voters"])
+            self._voter_ids[key] = voter_id
+            self._voter_public_keys[voter_id] = key
+
+        return voter_id
+
+    def _load_ids(self):
+        """
+        Load the id translation caches from the modules and voters tables
+
+        :return: None
+        """
+        self._module_ids, self._module_identifiers, self._voter_ids, self._voter_public_keys = {}, {}, {}, {}
+        self._creators = {}
+
+        for key, value in self._iter_table("modules"):
+            module_id, = ID.unpack(key)
+            creator_length, = MODULE_VALUE.unpack_from(value)
+            creator = bytes(value[MODULE_VALUE.size:MODULE_VALUE.size + creator_length])
+            content_hash = bytes(value[MODULE_VALUE.size + creator_length:])
+            self._module_ids[(creator, content_hash)] = module_id
+            self._module_identifiers[module_id] = ModuleIdentifier(creator, content_hash)
+
+        for creator in set(identifier.creator for identifier in self._module_identifiers.values()):
+            self._add_creator(creator)
+
+        for key, value in self._iter_table("voters"):
+            voter_id, = ID.unpack(key)
+            self._voter_ids[bytes(value)] = voter_id
+            self._voter_public_keys[voter_id] = bytes(value)
+
+        self._next_module_id = max(self._module_identifiers) + 1 if self._module_identifiers else 1
+        self._next_voter_id = max(self._voter_public_keys) + 1 if self._voter_public_keys else 1
+
+        self._logger.info("persistence: Loaded ids (modules: %d, voters: %d)", len(self._module_ids),
+                          len(self._voter_ids))
+
+    # trending
+    def _load_trending_reference(self):
+        """
+        Load the trending reference time, a new database starts at the current time
+
+        :return: None
+        """
+        value = self._read_txn().get(b"trending_reference", db=self._tables["option"])
+        if value is None:
+            self._trending_reference = time.time()
+            self._store_trending_reference()
+        else:
+            self._trending_reference = float(value)
+
+    def _store_trending_reference(self):
+        self._write_txn().put(b"trending_reference", repr(self._trending_reference), db=self._tables["option"])
+        self._commit_write()
+
+    def _scale_trending_scores(self, factor):
+        txn = self._write_txn()
+        for key, value in list(txn.cursor(db=self._tables["catalog"]).iternext()):
+            votes, trending, name = self._decode_catalog_value(value)
+            txn.put(key, CATALOG_VALUE.pack(votes, trending * factor) + name, db=self._tables["catalog"])
+        self._commit_write()
+
+    # statistics
+    def get_index_statistics(self):
+        txn = self._read_txn()
+
+        statistics = {}
+        for table, (lookups, hits) in self._lookups.items():
+            statistics[table] = {
+                'size': txn.stat(self._tables[table])['entries'],
+                'lookups': lookups,
+                'hits': hits,
+                'misses': lookups - hits,
+                'hit_rate': float(hits) / lookups if lookups else 0.0,
+            }
+
+        return statistics
+
+    # unit of work
+    def _commit_pending(self):
+        """
+        Commit the write transaction, which makes the pending writes durable
+
+        :return: None
+        """
+        if self._txn is not None:
+            self._txn.commit()
+            self._txn = None
+
+    def _discard_pending(self):
+        """
+        Abort the write transaction, the id caches and trending reference were updated by the discarded writes
+
+        :return: None
+        """
+        if self._txn is not None:
+            self._txn.abort()
+            self._txn = None
+
+        self._load_ids()
+        self._load_trending_reference()
+
+    def close(self, commit=True):
+        if commit:
+            self.flush()
+        self._cancel_flush()
+
+        if self._txn is not None:
+            self._txn.abort()
+            self._txn = None
+
+        self.replica.close()
+        self._env.close()
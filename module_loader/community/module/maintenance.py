@@ -0,0 +1,214 @@
+from __future__ import absolute_import
+
+# Default library imports
+import logging
+import time
+
+# Third party imports
+from twisted.internet.defer import succeed
+from twisted.internet.task import Cooperator, SchedulerStopped
+
+# Constants
+MAINTENANCE_TIME_BUDGET = 0.05  # maximum time in seconds maintenance jobs run before the reactor gets control back
+
+
+class MaintenanceJob(object):
+    """
+    Progress and reactor stall statistics of a maintenance job. The job itself is a generator that does a bounded chunk
+    of work between two yields, it can yield a Deferred to wait for it before the next chunk.
+    """
+
+    def __init__(self, name):
+        """
+        Initialize the job statistics
+
+        :param name: Name of the job
+        :type name: str
+        """
+        super(MaintenanceJob, self).__init__()
+
+        self.name = name  # type: str
+
+        # Progress
+        self.done = 0  # type: int
+        self.total = None  # type: int
+        self.running = False  # type: bool
+
+        # Statistics
+        self.runs = 0  # type: int
+        self.chunks = 0  # type: int
+        self.last_start_time = None  # type: float
+        self.last_duration = 0.0  # type: float
+        self.max_stall = 0.0  # type: float
+
+    def set_total(self, total):
+        """
+        Set the amount of work of the current run
+
+        :param total: Number of items the job will process
+        :type total: int
+        :return: None
+        """
+        self.total = total
+
+    def advance(self, count=1):
+        """
+        Report processed items
+
+        :param count: Number of items processed
+        :type count: int
+        :return: None
+        """
+        self.done += count
+
+    def get_progress(self):
+        """
+        Get the progress of the current run
+
+        :return: fraction of the work that is done, or None if the amount of work is unknown
+        """
+        if not self.total:
+            return None if self.total is None else 1.0
+
+        return min(1.0, float(self.done) / self.total)
+
+    def get_statistics(self):
+        """
+        Get the job statistics
+
+        :return: dictionary with the progress of the current run, the number of runs and chunks and the maximum time in
+        seconds the job blocked the reactor with a single chunk
+        """
+        return {
+            'running': self.running,
+            'done': self.done,
+            'total': self.total,
+            'progress': self.get_progress(),
+            'runs': self.runs,
+            'chunks': self.chunks,
+            'last_duration': self.last_duration,
+            'max_stall': self.max_stall,
+        }
+
+
+class MaintenanceScheduler(object):
+    """
+    Runs long maintenance jobs cooperatively on the reactor. Each reactor iteration the jobs get to run chunks of work
+    until the time budget is used up, so packet handling never waits for a whole job.
+    """
+
+    def __init__(self, time_budget=MAINTENANCE_TIME_BUDGET):
+        """
+        Initialize the scheduler
+
+        :param time_budget: Time in seconds the jobs may run each reactor iteration
+        :type time_budget: float
+        """
+        super(MaintenanceScheduler, self).__init__()
+
+        self.time_budget = time_budget  # type: float
+        self.jobs = {}  # type: {str: MaintenanceJob}
+
+        self._cooperator = Cooperator(terminationPredicateFactory=self._create_budget_predicate)
+
+        # Logging
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def _create_budget_predicate(self):
+        """
+        Create the predicate that ends a reactor iteration of the jobs once the time budget is used
+
+        :return: function returning True when the time budget is used
+        """
+        end_time = time.time() + self.time_budget
+        return lambda: time.time() >= end_time
+
+    def run(self, name, job_function, *args, **kwargs):
+        """
+        Start a maintenance job, unless a job with the same name is still running
+
+        :param name: Name of the job
+        :type name: str
+        :param job_function: function returning the generator of the job, called with the job statistics as first
+        argument, followed by args and kwargs
+        :return: Deferred firing when the job is done
+        """
+        job = self.jobs.get(name)
+        if job is None:
+            job = self.jobs[name] = MaintenanceJob(name)
+
+        if job.running:
+            self._logger.info("maintenance: Job %s is still running, not starting it again", name)
+            return succeed(None)
+
+        job.running = True
+        job.done = 0
+        job.total = None
+        job.runs += 1
+        job.last_start_time = time.time()
+
+        deferred = self._cooperator.coiterate(self._measure(job, job_function(job, *args, **kwargs)))
+
+        def on_done(result):
+            job.running = False
+            job.last_duration = time.time() - job.last_start_time
+            self._logger.info("maintenance: Job %s finished %d items in %.2f s (max stall: %.3f s)", name, job.done,
+                              job.last_duration, job.max_stall)
+            return result
+
+        def on_stopped(failure):
+            failure.trap(SchedulerStopped)
+            self._logger.info("maintenance: Job %s stopped", name)
+
+        deferred.addBoth(on_done)
+        deferred.addErrback(on_stopped)
+        return deferred
+
+    def is_running(self, name):
+        """
+        Check if a job is running
+
+        :param name: Name of the job
+        :type name: str
+        :return: True if the job is running, otherwise False
+        """
+        job = self.jobs.get(name)
+        return job is not None and job.running
+
+    @staticmethod
+    def _measure(job, iterator):
+        """
+        Wrap a job to measure how long each chunk blocks the reactor
+
+        :param job: The job statistics
+        :type job: MaintenanceJob
+        :param iterator: The generator of the job
+        :return: generator yielding what the job yields
+        """
+        while True:
+            start_time = time.time()
+            try:
+                result = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                job.max_stall = max(job.max_stall, time.time() - start_time)
+
+            job.chunks += 1
+            yield result
+
+    def get_statistics(self):
+        """
+        Get the statistics of all jobs
+
+        :return: dictionary with the statistics of each job by name
+        """
+        return {name: job.get_statistics() for name, job in self.jobs.items()}
+
+    def stop(self):
+        """
+        Stop all running jobs
+
+        :return: None
+        """
+        self._cooperator.stop()
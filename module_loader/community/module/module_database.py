@@ -2,6 +2,11 @@ from __future__ import absolute_import
 
 import os
 # Default library imports
+import itertools
+import logging
+import re
+import sqlite3
+import time
 from binascii import hexlify
 
 # Third party imports
@@ -10,18 +15,414 @@ from ipv8.database import Database, database_blob
 # Project imports
 from module_loader.community.module.core.module import Module
 from module_loader.community.module.core.module_identifier import ModuleIdentifier
+from module_loader.community.module.module_index import MembershipIndex
+from module_loader.community.module.snapshot import ModuleSnapshot
+from module_loader.community.module.storage import ModuleStorage, ModuleStorageQueries, get_search_words, \
+    matches_search_words, CATALOG_ORDER_NAME, CATALOG_ORDER_TRENDING, CATALOG_ORDER_VOTES
 
 # Constants
 DATABASE_DIRECTORY = os.path.join(u"sqlite")  # Database sub-directory
 
+# Catalog page queries, one fixed statement per ordering so each is prepared once and reused from the statement cache
+CATALOG_PAGE_QUERIES = {
+    None: "SELECT module_id, name, votes FROM module_catalog ORDER BY module_id ASC LIMIT ? OFFSET ?;",
+    CATALOG_ORDER_VOTES: "SELECT module_id, name, votes FROM module_catalog ORDER BY votes DESC LIMIT ? OFFSET ?;",
+    CATALOG_ORDER_NAME: "SELECT module_id, name, votes FROM module_catalog ORDER BY name ASC LIMIT ? OFFSET ?;",
+    CATALOG_ORDER_TRENDING: "SELECT module_id, name, votes FROM module_catalog ORDER BY trending DESC "
+                            "LIMIT ? OFFSET ?;",
+}
+
+# Pages of all votes in primary key order, later pages start with a search of the primary key
+VOTES_PAGE_QUERY = "SELECT v.public_key, mv.module_id FROM module_votes mv JOIN voters v ON v.id = mv.voter_id " \
+                   "ORDER BY mv.voter_id, mv.module_id LIMIT ?;"
+VOTES_PAGE_AFTER_QUERY = "SELECT v.public_key, mv.module_id FROM module_votes mv JOIN voters v ON v.id = mv.voter_id " \
+                         "WHERE (mv.voter_id, mv.module_id) > (?, ?) ORDER BY mv.voter_id, mv.module_id LIMIT ?;"
+
+# Full-text index on the catalog names, maintained by a trigger and built from the existing catalog when created
+SEARCH_INDEX_SCRIPT = u"""
+CREATE VIRTUAL TABLE IF NOT EXISTS module_catalog_fts USING fts5 (
+    name, content = 'module_catalog', content_rowid = 'module_id'
+);
+INSERT INTO module_catalog_fts (module_catalog_fts) VALUES ('rebuild');
+
+CREATE TRIGGER module_catalog_fts_trg AFTER INSERT ON module_catalog
+BEGIN
+    INSERT INTO module_catalog_fts (rowid, name) VALUES (NEW.module_id, NEW.name);
+END;
+"""
+
+# Catalog search without the full-text index, every query word narrows the candidates that are matched word by word
+SEARCH_LIKE_CONDITION = u"CAST(name AS TEXT) LIKE ? ESCAPE '\\'"
+SEARCH_LIKE_QUERY = u"SELECT module_id, name, votes FROM module_catalog WHERE {0} ORDER BY votes DESC, module_id ASC;"
+
+# Votes of a single module, served by the module_votes_module_ind index
+MODULE_VOTES_QUERY = "SELECT v.public_key, mv.block_timestamp, mv.sequence_number FROM module_votes mv " \
+                     "JOIN voters v ON v.id = mv.voter_id WHERE mv.module_id = ?;"
+
+
+class ModuleQueries(ModuleStorageQueries):
+    """
+    Read queries on the module tables, shared by the database and its read replica. Subclasses provide the connection
+    the queries run on and the translation between module ids and identifiers.
+    """
+
+    # module cache
+    def get_module_from_cache(self, module_identifier):
+        """
+        Get module from the cache
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: module information
+        """
+        self._logger.debug("persistence: Getting module (%s) from cache", module_identifier)
+
+        module_id = self._get_module_id(module_identifier)
+        if module_id is None:
+            return None
+
+        sql = "SELECT module_id FROM module_cache WHERE module_id = ?;"
+        return self._query_one(sql, (module_id,), self._identifier_row_factory)
+
+    def get_modules_from_cache(self):
+        """
+        Retrieve all modules from the cache
+
+        :return: All modules
+        """
+        self._logger.debug("persistence: Getting all modules from cache")
+
+        return list(self.iter_cache())
+
+    def iter_cache(self, limit=None, offset=0):
+        """
+        Iterate over the modules in the cache without loading them all in memory
+
+        :param limit: Maximum number of modules to return, or None for all
+        :type limit: int
+        :param offset: Number of modules to skip
+        :type offset: int
+        :return: generator of module identifiers
+        """
+        sql = "SELECT module_id FROM module_cache LIMIT ? OFFSET ?;"
+        return self._iter_rows(sql, (limit if limit is not None else -1, offset,), self._identifier_row_factory)
+
+    # module catalog
+    def get_module_from_catalog(self, module_identifier):
+        """
+        Get module from the catalog
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: module information
+        """
+        self._logger.debug("persistence: Getting module (%s) from catalog", module_identifier)
+
+        module_id = self._get_module_id(module_identifier)
+        if module_id is None:
+            return None
+
+        sql = "SELECT module_id, name, votes FROM module_catalog WHERE module_id = ?;"
+        return self._query_one(sql, (module_id,), self._module_row_factory)
+
+    def get_modules_from_catalog(self):
+        """
+        Retrieve all modules from the catalog
+
+        :return: All modules
+        """
+        self._logger.debug("persistence: Getting all modules from catalog")
+
+        return list(self.iter_catalog())
+
+    def iter_catalog(self, order_by=None, limit=None, offset=0):
+        """
+        Iterate over the modules in the catalog without loading them all in memory
+
+        :param order_by: CATALOG_ORDER_VOTES, CATALOG_ORDER_NAME, CATALOG_ORDER_TRENDING or None for insertion order
+        :type order_by: str
+        :param limit: Maximum number of modules to return, or None for all
+        :type limit: int
+        :param offset: Number of modules to skip
+        :type offset: int
+        :return: generator of modules
+        """
+        if order_by not in CATALOG_PAGE_QUERIES:
+            raise ValueError("Unknown catalog order: {0}".format(order_by))
+
+        return self._iter_rows(CATALOG_PAGE_QUERIES[order_by], (limit if limit is not None else -1, offset,),
+                               self._module_row_factory)
+
+    def search_catalog(self, query, limit=None, offset=0):
+        """
+        Search the catalog by module name. Every word of the query has to match the start of a word in the name, results
+        are ranked by match quality first and number of votes second.
+
+        :param query: Search query
+        :type query: str
+        :param limit: Maximum number of modules to return, or None for all
+        :type limit: int
+        :param offset: Number of modules to skip
+        :type offset: int
+        :return: generator of modules
+        """
+        self._logger.debug("persistence: Searching catalog for (%s)", query)
+
+        if not self.full_text_search:
+            return self._search_catalog_names(query, limit, offset)
+
+        match = self._search_expression(query)
+        if not match:
+            return iter([])
+
+        sql = "SELECT c.module_id, c.name, c.votes FROM module_catalog_fts f " \
+              "JOIN module_catalog c ON c.module_id = f.rowid " \
+              "WHERE module_catalog_fts MATCH ? ORDER BY f.rank ASC, c.votes DESC, c.module_id ASC LIMIT ? OFFSET ?;"
+        return self._iter_rows(sql, (match, limit if limit is not None else -1, offset,), self._module_row_factory)
+
+    def _search_catalog_names(self, query, limit, offset):
+        """
+        Search the catalog by module name without the full-text index, for SQLite builds without FTS5. Results are
+        ranked by number of votes.
+
+        :param query: Search query
+        :type query: str
+        :param limit: Maximum number of modules to return, or None for all
+        :type limit: int
+        :param offset: Number of modules to skip
+        :type offset: int
+        :return: generator of modules
+        """
+        query_words = get_search_words(query)
+        if not query_words:
+            return iter([])
+
+        # LIKE finds the names that contain every word, the words have to start a word of the name as well. Names are
+        # stored as blobs, which LIKE doesn't match without a cast.
+        patterns = [u"%" + re.sub(r"([\\%_])", r"\\\1", word) + u"%" for word in query_words]
+        sql = SEARCH_LIKE_QUERY.format(u" AND ".join([SEARCH_LIKE_CONDITION] * len(query_words)))
+        modules = (module for module in self._iter_rows(sql, tuple(patterns), self._module_row_factory)
+                   if matches_search_words(module.name, query_words))
+        return itertools.islice(modules, offset, offset + limit if limit is not None else None)
+
+    @staticmethod
+    def _search_expression(query):
+        """
+        Turn a user query into a full-text match expression, every word becomes a quoted prefix search so the query
+        syntax of the index can't be injected
+
+        :param query: Search query
+        :type query: str
+        :return: match expression or an empty string if the query has no words
+        """
+        words = query.replace('"', ' ').split()
+        return " ".join('"' + word + '"*' for word in words)
+
+    # module library
+    def get_module_from_library(self, module_identifier):
+        """
+        Get module from the library
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: module information
+        """
+        self._logger.debug("persistence: Getting module (%s) from library", module_identifier)
+
+        module_id = self._get_module_id(module_identifier)
+        if module_id is None:
+            return None
+
+        sql = "SELECT module_id FROM module_library WHERE module_id = ?;"
+        return self._query_one(sql, (module_id,), self._identifier_row_factory)
+
+    def get_modules_from_library(self):
+        """
+        Retrieve all modules from the library
+
+        :return: All modules
+        """
+        self._logger.debug("persistence: Getting all modules from library")
+
+        return list(self.iter_library())
+
+    def iter_library(self, limit=None, offset=0):
+        """
+        Iterate over the modules in the library without loading them all in memory
+
+        :param limit: Maximum number of modules to return, or None for all
+        :type limit: int
+        :param offset: Number of modules to skip
+        :type offset: int
+        :return: generator of module identifiers
+        """
+        sql = "SELECT module_id FROM module_library LIMIT ? OFFSET ?;"
+        return self._iter_rows(sql, (limit if limit is not None else -1, offset,), self._identifier_row_factory)
+
+    # module votes
+    def iter_votes(self, limit=None, after=None):
+        """
+        Iterate over all votes in primary key order without loading them all in memory, a page starts with a search of
+        the primary key right after the last vote of the previous page
+
+        :param limit: Maximum number of votes to return, or None for all
+        :type limit: int
+        :param after: The last vote of the previous page as (voter public key, module identifier) tuple, or None to
+        start at the first vote
+        :type after: (bytes, ModuleIdentifier)
+        :return: generator of (voter public key, module identifier) tuples
+        :raises ValueError: if the vote to start after is unknown
+        """
+        if after is None:
+            return self._iter_rows(VOTES_PAGE_QUERY, (limit if limit is not None else -1,), self._vote_row_factory)
+
+        voter_id, module_id = self._get_voter_id(after[0]), self._get_module_id(after[1])
+        if voter_id is None or module_id is None:
+            raise ValueError("Unknown vote to start after")
+
+        return self._iter_rows(VOTES_PAGE_AFTER_QUERY, (voter_id, module_id, limit if limit is not None else -1,),
+                               self._vote_row_factory)
+
+    # row decoding
+    def _iter_rows(self, sql, bindings=(), row_factory=None):
+        """
+        Stream the rows of a query through a dedicated cursor
+
+        :param sql: SQL query
+        :type sql: str
+        :param bindings: Values for the query placeholders
+        :type bindings: tuple
+        :param row_factory: function called by sqlite with the cursor and the row tuple, or None to get plain tuples
+        :return: generator of rows
+        """
+        cursor = self._connection.cursor()
+        cursor.row_factory = row_factory
+        try:
+            cursor.execute(sql, bindings)
+            for row in cursor:
+                yield row
+        finally:
+            cursor.close()
+
+    def _query_one(self, sql, bindings=(), row_factory=None):
+        """
+        Get the first row of a query
+
+        :param sql: SQL query
+        :type sql: str
+        :param bindings: Values for the query placeholders
+        :type bindings: tuple
+        :param row_factory: function called by sqlite with the cursor and the row tuple, or None to get a plain tuple
+        :return: the first row or None if the query has no results
+        """
+        return next(self._iter_rows(sql, bindings, row_factory), None)
+
+    def _identifier_row_factory(self, _, row):
+        """
+        Decode a (module_id) row, identifiers are shared with the id translation cache
+
+        :param row: database row
+        :type row: tuple
+        :return: module identifier
+        """
+        return self._module_identifiers[row[0]]
+
+    def _module_row_factory(self, _, row):
+        """
+        Decode a (module_id, name, votes) row
 
-class ModuleDatabase(Database):
+        :param row: database row
+        :type row: tuple
+        :return: module
+        """
+        return Module(self._module_identifiers[row[0]], str(row[1]), row[2])
+
+    def _vote_row_factory(self, _, row):
+        """
+        Decode a (public_key, module_id) row, identifiers are shared with the id translation cache
+
+        :param row: database row
+        :type row: tuple
+        :return: (voter public key, module identifier) tuple
+        """
+        return bytes(row[0]), self._module_identifiers[row[1]]
+
+
+class ModuleDatabaseReplica(ModuleQueries):
+    """
+    Read-only connection to the module database for presentation layers. With the database in WAL mode every query
+    reads a consistent snapshot of the committed state, without blocking writers or being blocked by them.
+    """
+
+    def __init__(self, database):
+        """
+        Open the read-only connection
+
+        :param database: The database to read from
+        :type database: ModuleDatabase
+        """
+        super(ModuleDatabaseReplica, self).__init__()
+
+        self._database = database  # type: ModuleDatabase
+
+        # Logging
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        self._connection = sqlite3.connect(database.file_path, check_same_thread=False)
+        self._connection.execute(u"PRAGMA query_only = ON")
+
+    @property
+    def _module_identifiers(self):
+        return self._database._module_identifiers
+
+    @property
+    def full_text_search(self):
+        return self._database.full_text_search
+
+    def _get_module_id(self, module_identifier):
+        """
+        Translate a module identifier into the integer id used to reference the module in the database
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: module id, or None if the module is unknown
+        """
+        return self._database._get_module_id(module_identifier)
+
+    def _get_voter_id(self, voter_public_key):
+        """
+        Translate a voter public key into the integer id used to reference the voter in the database
+
+        :param voter_public_key: Public key of the voter
+        :type voter_public_key: bytes
+        :return: voter id, or None if the voter is unknown
+        """
+        return self._database._get_voter_id(voter_public_key)
+
+    def count_modules_in_catalog(self):
+        """
+        Count the modules in the catalog
+
+        :return: Number of modules in the catalog
+        """
+        return self._query_one("SELECT COUNT(*) FROM module_catalog;")[0]
+
+    def close(self):
+        """
+        Close the read-only connection
+
+        :return: None
+        """
+        self._connection.close()
+
+
+class ModuleDatabase(Database, ModuleQueries, ModuleStorage):
     """
     Persistence layer for module information.
     """
 
     # Database scheme version
-    LATEST_DB_VERSION = 1  # type: int
+    LATEST_DB_VERSION = 9  # type: int
 
     def __init__(self, working_directory, db_name):
         """
@@ -42,6 +443,21 @@ class ModuleDatabase(Database):
         self._logger.info("persistence: module database path: %s", db_path)
         self._logger.info("persistence: module database version: %d", self.LATEST_DB_VERSION)
         self.db_name = db_name
+
+        # In-memory membership indexes, loaded on open and kept in sync on every insert
+        self.cache_index = MembershipIndex("cache")  # type: MembershipIndex
+        self.catalog_index = MembershipIndex("catalog")  # type: MembershipIndex
+        self.library_index = MembershipIndex("library")  # type: MembershipIndex
+        self.votes_index = MembershipIndex("votes")  # type: MembershipIndex
+
+        # Id translation caches, loaded on open and kept in sync on every insert
+        self._module_ids = {}  # type: dict
+        self._module_identifiers = {}  # type: dict
+        self._voter_ids = {}  # type: dict
+
+        # Whether SQLite supports the full-text index, detected when connecting
+        self.full_text_search = False  # type: bool
+
         self.open()
 
     def get_schema(self):
@@ -49,40 +465,77 @@ class ModuleDatabase(Database):
         Return the schema for the database.
         """
         return u"""
-        CREATE TABLE IF NOT EXISTS module_cache (
-            public_key  TEXT NOT NULL,
+        CREATE TABLE IF NOT EXISTS modules (
+            id          INTEGER PRIMARY KEY,
+            public_key  BLOB NOT NULL,
             info_hash   TEXT NOT NULL,
 
-            PRIMARY KEY (public_key, info_hash)
+            UNIQUE (public_key, info_hash)
+        );
+
+        CREATE TABLE IF NOT EXISTS voters (
+            id          INTEGER PRIMARY KEY,
+            public_key  BLOB NOT NULL UNIQUE
+        );
+
+        CREATE TABLE IF NOT EXISTS module_cache (
+            module_id   INTEGER PRIMARY KEY REFERENCES modules (id)
         );
         
         CREATE TABLE IF NOT EXISTS module_catalog (
-            public_key  TEXT NOT NULL,
-            info_hash   TEXT NOT NULL,
+            module_id   INTEGER PRIMARY KEY REFERENCES modules (id),
             name        TEXT NOT NULL,
             votes       INTEGER NOT NULL,
-
-            PRIMARY KEY (public_key, info_hash)
+            trending    REAL NOT NULL DEFAULT 0
         );
         
         CREATE TABLE IF NOT EXISTS module_library (
-            public_key  TEXT NOT NULL,
-            info_hash   TEXT NOT NULL,
-
-            PRIMARY KEY (public_key, info_hash)
+            module_id   INTEGER PRIMARY KEY REFERENCES modules (id)
         );
         
         CREATE TABLE IF NOT EXISTS module_votes (
-            voter_public_key    TEXT NOT NULL,
-            public_key          TEXT NOT NULL,
+            voter_id        INTEGER NOT NULL REFERENCES voters (id),
+            module_id       INTEGER NOT NULL REFERENCES modules (id),
+            block_timestamp INTEGER NOT NULL DEFAULT 0,
+            sequence_number INTEGER NOT NULL DEFAULT 0,
+
+            PRIMARY KEY (voter_id, module_id)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS crawl_cursors (
+            public_key      BLOB PRIMARY KEY,
+            sequence_number INTEGER NOT NULL
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS vote_checkpoints (
+            public_key      BLOB PRIMARY KEY,
+            sequence_number INTEGER NOT NULL
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS pending_votes (
+            creator_digest      BLOB NOT NULL,
             info_hash           TEXT NOT NULL,
+            voter_public_key    BLOB NOT NULL,
+            block_timestamp     INTEGER NOT NULL,
+            sequence_number     INTEGER NOT NULL,
 
-            PRIMARY KEY (voter_public_key, public_key, info_hash)
-        );
+            PRIMARY KEY (creator_digest, info_hash, voter_public_key)
+        ) WITHOUT ROWID;
 
         CREATE TABLE IF NOT EXISTS option(key TEXT PRIMARY KEY, value BLOB);
         DELETE FROM option WHERE key = 'database_version';
         INSERT INTO option(key, value) VALUES('database_version', '{version}');
+
+        CREATE INDEX IF NOT EXISTS module_votes_module_ind ON module_votes (module_id, voter_id);
+        CREATE INDEX IF NOT EXISTS module_catalog_votes_ind ON module_catalog (votes, name);
+        CREATE INDEX IF NOT EXISTS module_catalog_trending_ind ON module_catalog (trending);
+        CREATE INDEX IF NOT EXISTS module_votes_timestamp_ind ON module_votes (block_timestamp);
+        CREATE INDEX IF NOT EXISTS module_votes_sequence_ind ON module_votes (voter_id, sequence_number);
+
+        CREATE TRIGGER IF NOT EXISTS module_votes_count_trg AFTER INSERT ON module_votes
+        BEGIN
+            UPDATE module_catalog SET votes = votes + 1 WHERE module_id = NEW.module_id;
+        END;
         """.format(version=self.LATEST_DB_VERSION)
 
     def get_upgrade_script(self, current_version):
@@ -90,6 +543,116 @@ class ModuleDatabase(Database):
         Return the upgrade script for a specific version.
         :param current_version: the version of the script to return.
         """
+        # Version 2 stores info hashes as text, they used to be stored as blobs in text columns
+        if current_version == 1:
+            return u"""
+            BEGIN;
+            UPDATE module_cache SET info_hash = CAST(info_hash AS TEXT) WHERE typeof(info_hash) = 'blob';
+            UPDATE module_catalog SET info_hash = CAST(info_hash AS TEXT) WHERE typeof(info_hash) = 'blob';
+            UPDATE module_library SET info_hash = CAST(info_hash AS TEXT) WHERE typeof(info_hash) = 'blob';
+            UPDATE module_votes SET info_hash = CAST(info_hash AS TEXT) WHERE typeof(info_hash) = 'blob';
+            COMMIT;
+            """
+
+        # Version 3 references modules and voters by integer id instead of repeating their keys in every table
+        if current_version == 2:
+            return u"""
+            BEGIN;
+            CREATE TABLE modules (
+                id          INTEGER PRIMARY KEY,
+                public_key  BLOB NOT NULL,
+                info_hash   TEXT NOT NULL,
+
+                UNIQUE (public_key, info_hash)
+            );
+            INSERT INTO modules (public_key, info_hash)
+                SELECT public_key, info_hash FROM module_catalog
+                UNION SELECT public_key, info_hash FROM module_cache
+                UNION SELECT public_key, info_hash FROM module_library
+                UNION SELECT public_key, info_hash FROM module_votes;
+
+            CREATE TABLE voters (
+                id          INTEGER PRIMARY KEY,
+                public_key  BLOB NOT NULL UNIQUE
+            );
+            INSERT INTO voters (public_key) SELECT DISTINCT voter_public_key FROM module_votes;
+
+            ALTER TABLE module_cache RENAME TO module_cache_v2;
+            CREATE TABLE module_cache (
+                module_id   INTEGER PRIMARY KEY REFERENCES modules (id)
+            );
+            INSERT INTO module_cache (module_id)
+                SELECT m.id FROM module_cache_v2 c JOIN modules m USING (public_key, info_hash);
+            DROP TABLE module_cache_v2;
+
+            ALTER TABLE module_catalog RENAME TO module_catalog_v2;
+            CREATE TABLE module_catalog (
+                module_id   INTEGER PRIMARY KEY REFERENCES modules (id),
+                name        TEXT NOT NULL,
+                votes       INTEGER NOT NULL
+            );
+            INSERT INTO module_catalog (module_id, name, votes)
+                SELECT m.id, c.name, c.votes FROM module_catalog_v2 c JOIN modules m USING (public_key, info_hash);
+            DROP TABLE module_catalog_v2;
+
+            ALTER TABLE module_library RENAME TO module_library_v2;
+            CREATE TABLE module_library (
+                module_id   INTEGER PRIMARY KEY REFERENCES modules (id)
+            );
+            INSERT INTO module_library (module_id)
+                SELECT m.id FROM module_library_v2 l JOIN modules m USING (public_key, info_hash);
+            DROP TABLE module_library_v2;
+
+            ALTER TABLE module_votes RENAME TO module_votes_v2;
+            CREATE TABLE module_votes (
+                voter_id    INTEGER NOT NULL REFERENCES voters (id),
+                module_id   INTEGER NOT NULL REFERENCES modules (id),
+
+                PRIMARY KEY (voter_id, module_id)
+            ) WITHOUT ROWID;
+            INSERT INTO module_votes (voter_id, module_id)
+                SELECT v.id, m.id FROM module_votes_v2 mv
+                JOIN voters v ON v.public_key = mv.voter_public_key
+                JOIN modules m ON m.public_key = mv.public_key AND m.info_hash = mv.info_hash;
+            DROP TABLE module_votes_v2;
+            COMMIT;
+            """
+
+        # Version 4 maintains the catalog vote counters with a trigger, recount them once from the stored votes
+        if current_version == 3:
+            return u"""
+            BEGIN;
+            UPDATE module_catalog SET votes = (SELECT COUNT(*) FROM module_votes
+                                               WHERE module_votes.module_id = module_catalog.module_id);
+            COMMIT;
+            """
+
+        # Version 5 adds a full-text index on the catalog names, which is created on open if SQLite supports it
+
+        # Version 6 keeps the block timestamp and sequence number of every vote and a trending score per module. Votes
+        # stored before have no timestamp, they are filled in when the votes are checked against trustchain.
+        if current_version == 5:
+            return u"""
+            BEGIN;
+            ALTER TABLE module_votes ADD COLUMN block_timestamp INTEGER NOT NULL DEFAULT 0;
+            ALTER TABLE module_votes ADD COLUMN sequence_number INTEGER NOT NULL DEFAULT 0;
+            ALTER TABLE module_catalog ADD COLUMN trending REAL NOT NULL DEFAULT 0;
+            COMMIT;
+            """
+
+        # Version 7 adds the crawl cursors table, which is created by the schema
+
+        # Version 8 adds the pending votes table, which is created by the schema
+
+        # Version 9 keeps a vote checkpoint per voter in a table created by the schema, instead of a row id of the
+        # trustchain database. The votes are reconciled from the start of every chain once.
+        if current_version == 8:
+            return u"""
+            BEGIN;
+            DELETE FROM option WHERE key = 'vote_checkpoint';
+            COMMIT;
+            """
+
         return None
 
     # module cache
@@ -103,371 +666,728 @@ class ModuleDatabase(Database):
         """
         self._logger.info("persistence: Adding module (%s) to cache", module_identifier)
 
-        sql = "INSERT INTO module_cache (public_key, info_hash) VALUES(?, ?)"
-        self.execute(sql, (database_blob(module_identifier.creator), database_blob(module_identifier.content_hash),))
-        self.commit()
+        sql = "INSERT INTO module_cache (module_id) VALUES(?)"
+        self.execute(sql, (self._get_module_id(module_identifier, create=True),))
+        self._commit_write()
 
-    def get_module_from_cache(self, module_identifier):
+        self.cache_index.add(self._module_key(module_identifier))
+
+    def has_module_in_cache(self, module_identifier):
         """
-        Get module from the cache
+        Check if module exists in cache
 
         :param module_identifier: module identifier
         :type module_identifier: ModuleIdentifier
-        :return: module information
+        :return: If the module has been found
         """
-        self._logger.debug("persistence: Getting module (%s) from cache", module_identifier)
+        self._logger.debug("persistence: Check for module (%s) in cache", module_identifier)
 
-        if not self.has_module_in_cache(module_identifier):
-            return None
+        return self.cache_index.contains(self._module_key(module_identifier))
 
-        sql = "SELECT * FROM module_cache WHERE public_key = ? AND info_hash = ?;"
-        res = list(
-            self.execute(sql, (database_blob(module_identifier.creator), database_blob(module_identifier.content_hash),)))
+    # module catalog
+    def add_module_to_catalog(self, module):
+        """
+        Add module to the catalog. The vote counter and trending score start from the votes already stored for the
+        module and are kept up to date by the database from then on.
+
+        :param module: module
+        :type module: Module
+        :return: None
+        """
+        self._logger.info("persistence: Adding module (%s) to catalog", module)
 
-        module = res[0]
+        module_id = self._get_module_id(module.id, create=True)
 
-        public_key = bytes(module[0])
-        content_hash = str(module[1])
-        identifier = ModuleIdentifier(public_key, content_hash)
+        sql = "INSERT INTO module_catalog (module_id, name, votes, trending) " \
+              "SELECT ?, ?, COUNT(*), TOTAL(trending_weight(block_timestamp)) FROM module_votes WHERE module_id = ?;"
+        self.execute(sql, (module_id, database_blob(module.name), module_id,))
+        self._commit_write()
 
-        return identifier
+        self.catalog_index.add(self._module_key(module.id))
 
-    def get_modules_from_cache(self):
+    def count_modules_in_catalog(self):
         """
-        Retrieve all modules from the cache
+        Count the modules in the catalog
 
-        :return: All modules
+        :return: Number of modules in the catalog
         """
-        self._logger.debug("persistence: Getting all modules from cache")
+        return len(self.catalog_index)
 
-        sql = "SELECT * FROM module_cache;"
-        res = list(self.execute(sql))
+    def has_module_in_catalog(self, module_identifier):
+        """
+        Check if module exists in catalog
 
-        modules = []
-        for module in res:
-            public_key = bytes(module[0])
-            content_hash = str(module[1])
-            identifier = ModuleIdentifier(public_key, content_hash)
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: If the module has been found
+        """
+        self._logger.debug("persistence: Check for module (%s) in catalog", module_identifier)
 
-            modules.append(identifier)
-        return modules
+        return self.catalog_index.contains(self._module_key(module_identifier))
 
-    def has_module_in_cache(self, module_identifier):
+    def update_module_in_catalog(self, module_identifier, votes):
         """
-        Check if module exists in cache
+        Update the number of votes for a module in the catalog
 
         :param module_identifier: module identifier
         :type module_identifier: ModuleIdentifier
-        :return: If the module has been found
+        :param votes: Number of votes
+        :type votes: int
+        :return: None
         """
-        self._logger.debug("persistence: Check for module (%s) in cache", module_identifier)
-
-        sql = "SELECT public_key, info_hash FROM module_cache WHERE public_key = ? AND info_hash = ?;"
-        res = list(
-            self.execute(sql, (database_blob(module_identifier.creator), database_blob(module_identifier.content_hash),)))
-        count = len(res)
+        self._logger.debug("persistence: Update module (%s)", module_identifier)
 
-        if count > 0:
-            return True
+        module_id = self._get_module_id(module_identifier)
+        if module_id is None:
+            return
 
-        return False
+        sql = "UPDATE module_catalog SET votes = ? WHERE module_id = ?;"
+        self.execute(sql, (votes, module_id,))
+        self._commit_write()
 
-    # module catalog
-    def add_module_to_catalog(self, module):
+    # module library
+    def add_module_to_library(self, module_identifier):
         """
-        Add module to the catalog
+        Add module to library
 
-        :param module: module
-        :type module: Module
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
         :return: None
         """
-        self._logger.info("persistence: Adding module (%s) to catalog", module)
+        self._logger.info("persistence: Adding module (%s) to library", module_identifier)
 
-        sql = "INSERT INTO module_catalog (public_key, info_hash, name, votes) VALUES(?, ?, ?, ?)"
-        self.execute(sql, (
-            database_blob(module.id.creator), database_blob(module.id.content_hash), database_blob(module.name), module.votes,))
-        self.commit()
+        sql = "INSERT INTO module_library (module_id) VALUES(?)"
+        self.execute(sql, (self._get_module_id(module_identifier, create=True),))
+        self._commit_write()
+
+        self.library_index.add(self._module_key(module_identifier))
 
-    def add_vote_to_module_in_catalog(self, module_identifier):
+    def has_module_in_library(self, module_identifier):
         """
-        Increment votes for the provided module
+        Check if module exists in library
 
         :param module_identifier: module identifier
         :type module_identifier: ModuleIdentifier
-        :return: None
+        :return: If the module has been found
         """
-        self._logger.debug("persistence: Adding vote to module (%s) in catalog", module_identifier)
+        self._logger.debug("persistence: Check for module (%s) in library", module_identifier)
 
-        sql = "UPDATE module_catalog SET votes = votes + 1 WHERE public_key = ? AND info_hash = ?;"
-        self.execute(sql, (database_blob(module_identifier.creator), database_blob(module_identifier.content_hash),))
-        self.commit()
+        return self.library_index.contains(self._module_key(module_identifier))
 
-    def get_module_from_catalog(self, module_identifier):
+    # module votes
+    def record_vote(self, voter_public_key, module_identifier, block_timestamp=0, sequence_number=0):
         """
-        Get module from the catalog
+        Add vote to votes database, the vote counter of the module in the catalog is incremented by the database in the
+        same statement and the weight of the vote is added to its trending score
 
+        :param voter_public_key: Public key of the voter
+        :type voter_public_key: bytes
         :param module_identifier: module identifier
         :type module_identifier: ModuleIdentifier
-        :return: module information
+        :param block_timestamp: Timestamp in milliseconds of the vote block, 0 if unknown
+        :type block_timestamp: int
+        :param sequence_number: Sequence number of the vote block in the chain of the voter, 0 if unknown
+        :type sequence_number: int
+        :return: True if the vote is new, False if it was already recorded
         """
-        self._logger.debug("persistence: Getting module (%s) from catalog", module_identifier)
+        vote_key = self._vote_key(voter_public_key, module_identifier)
+        if self.votes_index.contains(vote_key):
+            return False
 
-        if not self.has_module_in_catalog(module_identifier):
-            return None
+        self._logger.debug("persistence: Record vote (%s, %s)", hexlify(voter_public_key), module_identifier)
 
-        sql = "SELECT * FROM module_catalog WHERE public_key = ? AND info_hash = ?;"
-        res = list(
-            self.execute(sql, (database_blob(module_identifier.creator), database_blob(module_identifier.content_hash),)))
+        self._rebase_trending_if_needed(block_timestamp)
 
-        module = res[0]
+        module_id = self._get_module_id(module_identifier, create=True)
 
-        public_key = bytes(module[0])
-        content_hash = str(module[1])
-        name = str(module[2])
-        identifier = ModuleIdentifier(public_key, content_hash)
-        votes = int(module[3])
+        sql = "INSERT OR IGNORE INTO module_votes (voter_id, module_id, block_timestamp, sequence_number) " \
+              "VALUES (?, ?, ?, ?);"
+        self.execute(sql, (self._get_voter_id(voter_public_key, create=True), module_id, block_timestamp,
+                           sequence_number,))
+        is_new = self._cursor.rowcount > 0
 
-        return Module(identifier, name, votes)
+        if is_new:
+            sql = "UPDATE module_catalog SET trending = trending + ? WHERE module_id = ?;"
+            self.execute(sql, (self._trending_weight(block_timestamp), module_id,))
 
-    def get_modules_from_catalog(self):
+        self._commit_write()
+
+        self.votes_index.add(vote_key)
+
+        return is_new
+
+    def get_votes_for_module(self, module_identifier):
         """
-        Retrieve all modules from the catalog
+        Get votes for module
 
-        :return: All modules
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: vote information
         """
-        self._logger.debug("persistence: Getting all modules from catalog")
+        self._logger.debug("persistence: Getting votes for module (%s)", module_identifier)
 
-        sql = "SELECT * FROM module_catalog;"
-        res = list(self.execute(sql))
+        if not self.has_module_in_catalog(module_identifier):
+            return None
 
-        modules = []
-        for module in res:
-            public_key = bytes(module[0])
-            content_hash = str(module[1])
-            name = str(module[2])
-            identifier = ModuleIdentifier(public_key, content_hash)
-            votes = int(module[3])
+        res = list(self.execute(MODULE_VOTES_QUERY, (self._get_module_id(module_identifier),)))
 
-            modules.append(Module(identifier, name, votes))
-        return modules
+        votes = []
+        for vote in res:
+            votes.append({
+                'voter': bytes(vote[0]),
+                'identifier': module_identifier,
+                'timestamp': vote[1],
+                'sequence_number': vote[2],
+            })
+        return votes
 
-    def has_module_in_catalog(self, module_identifier):
+    def get_votes_for_peer(self, peer):
         """
-        Check if module exists in catalog
+        Get votes for peer
+
+        :param peer: public key of peer
+        :type peer: bytes
+        :return: vote information
+        """
+        self._logger.debug("persistence: Getting votes for peer (%s)", hexlify(peer))
+
+        voter_id = self._get_voter_id(peer)
+        if voter_id is None:
+            return []
+
+        sql = "SELECT module_id, block_timestamp, sequence_number FROM module_votes WHERE voter_id = ?;"
+
+        votes = []
+        for vote in self._iter_rows(sql, (voter_id,)):
+            votes.append({
+                'voter': peer,
+                'identifier': self._module_identifiers[vote[0]],
+                'timestamp': vote[1],
+                'sequence_number': vote[2],
+            })
+        return votes
 
+    def did_vote(self, voter_public_key, module_identifier):
+        """
+        Check if the node with the provided public key voted on the module with the provided info_hash
+
+        :param voter_public_key: Public key of the voter
+        :type voter_public_key: bytes
         :param module_identifier: module identifier
         :type module_identifier: ModuleIdentifier
-        :return: If the module has been found
+        :return: True if voted, otherwise False
         """
-        self._logger.debug("persistence: Check for module (%s) in catalog", module_identifier)
+        self._logger.debug("persistence: Check for vote (%s, %s) in votes", hexlify(voter_public_key), module_identifier)
 
-        sql = "SELECT public_key, info_hash FROM module_catalog WHERE public_key = ? AND info_hash = ?;"
-        res = list(
-            self.execute(sql, (database_blob(module_identifier.creator), database_blob(module_identifier.content_hash),)))
-        count = len(res)
+        return self.votes_index.contains(self._vote_key(voter_public_key, module_identifier))
 
-        if count > 0:
-            return True
+    # snapshots
+    def export_snapshot(self, file_path):
+        """
+        Export the catalog, votes, cache and library to a snapshot file
 
-        return False
+        :param file_path: Path of the snapshot file
+        :type file_path: str
+        :return: dictionary with the number of exported entries per table
+        """
+        self._logger.info("persistence: Exporting snapshot to %s", file_path)
+
+        snapshot = ModuleSnapshot(
+            modules=[(row[0], bytes(row[1]), str(row[2]))
+                     for row in self._iter_rows("SELECT id, public_key, info_hash FROM modules;")],
+            voters=[(row[0], bytes(row[1])) for row in self._iter_rows("SELECT id, public_key FROM voters;")],
+            catalog=[(row[0], bytes(row[1])) for row in self._iter_rows("SELECT module_id, name FROM module_catalog;")],
+            cache=[row[0] for row in self._iter_rows("SELECT module_id FROM module_cache;")],
+            library=[row[0] for row in self._iter_rows("SELECT module_id FROM module_library;")],
+            votes=[tuple(row) for row in self._iter_rows("SELECT voter_id, module_id, block_timestamp, sequence_number "
+                                                         "FROM module_votes;")],
+        )
+
+        # Write to a temporary file first so an interrupted export never leaves a truncated snapshot behind
+        temporary_path = file_path + ".tmp"
+        with open(temporary_path, "wb") as snapshot_file:
+            snapshot_file.write(snapshot.encode())
+        os.rename(temporary_path, file_path)
+
+        return snapshot.get_statistics()
+
+    def import_snapshot(self, file_path):
+        """
+        Import a snapshot file in a single transaction. Entries that are already in the database are kept, so a snapshot
+        can be imported into a database that is in use.
 
-    def update_module_in_catalog(self, module_identifier, votes):
+        :param file_path: Path of the snapshot file
+        :type file_path: str
+        :return: dictionary with the number of entries per table in the snapshot
+        :raises SnapshotError: if the snapshot is corrupt or of an unsupported version, nothing is imported
         """
-        Update the number of votes for a module in the catalog
+        self._logger.info("persistence: Importing snapshot from %s", file_path)
+
+        with open(file_path, "rb") as snapshot_file:
+            snapshot = ModuleSnapshot.decode(snapshot_file.read())
+
+        start_time = time.time()
+
+        with self.transaction():
+            # Translate the ids of the exporting database into local ids
+            module_ids = {module_id: self._get_module_id(ModuleIdentifier(public_key, content_hash), create=True)
+                          for module_id, public_key, content_hash in snapshot.modules}
+            voter_ids = {voter_id: self._get_voter_id(public_key, create=True)
+                         for voter_id, public_key in snapshot.voters}
+
+            sql = "INSERT OR IGNORE INTO module_cache (module_id) VALUES (?);"
+            self.executemany(sql, [(module_ids[module_id],) for module_id in snapshot.cache])
+
+            sql = "INSERT OR IGNORE INTO module_library (module_id) VALUES (?);"
+            self.executemany(sql, [(module_ids[module_id],) for module_id in snapshot.library])
+
+            # The vote trigger only counts votes for modules already in the catalog, new catalog entries count their
+            # votes once after all votes are in
+            if snapshot.votes:
+                self._rebase_trending_if_needed(max(vote[2] for vote in snapshot.votes))
+
+            sql = "INSERT OR IGNORE INTO module_votes (voter_id, module_id, block_timestamp, sequence_number) " \
+                  "VALUES (?, ?, ?, ?);"
+            self.executemany(sql, [(voter_ids[voter_id], module_ids[module_id], block_timestamp, sequence_number)
+                                   for voter_id, module_id, block_timestamp, sequence_number in snapshot.votes])
+
+            sql = "INSERT OR IGNORE INTO module_catalog (module_id, name, votes) " \
+                  "SELECT ?, ?, COUNT(*) FROM module_votes WHERE module_id = ?;"
+            self.executemany(sql, [(module_ids[module_id], database_blob(name), module_ids[module_id])
+                                   for module_id, name in snapshot.catalog])
+
+            # Trending scores are computed once per module from all of its votes instead of once per imported vote
+            sql = "UPDATE module_catalog SET trending = " \
+                  "(SELECT TOTAL(trending_weight(block_timestamp)) FROM module_votes WHERE module_id = ?) " \
+                  "WHERE module_id = ?;"
+            self.executemany(sql, [(module_id, module_id)
+                                   for module_id in set(module_ids[vote[1]] for vote in snapshot.votes)])
+
+            self._commit_write()
+            self._load_indexes()
+
+        self._logger.info("persistence: Imported snapshot in %.2f s (%s)", time.time() - start_time,
+                          snapshot.get_statistics())
+
+        return snapshot.get_statistics()
+
+    # id translation
+    def _get_module_id(self, module_identifier, create=False):
+        """
+        Translate a module identifier into the integer id used to reference the module in the database
 
         :param module_identifier: module identifier
         :type module_identifier: ModuleIdentifier
-        :param votes: Number of votes
-        :type votes: int
-        :return: None
+        :param create: Whether to add the module when it has no id yet
+        :type create: bool
+        :return: module id, or None if the module is unknown and create is False
         """
-        self._logger.debug("persistence: Update module (%s)", module_identifier)
+        key = self._module_key(module_identifier)
+        module_id = self._module_ids.get(key)
+
+        if module_id is None and create:
+            sql = "INSERT INTO modules (public_key, info_hash) VALUES (?, ?);"
+            self.execute(sql, (database_blob(key[0]), key[1],))
+            module_id = self._cursor.lastrowid
+            self._module_ids[key] = module_id
+            self._module_identifiers[module_id] = ModuleIdentifier(*key)
+            self._add_creator(key[0])
+
+        return module_id
+
+    def _get_voter_id(self, voter_public_key, create=False):
+        """
+        Translate a voter public key into the integer id used to reference the voter in the database
+
+        :param voter_public_key: Public key of the voter
+        :type voter_public_key: bytes
+        :param create: Whether to add the voter when it has no id yet
+        :type create: bool
+        :return: voter id, or None if the voter is unknown and create is False
+        """
+        key = bytes(voter_public_key)
+        voter_id = self._voter_ids.get(key)
+
+        if voter_id is None and create:
+            sql = "INSERT INTO voters (public_key) VALUES (?);"
+            self.execute(sql, (database_blob(key),))
+            voter_id = self._cursor.lastrowid
+            self._voter_ids[key] = voter_id
 
-        sql = "UPDATE module_catalog SET votes = ? WHERE public_key = ? AND info_hash = ?;"
-        self.execute(sql, (votes, database_blob(module_identifier.creator), database_blob(module_identifier.content_hash),))
+        return voter_id
+
+    # unit of work
+    def _commit_pending(self):
+        """
+        Commit the pending writes to the database file
+
+        :return: None
+        """
         self.commit()
 
-    # module library
-    def add_module_to_library(self, module_identifier):
+    def _discard_pending(self):
         """
-        Add module to library
+        Roll back the pending writes, the indexes and trending reference were updated by the discarded writes
 
-        :param module_identifier: module identifier
-        :type module_identifier: ModuleIdentifier
         :return: None
         """
-        self._logger.info("persistence: Adding module (%s) to library", module_identifier)
+        self._connection.rollback()
 
-        sql = "INSERT INTO module_library (public_key, info_hash) VALUES(?, ?)"
-        self.execute(sql, (database_blob(module_identifier.creator), database_blob(module_identifier.content_hash),))
-        self.commit()
+        self._load_indexes()
+        self._load_trending_reference()
 
-    def get_module_from_library(self, module_identifier):
+    # trending
+    def _connect(self):
+        super(ModuleDatabase, self)._connect()
+
+        # Used to compute the trending score of a module from all of its votes at once
+        self._connection.create_function("trending_weight", 1, self._trending_weight)
+
+        self.full_text_search = self._detect_full_text_search()
+        if not self.full_text_search:
+            self._logger.warning("persistence: SQLite has no FTS5 support, catalog search scans the catalog")
+
+    def _detect_full_text_search(self):
         """
-        Get module from the library
+        Check if SQLite supports the FTS5 full-text index, it is an optional part of SQLite builds
+
+        :return: True if an FTS5 table can be created
+        """
+        try:
+            self._connection.execute(u"CREATE VIRTUAL TABLE temp.module_catalog_fts_probe USING fts5 (name);")
+        except sqlite3.OperationalError:
+            return False
+        self._connection.execute(u"DROP TABLE temp.module_catalog_fts_probe;")
+        return True
+
+    def _prepare_search_index(self):
+        """
+        Create the full-text index if SQLite supports it, or stop maintaining it if it doesn't. An index that wasn't
+        maintained for a while is rebuilt from the catalog.
+
+        :return: None
+        """
+        maintained = self._query_one(u"SELECT 1 FROM sqlite_master WHERE type = 'trigger' "
+                                     u"AND name = 'module_catalog_fts_trg';") is not None
+
+        if self.full_text_search and not maintained:
+            self._logger.info("persistence: Building the full-text index of the catalog")
+            self.executescript(SEARCH_INDEX_SCRIPT)
+        elif not self.full_text_search and maintained:
+            # The trigger can't update the index without FTS5, so it would fail every catalog insert
+            self.executescript(u"DROP TRIGGER module_catalog_fts_trg;")
+
+    def get_trending_score(self, module_identifier):
+        """
+        Get the trending score of a module, which is the number of votes weighted by how recent they are
 
         :param module_identifier: module identifier
         :type module_identifier: ModuleIdentifier
-        :return: module information
+        :return: trending score, or None if the module isn't in the catalog
         """
-        self._logger.debug("persistence: Getting module (%s) from library", module_identifier)
+        module_id = self._get_module_id(module_identifier)
+        if module_id is None:
+            return None
 
-        if not self.has_module_in_library(module_identifier):
+        row = self._query_one("SELECT trending FROM module_catalog WHERE module_id = ?;", (module_id,))
+        if row is None:
             return None
 
-        sql = "SELECT * FROM module_library WHERE public_key = ? AND info_hash = ?;"
-        res = list(
-            self.execute(sql, (database_blob(module_identifier.creator), database_blob(module_identifier.content_hash),)))
+        return row[0] * self._trending_decay()
 
-        module = res[0]
+    def _load_trending_reference(self):
+        """
+        Load the trending reference time, a new database starts at the current time
 
-        public_key = bytes(module[0])
-        content_hash = str(module[1])
-        identifier = ModuleIdentifier(public_key, content_hash)
+        :return: None
+        """
+        row = self._query_one("SELECT value FROM option WHERE key = 'trending_reference';")
 
-        return identifier
+        if row is None:
+            self._trending_reference = time.time()
+            self._store_trending_reference()
+        else:
+            self._trending_reference = float(row[0])
 
-    def get_modules_from_library(self):
+    def _store_trending_reference(self):
         """
-        Retrieve all modules from the library
+        Store the trending reference time
 
-        :return: All modules
+        :return: None
         """
-        self._logger.debug("persistence: Getting all modules from library")
+        sql = "INSERT OR REPLACE INTO option (key, value) VALUES ('trending_reference', ?);"
+        self.execute(sql, (repr(self._trending_reference),))
+        self._commit_write()
 
-        sql = "SELECT * FROM module_library;"
-        res = list(self.execute(sql))
+    def _scale_trending_scores(self, factor):
+        """
+        Multiply all stored trending scores
+
+        :param factor: Factor to multiply the scores with
+        :type factor: float
+        :return: None
+        """
+        self.execute("UPDATE module_catalog SET trending = trending * ?;", (factor,))
+        self._commit_write()
 
-        modules = []
-        for module in res:
-            public_key = bytes(module[0])
-            content_hash = str(module[1])
-            identifier = ModuleIdentifier(public_key, content_hash)
+    def count_votes_without_history(self):
+        """
+        Count the votes stored without block timestamp, which were recorded before vote history was kept
 
-            modules.append(identifier)
-        return modules
+        :return: Number of votes without history
+        """
+        return self._query_one("SELECT COUNT(*) FROM module_votes WHERE block_timestamp = 0;")[0]
 
-    def has_module_in_library(self, module_identifier):
+    def add_vote_history(self, voter_public_key, module_identifier, block_timestamp, sequence_number):
         """
-        Check if module exists in library
+        Fill in the block timestamp and sequence number of a vote that was stored without them
 
+        :param voter_public_key: Public key of the voter
+        :type voter_public_key: bytes
         :param module_identifier: module identifier
         :type module_identifier: ModuleIdentifier
-        :return: If the module has been found
+        :param block_timestamp: Timestamp in milliseconds of the vote block
+        :type block_timestamp: int
+        :param sequence_number: Sequence number of the vote block in the chain of the voter
+        :type sequence_number: int
+        :return: True if the vote history was added, otherwise False
         """
-        self._logger.debug("persistence: Check for module (%s) in library", module_identifier)
+        voter_id = self._get_voter_id(voter_public_key)
+        module_id = self._get_module_id(module_identifier)
+        if voter_id is None or module_id is None or block_timestamp == 0:
+            return False
 
-        sql = "SELECT public_key, info_hash FROM module_library WHERE public_key = ? AND info_hash = ?;"
-        res = list(
-            self.execute(sql,
-                         (database_blob(module_identifier.creator), database_blob(module_identifier.content_hash),)))
-        count = len(res)
+        self._rebase_trending_if_needed(block_timestamp)
 
-        if count > 0:
-            return True
+        sql = "UPDATE module_votes SET block_timestamp = ?, sequence_number = ? " \
+              "WHERE voter_id = ? AND module_id = ? AND block_timestamp = 0;"
+        self.execute(sql, (block_timestamp, sequence_number, voter_id, module_id,))
+        if self._cursor.rowcount == 0:
+            return False
 
-        return False
+        sql = "UPDATE module_catalog SET trending = trending + ? WHERE module_id = ?;"
+        self.execute(sql, (self._trending_weight(block_timestamp), module_id,))
+        self._commit_write()
 
-    # module votes
-    def add_vote_to_votes(self, voter_public_key, module_identifier):
+        return True
+
+    # pending votes
+    def add_pending_vote(self, creator_digest, content_hash, voter_public_key, block_timestamp, sequence_number):
         """
-        Add vote to votes database
+        Keep a compact vote on a module that isn't in the catalog yet, until the module is added
 
+        :param creator_digest: Digest of the public key of the creator of the module
+        :type creator_digest: bytes
+        :param content_hash: Content hash of the module
+        :type content_hash: str
         :param voter_public_key: Public key of the voter
         :type voter_public_key: bytes
-        :param module_identifier: module identifier
-        :type module_identifier: ModuleIdentifier
-        :return: None
+        :param block_timestamp: Timestamp in milliseconds of the vote block
+        :type block_timestamp: int
+        :param sequence_number: Sequence number of the vote block in the chain of the voter
+        :type sequence_number: int
+        :return: True if the vote was added, False if the voter already has a pending vote on the module
         """
-        self._logger.debug("persistence: Add vote (%s, %s) to votes", hexlify(voter_public_key), module_identifier)
+        sql = "INSERT OR IGNORE INTO pending_votes (creator_digest, info_hash, voter_public_key, block_timestamp, " \
+              "sequence_number) VALUES (?, ?, ?, ?, ?);"
+        self.execute(sql, (database_blob(creator_digest), content_hash, database_blob(voter_public_key),
+                           block_timestamp, sequence_number,))
+        if self._cursor.rowcount == 0:
+            return False
 
-        sql = "INSERT INTO module_votes (voter_public_key, public_key, info_hash) VALUES (?, ?, ?);"
-        self.execute(sql, (database_blob(voter_public_key), database_blob(module_identifier.creator),
-                           database_blob(module_identifier.content_hash),))
-        self.commit()
+        self._commit_write()
+        return True
 
-    def get_votes_for_module(self, module_identifier):
+    def pop_pending_votes(self, creator_digest, content_hash):
         """
-        Get votes for module
+        Remove and return the pending votes on a module
 
-        :param module_identifier: module identifier
-        :type module_identifier: ModuleIdentifier
-        :return: vote information
+        :param creator_digest: Digest of the public key of the creator of the module
+        :type creator_digest: bytes
+        :param content_hash: Content hash of the module
+        :type content_hash: str
+        :return: list of (voter public key, block timestamp, sequence number) tuples
         """
-        self._logger.debug("persistence: Getting votes for module (%s)", module_identifier)
+        bindings = (database_blob(creator_digest), content_hash,)
+        votes = [(bytes(voter_public_key), block_timestamp, sequence_number)
+                 for voter_public_key, block_timestamp, sequence_number
+                 in self._iter_rows("SELECT voter_public_key, block_timestamp, sequence_number FROM pending_votes "
+                                    "WHERE creator_digest = ? AND info_hash = ?;", bindings)]
+        if votes:
+            self.execute("DELETE FROM pending_votes WHERE creator_digest = ? AND info_hash = ?;", bindings)
+            self._commit_write()
 
-        if not self.has_module_in_catalog(module_identifier):
-            return None
+        return votes
 
-        sql = "SELECT * FROM module_votes WHERE public_key = ? AND info_hash = ?;"
-        res = list(
-            self.execute(sql, (database_blob(module_identifier.creator), database_blob(module_identifier.content_hash),)))
+    def count_pending_votes(self):
+        """
+        Count the pending votes on all modules
 
-        votes = []
-        for vote in res:
-            voter_public_key = bytes(vote[0])
-            creator = bytes(vote[1])
-            content_hash = str(vote[2])
-            identifier = ModuleIdentifier(creator, content_hash)
+        :return: Number of pending votes
+        """
+        return self._query_one("SELECT COUNT(*) FROM pending_votes;")[0]
 
-            votes.append({
-                'voter': voter_public_key,
-                'identifier': identifier,
-            })
-        return votes
+    # vote reconciliation
+    def get_vote_checkpoint(self, public_key):
+        """
+        Get the checkpoint of the vote reconciliation of a voter
 
-    def get_votes_for_peer(self, peer):
+        :param public_key: Public key of the voter
+        :type public_key: bytes
+        :return: Highest sequence number in the chain of the voter that is reconciled, 0 if none is
         """
-        Get votes for peer
+        row = self._query_one("SELECT sequence_number FROM vote_checkpoints WHERE public_key = ?;",
+                              (database_blob(public_key),))
+        return row[0] if row is not None else 0
 
-        :param peer: public key of peer
-        :type peer: bytes
-        :return: vote information
+    def set_vote_checkpoint(self, public_key, sequence_number):
         """
-        self._logger.debug("persistence: Getting votes for peer (%s)", hexlify(peer))
+        Set the checkpoint of the vote reconciliation of a voter
 
-        sql = "SELECT * FROM module_votes WHERE voter_public_key = ?;"
-        res = list(self.execute(sql, (database_blob(peer),)))
+        :param public_key: Public key of the voter
+        :type public_key: bytes
+        :param sequence_number: Highest sequence number in the chain of the voter that is reconciled
+        :type sequence_number: int
+        :return: None
+        """
+        sql = "INSERT OR REPLACE INTO vote_checkpoints (public_key, sequence_number) VALUES (?, ?);"
+        self.execute(sql, (database_blob(public_key), sequence_number,))
+        self._commit_write()
 
-        votes = []
-        for vote in res:
-            voter_public_key = bytes(vote[0])
-            creator = bytes(vote[1])
-            content_hash = str(vote[2])
-            identifier = ModuleIdentifier(creator, content_hash)
+    # crawl cursors
+    def get_crawl_cursor(self, public_key):
+        """
+        Get the crawl cursor of a peer
 
-            votes.append({
-                'voter': voter_public_key,
-                'identifier': identifier,
-            })
-        return votes
+        :param public_key: Public key of the peer
+        :type public_key: bytes
+        :return: Highest sequence number in the chain of the peer that was crawled, 0 if the peer was never crawled
+        """
+        row = self._query_one("SELECT sequence_number FROM crawl_cursors WHERE public_key = ?;",
+                              (database_blob(public_key),))
+        return row[0] if row is not None else 0
 
-    def did_vote(self, voter_public_key, module_identifier):
+    def set_crawl_cursor(self, public_key, sequence_number):
         """
-        Check if the node with the provided public key voted on the module with the provided info_hash
+        Set the crawl cursor of a peer
+
+        :param public_key: Public key of the peer
+        :type public_key: bytes
+        :param sequence_number: Highest sequence number in the chain of the peer that was crawled
+        :type sequence_number: int
+        :return: None
+        """
+        sql = "INSERT OR REPLACE INTO crawl_cursors (public_key, sequence_number) VALUES (?, ?);"
+        self.execute(sql, (database_blob(public_key), sequence_number,))
+        self._commit_write()
+
+    # membership indexes
+    @staticmethod
+    def _module_key(module_identifier):
+        """
+        Get the index key for a module
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: key of the module in the membership indexes
+        """
+        return bytes(module_identifier.creator), str(module_identifier.content_hash)
+
+    @staticmethod
+    def _vote_key(voter_public_key, module_identifier):
+        """
+        Get the index key for a vote
 
         :param voter_public_key: Public key of the voter
         :type voter_public_key: bytes
         :param module_identifier: module identifier
         :type module_identifier: ModuleIdentifier
-        :return: True if voted, otherwise False
+        :return: key of the vote in the votes index
         """
-        self._logger.debug("persistence: Check for vote (%s, %s) in votes", hexlify(voter_public_key), module_identifier)
+        return bytes(voter_public_key), bytes(module_identifier.creator), str(module_identifier.content_hash)
+
+    def _load_indexes(self):
+        """
+        Load the id translation caches and membership indexes from the database
 
-        sql = "SELECT * FROM module_votes WHERE voter_public_key = ? AND public_key = ? AND info_hash = ?;"
-        res = list(self.execute(sql, (database_blob(voter_public_key), database_blob(module_identifier.creator),
-                                      database_blob(module_identifier.content_hash),)))
-        count = len(res)
+        :return: None
+        """
+        self._logger.debug("persistence: Loading membership indexes")
+
+        # Id translation caches
+        module_keys = {row[0]: (bytes(row[1]), str(row[2]))
+                       for row in self.execute("SELECT id, public_key, info_hash FROM modules;")}
+        voter_keys = {row[0]: bytes(row[1]) for row in self.execute("SELECT id, public_key FROM voters;")}
+        self._module_ids = {key: module_id for module_id, key in module_keys.items()}
+        self._module_identifiers = {module_id: ModuleIdentifier(*key) for module_id, key in module_keys.items()}
+        self._voter_ids = {key: voter_id for voter_id, key in voter_keys.items()}
+        self._creators = {}
+        for creator in set(key[0] for key in module_keys.values()):
+            self._add_creator(creator)
+
+        sql = "SELECT module_id FROM module_cache;"
+        self.cache_index.load(module_keys[row[0]] for row in self.execute(sql))
 
-        if count > 0:
-            return True
+        sql = "SELECT module_id FROM module_catalog;"
+        self.catalog_index.load(module_keys[row[0]] for row in self.execute(sql))
 
-        return False
+        sql = "SELECT module_id FROM module_library;"
+        self.library_index.load(module_keys[row[0]] for row in self.execute(sql))
+
+        sql = "SELECT voter_id, module_id FROM module_votes;"
+        self.votes_index.load((voter_keys[row[0]],) + module_keys[row[1]] for row in self.execute(sql))
+
+        self._logger.info("persistence: Loaded membership indexes (cache: %d, catalog: %d, library: %d, votes: %d)",
+                          len(self.cache_index), len(self.catalog_index), len(self.library_index),
+                          len(self.votes_index))
+
+    def get_index_statistics(self):
+        """
+        Get the lookup statistics of the membership indexes
+
+        :return: dictionary with the statistics per index
+        """
+        return {index.name: index.get_statistics()
+                for index in [self.cache_index, self.catalog_index, self.library_index, self.votes_index]}
 
     def open(self, initial_statements=True, prepare_visioning=True):
-        return super(ModuleDatabase, self).open(initial_statements, prepare_visioning)
+        result = super(ModuleDatabase, self).open(initial_statements, prepare_visioning)
+        self._prepare_search_index()
+        self._load_indexes()
+        self._load_trending_reference()
+        self._rebase_trending_if_needed(int(time.time() * 1000))
+
+        if self.file_path == u":memory:":
+            # An in-memory database can't be shared with a second connection
+            self.replica = self  # type: ModuleQueries
+        else:
+            self._release_exclusive_lock()
+            self.replica = ModuleDatabaseReplica(self)  # type: ModuleQueries
+
+        return result
+
+    def _release_exclusive_lock(self):
+        """
+        Switch to normal locking so the read replica can access the database. A database that is switched to WAL for
+        the first time is opened in exclusive locking mode, which can only be left by leaving WAL mode.
+
+        :return: None
+        """
+        locking_mode, = next(self.execute(u"PRAGMA locking_mode;"))
+        if locking_mode.upper() != u"EXCLUSIVE":
+            return
+
+        self._logger.info("persistence: Switching module database to normal locking mode")
+        self.executescript(u"PRAGMA journal_mode = DELETE; PRAGMA locking_mode = NORMAL; PRAGMA journal_mode = WAL;")
 
     def close(self, commit=True):
+        if commit:
+            self.flush()
+        self._cancel_flush()
+
+        if self.replica is not self:
+            self.replica.close()
+
         return super(ModuleDatabase, self).close(commit)
 
     def check_database(self, database_version):
@@ -481,6 +1401,15 @@ class ModuleDatabase(Database):
         database_version = int(database_version)
 
         if database_version < self.LATEST_DB_VERSION:
+            # A new database starts at the latest schema, existing ones are migrated one version at a time
+            while 0 < database_version < self.LATEST_DB_VERSION:
+                upgrade_script = self.get_upgrade_script(current_version=database_version)
+                if upgrade_script:
+                    self._logger.info("persistence: Upgrading module database from version %d to %d",
+                                      database_version, database_version + 1)
+                    self.executescript(upgrade_script)
+                database_version += 1
             self.executescript(self.get_schema())
+            self.commit()
 
         return self.LATEST_DB_VERSION
@@ -0,0 +1,471 @@
+from __future__ import absolute_import
+
+# Default library imports
+import hashlib
+import math
+import struct
+
+# Constants
+BLOOM_DIGEST = struct.Struct(">II")  # Two 32-bit hashes taken from the digest of a key
+BLOOM_INITIAL_CAPACITY = 100000  # Number of keys the first filter of a scalable Bloom filter is sized for
+BLOOM_GROWTH = 2  # Capacity of each next filter relative to the previous one
+BLOOM_TIGHTENING = 0.5  # Error rate of each next filter relative to the previous one
+IBLT_HASH_COUNT = 3  # Number of cells an element is stored in
+IBLT_ELEMENT = struct.Struct(">Q")  # 64-bit element taken from the digest of a key
+IBLT_DIGEST = struct.Struct(">IIII")  # Cell hashes and check hash taken from the digest of an element
+IBLT_CELL = struct.Struct(">iQI")  # Count, element sum and check hash sum of a cell
+
+
+class MembershipIndex(object):
+    """
+    In-memory set of keys mirroring the rows of a database table, used to answer membership checks without a query.
+    """
+
+    def __init__(self, name):
+        """
+        Initialize an empty index
+
+        :param name: Name of the index, used for reporting
+        :type name: str
+        """
+        super(MembershipIndex, self).__init__()
+
+        self.name = name  # type: str
+        self._keys = set()
+
+        # Statistics
+        self.lookups = 0  # type: int
+        self.hits = 0  # type: int
+
+    def load(self, keys):
+        """
+        Replace the contents of the index
+
+        :param keys: All keys currently stored in the backing table
+        :return: None
+        """
+        self._keys = set(keys)
+
+    def add(self, key):
+        """
+        Add a key to the index
+
+        :param key: key
+        :type key: tuple
+        :return: None
+        """
+        self._keys.add(key)
+
+    def contains(self, key):
+        """
+        Check if a key is in the index and update the lookup statistics
+
+        :param key: key
+        :type key: tuple
+        :return: True if the key is in the index, otherwise False
+        """
+        self.lookups += 1
+
+        if key in self._keys:
+            self.hits += 1
+            return True
+
+        return False
+
+    @property
+    def misses(self):
+        return self.lookups - self.hits
+
+    @property
+    def hit_rate(self):
+        if self.lookups == 0:
+            return 0.0
+
+        return float(self.hits) / self.lookups
+
+    def get_statistics(self):
+        """
+        Get the statistics of this index
+
+        :return: dictionary with the size, number of lookups, hits, misses and the hit rate
+        """
+        return {
+            'size': len(self._keys),
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+        }
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class BloomFilter(object):
+    """
+    Fixed size probabilistic set of keys. A key that was added is always found, a key that wasn't added is found with a
+    probability of at most the error rate as long as no more keys than the capacity are added.
+    """
+
+    def __init__(self, capacity, error_rate):
+        """
+        Initialize an empty filter
+
+        :param capacity: Number of keys the filter is sized for
+        :type capacity: int
+        :param error_rate: False positive rate at capacity
+        :type error_rate: float
+        """
+        super(BloomFilter, self).__init__()
+
+        self.capacity = capacity  # type: int
+        self.error_rate = error_rate  # type: float
+        self.bit_count = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))  # type: int
+        self.hash_count = max(1, int(round(float(self.bit_count) / capacity * math.log(2))))  # type: int
+        self.count = 0  # type: int
+
+        self._bits = bytearray((self.bit_count + 7) // 8)
+
+    @staticmethod
+    def hash(key):
+        """
+        Hash a key, the bit indexes of the key in any filter are derived from the two hashes
+
+        :param key: key
+        :type key: bytes
+        :return: tuple of two 32-bit hashes
+        """
+        return BLOOM_DIGEST.unpack_from(hashlib.md5(key).digest())
+
+    def add_hash(self, hashes):
+        """
+        Add a hashed key to the filter
+
+        :param hashes: The hashes of the key
+        :type hashes: tuple
+        :return: None
+        """
+        bits, bit_count = self._bits, self.bit_count
+        index, step = hashes[0] % bit_count, hashes[1] % bit_count or 1
+        for _ in range(self.hash_count):
+            bits[index >> 3] |= 1 << (index & 7)
+            index += step
+            if index >= bit_count:
+                index -= bit_count
+        self.count += 1
+
+    def contains_hash(self, hashes):
+        """
+        Check if a hashed key is in the filter
+
+        :param hashes: The hashes of the key
+        :type hashes: tuple
+        :return: True if the key is probably in the filter, False if it is certainly not
+        """
+        bits, bit_count = self._bits, self.bit_count
+        index, step = hashes[0] % bit_count, hashes[1] % bit_count or 1
+        for _ in range(self.hash_count):
+            if not bits[index >> 3] & (1 << (index & 7)):
+                return False
+            index += step
+            if index >= bit_count:
+                index -= bit_count
+        return True
+
+    def add(self, key):
+        """
+        Add a key to the filter
+
+        :param key: key
+        :type key: bytes
+        :return: None
+        """
+        self.add_hash(self.hash(key))
+
+    def __contains__(self, key):
+        return self.contains_hash(self.hash(key))
+
+    @property
+    def false_positive_rate(self):
+        """
+        Expected false positive rate at the current number of keys
+        """
+        return (1.0 - math.exp(-float(self.hash_count) * self.count / self.bit_count)) ** self.hash_count
+
+
+class ScalableBloomFilter(object):
+    """
+    Probabilistic set of keys that grows with the number of keys. Full filters are kept and a larger one with a lower
+    error rate is added, so the overall false positive rate stays below the configured rate.
+    """
+
+    def __init__(self, error_rate, initial_capacity=BLOOM_INITIAL_CAPACITY):
+        """
+        Initialize an empty filter
+
+        :param error_rate: Maximum false positive rate
+        :type error_rate: float
+        :param initial_capacity: Number of keys the first filter is sized for
+        :type initial_capacity: int
+        """
+        super(ScalableBloomFilter, self).__init__()
+
+        self.error_rate = error_rate  # type: float
+        self.initial_capacity = initial_capacity  # type: int
+        self._filters = []  # type: [BloomFilter]
+
+        # Statistics
+        self.lookups = 0  # type: int
+        self.hits = 0  # type: int
+        self.false_positives = 0  # type: int
+
+    def add(self, key):
+        """
+        Add a key to the filter, unless it is found already
+
+        :param key: key
+        :type key: bytes
+        :return: None
+        """
+        hashes = BloomFilter.hash(key)
+        if self._contains_hash(hashes):
+            return
+
+        if not self._filters or self._filters[-1].count >= self._filters[-1].capacity:
+            # The error rates of the filters form a geometric series that sums up to the configured rate
+            index = len(self._filters)
+            self._filters.append(BloomFilter(self.initial_capacity * BLOOM_GROWTH ** index,
+                                             self.error_rate * (1 - BLOOM_TIGHTENING) * BLOOM_TIGHTENING ** index))
+
+        self._filters[-1].add_hash(hashes)
+
+    def contains(self, key):
+        """
+        Check if a key is in the filter and update the lookup statistics
+
+        :param key: key
+        :type key: bytes
+        :return: True if the key is probably in the filter, False if it is certainly not
+        """
+        self.lookups += 1
+
+        if self._contains_hash(BloomFilter.hash(key)):
+            self.hits += 1
+            return True
+
+        return False
+
+    def report_false_positive(self):
+        """
+        Count a key that was found while it was never added, as found out by the user of the filter
+
+        :return: None
+        """
+        self.false_positives += 1
+
+    @property
+    def false_positive_rate(self):
+        """
+        Expected false positive rate at the current number of keys
+        """
+        rate = 1.0
+        for bloom_filter in self._filters:
+            rate *= 1.0 - bloom_filter.false_positive_rate
+        return 1.0 - rate
+
+    def get_statistics(self):
+        """
+        Get the statistics of this filter
+
+        :return: dictionary with the number of keys and filters, the memory used, the configured and expected false
+        positive rate, the number of lookups and hits and the number of reported false positives
+        """
+        return {
+            'size': sum(bloom_filter.count for bloom_filter in self._filters),
+            'filters': len(self._filters),
+            'bytes': sum(len(bloom_filter._bits) for bloom_filter in self._filters),
+            'error_rate': self.error_rate,
+            'false_positive_rate': self.false_positive_rate,
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'false_positives': self.false_positives,
+        }
+
+    def _contains_hash(self, hashes):
+        """
+        Check if a hashed key is in any of the filters
+
+        :param hashes: The hashes of the key
+        :type hashes: tuple
+        :return: True if the key is probably in the filter, False if it is certainly not
+        """
+        for bloom_filter in reversed(self._filters):
+            if bloom_filter.contains_hash(hashes):
+                return True
+        return False
+
+    def __contains__(self, key):
+        return self._contains_hash(BloomFilter.hash(key))
+
+    def __len__(self):
+        return sum(bloom_filter.count for bloom_filter in self._filters)
+
+
+class InvertibleBloomLookupTable(object):
+    """
+    Fixed size sketch of a set of 64-bit elements. Subtracting the sketch of another set leaves a sketch of the
+    difference between the sets, which can be decoded into the elements as long as the difference is small compared to
+    the number of cells, no matter how large the sets are.
+    """
+
+    def __init__(self, cell_count, hash_count=IBLT_HASH_COUNT):
+        """
+        Initialize an empty table
+
+        :param cell_count: Number of cells, rounded up to a multiple of the hash count
+        :type cell_count: int
+        :param hash_count: Number of cells an element is stored in
+        :type hash_count: int
+        """
+        super(InvertibleBloomLookupTable, self).__init__()
+
+        self.hash_count = hash_count  # type: int
+        self.cell_count = -(-cell_count // hash_count) * hash_count  # type: int
+
+        self._counts = [0] * self.cell_count
+        self._element_sums = [0] * self.cell_count
+        self._hash_sums = [0] * self.cell_count
+
+    @staticmethod
+    def hash(key):
+        """
+        Hash a key to the element that represents it
+
+        :param key: key
+        :type key: bytes
+        :return: 64-bit element
+        """
+        return IBLT_ELEMENT.unpack_from(hashlib.md5(key).digest())[0]
+
+    def _get_cells(self, element):
+        """
+        Get the cells an element is stored in, one in each part of the table, and the check hash of the element
+
+        :param element: The element
+        :type element: int
+        :return: tuple of the list of cell indexes and the check hash
+        """
+        hashes = IBLT_DIGEST.unpack(hashlib.md5(IBLT_ELEMENT.pack(element)).digest())
+        part_size = self.cell_count // self.hash_count
+        return [part * part_size + hashes[part] % part_size for part in range(self.hash_count)], hashes[-1]
+
+    def _update(self, element, count):
+        """
+        Add an element to or remove it from its cells
+
+        :param element: The element
+        :type element: int
+        :param count: 1 to add the element, -1 to remove it
+        :type count: int
+        :return: None
+        """
+        cells, check_hash = self._get_cells(element)
+        for cell in cells:
+            self._counts[cell] += count
+            self._element_sums[cell] ^= element
+            self._hash_sums[cell] ^= check_hash
+
+    def insert(self, element):
+        """
+        Add an element to the table
+
+        :param element: The element
+        :type element: int
+        :return: None
+        """
+        self._update(element, 1)
+
+    def subtract(self, other):
+        """
+        Subtract the table of another set with the same number of cells
+
+        :param other: The table of the other set
+        :type other: InvertibleBloomLookupTable
+        :return: table of the elements only in this set with a positive count and only in the other with a negative count
+        """
+        if other.cell_count != self.cell_count or other.hash_count != self.hash_count:
+            raise ValueError("Can't subtract tables of different sizes")
+
+        result = InvertibleBloomLookupTable(self.cell_count, self.hash_count)
+        result._counts = [count - other_count for count, other_count in zip(self._counts, other._counts)]
+        result._element_sums = [a ^ b for a, b in zip(self._element_sums, other._element_sums)]
+        result._hash_sums = [a ^ b for a, b in zip(self._hash_sums, other._hash_sums)]
+        return result
+
+    def _is_pure(self, cell):
+        """
+        Check if a cell holds a single element
+
+        :param cell: Index of the cell
+        :type cell: int
+        :return: True if the cell holds a single element, otherwise False
+        """
+        if self._counts[cell] not in (1, -1):
+            return False
+
+        return self._get_cells(self._element_sums[cell])[1] == self._hash_sums[cell]
+
+    def decode(self):
+        """
+        Take the elements out of the table, one cell holding a single element at a time. Decoding empties the table.
+
+        :return: tuple of the elements with a positive count, the elements with a negative count and whether the table
+        was decoded completely
+        """
+        positive, negative = [], []
+
+        pure_cells = [cell for cell in range(self.cell_count) if self._is_pure(cell)]
+        while pure_cells:
+            cell = pure_cells.pop()
+            if not self._is_pure(cell):
+                continue
+
+            element, count = self._element_sums[cell], self._counts[cell]
+            (positive if count > 0 else negative).append(element)
+
+            cells, _ = self._get_cells(element)
+            self._update(element, -count)
+            pure_cells.extend(other_cell for other_cell in cells if self._is_pure(other_cell))
+
+        complete = not any(self._counts) and not any(self._element_sums) and not any(self._hash_sums)
+        return positive, negative, complete
+
+    def pack(self):
+        """
+        Serialize the cells of the table
+
+        :return: the serialized cells
+        """
+        return b"".join(IBLT_CELL.pack(*cell) for cell in zip(self._counts, self._element_sums, self._hash_sums))
+
+    @classmethod
+    def unpack(cls, data, hash_count=IBLT_HASH_COUNT):
+        """
+        Deserialize a table
+
+        :param data: The serialized cells
+        :type data: bytes
+        :param hash_count: Number of cells an element is stored in
+        :type hash_count: int
+        :return: the table
+        """
+        cell_count = len(data) // IBLT_CELL.size
+        if cell_count * IBLT_CELL.size != len(data) or cell_count % hash_count:
+            raise ValueError("Invalid table size")
+
+        table = cls(cell_count, hash_count)
+        cells = [IBLT_CELL.unpack_from(data, offset) for offset in range(0, len(data), IBLT_CELL.size)]
+        table._counts = [cell[0] for cell in cells]
+        table._element_sums = [cell[1] for cell in cells]
+        table._hash_sums = [cell[2] for cell in cells]
+        return table
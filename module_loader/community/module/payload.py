@@ -0,0 +1,150 @@
+from __future__ import absolute_import
+
+# Default library imports
+import struct
+
+# Third party imports
+from ipv8.messaging.payload import Payload
+
+# Constants
+ANNOUNCEMENT_SIGNED_HEADER = struct.Struct(">H20sQ")  # length of the creator key, info hash and size of the module
+
+
+class ModuleAnnouncementPayload(Payload):
+    """
+    Payload for the message that announces a new module. The module is signed by its creator, so peers can forward the
+    announcement without being able to change it. The TTL is not signed, every peer that forwards it lowers it and
+    caps it at the TTL it announces modules with.
+    """
+
+    format_list = ['varlenH', '20s', 'varlenH', 'Q', 'varlenH', 'B']
+
+    def __init__(self, creator, info_hash, name, size, signature, ttl):
+        """
+        Initialize the payload
+
+        :param creator: Public key of the creator of the module
+        :type creator: bytes
+        :param info_hash: Binary info hash of the module
+        :type info_hash: bytes
+        :param name: Name of the module
+        :type name: str
+        :param size: Size of the module in bytes
+        :type size: int
+        :param signature: Signature of the creator over the signed data
+        :type signature: bytes
+        :param ttl: Number of times the announcement may still be forwarded
+        :type ttl: int
+        """
+        super(ModuleAnnouncementPayload, self).__init__()
+
+        self.creator = creator  # type: bytes
+        self.info_hash = info_hash  # type: bytes
+        self.name = name  # type: str
+        self.size = size  # type: int
+        self.signature = signature  # type: bytes
+        self.ttl = ttl  # type: int
+
+    @staticmethod
+    def get_signed_data(creator, info_hash, name, size):
+        """
+        Get the data the creator signs
+
+        :param creator: Public key of the creator of the module
+        :type creator: bytes
+        :param info_hash: Binary info hash of the module
+        :type info_hash: bytes
+        :param name: Name of the module
+        :type name: str
+        :param size: Size of the module in bytes
+        :type size: int
+        :return: the signed data
+        """
+        return ANNOUNCEMENT_SIGNED_HEADER.pack(len(creator), info_hash, size) + creator + name
+
+    @property
+    def signed_data(self):
+        return self.get_signed_data(self.creator, self.info_hash, self.name, self.size)
+
+    def to_pack_list(self):
+        data = [('varlenH', self.creator),
+                ('20s', self.info_hash),
+                ('varlenH', self.name),
+                ('Q', self.size),
+                ('varlenH', self.signature),
+                ('B', self.ttl)]
+
+        return data
+
+    @classmethod
+    def from_unpack_list(cls, creator, info_hash, name, size, signature, ttl):
+        return ModuleAnnouncementPayload(creator, info_hash, name, size, signature, ttl)
+
+
+class CatalogSketchPayload(Payload):
+    """
+    Payload for the message that starts a catalog reconciliation, carrying the sketch of the votes of the sender
+    """
+
+    format_list = ['I', 'varlenH']
+
+    def __init__(self, identifier, sketch):
+        """
+        Initialize the payload
+
+        :param identifier: Identifier of the reconciliation
+        :type identifier: int
+        :param sketch: The serialized invertible Bloom lookup table of the votes of the sender
+        :type sketch: bytes
+        """
+        super(CatalogSketchPayload, self).__init__()
+
+        self.identifier = identifier  # type: int
+        self.sketch = sketch  # type: bytes
+
+    def to_pack_list(self):
+        data = [('I', self.identifier),
+                ('varlenH', self.sketch)]
+
+        return data
+
+    @classmethod
+    def from_unpack_list(cls, identifier, sketch):
+        return CatalogSketchPayload(identifier, sketch)
+
+
+class CatalogDifferencePayload(Payload):
+    """
+    Payload for the message that answers a catalog sketch with the votes the sender is missing, or with the request for
+    a larger sketch if the difference could not be decoded
+    """
+
+    format_list = ['I', '?', 'varlenH']
+
+    def __init__(self, identifier, complete, missing):
+        """
+        Initialize the payload
+
+        :param identifier: Identifier of the reconciliation
+        :type identifier: int
+        :param complete: True if the difference was decoded, False if a larger sketch is needed
+        :type complete: bool
+        :param missing: The packed 64-bit elements of the votes the sender is missing
+        :type missing: bytes
+        """
+        super(CatalogDifferencePayload, self).__init__()
+
+        self.identifier = identifier  # type: int
+        self.complete = complete  # type: bool
+        self.missing = missing  # type: bytes
+
+    def to_pack_list(self):
+        data = [('I', self.identifier),
+                ('?', self.complete),
+                ('varlenH', self.missing)]
+
+        return data
+
+    @classmethod
+    def from_unpack_list(cls, identifier, complete, missing):
+        return CatalogDifferencePayload(identifier, complete, missing)
@@ -0,0 +1,144 @@
+from __future__ import absolute_import
+
+# Default library imports
+import random
+import struct
+import time
+
+# Project imports
+from module_loader.community.module.module_index import InvertibleBloomLookupTable
+
+# Constants
+CATALOG_SYNC_INTERVAL = 300.0  # interval in seconds between two reconciliations of the catalog with a random peer
+CATALOG_SYNC_INITIAL_CELLS = 60  # number of cells of the first sketch of a reconciliation
+CATALOG_SYNC_MAX_CELLS = 3840  # number of cells of the largest sketch, 60 KB still fits a UDP packet
+CATALOG_SYNC_PAGE_SIZE = 2000  # number of votes read or added to a sketch per step
+CATALOG_SYNC_ELEMENT = struct.Struct(">Q")  # packed 64-bit element of a vote
+CATALOG_SYNC_MAX_SKETCHES = 7  # sketches of a peer answered per interval, a reconciliation doubles its sketch 6 times
+CATALOG_SYNC_MAX_BLOCKS_SENT = 500  # maximum number of vote blocks sent to a peer per reconciliation
+CATALOG_SYNC_RATE_LIMIT_PEERS = 1000  # number of peers with a sketch budget above which full budgets are forgotten
+
+
+class CatalogSyncSession(object):
+    """
+    State of a catalog reconciliation we started with a peer. The peer answers our sketch with the votes we are missing
+    and sends us the votes we are missing, or asks for a sketch twice as large if it couldn't decode the difference.
+    """
+
+    def __init__(self, peer, elements):
+        """
+        Initialize the reconciliation
+
+        :param peer: The peer we reconcile with
+        :type peer: Peer
+        :param elements: The elements of our votes
+        :type elements: [int]
+        """
+        super(CatalogSyncSession, self).__init__()
+
+        self.peer = peer
+        self.elements = elements  # type: [int]
+        self.identifier = random.randint(0, 0xFFFFFFFF)  # type: int
+        self.cell_count = CATALOG_SYNC_INITIAL_CELLS  # type: int
+        self.sketches = 0  # type: int
+        self.start_time = time.time()  # type: float
+
+    def create_sketch(self):
+        """
+        Create an empty sketch of the current size, the elements are added to it in steps
+
+        :return: the sketch
+        """
+        self.sketches += 1
+        return InvertibleBloomLookupTable(self.cell_count)
+
+    def grow(self):
+        """
+        Double the size of the sketch
+
+        :return: True if the larger sketch fits a message, otherwise False
+        """
+        self.cell_count *= 2
+        return self.cell_count <= CATALOG_SYNC_MAX_CELLS
+
+
+class CatalogSyncRateLimiter(object):
+    """
+    Limits the sketches of each peer that are answered. Answering a sketch means reading all our votes, so every peer
+    has a budget of sketches that is refilled over the reconciliation interval.
+    """
+
+    def __init__(self, budget=CATALOG_SYNC_MAX_SKETCHES, interval=CATALOG_SYNC_INTERVAL):
+        """
+        Initialize the rate limiter
+
+        :param budget: Maximum number of sketches of a peer answered per interval
+        :type budget: int
+        :param interval: Time in seconds in which the budget of a peer is refilled
+        :type interval: float
+        """
+        super(CatalogSyncRateLimiter, self).__init__()
+
+        self.budget = budget  # type: int
+        self.interval = interval  # type: float
+
+        # Sketches each peer may still send and the time its budget was last refilled, by public key
+        self.peers = {}  # type: {bytes: (float, float)}
+
+    def allow(self, public_key):
+        """
+        Charge a sketch to the budget of a peer
+
+        :param public_key: Public key of the peer that sent the sketch
+        :type public_key: bytes
+        :return: True if the sketch may be answered, False if the budget of the peer is spent
+        """
+        now = time.time()
+
+        tokens, last_refill_time = self.peers.get(public_key, (float(self.budget), now))
+        tokens = min(float(self.budget), tokens + (now - last_refill_time) * self.budget / self.interval)
+        if tokens < 1:
+            self.peers[public_key] = (tokens, now)
+            return False
+
+        self.peers[public_key] = (tokens - 1, now)
+
+        if len(self.peers) > CATALOG_SYNC_RATE_LIMIT_PEERS:
+            self._forget_full_budgets(now)
+
+        return True
+
+    def _forget_full_budgets(self, now):
+        """
+        Forget the peers whose budget is refilled completely, they start over with a full budget anyway
+
+        :param now: The current time
+        :type now: float
+        :return: None
+        """
+        self.peers = {public_key: (tokens, last_refill_time)
+                      for public_key, (tokens, last_refill_time) in self.peers.items()
+                      if now - last_refill_time < self.interval}
+
+
+def pack_elements(elements):
+    """
+    Serialize a list of elements
+
+    :param elements: The elements
+    :type elements: [int]
+    :return: the packed elements
+    """
+    return b"".join(CATALOG_SYNC_ELEMENT.pack(element) for element in elements)
+
+
+def unpack_elements(data):
+    """
+    Deserialize a list of elements
+
+    :param data: The packed elements
+    :type data: bytes
+    :return: list of elements
+    """
+    size = CATALOG_SYNC_ELEMENT.size
+    return [CATALOG_SYNC_ELEMENT.unpack_from(data, offset)[0] for offset in range(0, len(data) - size + 1, size)]
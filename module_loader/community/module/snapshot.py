@@ -0,0 +1,204 @@
+from __future__ import absolute_import
+
+# Default library imports
+import hashlib
+import struct
+import zlib
+
+# Constants
+SNAPSHOT_MAGIC = b"MLSNAP"  # Marker at the start of every snapshot file
+SNAPSHOT_VERSION = 2  # Version of the snapshot format, version 1 snapshots have no vote history
+SNAPSHOT_CHECKSUM_SIZE = 32  # Size of the sha256 checksum at the end of the snapshot
+SNAPSHOT_HEADER_SIZE = len(SNAPSHOT_MAGIC) + 2  # Size of the magic and version
+
+
+class SnapshotError(Exception):
+    """
+    Raised when a snapshot can't be decoded
+    """
+    pass
+
+
+class ModuleSnapshot(object):
+    """
+    Contents of the module database at the moment of export. Modules and voters are referenced by the ids they had in
+    the exporting database. Catalog vote counters aren't stored, they follow from the votes.
+    """
+
+    def __init__(self, modules=None, voters=None, catalog=None, cache=None, library=None, votes=None):
+        """
+        Initialize snapshot
+
+        :param modules: list of (module id, creator public key, content hash)
+        :param voters: list of (voter id, public key)
+        :param catalog: list of (module id, name)
+        :param cache: list of module ids
+        :param library: list of module ids
+        :param votes: list of (voter id, module id, block timestamp, sequence number)
+        """
+        super(ModuleSnapshot, self).__init__()
+
+        self.modules = modules or []  # type: list
+        self.voters = voters or []  # type: list
+        self.catalog = catalog or []  # type: list
+        self.cache = cache or []  # type: list
+        self.library = library or []  # type: list
+        self.votes = votes or []  # type: list
+
+    def get_statistics(self):
+        """
+        Get the number of entries in the snapshot
+
+        :return: dictionary with the number of entries per table
+        """
+        return {
+            'modules': len(self.modules),
+            'voters': len(self.voters),
+            'catalog': len(self.catalog),
+            'cache': len(self.cache),
+            'library': len(self.library),
+            'votes': len(self.votes),
+        }
+
+    def encode(self):
+        """
+        Encode the snapshot as header, compressed body and a checksum over both
+
+        :return: encoded snapshot
+        """
+        chunks = [struct.pack(">I", len(self.modules))]
+        for module_id, public_key, content_hash in self.modules:
+            chunks.extend([struct.pack(">I", module_id), _pack_string(public_key), _pack_string(content_hash)])
+
+        chunks.append(struct.pack(">I", len(self.voters)))
+        for voter_id, public_key in self.voters:
+            chunks.extend([struct.pack(">I", voter_id), _pack_string(public_key)])
+
+        chunks.append(struct.pack(">I", len(self.catalog)))
+        for module_id, name in self.catalog:
+            chunks.extend([struct.pack(">I", module_id), _pack_string(name)])
+
+        chunks.extend([struct.pack(">I", len(self.cache)), _pack_ints(self.cache)])
+        chunks.extend([struct.pack(">I", len(self.library)), _pack_ints(self.library)])
+
+        # Votes are stored column by column, which compresses better than vote by vote
+        voter_ids, module_ids, block_timestamps, sequence_numbers = zip(*self.votes) if self.votes else ([],) * 4
+        chunks.extend([struct.pack(">I", len(self.votes)), _pack_ints(voter_ids), _pack_ints(module_ids),
+                       _pack_ints(block_timestamps, "Q"), _pack_ints(sequence_numbers)])
+
+        data = SNAPSHOT_MAGIC + struct.pack(">H", SNAPSHOT_VERSION) + zlib.compress(b"".join(chunks))
+        return data + hashlib.sha256(data).digest()
+
+    @classmethod
+    def decode(cls, data):
+        """
+        Decode an encoded snapshot
+
+        :param data: encoded snapshot
+        :type data: bytes
+        :return: the decoded snapshot
+        :raises SnapshotError: if the snapshot is corrupt or of an unsupported version
+        """
+        if len(data) < SNAPSHOT_HEADER_SIZE + SNAPSHOT_CHECKSUM_SIZE or not data.startswith(SNAPSHOT_MAGIC):
+            raise SnapshotError("Not a module snapshot")
+
+        version, = struct.unpack_from(">H", data, len(SNAPSHOT_MAGIC))
+        if version not in (1, SNAPSHOT_VERSION):
+            raise SnapshotError("Unsupported snapshot version {0}".format(version))
+
+        body, checksum = data[:-SNAPSHOT_CHECKSUM_SIZE], data[-SNAPSHOT_CHECKSUM_SIZE:]
+        if hashlib.sha256(body).digest() != checksum:
+            raise SnapshotError("Snapshot checksum mismatch")
+
+        try:
+            reader = _Reader(zlib.decompress(body[SNAPSHOT_HEADER_SIZE:]))
+
+            snapshot = cls()
+            snapshot.modules = [(reader.int(), reader.string(), reader.string()) for _ in range(reader.int())]
+            snapshot.voters = [(reader.int(), reader.string()) for _ in range(reader.int())]
+            snapshot.catalog = [(reader.int(), reader.string()) for _ in range(reader.int())]
+            snapshot.cache = list(reader.ints(reader.int()))
+            snapshot.library = list(reader.ints(reader.int()))
+
+            if version == 1:
+                flat_votes = reader.ints(reader.int() * 2)
+                snapshot.votes = [(voter_id, module_id, 0, 0)
+                                  for voter_id, module_id in zip(flat_votes[0::2], flat_votes[1::2])]
+            else:
+                count = reader.int()
+                snapshot.votes = zip(reader.ints(count), reader.ints(count), reader.ints(count, "Q"),
+                                     reader.ints(count))
+        except (struct.error, zlib.error) as e:
+            raise SnapshotError("Corrupt snapshot: {0}".format(e))
+
+        if not reader.at_end():
+            raise SnapshotError("Corrupt snapshot: trailing data")
+
+        module_ids = set(module[0] for module in snapshot.modules)
+        voter_ids = set(voter[0] for voter in snapshot.voters)
+        if not module_ids.issuperset(module_id for module_id, _ in snapshot.catalog) \
+                or not module_ids.issuperset(snapshot.cache) or not module_ids.issuperset(snapshot.library) \
+                or not module_ids.issuperset(vote[1] for vote in snapshot.votes) \
+                or not voter_ids.issuperset(vote[0] for vote in snapshot.votes):
+            raise SnapshotError("Corrupt snapshot: reference to unknown module or voter")
+
+        return snapshot
+
+
+def _pack_string(value):
+    """
+    Encode a length prefixed string
+
+    :param value: string
+    :type value: bytes
+    :return: encoded string
+    """
+    value = bytes(value)
+    return struct.pack(">H", len(value)) + value
+
+
+def _pack_ints(values, size="I"):
+    """
+    Encode a sequence of unsigned integers
+
+    :param values: integers
+    :type values: list
+    :param size: struct format character of the integers
+    :type size: str
+    :return: encoded integers
+    """
+    return struct.pack(">{0}{1}".format(len(values), size), *values)
+
+
+class _Reader(object):
+    """
+    Sequential reader over a decompressed snapshot body
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self._offset = 0
+
+    def int(self):
+        value, = struct.unpack_from(">I", self._data, self._offset)
+        self._offset += 4
+        return value
+
+    def ints(self, count, size="I"):
+        values = struct.unpack_from(">{0}{1}".format(count, size), self._data, self._offset)
+        self._offset += struct.calcsize(">" + size) * count
+        return values
+
+    def string(self):
+        length, = struct.unpack_from(">H", self._data, self._offset)
+        self._offset += 2
+
+        value = self._data[self._offset:self._offset + length]
+        if len(value) != length:
+            raise struct.error("string exceeds snapshot")
+        self._offset += length
+
+        return value
+
+    def at_end(self):
+        return self._offset == len(self._data)
@@ -0,0 +1,813 @@
+from __future__ import absolute_import
+
+# Default library imports
+import re
+import time
+from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+
+# Third party imports
+import six
+from twisted.internet import reactor
+
+# Project imports
+from module_loader.community.module.core.module_identifier import get_creator_digest
+
+# Constants
+STORAGE_BACKEND_SQLITE = "sqlite"  # Module storage in an SQLite database
+STORAGE_BACKEND_LMDB = "lmdb"  # Module storage in a memory-mapped LMDB key-value store
+STORAGE_BACKEND_HYBRID = "hybrid"  # Module storage in an in-memory SQLite database that is backed up to disk
+STORAGE_BACKENDS = [STORAGE_BACKEND_SQLITE, STORAGE_BACKEND_LMDB, STORAGE_BACKEND_HYBRID]  # All module storage backends
+CATALOG_ORDER_VOTES = "votes"  # Catalog ordering by number of votes, most voted first
+CATALOG_ORDER_NAME = "name"  # Catalog ordering by module name
+CATALOG_ORDER_TRENDING = "trending"  # Catalog ordering by recent votes, most popular right now first
+CATALOG_ORDERS = [None, CATALOG_ORDER_VOTES, CATALOG_ORDER_NAME, CATALOG_ORDER_TRENDING]  # None is insertion order
+TRENDING_HALF_LIFE = 24 * 3600  # Time in seconds after which the weight of a vote in the trending score halves
+TRENDING_REBASE_HALF_LIVES = 512  # Half-lives after the reference time at which trending scores are rebased
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)  # Words of a module name or search query
+
+
+def create_module_storage(backend, working_directory, db_name, **kwargs):
+    """
+    Open the module storage of a backend
+
+    :param backend: One of STORAGE_BACKENDS
+    :type backend: str
+    :param working_directory: Path to the working directory where the state is stored, or :memory:
+    :type working_directory: str
+    :param db_name: The name of the database
+    :type db_name: str
+    :param kwargs: Backend specific options, the backup_interval and max_data_loss of the hybrid backend
+    :return: the opened storage
+    :raises ValueError: if the backend is unknown
+    """
+    if backend == STORAGE_BACKEND_SQLITE:
+        from module_loader.community.module.module_database import ModuleDatabase
+        return ModuleDatabase(working_directory, db_name)
+
+    if backend == STORAGE_BACKEND_LMDB:
+        from module_loader.community.module.lmdb_module_database import LMDBModuleDatabase
+        return LMDBModuleDatabase(working_directory, db_name)
+
+    if backend == STORAGE_BACKEND_HYBRID:
+        from module_loader.community.module.hybrid_module_database import HybridModuleDatabase
+        return HybridModuleDatabase(working_directory, db_name, **kwargs)
+
+    raise ValueError("Unknown storage backend: {0}".format(backend))
+
+
+def get_search_words(text):
+    """
+    Split a module name or search query into lowercase words
+
+    :param text: Module name or search query
+    :type text: str
+    :return: list of words
+    """
+    if isinstance(text, bytes):
+        text = text.decode('utf-8', 'replace')
+    return WORD_PATTERN.findall(text.lower())
+
+
+def matches_search_words(name, query_words):
+    """
+    Check if every word of a search query matches the start of a word in a module name
+
+    :param name: Module name
+    :type name: str
+    :param query_words: Words of the search query
+    :type query_words: [str]
+    :return: True if the name matches
+    """
+    name_words = get_search_words(name)
+    return all(any(name_word.startswith(word) for name_word in name_words) for word in query_words)
+
+
+class ModuleStorageQueries(six.with_metaclass(ABCMeta, object)):
+    """
+    Read queries on the module storage, answered by the storage itself and by its read replica.
+    """
+
+    # module cache
+    @abstractmethod
+    def get_module_from_cache(self, module_identifier):
+        """
+        Get module from the cache
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: module identifier, or None if the module isn't in the cache
+        """
+        pass
+
+    @abstractmethod
+    def get_modules_from_cache(self):
+        """
+        Retrieve all modules from the cache
+
+        :return: list of module identifiers
+        """
+        pass
+
+    @abstractmethod
+    def iter_cache(self, limit=None, offset=0):
+        """
+        Iterate over the modules in the cache without loading them all in memory
+
+        :param limit: Maximum number of modules to return, or None for all
+        :type limit: int
+        :param offset: Number of modules to skip
+        :type offset: int
+        :return: generator of module identifiers
+        """
+        pass
+
+    # module catalog
+    @abstractmethod
+    def get_module_from_catalog(self, module_identifier):
+        """
+        Get module from the catalog
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: module, or None if the module isn't in the catalog
+        """
+        pass
+
+    @abstractmethod
+    def get_modules_from_catalog(self):
+        """
+        Retrieve all modules from the catalog
+
+        :return: list of modules
+        """
+        pass
+
+    @abstractmethod
+    def iter_catalog(self, order_by=None, limit=None, offset=0):
+        """
+        Iterate over the modules in the catalog without loading them all in memory
+
+        :param order_by: One of CATALOG_ORDERS
+        :type order_by: str
+        :param limit: Maximum number of modules to return, or None for all
+        :type limit: int
+        :param offset: Number of modules to skip
+        :type offset: int
+        :return: generator of modules
+        :raises ValueError: if the ordering is unknown
+        """
+        pass
+
+    @abstractmethod
+    def count_modules_in_catalog(self):
+        """
+        Count the modules in the catalog
+
+        :return: Number of modules in the catalog
+        """
+        pass
+
+    @abstractmethod
+    def search_catalog(self, query, limit=None, offset=0):
+        """
+        Search the catalog by module name. Every word of the query has to match the start of a word in the name.
+
+        :param query: Search query
+        :type query: str
+        :param limit: Maximum number of modules to return, or None for all
+        :type limit: int
+        :param offset: Number of modules to skip
+        :type offset: int
+        :return: generator of modules
+        """
+        pass
+
+    # module library
+    @abstractmethod
+    def get_module_from_library(self, module_identifier):
+        """
+        Get module from the library
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: module identifier, or None if the module isn't in the library
+        """
+        pass
+
+    @abstractmethod
+    def get_modules_from_library(self):
+        """
+        Retrieve all modules from the library
+
+        :return: list of module identifiers
+        """
+        pass
+
+    @abstractmethod
+    def iter_library(self, limit=None, offset=0):
+        """
+        Iterate over the modules in the library without loading them all in memory
+
+        :param limit: Maximum number of modules to return, or None for all
+        :type limit: int
+        :param offset: Number of modules to skip
+        :type offset: int
+        :return: generator of module identifiers
+        """
+        pass
+
+    # module votes
+    @abstractmethod
+    def iter_votes(self, limit=None, after=None):
+        """
+        Iterate over all votes in a fixed order without loading them all in memory. A page starts right after the last
+        vote of the previous page, which is looked up by key instead of skipping all votes before it.
+
+        :param limit: Maximum number of votes to return, or None for all
+        :type limit: int
+        :param after: The last vote of the previous page as (voter public key, module identifier) tuple, or None to
+        start at the first vote
+        :type after: (bytes, ModuleIdentifier)
+        :return: generator of (voter public key, module identifier) tuples
+        :raises ValueError: if the vote to start after is unknown
+        """
+        pass
+
+
+class ModuleStorage(ModuleStorageQueries):
+    """
+    Persistence layer for module information that the module community depends on. Backends implement the storage of
+    modules and votes, the unit of work that groups writes into commits is shared by all backends.
+    """
+
+    def __init__(self):
+        super(ModuleStorage, self).__init__()
+
+        # Read-only view for presentation layers, opened with the storage
+        self.replica = None  # type: ModuleStorageQueries
+
+        # Unit of work state
+        self._transaction_depth = 0  # type: int
+        self._pending_writes = 0  # type: int
+        self._write_behind_interval = None  # type: float
+        self._flush_call = None
+
+        # Time in seconds at which a vote adds a weight of 1 to the trending score, loaded on open
+        self._trending_reference = None  # type: float
+
+        # Public keys of the creators of known modules by their digest, loaded on open
+        self._creators = {}  # type: {bytes: bytes}
+
+        # Flush statistics
+        self.flush_count = 0  # type: int
+        self.flushed_writes = 0  # type: int
+        self.last_flush_latency = 0.0  # type: float
+        self.max_flush_latency = 0.0  # type: float
+        self.total_flush_latency = 0.0  # type: float
+        self.last_batch_size = 0  # type: int
+        self.max_batch_size = 0  # type: int
+
+    # module cache
+    @abstractmethod
+    def add_module_to_cache(self, module_identifier):
+        """
+        Add module to cache
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def has_module_in_cache(self, module_identifier):
+        """
+        Check if module exists in cache
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: If the module has been found
+        """
+        pass
+
+    # module catalog
+    @abstractmethod
+    def add_module_to_catalog(self, module):
+        """
+        Add module to the catalog. The vote counter and trending score start from the votes already stored for the
+        module and are kept up to date from then on.
+
+        :param module: module
+        :type module: Module
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def has_module_in_catalog(self, module_identifier):
+        """
+        Check if module exists in catalog
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: If the module has been found
+        """
+        pass
+
+    def resolve_creator(self, creator_digest):
+        """
+        Get the public key of a module creator from its digest
+
+        :param creator_digest: Digest of the public key of the creator
+        :type creator_digest: bytes
+        :return: public key of the creator, or None if no known module has a creator with this digest
+        """
+        return self._creators.get(creator_digest)
+
+    def _add_creator(self, creator):
+        """
+        Add the public key of a module creator to the creators that digests resolve to
+
+        :param creator: Public key of the creator
+        :type creator: bytes
+        :return: None
+        """
+        self._creators[get_creator_digest(creator)] = creator
+
+    @abstractmethod
+    def update_module_in_catalog(self, module_identifier, votes):
+        """
+        Update the number of votes for a module in the catalog
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :param votes: Number of votes
+        :type votes: int
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def get_trending_score(self, module_identifier):
+        """
+        Get the trending score of a module, the number of votes with every vote weighted by its age
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: trending score at the current time, or None if the module isn't in the catalog
+        """
+        pass
+
+    # module library
+    @abstractmethod
+    def add_module_to_library(self, module_identifier):
+        """
+        Add module to library
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def has_module_in_library(self, module_identifier):
+        """
+        Check if module exists in library
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: If the module has been found
+        """
+        pass
+
+    # module votes
+    @abstractmethod
+    def record_vote(self, voter_public_key, module_identifier, block_timestamp=0, sequence_number=0):
+        """
+        Add vote to the votes, update the vote counter and trending score of the module in the catalog
+
+        :param voter_public_key: Public key of the voter
+        :type voter_public_key: bytes
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :param block_timestamp: Timestamp in milliseconds of the vote block, 0 if unknown
+        :type block_timestamp: int
+        :param sequence_number: Sequence number of the vote block in the chain of the voter, 0 if unknown
+        :type sequence_number: int
+        :return: True if the vote is new, False if it was already recorded
+        """
+        pass
+
+    @abstractmethod
+    def did_vote(self, voter_public_key, module_identifier):
+        """
+        Check if the node with the provided public key voted on the module
+
+        :param voter_public_key: Public key of the voter
+        :type voter_public_key: bytes
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: True if voted, otherwise False
+        """
+        pass
+
+    @abstractmethod
+    def get_votes_for_module(self, module_identifier):
+        """
+        Get votes for module
+
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :return: list of vote dictionaries, or None if the module isn't in the catalog
+        """
+        pass
+
+    @abstractmethod
+    def get_votes_for_peer(self, peer):
+        """
+        Get votes for peer
+
+        :param peer: public key of peer
+        :type peer: bytes
+        :return: list of vote dictionaries
+        """
+        pass
+
+    @abstractmethod
+    def count_votes_without_history(self):
+        """
+        Count the votes that were recorded without block timestamp
+
+        :return: Number of votes without history
+        """
+        pass
+
+    @abstractmethod
+    def add_vote_history(self, voter_public_key, module_identifier, block_timestamp, sequence_number):
+        """
+        Fill in the block timestamp and sequence number of a vote recorded without them and add its weight to the
+        trending score of the module
+
+        :param voter_public_key: Public key of the voter
+        :type voter_public_key: bytes
+        :param module_identifier: module identifier
+        :type module_identifier: ModuleIdentifier
+        :param block_timestamp: Timestamp in milliseconds of the vote block
+        :type block_timestamp: int
+        :param sequence_number: Sequence number of the vote block in the chain of the voter
+        :type sequence_number: int
+        :return: True if the history was added, False if the vote is unknown or already has history
+        """
+        pass
+
+    # pending votes
+    @abstractmethod
+    def add_pending_vote(self, creator_digest, content_hash, voter_public_key, block_timestamp, sequence_number):
+        """
+        Keep a compact vote on a module that isn't in the catalog yet, until the module is added
+
+        :param creator_digest: Digest of the public key of the creator of the module
+        :type creator_digest: bytes
+        :param content_hash: Content hash of the module
+        :type content_hash: str
+        :param voter_public_key: Public key of the voter
+        :type voter_public_key: bytes
+        :param block_timestamp: Timestamp in milliseconds of the vote block
+        :type block_timestamp: int
+        :param sequence_number: Sequence number of the vote block in the chain of the voter
+        :type sequence_number: int
+        :return: True if the vote was added, False if the voter already has a pending vote on the module
+        """
+        pass
+
+    @abstractmethod
+    def pop_pending_votes(self, creator_digest, content_hash):
+        """
+        Remove and return the pending votes on a module
+
+        :param creator_digest: Digest of the public key of the creator of the module
+        :type creator_digest: bytes
+        :param content_hash: Content hash of the module
+        :type content_hash: str
+        :return: list of (voter public key, block timestamp, sequence number) tuples
+        """
+        pass
+
+    @abstractmethod
+    def count_pending_votes(self):
+        """
+        Count the pending votes on all modules
+
+        :return: Number of pending votes
+        """
+        pass
+
+    # vote reconciliation
+    @abstractmethod
+    def get_vote_checkpoint(self, public_key):
+        """
+        Get the checkpoint of the vote reconciliation of a voter
+
+        :param public_key: Public key of the voter
+        :type public_key: bytes
+        :return: Highest sequence number in the chain of the voter that is reconciled, 0 if none is
+        """
+        pass
+
+    @abstractmethod
+    def set_vote_checkpoint(self, public_key, sequence_number):
+        """
+        Set the checkpoint of the vote reconciliation of a voter
+
+        :param public_key: Public key of the voter
+        :type public_key: bytes
+        :param sequence_number: Highest sequence number in the chain of the voter that is reconciled
+        :type sequence_number: int
+        :return: None
+        """
+        pass
+
+    # crawl cursors
+    @abstractmethod
+    def get_crawl_cursor(self, public_key):
+        """
+        Get the crawl cursor of a peer
+
+        :param public_key: Public key of the peer
+        :type public_key: bytes
+        :return: Highest sequence number in the chain of the peer that was crawled, 0 if the peer was never crawled
+        """
+        pass
+
+    @abstractmethod
+    def set_crawl_cursor(self, public_key, sequence_number):
+        """
+        Set the crawl cursor of a peer
+
+        :param public_key: Public key of the peer
+        :type public_key: bytes
+        :param sequence_number: Highest sequence number in the chain of the peer that was crawled
+        :type sequence_number: int
+        :return: None
+        """
+        pass
+
+    # snapshots
+    @abstractmethod
+    def export_snapshot(self, file_path):
+        """
+        Export the catalog, votes, cache and library to a snapshot file
+
+        :param file_path: Path of the snapshot file
+        :type file_path: str
+        :return: dictionary with the number of exported entries per table
+        """
+        pass
+
+    @abstractmethod
+    def import_snapshot(self, file_path):
+        """
+        Import a snapshot file in a single transaction, entries that are already stored are kept
+
+        :param file_path: Path of the snapshot file
+        :type file_path: str
+        :return: dictionary with the number of entries per table in the snapshot
+        :raises SnapshotError: if the snapshot is corrupt or of an unsupported version, nothing is imported
+        """
+        pass
+
+    # statistics
+    @abstractmethod
+    def get_index_statistics(self):
+        """
+        Get the lookup statistics of the membership checks
+
+        :return: dictionary with the size, number of lookups, hits, misses and the hit rate per table
+        """
+        pass
+
+    # trending
+    def _trending_weight(self, block_timestamp):
+        """
+        Weight of a vote in the trending score, relative to the trending reference time. Scores are only ever added to,
+        the decay is applied when they are read, so ordering by the stored scores orders by the decayed scores.
+
+        :param block_timestamp: Timestamp in milliseconds of the vote block, 0 if unknown
+        :type block_timestamp: int
+        :return: weight of the vote
+        """
+        # Timestamps are chosen by the voter, votes from the future count as votes made now
+        timestamp = min(block_timestamp / 1000.0, time.time())
+        return 2.0 ** ((timestamp - self._trending_reference) / TRENDING_HALF_LIFE)
+
+    def _trending_decay(self):
+        """
+        Factor that scales a stored trending score to the current time
+
+        :return: decay since the trending reference time
+        """
+        return 2.0 ** ((self._trending_reference - time.time()) / TRENDING_HALF_LIFE)
+
+    def _rebase_trending_if_needed(self, block_timestamp):
+        """
+        Move the trending reference time forward before vote weights grow too large to represent. All stored scores
+        are scaled down by the decay over the skipped period, which keeps their order.
+
+        :param block_timestamp: Timestamp in milliseconds of the vote about to be recorded
+        :type block_timestamp: int
+        :return: None
+        """
+        now = time.time()
+        timestamp = min(block_timestamp / 1000.0, now)
+        if timestamp - self._trending_reference < TRENDING_REBASE_HALF_LIVES * TRENDING_HALF_LIFE:
+            return
+
+        self._logger.info("persistence: Rebasing trending scores")
+
+        self._scale_trending_scores(self._trending_decay())
+
+        self._trending_reference = now
+        self._store_trending_reference()
+
+    @abstractmethod
+    def _scale_trending_scores(self, factor):
+        """
+        Multiply all stored trending scores
+
+        :param factor: Factor to multiply the scores with
+        :type factor: float
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def _store_trending_reference(self):
+        """
+        Store the trending reference time
+
+        :return: None
+        """
+        pass
+
+    # unit of work
+    @abstractmethod
+    def _commit_pending(self):
+        """
+        Make all pending writes durable
+
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def _discard_pending(self):
+        """
+        Discard all pending writes and reload the state that depends on them
+
+        :return: None
+        """
+        pass
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group all writes made within the context into a single commit.
+
+        Transactions can be nested, only the outermost one commits. If the outermost transaction raises, all writes
+        that have not been committed yet are rolled back.
+
+        :return: context manager yielding this storage
+        """
+        self._transaction_depth += 1
+        try:
+            yield self
+        except Exception:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.rollback()
+            raise
+        else:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self._schedule_flush()
+
+    def set_write_behind(self, interval):
+        """
+        Enable or disable write-behind mode. In write-behind mode writes are committed in batches, either on the next
+        reactor iteration (interval of 0) or after the provided interval.
+
+        :param interval: Maximum time in seconds a write stays uncommitted, or None to commit every write right away
+        :type interval: float
+        :return: None
+        """
+        self._logger.info("persistence: Write-behind interval set to %s", interval)
+
+        self._write_behind_interval = interval
+        if interval is None:
+            self.flush()
+
+    def _commit_write(self):
+        """
+        Commit a write, unless it is part of a transaction or write-behind is enabled
+
+        :return: None
+        """
+        self._pending_writes += 1
+
+        if self._transaction_depth == 0:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """
+        Flush the pending writes now, or schedule a flush when write-behind is enabled
+
+        :return: None
+        """
+        if self._pending_writes == 0:
+            return
+
+        if self._write_behind_interval is None:
+            self.flush()
+        elif self._flush_call is None:
+            self._flush_call = reactor.callLater(self._write_behind_interval, self.flush)
+
+    def _cancel_flush(self):
+        """
+        Cancel the scheduled flush, if any
+
+        :return: None
+        """
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+
+    def flush(self):
+        """
+        Commit all pending writes
+
+        :return: None
+        """
+        self._cancel_flush()
+
+        if self._pending_writes == 0 or self._transaction_depth > 0:
+            return
+
+        start_time = time.time()
+        self._commit_pending()
+        latency = time.time() - start_time
+
+        batch_size, self._pending_writes = self._pending_writes, 0
+
+        self.flush_count += 1
+        self.flushed_writes += batch_size
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self.total_flush_latency += latency
+        self.last_batch_size = batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+
+        self._logger.debug("persistence: Flushed %d writes in %.2f ms", batch_size, latency * 1000)
+
+    def rollback(self):
+        """
+        Discard all pending writes
+
+        :return: None
+        """
+        self._logger.warning("persistence: Rolling back %d pending writes", self._pending_writes)
+
+        self._cancel_flush()
+        self._discard_pending()
+        self._pending_writes = 0
+
+    def get_flush_statistics(self):
+        """
+        Get the statistics of the committed batches
+
+        :return: dictionary with the number of flushes, batch sizes and flush latencies in seconds
+        """
+        return {
+            'flushes': self.flush_count,
+            'writes': self.flushed_writes,
+            'pending_writes': self._pending_writes,
+            'last_batch_size': self.last_batch_size,
+            'max_batch_size': self.max_batch_size,
+            'average_batch_size': float(self.flushed_writes) / self.flush_count if self.flush_count else 0.0,
+            'last_flush_latency': self.last_flush_latency,
+            'max_flush_latency': self.max_flush_latency,
+            'average_flush_latency': self.total_flush_latency / self.flush_count if self.flush_count else 0.0,
+        }
+
+    @abstractmethod
+    def close(self, commit=True):
+        """
+        Close the storage and its read replica
+
+        :param commit: Whether to commit the pending writes first
+        :type commit: bool
+        :return: None
+        """
+        pass
@@ -120,6 +120,7 @@ class BittorrentTransport(object):
         return {
             'info_hash': torrent_info.info_hash(),
             'name': torrent_info.name(),
+            'size': torrent_info.total_size(),
         }
 
     def start(self):
@@ -0,0 +1,335 @@
+from __future__ import absolute_import
+
+# Default library imports
+import logging
+import multiprocessing
+import time
+
+# Third party imports
+from ipv8.attestation.trustchain.payload import CrawlResponsePayload
+from ipv8.keyvault.crypto import default_eccrypto
+from ipv8.peer import Peer
+from twisted.internet import reactor
+from twisted.internet.defer import gatherResults, succeed
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
+# Project imports
+
+# Constants
+VERIFY_PROCESSES = 0  # default number of worker processes that verify signatures, 0 verifies them on the reactor
+VERIFY_INLINE_THRESHOLD = 32  # batches smaller than this are verified on the reactor, a worker round trip costs more
+VERIFY_BATCH_DELAY = 0.02  # maximum time in seconds a crawled block waits for its batch to fill up
+CRAWL_RESPONSE_MESSAGE = chr(3)  # trustchain message carrying a crawled block
+
+
+def verify_signatures(signatures):
+    """
+    Verify block signatures, runs in a worker process
+
+    :param signatures: The (public key, signed data, signature) tuples of the blocks
+    :type signatures: [(bytes, bytes, bytes)]
+    :return: tuple of the list of verification results and the time in seconds it took
+    """
+    start_time = time.time()
+
+    results = []
+    for public_key, data, signature in signatures:
+        try:
+            results.append(default_eccrypto.is_valid_signature(default_eccrypto.key_from_public_bin(public_key), data,
+                                                                signature))
+        except Exception:
+            results.append(False)
+
+    return results, time.time() - start_time
+
+
+class SignatureVerifier(object):
+    """
+    Verifies the signatures of batches of blocks in a pool of worker processes, so large batches don't block the
+    reactor. Small batches are verified on the reactor, where they cost less than a round trip to the workers. The
+    workers are forked when the verifier is created, so it has to be created before the process starts any threads.
+    """
+
+    def __init__(self, processes=VERIFY_PROCESSES, inline_threshold=VERIFY_INLINE_THRESHOLD):
+        """
+        Start the worker processes
+
+        :param processes: Number of worker processes, 0 to verify all batches on the reactor
+        :type processes: int
+        :param inline_threshold: Minimum number of blocks in a batch that is verified by the workers
+        :type inline_threshold: int
+        """
+        super(SignatureVerifier, self).__init__()
+
+        self.processes = processes  # type: int
+        self.inline_threshold = inline_threshold  # type: int
+
+        # Logging
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        # Worker processes, and a thread per worker that waits for its results
+        self._pool = None  # type: multiprocessing.Pool
+        self._threadpool = None  # type: ThreadPool
+        if self.processes > 0:
+            self._start_workers()
+
+        # Statistics
+        self.batches = 0  # type: int
+        self.inline_batches = 0  # type: int
+        self.verified_blocks = 0  # type: int
+        self.invalid_blocks = 0  # type: int
+        self.verification_time = 0.0  # type: float
+        self.max_inline_time = 0.0  # type: float
+
+    def verify(self, blocks):
+        """
+        Verify the signatures of a batch of blocks
+
+        :param blocks: The blocks to verify
+        :type blocks: [TrustChainBlock]
+        :return: Deferred firing with a list that is True for each block with a valid signature
+        """
+        signatures = [(block.public_key, block.pack(signature=False), block.signature) for block in blocks]
+
+        self.batches += 1
+
+        if self._pool is None or len(signatures) < self.inline_threshold:
+            self.inline_batches += 1
+            results, duration = verify_signatures(signatures)
+            self.max_inline_time = max(self.max_inline_time, duration)
+            return succeed(self._on_verified([(results, duration)]))
+
+        # A chunk per worker
+        chunk_size = -(-len(signatures) // self.processes)
+        deferreds = [deferToThreadPool(reactor, self._threadpool, self._pool.apply, verify_signatures,
+                                       (signatures[start:start + chunk_size],))
+                     for start in range(0, len(signatures), chunk_size)]
+        return gatherResults(deferreds, consumeErrors=True).addCallback(self._on_verified)
+
+    def _start_workers(self):
+        """
+        Internal function for starting the worker processes and the threads that wait for their results. Python 2 forks
+        the workers, a thread of this process that holds a lock at that moment leaves it held in the workers.
+
+        :return: None
+        """
+        self._logger.info("module-community: Starting %d signature verification processes", self.processes)
+
+        self._pool = multiprocessing.Pool(self.processes)
+        self._threadpool = ThreadPool(minthreads=1, maxthreads=self.processes, name="signature-verification")
+        self._threadpool.start()
+
+    def _on_verified(self, chunks):
+        """
+        Combine the results of the verified chunks of a batch
+
+        :param chunks: The (results, duration) tuple of each chunk, in order
+        :type chunks: [([bool], float)]
+        :return: list of the verification results
+        """
+        results = []
+        for chunk_results, duration in chunks:
+            results.extend(chunk_results)
+            self.verification_time += duration
+
+        self.verified_blocks += len(results)
+        self.invalid_blocks += results.count(False)
+        return results
+
+    def get_statistics(self):
+        """
+        Get the verification statistics
+
+        :return: dictionary with the number of worker processes, batches and verified blocks, the number of blocks
+        verified per second by a single core and the longest time a batch was verified on the reactor
+        """
+        return {
+            'processes': self.processes,
+            'batches': self.batches,
+            'inline_batches': self.inline_batches,
+            'verified_blocks': self.verified_blocks,
+            'invalid_blocks': self.invalid_blocks,
+            'blocks_per_second_per_core': self.verified_blocks / self.verification_time
+            if self.verification_time else 0.0,
+            'max_inline_time': self.max_inline_time,
+        }
+
+    def stop(self):
+        """
+        Finish the batches that are being verified and stop the worker processes
+
+        :return: None
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._threadpool.stop()
+            self._pool, self._threadpool = None, None
+
+
+class CrawlResponseVerifier(object):
+    """
+    Verifies the signatures of crawled blocks of the given types in batches, before trustchain processes the crawl
+    responses that carry them. Trustchain validates these blocks as usual, except that it doesn't verify their signature
+    again. Crawl responses with other blocks are passed on to trustchain right away.
+
+    This relies on the internals of the trustchain overlay of pyipv8 1.6: it replaces the handler of the crawl response
+    message in decode_map, unpacks the messages with _ez_unpack_noauth, and processes the verified blocks the way
+    received_crawl_response does, holding the receive_block_lock that its synchronized decorator takes.
+    ModuleBlock.update_block_invariant skips the signature check of the verified blocks. The community only takes over
+    the crawl responses when it verifies signatures in worker processes.
+    """
+
+    def __init__(self, trustchain, verifier, block_types, delay=VERIFY_BATCH_DELAY):
+        """
+        Take over the crawl responses of trustchain
+
+        :param trustchain: TrustChain overlay
+        :type trustchain: TrustChainCommunity
+        :param verifier: The verifier of the batches
+        :type verifier: SignatureVerifier
+        :param block_types: The block types verified in batches, their block class must be ModuleBlock
+        :type block_types: [str]
+        :param delay: Maximum time in seconds a crawled block waits for its batch to fill up
+        :type delay: float
+        """
+        super(CrawlResponseVerifier, self).__init__()
+
+        self.trustchain = trustchain  # type: TrustChainCommunity
+        self.verifier = verifier  # type: SignatureVerifier
+        self.block_types = block_types  # type: [str]
+        self.delay = delay  # type: float
+
+        # Crawl responses waiting for their batch, in order of arrival
+        self._pending = []  # type: [(tuple, bytes, CrawlResponsePayload, ModuleBlock)]
+        self._flush_call = None
+
+        # Logging
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        self._handler = self.trustchain.decode_map[CRAWL_RESPONSE_MESSAGE]
+        self.trustchain.decode_map[CRAWL_RESPONSE_MESSAGE] = self.on_crawl_response
+
+    def on_crawl_response(self, source_address, data):
+        """
+        Callback function for crawl responses received by trustchain
+
+        :param source_address: The address of the sender
+        :type source_address: tuple
+        :param data: The message
+        :type data: bytes
+        :return: None
+        """
+        try:
+            _, payload = self.trustchain._ez_unpack_noauth(CrawlResponsePayload, data)
+        except Exception:
+            # Trustchain handles malformed messages
+            self._handler(source_address, data)
+            return
+
+        if payload.type not in self.block_types:
+            self._handler(source_address, data)
+            return
+
+        block = self.trustchain.get_block_class(payload.type).from_payload(payload, self.trustchain.serializer)
+        self._pending.append((source_address, data, payload, block))
+
+        if self._flush_call is None:
+            self._flush_call = reactor.callLater(self.delay, self.flush)
+
+    def flush(self):
+        """
+        Verify the waiting crawled blocks and pass their crawl responses on to trustchain once they are verified
+
+        :return: Deferred firing when trustchain processed the crawl responses
+        """
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+
+        pending, self._pending = self._pending, []
+        if not pending:
+            return succeed(None)
+
+        deferred = self.verifier.verify([block for _, _, _, block in pending])
+        deferred.addCallbacks(self._process, self._on_failure, callbackArgs=(pending,), errbackArgs=(pending,))
+        return deferred
+
+    def _on_failure(self, failure, pending):
+        """
+        Pass the crawl responses on to trustchain after their verification failed, trustchain verifies them instead
+
+        :param failure: The failure of the verification
+        :type failure: Failure
+        :param pending: The (source address, message, payload, block) tuple of each crawl response
+        :type pending: [(tuple, bytes, CrawlResponsePayload, ModuleBlock)]
+        :return: None
+        """
+        self._logger.error("module-community: Verifying %d crawled blocks failed: %s", len(pending),
+                           failure.getErrorMessage())
+
+        self._process([False] * len(pending), pending)
+
+    def _process(self, results, pending):
+        """
+        Pass the crawl responses on to trustchain. The blocks with a verified signature are handed to trustchain as the
+        block objects that were verified, marked as such. Trustchain decodes the other crawl responses and verifies the
+        signature of their blocks itself, which rejects the invalid ones.
+
+        :param results: The verification result of each block
+        :type results: [bool]
+        :param pending: The (source address, message, payload, block) tuple of each crawl response
+        :type pending: [(tuple, bytes, CrawlResponsePayload, ModuleBlock)]
+        :return: None
+        """
+        for (source_address, data, payload, block), valid in zip(pending, results):
+            try:
+                if valid:
+                    self._process_verified(source_address, payload, block)
+                else:
+                    self._handler(source_address, data)
+            except Exception:
+                self._logger.exception("module-community: Failed to process crawl response")
+
+    def _process_verified(self, source_address, payload, block):
+        """
+        Internal function for processing a crawl response with a verified block, like trustchain does with the blocks
+        it decodes itself
+
+        :param source_address: The address of the sender
+        :type source_address: tuple
+        :param payload: The crawl response
+        :type payload: CrawlResponsePayload
+        :param block: The block in the crawl response, of which the signature is verified
+        :type block: ModuleBlock
+        :return: None
+        """
+        with self.trustchain.receive_block_lock:
+            block.signature_verified = True
+            try:
+                self.trustchain.process_half_block(block, Peer(block.public_key, source_address))
+            finally:
+                block.signature_verified = False
+
+            cache = self.trustchain.request_cache.get(u"crawl", payload.crawl_id)
+            if cache:
+                cache.received_block(block, payload.total_count)
+
+    def stop(self):
+        """
+        Pass the waiting crawl responses on to trustchain and stop taking them over
+
+        :return: None
+        """
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+
+        pending, self._pending = self._pending, []
+        for source_address, data, _, _ in pending:
+            self._handler(source_address, data)
+
+        self.trustchain.decode_map[CRAWL_RESPONSE_MESSAGE] = self._handler
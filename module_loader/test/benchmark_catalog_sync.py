@@ -0,0 +1,203 @@
+"""
+Measures the traffic of reconciling the votes of two nodes with catalog sketches, against replaying the chains of all
+voters. Both nodes run real module and trustchain communities in this process and share a number of votes, each has
+a number of votes the other lacks. Reconciliations run until both nodes have all votes, at most a number of rounds.
+Also measures what a node sends in answer to an empty sketch of the maximum size, from a verified peer and from an
+unknown one.
+
+Run with: python -m module_loader.test.benchmark_catalog_sync [--cases COMMON:DIFFERING ...] [--reply-votes N]
+"""
+from __future__ import absolute_import, print_function
+
+# Default library imports
+import argparse
+
+# Third party imports
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks, returnValue
+from twisted.internet.task import deferLater
+
+# Project imports
+from module_loader.community.module.community import CATALOG_SKETCH_MESSAGE, ModuleCommunity
+from module_loader.community.module.module_index import InvertibleBloomLookupTable
+from module_loader.community.module.payload import CatalogSketchPayload
+from module_loader.community.module.reconciliation import CatalogSyncRateLimiter, CATALOG_SYNC_MAX_CELLS
+from module_loader.test.generator import VoteBlockGenerator
+from module_loader.test.mocking import LatencyEndpoint, MockModuleNode
+
+# Constants
+LATENCY = 0.02  # latency in seconds of a packet
+POLL_INTERVAL = 0.05  # interval in seconds between checks whether a reconciliation is done
+SYNC_JOBS = ["catalog_sync", "catalog_sync_reply", "catalog_sync_send"]  # maintenance jobs of a reconciliation
+SKETCH_PREFIX = b"\x00" + ModuleCommunity.version + ModuleCommunity.master_peer.mid + \
+    chr(CATALOG_SKETCH_MESSAGE)  # start of the packets of catalog sketches
+
+
+def load_votes(node, blocks):
+    """
+    Add vote blocks to the trustchain database of a node and record their votes
+
+    :param node: The node
+    :type node: MockModuleNode
+    :param blocks: The vote blocks
+    :type blocks: [ModuleBlock]
+    :return: Deferred firing when the votes are recorded
+    """
+    for block in blocks:
+        node.trustchain.persistence.add_block(block)
+    return node.overlay.run_persistence(node.overlay._process_vote_blocks, blocks)
+
+
+def count_votes(node):
+    """
+    Count the votes a node recorded
+
+    :param node: The node
+    :type node: MockModuleNode
+    :return: number of votes
+    """
+    return sum(1 for _ in node.overlay.persistence.iter_votes())
+
+
+def is_idle(nodes):
+    """
+    Check whether a reconciliation between nodes is done: no packets are on their way, no reconciliation jobs run and
+    the received vote blocks are processed
+
+    :param nodes: The nodes
+    :type nodes: [MockModuleNode]
+    :return: True if the nodes are idle
+    """
+    for node in nodes:
+        ingestion = node.overlay.vote_ingestion
+        if node.endpoint.in_flight or any(node.overlay.maintenance.is_running(name) for name in SYNC_JOBS) or \
+                ingestion.get_statistics()['queued_blocks'] or ingestion._processing:
+            return False
+    return True
+
+
+@inlineCallbacks
+def run_sync(options, common, differing):
+    """
+    Reconcile two nodes that share common votes and each have differing votes
+
+    :param options: The command line options
+    :param common: Number of votes both nodes have
+    :type common: int
+    :param differing: Number of votes only one of the nodes has, for each node
+    :type differing: int
+    :return: Deferred firing with a dictionary of the results
+    """
+    generator = VoteBlockGenerator(voters=options.voters, modules=common + 2 * differing, seed=options.seed)
+    blocks = generator.create_vote_blocks(common + 2 * differing)
+    common_blocks, first_blocks, second_blocks = blocks[:common], blocks[common:common + differing], \
+        blocks[common + differing:]
+
+    first, second = nodes = [MockModuleNode(LatencyEndpoint(LATENCY, LATENCY)) for _ in range(2)]
+    first.introduce(second)
+    second.introduce(first)
+
+    yield load_votes(first, common_blocks + first_blocks)
+    yield load_votes(second, common_blocks + second_blocks)
+
+    rounds = 0
+    while rounds < options.rounds and not (count_votes(first) == count_votes(second) == len(blocks)):
+        # Reconciliations are an interval apart, which refills the sketch budget of the peer
+        second.overlay.catalog_sync_rate_limiter = CatalogSyncRateLimiter()
+
+        rounds += 1
+        yield first.overlay._sync_catalog()
+        while not is_idle(nodes):
+            yield deferLater(reactor, POLL_INTERVAL, lambda: None)
+
+    results = {
+        'rounds': rounds,
+        'votes': (count_votes(first), count_votes(second)),
+        'bytes': sum(node.endpoint.get_sent()[1] for node in nodes),
+        'sketch_bytes': sum(node.endpoint.get_sent(SKETCH_PREFIX)[1] for node in nodes),
+        'replay_bytes': sum(len(block.pack()) for block in blocks),
+    }
+
+    for node in nodes:
+        node.unload()
+    yield deferLater(reactor, LATENCY, lambda: None)
+
+    returnValue(results)
+
+
+@inlineCallbacks
+def run_reply(options, verified):
+    """
+    Send an empty sketch of the maximum size to a node with votes
+
+    :param options: The command line options
+    :param verified: Whether the sender is a verified peer of the node
+    :type verified: bool
+    :return: Deferred firing with a tuple of the number of packets and bytes the node sent in answer
+    """
+    generator = VoteBlockGenerator(voters=options.voters, modules=options.reply_votes, seed=options.seed)
+    blocks = generator.create_vote_blocks(options.reply_votes)
+
+    sender, node = nodes = [MockModuleNode(LatencyEndpoint(LATENCY, LATENCY)) for _ in range(2)]
+    sender.introduce(node)
+    if verified:
+        node.introduce(sender)
+
+    yield load_votes(node, blocks)
+
+    sketch = InvertibleBloomLookupTable(CATALOG_SYNC_MAX_CELLS)
+    packet = sender.overlay._create_packet(CATALOG_SKETCH_MESSAGE, CatalogSketchPayload(1, sketch.pack()))
+    sender.endpoint.send(node.endpoint.wan_address, packet)
+    yield deferLater(reactor, LATENCY, lambda: None)
+    while not is_idle(nodes):
+        yield deferLater(reactor, POLL_INTERVAL, lambda: None)
+
+    sent = node.endpoint.get_sent()
+
+    for node in nodes:
+        node.unload()
+    yield deferLater(reactor, LATENCY, lambda: None)
+
+    returnValue(sent)
+
+
+@inlineCallbacks
+def main(options):
+    print("%d voters, at most %d reconciliations" % (options.voters, options.rounds))
+    print("%8s %10s %7s %12s %10s %10s %12s %12s" % ("common", "differing", "rounds", "votes", "traffic", "sketches",
+                                                   "per vote", "chain replay"))
+    try:
+        for common, differing in options.cases:
+            results = yield run_sync(options, common, differing)
+            print("%8d %4d+%-5d %7d %5d, %5d %7.0f KB %8.0f%% %10.0f B %9.0f KB"
+                  % (common, differing, differing, results['rounds'], results['votes'][0], results['votes'][1],
+                     results['bytes'] / 1e3, 100.0 * results['sketch_bytes'] / max(1, results['bytes']),
+                     float(results['bytes']) / (2 * differing), results['replay_bytes'] / 1e3))
+
+        print()
+        print("answer to an empty sketch of %d cells from a node with %d votes" % (CATALOG_SYNC_MAX_CELLS,
+                                                                                  options.reply_votes))
+        for label, verified in [("verified peer", True), ("unknown peer", False)]:
+            packets, sent_bytes = yield run_reply(options, verified)
+            print("%-14s %6d packets %7.0f KB" % (label, packets, sent_bytes / 1e3))
+    finally:
+        reactor.stop()
+
+
+def parse_case(value):
+    common, differing = value.split(':')
+    return int(common), int(differing)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Catalog reconciliation traffic")
+    parser.add_argument('--cases', type=parse_case, nargs='+', default=[(2000, 10), (20000, 100), (20000, 1000)],
+                        help="COMMON:DIFFERING pairs, the votes both nodes have and the votes only one node has")
+    parser.add_argument('--voters', type=int, default=200, help="number of voters")
+    parser.add_argument('--rounds', type=int, default=10, help="maximum number of reconciliations")
+    parser.add_argument('--reply-votes', type=int, default=3000, help="number of votes of the node answering the "
+                                                                       "empty sketch")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the block generator")
+
+    reactor.callWhenRunning(main, parser.parse_args())
+    reactor.run()
@@ -0,0 +1,211 @@
+"""
+Simulates crawling peers that create vote blocks at different rates, with the adaptive crawl scheduler at several
+budgets and with the earlier hourly crawl of every peer. Reports the crawl requests sent and the latency from the
+creation of a vote until a crawl receives it. The simulation runs on a simulated clock, so it takes seconds.
+
+Run with: python -m module_loader.test.benchmark_crawl_schedule [--hours N] [--peers N] [--budgets N ...]
+"""
+from __future__ import absolute_import, print_function
+
+# Default library imports
+import argparse
+import random
+
+# Third party imports
+from ipv8.keyvault.crypto import default_eccrypto
+from ipv8.peer import Peer
+from twisted.internet.defer import succeed
+
+# Project imports
+from module_loader.community.module import crawler
+from module_loader.community.module.block import MODULE_BLOCK_TYPE_VOTE
+from module_loader.community.module.crawler import ChainCrawler, CrawlScheduler, CRAWL_SCHEDULE_INTERVAL
+
+# Constants
+HOURLY_INTERVAL = 3600.0  # interval in seconds between two crawls of every peer before the crawl scheduler
+HOURLY_DELAY = 20.0  # delay in seconds of the first hourly crawl
+BLOCK_SIZE = 435  # size in bytes of a packed vote block
+
+
+class SimulatedClock(object):
+    """
+    Clock of the simulation, replaces the time module of the crawler
+    """
+
+    def __init__(self):
+        super(SimulatedClock, self).__init__()
+        self.now = 0.0  # type: float
+
+    def time(self):
+        return self.now
+
+
+class SimulatedBlock(object):
+    """
+    Vote block of a simulated chain, with the time it was created
+    """
+
+    type = MODULE_BLOCK_TYPE_VOTE
+
+    def __init__(self, public_key, sequence_number, creation_time):
+        super(SimulatedBlock, self).__init__()
+        self.public_key = public_key  # type: bytes
+        self.sequence_number = sequence_number  # type: int
+        self.creation_time = creation_time  # type: float
+
+    def pack(self):
+        return b"\x00" * BLOCK_SIZE
+
+    def get_votes(self):
+        return [None]
+
+
+class SimulatedTrustChain(object):
+    """
+    Answers crawl requests from the chains created so far and stores the received blocks, recording the latency of
+    every vote received for the first time
+    """
+
+    def __init__(self, clock, chains):
+        super(SimulatedTrustChain, self).__init__()
+        self.clock = clock
+        self.chains = chains  # type: {bytes: [SimulatedBlock]}
+        self.persistence = self
+        self.stored = {public_key: 0 for public_key in chains}  # type: {bytes: int}
+        self.latencies = []  # type: [float]
+
+    def send_crawl_request(self, peer, public_key, start_seq_num, end_seq_num):
+        blocks = self.chains[public_key][start_seq_num - 1:end_seq_num]
+        for block in blocks:
+            if block.sequence_number == self.stored[public_key] + 1:
+                self.stored[public_key] += 1
+                self.latencies.append(self.clock.now - block.creation_time)
+        return succeed(blocks)
+
+    def get_lowest_sequence_number_unknown(self, public_key):
+        return self.stored[public_key] + 1
+
+    def contains(self, block):
+        return block.sequence_number <= self.stored[block.public_key]
+
+
+class SimulatedStorage(object):
+    """
+    Keeps the crawl cursors of the simulation
+    """
+
+    def __init__(self):
+        super(SimulatedStorage, self).__init__()
+        self.cursors = {}  # type: {bytes: int}
+
+    def get_crawl_cursor(self, public_key):
+        return self.cursors.get(public_key, 0)
+
+    def set_crawl_cursor(self, public_key, sequence_number):
+        self.cursors[public_key] = sequence_number
+
+
+def create_votes(peers, options):
+    """
+    Draw the creation times of the votes of every peer, the first peers vote at the active rate
+
+    :param peers: The simulated peers
+    :type peers: [Peer]
+    :param options: The command line options
+    :return: list of (creation time, public key) tuples, in order of creation
+    """
+    rng = random.Random(options.seed)
+    duration = options.hours * 3600.0
+
+    votes = []
+    for index, peer in enumerate(peers):
+        rate = 1.0 / (options.active_interval if index < options.active_peers else options.quiet_interval)
+        creation_time = rng.expovariate(rate)
+        while creation_time < duration:
+            votes.append((creation_time, peer.public_key.key_to_bin()))
+            creation_time += rng.expovariate(rate)
+    votes.sort()
+    return votes
+
+
+def simulate(peers, votes, options, budget=None):
+    """
+    Crawl the peers while they vote
+
+    :param peers: The simulated peers
+    :type peers: [Peer]
+    :param votes: The (creation time, public key) tuples of the votes, in order of creation
+    :param options: The command line options
+    :param budget: The crawl budget of the scheduler, None to crawl every peer every hour
+    :type budget: int
+    :return: tuple of the number of crawl requests and the sorted latencies of the received votes
+    """
+    clock = SimulatedClock()
+    original_time = crawler.time
+    crawler.time = clock
+    try:
+        chains = {peer.public_key.key_to_bin(): [] for peer in peers}
+        trustchain = SimulatedTrustChain(clock, chains)
+        storage = SimulatedStorage()
+
+        if budget is None:
+            chain_crawler = ChainCrawler(trustchain, lambda function: succeed(function(storage)))
+            interval = HOURLY_INTERVAL
+            clock.now = HOURLY_DELAY
+        else:
+            scheduler = CrawlScheduler(budget)
+            chain_crawler = ChainCrawler(trustchain, lambda function: succeed(function(storage)),
+                                         may_request=scheduler.request)
+            interval = CRAWL_SCHEDULE_INTERVAL
+            clock.now = CRAWL_SCHEDULE_INTERVAL
+
+        index = 0
+        while clock.now < options.hours * 3600.0:
+            while index < len(votes) and votes[index][0] <= clock.now:
+                creation_time, public_key = votes[index]
+                chains[public_key].append(SimulatedBlock(public_key, len(chains[public_key]) + 1, creation_time))
+                index += 1
+
+            if budget is None:
+                for peer in peers:
+                    chain_crawler.crawl(peer)
+            else:
+                for peer in scheduler.select(peers):
+                    chain_crawler.crawl(peer).addCallback(lambda new_votes, peer=peer: scheduler.report(peer,
+                                                                                                        new_votes))
+            clock.now += interval
+
+        return chain_crawler.requests, sorted(trustchain.latencies)
+    finally:
+        crawler.time = original_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl requests and vote latency of the crawl schedules")
+    parser.add_argument('--hours', type=float, default=12, help="simulated time in hours")
+    parser.add_argument('--peers', type=int, default=50, help="number of peers")
+    parser.add_argument('--active-peers', type=int, default=5, help="number of peers voting at the active interval")
+    parser.add_argument('--active-interval', type=float, default=120, help="mean time in seconds between two votes "
+                                                                            "of an active peer")
+    parser.add_argument('--quiet-interval', type=float, default=6 * 3600, help="mean time in seconds between two "
+                                                                                "votes of the other peers")
+    parser.add_argument('--budgets', type=int, nargs='+', default=[1, 2, 5], help="crawl budgets to simulate")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the vote times")
+    options = parser.parse_args()
+
+    peers = [Peer(default_eccrypto.generate_key(u"curve25519")) for _ in range(options.peers)]
+    votes = create_votes(peers, options)
+
+    print("%.0f hours, %d peers of which %d vote every %.0f s and the rest every %.0f s on average, %d votes"
+          % (options.hours, options.peers, options.active_peers, options.active_interval, options.quiet_interval,
+             len(votes)))
+    print("%-18s %9s %9s %14s %9s" % ("schedule", "requests", "received", "mean latency", "p90"))
+    for label, budget in [("hourly", None)] + [("adaptive, %d/min" % budget, budget) for budget in options.budgets]:
+        requests, latencies = simulate(peers, votes, options, budget)
+        mean = sum(latencies) / len(latencies) if latencies else 0.0
+        p90 = latencies[int(len(latencies) * 0.9)] if latencies else 0.0
+        print("%-18s %9d %9d %12.0f s %7.0f s" % (label, requests, len(latencies), mean, p90))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Measures how many received vote blocks per second the ingestion queue processes, one block per transaction against
+batches, for every storage backend. Generated vote blocks are mixed with repeated ones, like crawls return blocks we
+already have, and are received a burst per reactor iteration.
+
+Run with: python -m module_loader.test.benchmark_ingestion [--blocks N] [--repeats SHARE] [--burst N]
+"""
+from __future__ import absolute_import, print_function
+
+# Default library imports
+import argparse
+import time
+
+# Third party imports
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks, returnValue
+from twisted.internet.task import deferLater
+
+# Project imports
+from module_loader.community.module.ingestion import BLOCK_INGESTION_BATCH_SIZE
+from module_loader.community.module.storage import STORAGE_BACKEND_HYBRID, STORAGE_BACKEND_LMDB, \
+    STORAGE_BACKEND_SQLITE
+from module_loader.test.generator import VoteBlockGenerator
+from module_loader.test.mocking import MockModuleNode
+
+# Constants
+POLL_INTERVAL = 0.01  # interval in seconds between checks whether the ingestion queue is drained
+CONFIGURATIONS = [  # (label, storage backend, asynchronous persistence)
+    ("sqlite", STORAGE_BACKEND_SQLITE, False),
+    ("sqlite async", STORAGE_BACKEND_SQLITE, True),
+    ("lmdb", STORAGE_BACKEND_LMDB, False),
+    ("hybrid", STORAGE_BACKEND_HYBRID, False),
+]
+
+
+@inlineCallbacks
+def run_ingestion(blocks, burst, batch_size, backend, async_persistence):
+    """
+    Feed the blocks to a new node, a burst per reactor iteration, until all blocks are processed
+
+    :param blocks: The vote blocks
+    :type blocks: [ModuleBlock]
+    :param burst: Number of blocks received per reactor iteration
+    :type burst: int
+    :param batch_size: Number of blocks processed per transaction
+    :type batch_size: int
+    :param backend: The storage backend
+    :type backend: str
+    :param async_persistence: Whether the node uses the asynchronous persistence layer
+    :type async_persistence: bool
+    :return: Deferred firing with the ingestion statistics and the duration in seconds
+    """
+    node = MockModuleNode(storage_backend=backend, async_persistence=async_persistence)
+    ingestion = node.overlay.vote_ingestion
+    ingestion.batch_size = batch_size
+
+    start = time.time()
+    for offset in range(0, len(blocks), burst):
+        for block in blocks[offset:offset + burst]:
+            node.overlay.received_block(block)
+        yield deferLater(reactor, 0, lambda: None)
+
+    while ingestion.get_statistics()['queued_blocks'] or ingestion._processing:
+        yield deferLater(reactor, POLL_INTERVAL, lambda: None)
+    duration = time.time() - start
+
+    statistics = ingestion.get_statistics()
+    node.unload()
+    yield deferLater(reactor, 0, lambda: None)
+
+    statistics['duration'] = duration
+    returnValue(statistics)
+
+
+@inlineCallbacks
+def main(options):
+    generator = VoteBlockGenerator(voters=options.voters, modules=options.modules, seed=options.seed)
+    blocks = generator.repeat_blocks(generator.create_vote_blocks(options.blocks), options.repeats)
+
+    print("%d vote blocks of %d voters on %d modules with %d%% repeated, %d blocks per reactor iteration"
+          % (options.blocks, options.voters, options.modules, options.repeats * 100, options.burst))
+    print("%-14s %12s %12s %14s" % ("backend", "per block", "batched", "batched wall"))
+    try:
+        for label, backend, async_persistence in CONFIGURATIONS:
+            try:
+                single = yield run_ingestion(blocks, options.burst, 1, backend, async_persistence)
+                batched = yield run_ingestion(blocks, options.burst, BLOCK_INGESTION_BATCH_SIZE, backend,
+                                              async_persistence)
+            except ImportError as e:
+                print("%-14s skipped: %s" % (label, e))
+                continue
+            print("%-14s %10.0f/s %10.0f/s %12.0f/s"
+                  % (label, single['blocks_per_second'], batched['blocks_per_second'],
+                     batched['processed_blocks'] / batched['duration']))
+    finally:
+        reactor.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Vote block ingestion throughput")
+    parser.add_argument('--blocks', type=int, default=20000, help="number of vote blocks")
+    parser.add_argument('--repeats', type=float, default=0.2, help="repeated blocks as a share of the blocks")
+    parser.add_argument('--burst', type=int, default=100, help="number of blocks received per reactor iteration")
+    parser.add_argument('--voters', type=int, default=500, help="number of voters")
+    parser.add_argument('--modules', type=int, default=2000, help="number of modules")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the block generator")
+
+    reactor.callWhenRunning(main, parser.parse_args())
+    reactor.run()
@@ -0,0 +1,128 @@
+"""
+Measures how a new module spreads through a network of module communities in this process. One node creates a module,
+which it announces and votes on. Every other node knows a number of random peers and every hop has a random latency.
+Reports the share of the nodes the announcement reached, the share that added the module to the catalog because the
+vote block reached them, the times since the module was created and the announcement traffic.
+
+Run with: python -m module_loader.test.benchmark_propagation [--nodes N ...] [--degree N] [--fanout N] [--ttl N]
+"""
+from __future__ import absolute_import, print_function
+
+# Default library imports
+import argparse
+import random
+import time
+
+# Third party imports
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks, returnValue
+from twisted.internet.task import deferLater
+
+# Project imports
+from module_loader.community.module import community
+from module_loader.community.module.community import MODULE_ANNOUNCEMENT_MESSAGE
+from module_loader.community.module.core.module_identifier import ModuleIdentifier
+from module_loader.test.mocking import LatencyEndpoint, MockModuleNode
+
+# Constants
+POLL_INTERVAL = 0.01  # interval in seconds between checks which nodes know the module
+DURATION = 3.0  # time in seconds the module is given to spread
+MIN_LATENCY = 0.02  # minimum latency in seconds of a hop
+MAX_LATENCY = 0.08  # maximum latency in seconds of a hop
+TEST_INFO_HASH = "0000000000000000000000000000000000000000"  # info hash of the module create_module_test creates
+ANNOUNCEMENT_PREFIX = b"\x00" + community.ModuleCommunity.version + community.ModuleCommunity.master_peer.mid + \
+    chr(MODULE_ANNOUNCEMENT_MESSAGE)  # start of the packets of module announcements
+
+
+@inlineCallbacks
+def run_propagation(size, options):
+    """
+    Create a network of nodes and let one of them create a module
+
+    :param size: Number of nodes
+    :type size: int
+    :param options: The command line options
+    :return: Deferred firing with a tuple of the announcement arrival times, the catalog arrival times and the
+    number and size in bytes of the announcement messages
+    """
+    nodes = [MockModuleNode(LatencyEndpoint(MIN_LATENCY, MAX_LATENCY)) for _ in range(size)]
+
+    for node in nodes:
+        for other in random.sample([other for other in nodes if other is not node], options.degree):
+            node.introduce(other)
+
+    creator = nodes[0]
+    module_identifier = ModuleIdentifier(creator.my_peer.public_key.key_to_bin(), TEST_INFO_HASH)
+    key = (community.get_creator_digest(module_identifier.creator), module_identifier.content_hash)
+
+    announced = {}
+    cataloged = {}
+    start = time.time()
+    creator.overlay.create_module_test()
+
+    while time.time() - start < DURATION:
+        yield deferLater(reactor, POLL_INTERVAL, lambda: None)
+        now = time.time()
+        for node in nodes[1:]:
+            if node not in announced and key in node.overlay.announced_modules:
+                announced[node] = now - start
+            if node not in cataloged and node.overlay.persistence.has_module_in_catalog(module_identifier):
+                cataloged[node] = now - start
+
+    messages = sum(node.endpoint.get_sent(ANNOUNCEMENT_PREFIX)[0] for node in nodes)
+    message_bytes = sum(node.endpoint.get_sent(ANNOUNCEMENT_PREFIX)[1] for node in nodes)
+
+    for node in nodes:
+        node.unload()
+    yield deferLater(reactor, MAX_LATENCY, lambda: None)
+
+    returnValue((sorted(announced.values()), sorted(cataloged.values()), messages, message_bytes))
+
+
+def describe(times, size):
+    """
+    Describe arrival times
+
+    :param times: The sorted arrival times in seconds
+    :type times: [float]
+    :param size: Number of nodes
+    :type size: int
+    :return: the share of the other nodes reached and the mean and maximum time
+    """
+    if not times:
+        return "%8.0f%% %10s %10s" % (0, "-", "-")
+
+    return "%8.0f%% %7.0f ms %7.0f ms" % (100.0 * len(times) / (size - 1), 1000 * sum(times) / len(times),
+                                         1000 * times[-1])
+
+
+@inlineCallbacks
+def main(options):
+    community.ANNOUNCEMENT_FANOUT = options.fanout
+    community.ANNOUNCEMENT_TTL = options.ttl
+    random.seed(options.seed)
+
+    print("degree %d, fanout %d, TTL %d, %.0f-%.0f ms per hop"
+          % (options.degree, options.fanout, options.ttl, MIN_LATENCY * 1000, MAX_LATENCY * 1000))
+    print("%6s %9s %10s %10s %9s %10s %10s %10s %10s" % ("nodes", "announced", "mean", "max", "cataloged", "mean",
+                                                         "max", "messages", "bytes"))
+    try:
+        for size in options.nodes:
+            announced, cataloged, messages, message_bytes = yield run_propagation(size, options)
+            print("%6d %s %s %10d %10d" % (size, describe(announced, size), describe(cataloged, size), messages,
+                                           message_bytes))
+    finally:
+        reactor.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Propagation of a new module")
+    parser.add_argument('--nodes', type=int, nargs='+', default=[100, 200], help="numbers of nodes")
+    parser.add_argument('--degree', type=int, default=20, help="number of peers every node knows")
+    parser.add_argument('--fanout', type=int, default=community.ANNOUNCEMENT_FANOUT,
+                        help="number of peers an announcement is sent to by each node")
+    parser.add_argument('--ttl', type=int, default=community.ANNOUNCEMENT_TTL, help="hops an announcement travels")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the network and the latencies")
+
+    reactor.callWhenRunning(main, parser.parse_args())
+    reactor.run()
@@ -0,0 +1,97 @@
+"""
+Measures how long a flood of received vote blocks blocks the reactor, with the persistence layer on the reactor thread
+and on its own database thread.
+
+Run with: python -m module_loader.test.benchmark_reactor_lag [--blocks N] [--rate N]
+"""
+from __future__ import absolute_import, print_function
+
+# Default library imports
+import argparse
+import time
+
+# Third party imports
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks, returnValue
+from twisted.internet.task import LoopingCall, deferLater
+
+# Project imports
+from module_loader.community.module.lag_monitor import ReactorLagMonitor
+from module_loader.test.generator import VoteBlockGenerator
+from module_loader.test.mocking import MockModuleNode
+
+# Constants
+SAMPLE_INTERVAL = 0.01  # interval in seconds between reactor lag samples
+FEED_INTERVAL = 0.01  # interval in seconds between two bursts of received blocks
+
+
+@inlineCallbacks
+def run_flood(blocks, rate, async_persistence):
+    """
+    Feed the blocks to a new node at the given rate and measure the reactor lag until all blocks are processed
+
+    :param blocks: The vote blocks
+    :type blocks: [ModuleBlock]
+    :param rate: Number of blocks received per second
+    :type rate: int
+    :param async_persistence: Whether the node uses the asynchronous persistence layer
+    :type async_persistence: bool
+    :return: Deferred firing with the lag statistics, the number of processed blocks and the duration in seconds
+    """
+    node = MockModuleNode(async_persistence=async_persistence)
+    monitor = ReactorLagMonitor(SAMPLE_INTERVAL)
+    sample_task = LoopingCall(monitor.sample)
+    sample_task.start(SAMPLE_INTERVAL)
+
+    burst = max(1, int(rate * FEED_INTERVAL))
+    start = time.time()
+    for offset in range(0, len(blocks), burst):
+        for block in blocks[offset:offset + burst]:
+            node.overlay.received_block(block)
+        yield deferLater(reactor, FEED_INTERVAL, lambda: None)
+
+    ingestion = node.overlay.vote_ingestion
+    while ingestion.get_statistics()['queued_blocks'] or ingestion._processing:
+        yield deferLater(reactor, SAMPLE_INTERVAL, lambda: None)
+    duration = time.time() - start
+
+    sample_task.stop()
+    processed = ingestion.get_statistics()['processed_blocks']
+    node.unload()
+    yield deferLater(reactor, 0, lambda: None)
+
+    statistics = monitor.get_statistics()
+    statistics['processed_blocks'] = processed
+    statistics['duration'] = duration
+    returnValue(statistics)
+
+
+@inlineCallbacks
+def main(options):
+    generator = VoteBlockGenerator(voters=options.voters, modules=options.modules, seed=options.seed)
+    blocks = generator.create_vote_blocks(options.blocks)
+
+    print("%d vote blocks of %d voters on %d modules, received at %d blocks/s"
+          % (len(blocks), options.voters, options.modules, options.rate))
+    print("%-14s %10s %10s %12s %10s" % ("persistence", "max lag", "avg lag", "blocks/s", "samples"))
+    try:
+        for async_persistence in (False, True):
+            statistics = yield run_flood(blocks, options.rate, async_persistence)
+            print("%-14s %8.1f ms %7.2f ms %12.0f %10d"
+                  % ("async" if async_persistence else "reactor", statistics['max_lag'] * 1000,
+                     statistics['average_lag'] * 1000, statistics['processed_blocks'] / statistics['duration'],
+                     statistics['samples']))
+    finally:
+        reactor.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Reactor lag under a synthetic vote flood")
+    parser.add_argument('--blocks', type=int, default=20000, help="number of vote blocks")
+    parser.add_argument('--rate', type=int, default=5000, help="number of blocks received per second")
+    parser.add_argument('--voters', type=int, default=500, help="number of voters")
+    parser.add_argument('--modules', type=int, default=2000, help="number of modules")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the block generator")
+
+    reactor.callWhenRunning(main, parser.parse_args())
+    reactor.run()
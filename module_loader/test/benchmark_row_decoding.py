@@ -0,0 +1,87 @@
+"""
+Measures the time to decode a catalog row into a module: the catalog query with row factories and shared identifiers
+against the earlier query that joined the modules table and decoded the key columns of every row.
+
+Run with: python -m module_loader.test.benchmark_row_decoding [--modules N] [--repeat N]
+"""
+from __future__ import absolute_import, print_function
+
+# Default library imports
+import argparse
+import shutil
+import tempfile
+import time
+
+# Project imports
+from module_loader.community.module.core.module import Module
+from module_loader.community.module.core.module_identifier import ModuleIdentifier
+from module_loader.community.module.module_database import ModuleDatabase
+
+# Constants
+DB_NAME = u"modules"  # Name of the database of the benchmark
+CREATORS = 10  # Number of module creators
+
+# The catalog query before row factories, it joined the modules table for the key columns of every module
+JOINED_CATALOG_QUERY = "SELECT m.public_key, m.info_hash, c.name, c.votes FROM module_catalog c " \
+                       "JOIN modules m ON m.id = c.module_id ORDER BY c.module_id ASC LIMIT ? OFFSET ?;"
+
+
+def decode_joined_rows(database):
+    """
+    Read the catalog the way it was read before row factories, decoding plain tuples into new identifiers
+
+    :param database: The database
+    :type database: ModuleDatabase
+    :return: list of modules
+    """
+    return [Module(ModuleIdentifier(bytes(row[0]), str(row[1])), str(row[2]), int(row[3]))
+            for row in database._iter_rows(JOINED_CATALOG_QUERY, (-1, 0))]
+
+
+def best_time(function, repeat):
+    """
+    Run a function a number of times
+
+    :param function: The function
+    :param repeat: Number of runs
+    :type repeat: int
+    :return: the shortest run time in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog row decoding time")
+    parser.add_argument('--modules', type=int, default=100000, help="number of modules in the catalog")
+    parser.add_argument('--repeat', type=int, default=5, help="number of runs, the best one is reported")
+    options = parser.parse_args()
+
+    working_directory = tempfile.mkdtemp()
+    try:
+        database = ModuleDatabase(working_directory, DB_NAME)
+        try:
+            creators = [b"creator-public-key-%d" % creator for creator in range(CREATORS)]
+            with database.transaction():
+                for index in range(options.modules):
+                    module_identifier = ModuleIdentifier(creators[index % CREATORS], "%040x" % index)
+                    database.add_module_to_catalog(Module(module_identifier, "module %d" % index))
+
+            assert decode_joined_rows(database) == database.get_modules_from_catalog()
+
+            print("%d modules, best of %d runs" % (options.modules, options.repeat))
+            for label, function in [("joined tuples", lambda: decode_joined_rows(database)),
+                                    ("row factory", database.get_modules_from_catalog)]:
+                print("%-14s %6.2f us/row" % (label, best_time(function, options.repeat) * 1e6 / options.modules))
+        finally:
+            database.close()
+    finally:
+        shutil.rmtree(working_directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Measures the size of a catalog snapshot and the time to export it, import it into an empty storage and import it again
+into the populated storage, for every storage backend.
+
+Run with: python -m module_loader.test.benchmark_snapshot [--votes N] [--modules N] [--voters N]
+"""
+from __future__ import absolute_import, print_function
+
+# Default library imports
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+# Project imports
+from module_loader.community.module.core.module import Module
+from module_loader.community.module.core.module_identifier import ModuleIdentifier
+from module_loader.community.module.storage import create_module_storage, STORAGE_BACKENDS
+
+# Constants
+DB_NAME = u"modules"  # Name of the storages of the benchmark
+CREATORS = 10  # Number of module creators
+START_TIMESTAMP = 1500000000000  # Block timestamp in milliseconds of the first vote
+VOTE_PERIOD = 30 * 24 * 3600 * 1000  # Period in milliseconds the votes are spread over
+
+
+def populate(storage, modules, voters, votes, seed):
+    """
+    Add the modules to the catalog and let the voters vote on random modules
+
+    :param storage: The storage to populate
+    :type storage: ModuleStorage
+    :param modules: Number of modules
+    :type modules: int
+    :param voters: Number of voters
+    :type voters: int
+    :param votes: Number of votes, at most modules * voters
+    :type votes: int
+    :param seed: Seed of the random generator
+    :type seed: int
+    :return: None
+    """
+    rng = random.Random(seed)
+    creators = [b"creator-public-key-%d" % creator for creator in range(CREATORS)]
+    identifiers = [ModuleIdentifier(creators[index % CREATORS], "%040x" % index) for index in range(modules)]
+    voter_keys = [b"voter-public-key-%d" % voter for voter in range(voters)]
+
+    with storage.transaction():
+        for index, module_identifier in enumerate(identifiers):
+            storage.add_module_to_catalog(Module(module_identifier, "module %d" % index))
+        for index in range(modules // 10):
+            storage.add_module_to_cache(identifiers[index])
+
+    # Every voter votes on a random sample of the modules in a random order over a month, one transaction per voter
+    per_voter, remainder = divmod(votes, voters)
+    for voter, voter_key in enumerate(voter_keys):
+        count = per_voter + (1 if voter < remainder else 0)
+        timestamps = sorted(rng.randrange(START_TIMESTAMP, START_TIMESTAMP + VOTE_PERIOD) for _ in range(count))
+        with storage.transaction():
+            for sequence_number, (index, timestamp) in enumerate(zip(rng.sample(range(modules), count), timestamps)):
+                storage.record_vote(voter_key, identifiers[index], timestamp, sequence_number + 1)
+    storage.flush()
+
+
+def measure(backend, options):
+    """
+    Export a populated storage of the backend and import the snapshot twice
+
+    :param backend: One of STORAGE_BACKENDS
+    :type backend: str
+    :param options: The command line options
+    :return: tuple of the snapshot size in bytes and the export, import and re-import times in seconds
+    """
+    working_directory = tempfile.mkdtemp()
+    try:
+        file_path = os.path.join(working_directory, "catalog.snapshot")
+
+        source = create_module_storage(backend, os.path.join(working_directory, "source"), DB_NAME)
+        try:
+            populate(source, options.modules, options.voters, options.votes, options.seed)
+
+            start = time.time()
+            source.export_snapshot(file_path)
+            export_time = time.time() - start
+        finally:
+            source.close()
+
+        target = create_module_storage(backend, os.path.join(working_directory, "target"), DB_NAME)
+        try:
+            start = time.time()
+            target.import_snapshot(file_path)
+            import_time = time.time() - start
+
+            start = time.time()
+            target.import_snapshot(file_path)
+            reimport_time = time.time() - start
+        finally:
+            target.close()
+
+        return os.path.getsize(file_path), export_time, import_time, reimport_time
+    finally:
+        shutil.rmtree(working_directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog snapshot size and export and import times")
+    parser.add_argument('--votes', type=int, default=1000000, help="number of votes")
+    parser.add_argument('--modules', type=int, default=1000, help="number of modules")
+    parser.add_argument('--voters', type=int, default=1000, help="number of voters")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the random votes")
+    parser.add_argument('--backends', nargs='+', default=STORAGE_BACKENDS, choices=STORAGE_BACKENDS,
+                        help="storage backends to measure")
+    options = parser.parse_args()
+
+    if options.votes > options.modules * options.voters:
+        parser.error("a voter votes on a module at most once, so at most modules * voters votes")
+
+    print("%d modules, %d voters, %d votes" % (options.modules, options.voters, options.votes))
+    print("%-10s %10s %10s %10s %10s" % ("backend", "size", "export", "import", "re-import"))
+    for backend in options.backends:
+        try:
+            size, export_time, import_time, reimport_time = measure(backend, options)
+        except ImportError as e:
+            print("%-10s skipped: %s" % (backend, e))
+            continue
+        print("%-10s %7.1f MB %8.2f s %8.2f s %8.2f s"
+              % (backend, size / 1e6, export_time, import_time, reimport_time))
+
+
+if __name__ == '__main__':
+    main()
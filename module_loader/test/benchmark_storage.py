@@ -0,0 +1,109 @@
+"""
+Measures the same storage operations on every storage backend: recording votes with a commit per vote and in one
+transaction, checking votes, reading the catalog and opening a populated storage.
+
+Run with: python -m module_loader.test.benchmark_storage [--votes N] [--modules N] [--backends B ...]
+"""
+from __future__ import absolute_import, print_function
+
+# Default library imports
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+# Project imports
+from module_loader.community.module.core.module import Module
+from module_loader.community.module.core.module_identifier import ModuleIdentifier
+from module_loader.community.module.storage import create_module_storage, STORAGE_BACKENDS
+
+# Constants
+DB_NAME = u"modules"  # Name of the storages of the benchmark
+CREATORS = 10  # Number of module creators
+VOTES_PER_VOTER = 100  # Number of votes of every voter
+
+
+def measure(backend, options):
+    """
+    Run the operations on a new storage of the backend
+
+    :param backend: One of STORAGE_BACKENDS
+    :type backend: str
+    :param options: The command line options
+    :return: dictionary of the operations and their rate per second, or the open time in seconds
+    """
+    creators = [b"creator-public-key-%d" % creator for creator in range(CREATORS)]
+    identifiers = [ModuleIdentifier(creators[index % CREATORS], "%040x" % index) for index in range(options.modules)]
+    votes = [(b"voter-public-key-%d" % (index // VOTES_PER_VOTER), identifiers[index % options.modules])
+             for index in range(options.votes)]
+    committed_votes = votes[:options.committed_votes]
+    batched_votes = votes[options.committed_votes:]
+
+    working_directory = tempfile.mkdtemp()
+    try:
+        results = {}
+        storage = create_module_storage(backend, working_directory, DB_NAME)
+        try:
+            with storage.transaction():
+                for index, module_identifier in enumerate(identifiers):
+                    storage.add_module_to_catalog(Module(module_identifier, "module %d" % index))
+
+            start = time.time()
+            for voter, module_identifier in committed_votes:
+                storage.record_vote(voter, module_identifier, 1000, 1)
+            results['committed vote'] = len(committed_votes) / (time.time() - start)
+
+            start = time.time()
+            with storage.transaction():
+                for voter, module_identifier in batched_votes:
+                    storage.record_vote(voter, module_identifier, 1000, 1)
+            results['batched vote'] = len(batched_votes) / (time.time() - start)
+
+            start = time.time()
+            for voter, module_identifier in votes:
+                storage.did_vote(voter, module_identifier)
+            results['did_vote'] = len(votes) / (time.time() - start)
+
+            start = time.time()
+            storage.get_modules_from_catalog()
+            results['catalog row'] = len(identifiers) / (time.time() - start)
+        finally:
+            storage.close()
+
+        start = time.time()
+        storage = create_module_storage(backend, working_directory, DB_NAME)
+        results['open'] = time.time() - start
+        storage.close()
+
+        return results
+    finally:
+        shutil.rmtree(working_directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage backend operations")
+    parser.add_argument('--votes', type=int, default=100000, help="number of votes")
+    parser.add_argument('--committed-votes', type=int, default=1000, help="number of votes committed one by one")
+    parser.add_argument('--modules', type=int, default=10000, help="number of modules")
+    parser.add_argument('--backends', nargs='+', default=STORAGE_BACKENDS, choices=STORAGE_BACKENDS,
+                        help="storage backends to measure")
+    options = parser.parse_args()
+
+    print("%d modules, %d votes of which %d committed one by one"
+          % (options.modules, options.votes, options.committed_votes))
+    print("%-10s %16s %14s %12s %14s %10s"
+          % ("backend", "committed vote/s", "batched vote/s", "did_vote/s", "catalog row/s", "open"))
+    for backend in options.backends:
+        try:
+            results = measure(backend, options)
+        except ImportError as e:
+            print("%-10s skipped: %s" % (backend, e))
+            continue
+        print("%-10s %16.0f %14.0f %12.0f %14.0f %8.2f s"
+              % (backend, results['committed vote'], results['batched vote'], results['did_vote'],
+                 results['catalog row'], results['open']))
+
+
+if __name__ == '__main__':
+    main()
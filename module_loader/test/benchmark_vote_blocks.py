@@ -0,0 +1,135 @@
+"""
+Measures the size of vote blocks and the time to sign them and to check their signatures: a single vote block per vote
+against batch vote blocks, and the full vote encoding against the compact one. Signing includes creating the block and
+appending it to the chain of the voter.
+
+Run with: python -m module_loader.test.benchmark_vote_blocks [--votes N ...] [--encoding-votes N] [--seed N]
+"""
+from __future__ import absolute_import, print_function
+
+# Default library imports
+import argparse
+import time
+
+# Third party imports
+from ipv8.keyvault.crypto import default_eccrypto
+
+# Project imports
+from module_loader.community.module.block import MODULE_VOTE_BATCH_MAX_SIZE, MODULE_VOTE_VERSION_COMPACT, \
+    MODULE_VOTE_VERSION_FULL
+from module_loader.test.generator import VoteBlockGenerator
+
+# Constants
+BATCH_VOTERS = 1  # Number of voters of the batch comparison, a curator voting on many modules
+BATCH_CREATORS = 10  # Number of module creators of the batch comparison
+
+
+def create_blocks(generator, votes, batch_size, version=MODULE_VOTE_VERSION_FULL):
+    """
+    Create the blocks of a number of votes
+
+    :param generator: The block generator
+    :type generator: VoteBlockGenerator
+    :param votes: Number of votes
+    :type votes: int
+    :param batch_size: Number of votes per block
+    :type batch_size: int
+    :param version: The vote encoding
+    :type version: int
+    :return: tuple of the blocks and the time in seconds to sign them
+    """
+    start = time.time()
+    blocks = generator.create_vote_blocks((votes + batch_size - 1) // batch_size, batch_size, version)
+    return blocks, time.time() - start
+
+
+def verify_blocks(blocks):
+    """
+    Check the signatures of blocks the way trustchain checks them
+
+    :param blocks: The blocks
+    :type blocks: [ModuleBlock]
+    :return: time in seconds to check the signatures
+    """
+    start = time.time()
+    for block in blocks:
+        key = default_eccrypto.key_from_public_bin(block.public_key)
+        assert default_eccrypto.is_valid_signature(key, block.pack(signature=False), block.signature)
+    return time.time() - start
+
+
+def count_votes(blocks):
+    return sum(len(block.get_votes()) for block in blocks)
+
+
+def count_bytes(blocks):
+    return sum(len(block.pack()) for block in blocks)
+
+
+def compare_batches(options):
+    """
+    Sign the votes of a curator in single vote blocks and in batch vote blocks
+
+    :param options: The command line options
+    :return: None
+    """
+    print("%d creators, one voter" % BATCH_CREATORS)
+    print("%6s %6s %-8s %10s %9s %9s" % ("votes", "blocks", "", "bytes", "sign", "verify"))
+    for votes in options.votes:
+        for label, batch_size in [("single", 1), ("batch", MODULE_VOTE_BATCH_MAX_SIZE)]:
+            generator = VoteBlockGenerator(voters=BATCH_VOTERS, creators=BATCH_CREATORS, modules=votes,
+                                           seed=options.seed)
+            blocks, sign_time = create_blocks(generator, votes, batch_size)
+            verify_time = verify_blocks(blocks)
+            assert count_votes(blocks) == votes
+
+            print("%6d %6d %-8s %7.1f KB %6.0f ms %6.0f ms" % (votes, len(blocks), label, count_bytes(blocks) / 1e3,
+                                                              sign_time * 1000, verify_time * 1000))
+
+
+def compare_encodings(options):
+    """
+    Sign the same votes of many voters in the full and the compact encoding, in single and in batch vote blocks
+
+    :param options: The command line options
+    :return: None
+    """
+    votes = options.encoding_votes
+    batch_size = max(1, votes // options.voters)
+
+    print("%d votes by %d voters on modules of %d creators" % (votes, options.voters, options.creators))
+    print("%-8s %7s %15s %15s %6s" % ("", "blocks", "full", "compact", "saved"))
+    for label, size in [("single", 1), ("batch", batch_size)]:
+        per_vote = []
+        for version in (MODULE_VOTE_VERSION_FULL, MODULE_VOTE_VERSION_COMPACT):
+            # The same seed draws the same votes in both encodings
+            generator = VoteBlockGenerator(voters=options.voters, creators=options.creators, modules=options.modules,
+                                           seed=options.seed)
+            blocks, _ = create_blocks(generator, votes, size, version)
+            per_vote.append(float(count_bytes(blocks)) / count_votes(blocks))
+
+        voted_modules = sum(1 for module_votes in generator._module_votes if module_votes)
+        print("%-8s %7d %8.0f B/vote %8.0f B/vote %6.0f%%" % (label, len(blocks), per_vote[0], per_vote[1],
+                                                            100 * (1 - per_vote[1] / per_vote[0])))
+    print("%d modules voted on" % voted_modules)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Size, signing and verification time of vote blocks")
+    parser.add_argument('--votes', type=int, nargs='+', default=[200, 1000], help="numbers of votes of the curator")
+    parser.add_argument('--encoding-votes', type=int, default=12620, help="number of votes of the encoding "
+                                                                           "comparison")
+    parser.add_argument('--voters', type=int, default=300, help="number of voters of the encoding comparison")
+    parser.add_argument('--creators', type=int, default=50, help="number of module creators of the encoding "
+                                                                 "comparison")
+    parser.add_argument('--modules', type=int, default=2000, help="number of modules of the encoding comparison")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the block generator")
+    options = parser.parse_args()
+
+    compare_batches(options)
+    print()
+    compare_encodings(options)
+
+
+if __name__ == '__main__':
+    main()
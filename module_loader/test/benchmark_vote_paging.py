@@ -0,0 +1,121 @@
+"""
+Measures the time to page through all votes in the SQLite database: the pages that start with a search of the primary
+key after the last vote of the previous page, against the earlier pages that skipped the votes before them with an
+offset.
+
+Run with: python -m module_loader.test.benchmark_vote_paging [--votes N ...] [--page-size N]
+"""
+from __future__ import absolute_import, print_function
+
+# Default library imports
+import argparse
+import shutil
+import tempfile
+import time
+
+# Project imports
+from module_loader.community.module.core.module import Module
+from module_loader.community.module.core.module_identifier import ModuleIdentifier
+from module_loader.community.module.module_database import ModuleDatabase
+from module_loader.community.module.reconciliation import CATALOG_SYNC_PAGE_SIZE
+
+# Constants
+DB_NAME = u"modules"  # Name of the database of the benchmark
+CREATORS = 10  # Number of module creators
+MODULES = 10000  # Number of modules
+VOTES_PER_VOTER = 100  # Number of votes of every voter
+
+# The votes query before paging by key, a page skipped all votes before it
+OFFSET_VOTES_QUERY = "SELECT v.public_key, mv.module_id FROM module_votes mv JOIN voters v ON v.id = mv.voter_id " \
+                     "LIMIT ? OFFSET ?;"
+
+
+def populate(database, votes):
+    """
+    Add the modules to the catalog and record the votes
+
+    :param database: The database
+    :type database: ModuleDatabase
+    :param votes: Number of votes
+    :type votes: int
+    :return: None
+    """
+    creators = [b"creator-public-key-%d" % creator for creator in range(CREATORS)]
+    identifiers = [ModuleIdentifier(creators[index % CREATORS], "%040x" % index) for index in range(MODULES)]
+
+    with database.transaction():
+        for index, module_identifier in enumerate(identifiers):
+            database.add_module_to_catalog(Module(module_identifier, "module %d" % index))
+        for index in range(votes):
+            voter = b"voter-public-key-%d" % (index // VOTES_PER_VOTER)
+            database.record_vote(voter, identifiers[index % MODULES], 1000, index % VOTES_PER_VOTER + 1)
+
+
+def page_by_offset(database, page_size):
+    """
+    Read all votes the way they were read before paging by key
+
+    :param database: The database
+    :type database: ModuleDatabase
+    :param page_size: Number of votes per page
+    :type page_size: int
+    :return: number of votes read
+    """
+    count = 0
+    while True:
+        page = list(database._iter_rows(OFFSET_VOTES_QUERY, (page_size, count)))
+        count += len(page)
+        if len(page) < page_size:
+            return count
+
+
+def page_by_key(database, page_size):
+    """
+    Read all votes a page at a time, every page after the last vote of the previous page
+
+    :param database: The database
+    :type database: ModuleDatabase
+    :param page_size: Number of votes per page
+    :type page_size: int
+    :return: number of votes read
+    """
+    count = 0
+    after = None
+    while True:
+        page = list(database.iter_votes(page_size, after))
+        count += len(page)
+        if len(page) < page_size:
+            return count
+        after = page[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to page through all votes")
+    parser.add_argument('--votes', type=int, nargs='+', default=[100000, 400000], help="numbers of votes")
+    parser.add_argument('--page-size', type=int, default=CATALOG_SYNC_PAGE_SIZE, help="number of votes per page")
+    options = parser.parse_args()
+
+    print("%d votes per page" % options.page_size)
+    print("%10s %10s %10s" % ("votes", "offset", "by key"))
+    for votes in options.votes:
+        working_directory = tempfile.mkdtemp()
+        try:
+            database = ModuleDatabase(working_directory, DB_NAME)
+            try:
+                populate(database, votes)
+
+                times = []
+                for function in (page_by_offset, page_by_key):
+                    start = time.time()
+                    assert function(database, options.page_size) == votes
+                    times.append(time.time() - start)
+
+                print("%10d %8.2f s %8.2f s" % (votes, times[0], times[1]))
+            finally:
+                database.close()
+        finally:
+            shutil.rmtree(working_directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+from __future__ import absolute_import
+
+# Default library imports
+import bisect
+import random
+
+# Third party imports
+from ipv8.attestation.trustchain.database import TrustChainDB
+from ipv8.keyvault.crypto import default_eccrypto
+
+# Project imports
+from module_loader.community.module.block import ModuleBlock, MODULE_BLOCK_TYPE_VOTE, MODULE_BLOCK_TYPE_VOTE_BATCH, \
+    MODULE_BLOCK_TYPES_VOTE, MODULE_VOTE_VERSION_FULL
+from module_loader.community.module.core.module import Module
+from module_loader.community.module.core.module_identifier import ModuleIdentifier
+
+# Constants
+MODULE_NAMES = ["wallet", "chat", "market", "tunnel", "search", "video", "backup", "notes"]  # parts of module names
+
+
+class VoteBlockGenerator(object):
+    """
+    Generates signed vote blocks of synthetic voters on synthetic modules. The popularity of the modules follows a Zipf
+    distribution and a voter votes on a module at most once. The chains of the voters are kept in a trustchain database
+    of the generator, so the blocks link up like real chains.
+    """
+
+    def __init__(self, voters=100, creators=10, modules=1000, zipf_exponent=1.0, seed=None):
+        """
+        Create the voters, creators and modules
+
+        :param voters: Number of voters
+        :type voters: int
+        :param creators: Number of module creators
+        :type creators: int
+        :param modules: Number of modules
+        :type modules: int
+        :param zipf_exponent: Exponent of the popularity distribution, 0 for equally popular modules
+        :type zipf_exponent: float
+        :param seed: Seed of the random generator, or None for a random seed
+        :type seed: int
+        """
+        super(VoteBlockGenerator, self).__init__()
+
+        self.random = random.Random(seed)
+
+        self.voter_keys = [default_eccrypto.generate_key(u"curve25519") for _ in range(voters)]
+        self.creator_keys = [default_eccrypto.generate_key(u"curve25519") for _ in range(creators)]
+
+        self.modules = [Module(ModuleIdentifier(self.random.choice(self.creator_keys).pub().key_to_bin(),
+                                                "%040x" % self.random.getrandbits(160)),
+                               "%s-%s-%d.%d" % (self.random.choice(MODULE_NAMES), self.random.choice(MODULE_NAMES),
+                                                self.random.randint(1, 9), self.random.randint(0, 20)))
+                        for _ in range(modules)]
+
+        # Cumulative popularity of the modules, for weighted sampling
+        self._weights = []
+        total = 0.0
+        for rank in range(1, modules + 1):
+            total += 1.0 / rank ** zipf_exponent
+            self._weights.append(total)
+
+        # Modules each voter voted on, and the number of votes on each module
+        self._votes = [set() for _ in range(voters)]
+        self._module_votes = [0] * modules
+
+        self.database = TrustChainDB(u":memory:", u"generator")
+        for block_type in MODULE_BLOCK_TYPES_VOTE:
+            self.database.block_types[block_type] = ModuleBlock
+
+    def _pick_module(self, voter):
+        """
+        Pick a module the voter didn't vote on yet, popular modules are picked more often
+
+        :param voter: Index of the voter
+        :type voter: int
+        :return: index of the module, or None if the voter voted on all modules
+        """
+        votes = self._votes[voter]
+        if len(votes) == len(self.modules):
+            return None
+
+        while True:
+            index = bisect.bisect_left(self._weights, self.random.random() * self._weights[-1])
+            if index not in votes:
+                votes.add(index)
+                return index
+
+    def _sign(self, voter, block_type, transaction):
+        """
+        Sign a block of a voter and add it to the chain of the voter
+
+        :param voter: Index of the voter
+        :type voter: int
+        :param block_type: Type of the block
+        :type block_type: str
+        :param transaction: The transaction
+        :type transaction: dict
+        :return: the signed block
+        """
+        key = self.voter_keys[voter]
+        block = ModuleBlock.create(block_type, transaction, self.database, key.pub().key_to_bin())
+        block.sign(key)
+        self.database.add_block(block)
+        return block
+
+    def create_vote_blocks(self, count, batch_size=1, version=MODULE_VOTE_VERSION_FULL):
+        """
+        Create vote blocks of random voters
+
+        :param count: Number of blocks
+        :type count: int
+        :param batch_size: Number of votes per block, 1 for single vote blocks and more for batch vote blocks
+        :type batch_size: int
+        :param version: The vote encoding
+        :type version: int
+        :return: list of the signed blocks, in order of creation
+        """
+        blocks = []
+        while len(blocks) < count:
+            voter = self.random.randrange(len(self.voter_keys))
+
+            # A compact vote carries the creator and name of a module only if it is the first vote on it
+            modules = []
+            for _ in range(batch_size):
+                index = self._pick_module(voter)
+                if index is None:
+                    break
+                module = self.modules[index]
+                modules.append(Module(module.id, module.name, self._module_votes[index]))
+                self._module_votes[index] += 1
+
+            if not modules:
+                continue
+
+            if batch_size == 1:
+                transaction = ModuleBlock.create_vote_transaction(modules[0], version)
+                blocks.append(self._sign(voter, MODULE_BLOCK_TYPE_VOTE, transaction))
+            else:
+                transaction = ModuleBlock.create_vote_batch_transaction(modules, version)
+                blocks.append(self._sign(voter, MODULE_BLOCK_TYPE_VOTE_BATCH, transaction))
+
+        return blocks
+
+    def repeat_blocks(self, blocks, share):
+        """
+        Mix copies of some of the blocks into the blocks, like a crawl returns blocks we already have
+
+        :param blocks: The blocks
+        :type blocks: [ModuleBlock]
+        :param share: Number of copies as a share of the blocks
+        :type share: float
+        :return: list of the blocks and the copies, copies come after the block they repeat
+        """
+        entries = [(index, 0, block) for index, block in enumerate(blocks)]
+        for _ in range(int(len(blocks) * share)):
+            index = self.random.randrange(len(blocks))
+            entries.append((self.random.uniform(index, len(blocks)), 1, blocks[index]))
+        return [block for _, _, block in sorted(entries, key=lambda entry: entry[:2])]
@@ -0,0 +1,166 @@
+from __future__ import absolute_import
+
+# Default library imports
+import os
+import random
+import shutil
+import tempfile
+
+# Third party imports
+from ipv8.attestation.trustchain.community import TrustChainCommunity
+from ipv8.keyvault.crypto import default_eccrypto
+from ipv8.peer import Peer
+from ipv8.peerdiscovery.network import Network
+from ipv8.test.mocking.endpoint import AutoMockEndpoint, internet
+from twisted.internet import reactor
+
+# Project imports
+from module_loader.community.module import community
+from module_loader.community.module.community import ModuleCommunity
+
+# Constants
+PACKET_HEADER_SIZE = 23  # size of the community prefix and message identifier that start a packet
+
+
+class MockTransport(object):
+    """
+    Transport that doesn't share any packages, stands in for the bittorrent transport and its libtorrent session
+    """
+
+    def __init__(self, working_directory):
+        super(MockTransport, self).__init__()
+
+        self.working_directory = working_directory  # type: str
+        self.downloads = []  # type: [Module]
+
+    def create_module_package(self, name):
+        return {'info_hash': os.urandom(20).encode('hex'), 'name': name, 'size': 0}
+
+    def download_module(self, module):
+        self.downloads.append(module)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class LatencyEndpoint(AutoMockEndpoint):
+    """
+    Mock endpoint that delivers packets to the listeners on the reactor thread after a random latency, instead of on a
+    thread right away, and counts the packets it sends by community and message
+    """
+
+    def __init__(self, min_latency, max_latency):
+        """
+        Initialize the endpoint
+
+        :param min_latency: Minimum latency in seconds of a packet
+        :type min_latency: float
+        :param max_latency: Maximum latency in seconds of a packet
+        :type max_latency: float
+        """
+        super(LatencyEndpoint, self).__init__()
+
+        self.min_latency = min_latency  # type: float
+        self.max_latency = max_latency  # type: float
+
+        self.in_flight = 0  # type: int
+        self.sent_packets = {}  # type: {bytes: int}
+        self.sent_bytes = {}  # type: {bytes: int}
+
+    def send(self, socket_address, packet):
+        if not self.is_open():
+            return
+
+        header = packet[:PACKET_HEADER_SIZE]
+        self.sent_packets[header] = self.sent_packets.get(header, 0) + 1
+        self.sent_bytes[header] = self.sent_bytes.get(header, 0) + len(packet)
+
+        self.in_flight += 1
+        reactor.callLater(random.uniform(self.min_latency, self.max_latency), self._deliver, socket_address, packet)
+
+    def _deliver(self, socket_address, packet):
+        # The listeners handle the packet right away, so a packet counts as in flight until it is handled
+        endpoint = internet[socket_address]
+        try:
+            if endpoint.is_open():
+                for listener in list(endpoint._listeners):
+                    listener.on_packet((self.wan_address, packet))
+        finally:
+            self.in_flight -= 1
+
+    def get_sent(self, prefix=b""):
+        """
+        Get the number and size of the sent packets that start with a prefix
+
+        :param prefix: The start of the packets, for instance a community prefix and message identifier
+        :type prefix: bytes
+        :return: tuple of the number of packets and their size in bytes
+        """
+        headers = [header for header in self.sent_packets if header.startswith(prefix)]
+        return sum(self.sent_packets[header] for header in headers), sum(self.sent_bytes[header] for header in headers)
+
+
+class MockModuleNode(object):
+    """
+    A module community and the trustchain community it votes in, on a mock endpoint and in a working directory of its
+    own. Periodic tasks are stopped, so tests and benchmarks decide when maintenance runs.
+    """
+
+    def __init__(self, endpoint=None, **kwargs):
+        """
+        Create the node
+
+        :param endpoint: The endpoint of the node, None for a new mock endpoint
+        :type endpoint: MockEndpoint
+        :param kwargs: Options of the module community
+        """
+        super(MockModuleNode, self).__init__()
+
+        self.working_directory = tempfile.mkdtemp()  # type: str
+
+        self.endpoint = endpoint or AutoMockEndpoint()
+        self.endpoint.open()
+
+        self.network = Network()
+        self.my_peer = Peer(default_eccrypto.generate_key(u"curve25519"), self.endpoint.wan_address)
+
+        self.trustchain = TrustChainCommunity(self.my_peer, self.endpoint, self.network,
+                                              working_directory=u":memory:")  # type: TrustChainCommunity
+        self.trustchain.cancel_all_pending_tasks()
+
+        transport_class, community.BittorrentTransport = community.BittorrentTransport, MockTransport
+        try:
+            self.overlay = ModuleCommunity(self.my_peer, self.endpoint, self.network, trustchain=self.trustchain,
+                                           bus=None, working_directory=self.working_directory, ipv8=None, service=None,
+                                           **kwargs)  # type: ModuleCommunity
+        finally:
+            community.BittorrentTransport = transport_class
+        self.overlay.cancel_all_pending_tasks()
+
+    def introduce(self, other):
+        """
+        Make another node a verified peer of both communities of this node
+
+        :param other: The other node
+        :type other: MockModuleNode
+        :return: None
+        """
+        peer = Peer(other.my_peer.public_key.key_to_bin(), other.endpoint.wan_address)
+
+        for overlay in (self.overlay, self.trustchain):
+            overlay.network.add_verified_peer(peer)
+            overlay.network.discover_services(peer, [overlay.master_peer.mid])
+
+    def unload(self):
+        """
+        Unload both communities and remove the working directory
+
+        :return: None
+        """
+        self.endpoint.close()
+        self.overlay.unload()
+        self.trustchain.unload()
+        shutil.rmtree(self.working_directory, ignore_errors=True)
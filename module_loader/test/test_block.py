@@ -0,0 +1,199 @@
+from __future__ import absolute_import
+
+# Third party imports
+from ipv8.attestation.trustchain.database import TrustChainDB
+from ipv8.attestation.trustchain.payload import HalfBlockPayload
+from ipv8.messaging.serialization import default_serializer
+from twisted.trial import unittest
+
+# Project imports
+from module_loader.community.module.block import ModuleBlock, MODULE_BLOCK_TYPE_VOTE, MODULE_BLOCK_TYPE_VOTE_BATCH, \
+    MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_CREATORS, MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_VOTES, \
+    MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_CREATOR, MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_INFO_HASH, \
+    MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_NAME, MODULE_BLOCK_TYPE_VOTE_KEY_VERSION, MODULE_BLOCK_TYPES_VOTE, \
+    MODULE_VOTE_BATCH_MAX_SIZE, MODULE_VOTE_VERSION_COMPACT, MODULE_VOTE_VERSION_FULL, PreverifiedCrypto
+from module_loader.community.module.core.module import Module
+from module_loader.community.module.core.module_identifier import get_creator_digest
+from module_loader.test.generator import VoteBlockGenerator
+
+
+def decode(block):
+    """
+    Decode a block the way it's decoded when it's received
+
+    :param block: The block
+    :type block: ModuleBlock
+    :return: the decoded block
+    """
+    payload, = default_serializer.ez_unpack_serializables([HalfBlockPayload], block.pack())
+    return ModuleBlock.from_payload(payload, default_serializer)
+
+
+class TestModuleBlock(unittest.TestCase):
+    """
+    Validating and decoding single vote blocks and batch vote blocks in both vote encodings
+    """
+
+    def setUp(self):
+        self.generator = VoteBlockGenerator(voters=2, creators=2, modules=20, seed=1)
+        self.creator = self.generator.modules[0].id.creator
+
+        # Two modules of different creators
+        self.modules = [self.generator.modules[0], next(module for module in self.generator.modules
+                                                        if module.id.creator != self.creator)]
+
+    def sign(self, block_type, transaction):
+        return decode(self.generator._sign(0, block_type, transaction))
+
+    def sign_batch(self, creators, votes, version=MODULE_VOTE_VERSION_COMPACT):
+        transaction = {
+            MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_CREATORS: creators,
+            MODULE_BLOCK_TYPE_VOTE_BATCH_KEY_VOTES: votes,
+        }
+        if version is not None:
+            transaction[MODULE_BLOCK_TYPE_VOTE_KEY_VERSION] = version
+        return self.sign(MODULE_BLOCK_TYPE_VOTE_BATCH, transaction)
+
+    def assertInvalid(self, block):
+        self.assertFalse(block.is_valid_module_vote_block())
+        self.assertEqual([], block.get_votes())
+
+    def test_valid_blocks(self):
+        for version in (MODULE_VOTE_VERSION_FULL, MODULE_VOTE_VERSION_COMPACT):
+            for batch_size in (1, 5):
+                for block in self.generator.create_vote_blocks(3, batch_size, version):
+                    block = decode(block)
+
+                    self.assertTrue(block.is_valid_module_vote_block())
+                    self.assertEqual(batch_size, len(block.get_votes()))
+
+    def test_decode_old_and_new_blocks(self):
+        first, second = self.modules
+        blocks = [self.sign(MODULE_BLOCK_TYPE_VOTE, ModuleBlock.create_vote_transaction(first)),
+                  self.sign(MODULE_BLOCK_TYPE_VOTE, ModuleBlock.create_vote_transaction(
+                      Module(first.id, first.name, 0), MODULE_VOTE_VERSION_COMPACT)),
+                  self.sign(MODULE_BLOCK_TYPE_VOTE, ModuleBlock.create_vote_transaction(
+                      Module(second.id, second.name, 1), MODULE_VOTE_VERSION_COMPACT)),
+                  self.sign(MODULE_BLOCK_TYPE_VOTE_BATCH, ModuleBlock.create_vote_batch_transaction(self.modules)),
+                  self.sign(MODULE_BLOCK_TYPE_VOTE_BATCH, ModuleBlock.create_vote_batch_transaction(
+                      [Module(first.id, first.name, 0), Module(second.id, second.name, 1)],
+                      MODULE_VOTE_VERSION_COMPACT))]
+
+        # The version 1 transaction has no version key, the compact one leaves out what the catalog tells
+        self.assertNotIn(MODULE_BLOCK_TYPE_VOTE_KEY_VERSION, blocks[0].transaction)
+        self.assertEqual([[(first.id.creator, first.id.content_hash, first.name)],
+                          [(first.id.creator, first.id.content_hash, first.name)],
+                          [(get_creator_digest(second.id.creator), second.id.content_hash, None)],
+                          [(first.id.creator, first.id.content_hash, first.name),
+                           (second.id.creator, second.id.content_hash, second.name)],
+                          [(first.id.creator, first.id.content_hash, first.name),
+                           (get_creator_digest(second.id.creator), second.id.content_hash, None)]],
+                         [block.get_votes() for block in blocks])
+
+    def test_invalid_single_blocks(self):
+        module = self.modules[0]
+        transaction = ModuleBlock.create_vote_transaction(module)
+        transaction['extra'] = "field"
+        self.assertInvalid(self.sign(MODULE_BLOCK_TYPE_VOTE, transaction))
+
+        # The info hash of a compact vote is binary
+        transaction = ModuleBlock.create_vote_transaction(module, MODULE_VOTE_VERSION_COMPACT)
+        transaction[MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_INFO_HASH] = module.id.content_hash
+        self.assertInvalid(self.sign(MODULE_BLOCK_TYPE_VOTE, transaction))
+
+        # A batch type doesn't validate as a single vote block
+        block = self.sign(MODULE_BLOCK_TYPE_VOTE_BATCH, ModuleBlock.create_vote_transaction(module))
+        self.assertFalse(block.is_valid_vote_block())
+        self.assertInvalid(block)
+
+    def test_invalid_batch_blocks(self):
+        info_hashes = [ModuleBlock.create_vote_transaction(module, MODULE_VOTE_VERSION_COMPACT)
+                       [MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_INFO_HASH] for module in self.modules]
+        creators = [get_creator_digest(self.creator)]
+
+        self.assertInvalid(self.sign_batch(creators, []))
+        self.assertInvalid(self.sign_batch(creators, [[1, info_hashes[0]]]))
+        self.assertInvalid(self.sign_batch(creators, [[True, info_hashes[0]]]))
+        self.assertInvalid(self.sign_batch(creators, [[0, info_hashes[0]], [0, info_hashes[0]]]))
+        self.assertInvalid(self.sign_batch(creators, [[0, info_hashes[0], "name", "extra"]]))
+        self.assertInvalid(self.sign_batch(creators * 2, [[0, info_hashes[0]]]))
+        self.assertInvalid(self.sign_batch(creators, [[0, info_hashes[0]]], version=3))
+
+        # A version 1 batch has no version key and carries (creator index, content hash, name) triples
+        self.assertInvalid(self.sign_batch([self.creator], [[0, self.modules[0].id.content_hash]], version=None))
+        self.assertInvalid(self.sign_batch([self.creator], [[0, self.modules[0].id.content_hash, "name"]],
+                                           version=MODULE_VOTE_VERSION_FULL))
+
+        votes = [[0, "%040x" % index, "name"] for index in range(MODULE_VOTE_BATCH_MAX_SIZE + 1)]
+        self.assertInvalid(self.sign_batch([self.creator], votes, version=None))
+        self.assertTrue(self.sign_batch([self.creator], votes[1:], version=None).is_valid_module_vote_block())
+
+    def test_creator_digest_mismatch(self):
+        module = self.modules[0]
+        digest = get_creator_digest(module.id.creator)
+
+        # A first vote carries the name and the full creator key, never a digest
+        transaction = ModuleBlock.create_vote_transaction(Module(module.id, module.name, 0),
+                                                          MODULE_VOTE_VERSION_COMPACT)
+        transaction[MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_CREATOR] = digest
+        self.assertInvalid(self.sign(MODULE_BLOCK_TYPE_VOTE, transaction))
+
+        info_hash = transaction[MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_INFO_HASH]
+        self.assertInvalid(self.sign_batch([digest], [[0, info_hash, module.name]]))
+
+        # A creator shorter than a digest is neither a digest nor a key
+        transaction = ModuleBlock.create_vote_transaction(Module(module.id, module.name, 1),
+                                                          MODULE_VOTE_VERSION_COMPACT)
+        transaction[MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_CREATOR] = digest[:-1]
+        self.assertInvalid(self.sign(MODULE_BLOCK_TYPE_VOTE, transaction))
+
+        # A later vote with a name is not a first vote either, the name needs the key
+        transaction[MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_CREATOR] = digest
+        transaction[MODULE_BLOCK_TYPE_VOTE_COMPACT_KEY_NAME] = module.name
+        self.assertInvalid(self.sign(MODULE_BLOCK_TYPE_VOTE, transaction))
+
+
+class TestPreverifiedBlock(unittest.TestCase):
+    """
+    Validating a block of which the signature was verified in a batch before
+    """
+
+    def setUp(self):
+        self.generator = VoteBlockGenerator(voters=1, modules=1, seed=1)
+        self.block = decode(self.generator.create_vote_blocks(1)[0])
+
+        # A forged signature shows whether trustchain checked it
+        self.block.signature = b"\x00" * len(self.block.signature)
+
+        self.database = TrustChainDB(u":memory:", u"test")
+        for block_type in MODULE_BLOCK_TYPES_VOTE:
+            self.database.block_types[block_type] = ModuleBlock
+
+    def tearDown(self):
+        self.database.close()
+
+    def test_signature_checked(self):
+        _, errors = self.block.validate(self.database)
+
+        self.assertIn("Invalid signature", errors)
+
+    def test_signature_verified(self):
+        crypto = self.block.crypto
+        self.block.signature_verified = True
+
+        _, errors = self.block.validate(self.database)
+
+        self.assertNotIn("Invalid signature", errors)
+        self.assertIs(crypto, self.block.crypto)
+
+    def test_crypto_restored_on_error(self):
+        crypto = self.block.crypto
+        self.block.signature_verified = True
+
+        def fail(*_):
+            self.assertIsInstance(self.block.crypto, PreverifiedCrypto)
+            raise ValueError()
+        self.block.validate_transaction = fail
+
+        self.assertRaises(ValueError, self.block.validate, self.database)
+        self.assertIs(crypto, self.block.crypto)
@@ -0,0 +1,328 @@
+from __future__ import absolute_import
+
+# Default library imports
+from binascii import unhexlify
+
+# Third party imports
+from twisted.internet.defer import gatherResults, inlineCallbacks
+from twisted.trial import unittest
+
+# Project imports
+from module_loader.community.module.block import ModuleBlock, MODULE_BLOCK_TYPE_VOTE, \
+    MODULE_BLOCK_TYPE_VOTE_BATCH, MODULE_VOTE_VERSION_COMPACT
+from module_loader.community.module.community import ANNOUNCEMENT_TTL, MODULE_ANNOUNCEMENT_MESSAGE
+from module_loader.community.module.core.module import Module
+from module_loader.community.module.core.module_identifier import get_creator_digest, ModuleIdentifier
+from module_loader.community.module.payload import ModuleAnnouncementPayload
+from module_loader.test.generator import VoteBlockGenerator
+from module_loader.test.mocking import MockModuleNode
+
+# Constants
+CREATOR = b"creator-public-key"  # Public key of the creator of the test modules
+
+
+class TestVoting(unittest.TestCase):
+    """
+    Voting on modules in the catalog, with the persistence layer on the reactor thread
+    """
+
+    async_persistence = False  # type: bool
+
+    def setUp(self):
+        self.node = MockModuleNode(async_persistence=self.async_persistence)
+        self.public_key = self.node.my_peer.public_key.key_to_bin()
+
+        self.modules = [Module(ModuleIdentifier(CREATOR, "%040x" % index), "module %d" % index) for index in range(2)]
+        for module in self.modules:
+            self.node.overlay.persistence.add_module_to_catalog(module)
+
+    def tearDown(self):
+        self.node.unload()
+
+    def get_vote_blocks(self, block_type):
+        return self.node.trustchain.persistence.get_blocks_with_type(block_type, self.public_key)
+
+    @inlineCallbacks
+    def test_vote_module_twice(self):
+        module_identifier = self.modules[0].id
+
+        yield gatherResults([self.node.overlay.vote_module(module_identifier),
+                             self.node.overlay.vote_module(module_identifier)])
+
+        self.assertEqual(1, len(self.get_vote_blocks(MODULE_BLOCK_TYPE_VOTE)))
+        self.assertTrue(self.node.overlay.persistence.did_vote(self.public_key, module_identifier))
+        self.assertEqual(set(), self.node.overlay.votes_in_flight)
+
+        # The vote is recorded, so voting again later doesn't sign a block either
+        yield self.node.overlay.vote_module(module_identifier)
+
+        self.assertEqual(1, len(self.get_vote_blocks(MODULE_BLOCK_TYPE_VOTE)))
+
+    @inlineCallbacks
+    def test_vote_modules_and_module(self):
+        module_identifiers = [module.id for module in self.modules]
+
+        yield gatherResults([self.node.overlay.vote_modules(module_identifiers),
+                             self.node.overlay.vote_module(module_identifiers[0])])
+
+        blocks = self.get_vote_blocks(MODULE_BLOCK_TYPE_VOTE) + self.get_vote_blocks(MODULE_BLOCK_TYPE_VOTE_BATCH)
+        self.assertEqual(2, sum(len(block.get_votes()) for block in blocks))
+        for module_identifier in module_identifiers:
+            self.assertTrue(self.node.overlay.persistence.did_vote(self.public_key, module_identifier))
+
+    @inlineCallbacks
+    def test_vote_unknown_module(self):
+        yield self.node.overlay.vote_module(ModuleIdentifier(CREATOR, "%040x" % 100))
+
+        self.assertEqual([], self.get_vote_blocks(MODULE_BLOCK_TYPE_VOTE))
+        self.assertEqual(set(), self.node.overlay.votes_in_flight)
+
+
+class TestCompactVoting(unittest.TestCase):
+    """
+    Signing and receiving compact votes, the local catalog tells whether a vote is the first vote on a module
+    """
+
+    def setUp(self):
+        self.node = MockModuleNode(vote_version=MODULE_VOTE_VERSION_COMPACT)
+        self.public_key = self.node.my_peer.public_key.key_to_bin()
+
+        # Another voter voted on the second module already
+        self.modules = [Module(ModuleIdentifier(CREATOR, "%040x" % index), "module %d" % index) for index in range(2)]
+        for module in self.modules:
+            self.node.overlay.persistence.add_module_to_catalog(module)
+        self.node.overlay.persistence.record_vote(b"voter-public-key", self.modules[1].id, 1000, 1)
+
+    def tearDown(self):
+        self.node.unload()
+
+    def get_vote_blocks(self, block_type):
+        return self.node.trustchain.persistence.get_blocks_with_type(block_type, self.public_key)
+
+    @inlineCallbacks
+    def test_first_vote(self):
+        yield self.node.overlay.vote_module(self.modules[0].id)
+        yield self.node.overlay.vote_module(self.modules[1].id)
+
+        votes = [block.get_votes()[0] for block in sorted(self.get_vote_blocks(MODULE_BLOCK_TYPE_VOTE),
+                                                          key=lambda block: block.sequence_number)]
+        self.assertEqual([(CREATOR, self.modules[0].id.content_hash, self.modules[0].name),
+                          (get_creator_digest(CREATOR), self.modules[1].id.content_hash, None)], votes)
+
+    @inlineCallbacks
+    def test_first_vote_in_batch(self):
+        yield self.node.overlay.vote_modules([module.id for module in self.modules])
+
+        # The creator is stored as its key, because one of its modules gets a first vote
+        block, = self.get_vote_blocks(MODULE_BLOCK_TYPE_VOTE_BATCH)
+        self.assertEqual([(CREATOR, self.modules[0].id.content_hash, self.modules[0].name),
+                          (CREATOR, self.modules[1].id.content_hash, None)], block.get_votes())
+
+    @inlineCallbacks
+    def test_unknown_creator_digest(self):
+        # A vote on a module with the info hash of a module in the catalog, by a creator we don't know
+        generator = VoteBlockGenerator(voters=1, modules=1, seed=1)
+        module = Module(ModuleIdentifier(generator.creator_keys[0].pub().key_to_bin(), self.modules[0].id.content_hash),
+                        "other module", 1)
+        block = generator._sign(0, MODULE_BLOCK_TYPE_VOTE,
+                                ModuleBlock.create_vote_transaction(module, MODULE_VOTE_VERSION_COMPACT))
+
+        yield self.node.overlay._ingest_vote_blocks([block])
+
+        # The vote waits for its module instead of counting for the module in the catalog
+        self.assertFalse(self.node.overlay.persistence.did_vote(block.public_key, self.modules[0].id))
+        self.assertEqual(0, self.node.overlay.persistence.get_module_from_catalog(self.modules[0].id).votes)
+        self.assertEqual(1, self.node.overlay.get_vote_resolution_statistics()['pending'])
+
+
+class TestVoteReconciliation(unittest.TestCase):
+    """
+    Reconciling the votes in the catalog with the vote blocks in trustchain
+    """
+
+    def setUp(self):
+        self.node = MockModuleNode()
+        self.generator = VoteBlockGenerator(voters=1, modules=20, seed=1)
+        self.blocks = self.generator.create_vote_blocks(6)
+        self.public_key = self.blocks[0].public_key
+
+    def tearDown(self):
+        self.node.unload()
+
+    def add_blocks(self, blocks):
+        for block in blocks:
+            self.node.trustchain.persistence.add_block(block)
+
+    def get_checkpoint(self):
+        return self.node.overlay.persistence.get_vote_checkpoint(self.public_key)
+
+    def did_vote(self, block):
+        (creator, content_hash, _), = block.get_votes()
+        return self.node.overlay.persistence.did_vote(self.public_key, ModuleIdentifier(creator, content_hash))
+
+    @inlineCallbacks
+    def test_reconcile(self):
+        self.add_blocks(self.blocks)
+
+        yield self.node.overlay._check_votes_in_catalog()
+
+        self.assertEqual(6, self.get_checkpoint())
+        self.assertTrue(all(self.did_vote(block) for block in self.blocks))
+
+    @inlineCallbacks
+    def test_reconcile_after_gap(self):
+        self.add_blocks(self.blocks[:2] + self.blocks[3:])
+
+        yield self.node.overlay._check_votes_in_catalog()
+
+        # The blocks after the gap wait until it's filled
+        self.assertEqual(2, self.get_checkpoint())
+        self.assertEqual([True, True, False, False, False, False], [self.did_vote(block) for block in self.blocks])
+
+        self.add_blocks(self.blocks[2:3])
+        yield self.node.overlay._check_votes_in_catalog()
+
+        self.assertEqual(6, self.get_checkpoint())
+        self.assertTrue(all(self.did_vote(block) for block in self.blocks))
+
+    @inlineCallbacks
+    def test_reconcile_removed_blocks(self):
+        # The first blocks of the chain are removed from trustchain, the rest is reconciled
+        self.add_blocks(self.blocks[2:])
+
+        yield self.node.overlay._check_votes_in_catalog()
+
+        self.assertEqual(6, self.get_checkpoint())
+        self.assertTrue(all(self.did_vote(block) for block in self.blocks[2:]))
+
+    @inlineCallbacks
+    def test_reconcile_replaced_trustchain(self):
+        self.add_blocks(self.blocks[:3])
+        self.node.overlay.persistence.set_vote_checkpoint(self.public_key, 10)
+
+        yield self.node.overlay._check_votes_in_catalog()
+
+        self.assertEqual(3, self.get_checkpoint())
+        self.assertTrue(all(self.did_vote(block) for block in self.blocks[:3]))
+
+
+class TestVoteIngestion(unittest.TestCase):
+    """
+    Processing received vote blocks
+    """
+
+    def setUp(self):
+        self.node = MockModuleNode()
+        self.generator = VoteBlockGenerator(voters=1, modules=20, seed=1)
+        self.blocks = self.generator.create_vote_blocks(2)
+        self.public_key = self.blocks[0].public_key
+
+    def tearDown(self):
+        self.node.unload()
+
+    def get_identifier(self, block):
+        (creator, content_hash, _), = block.get_votes()
+        return ModuleIdentifier(creator, content_hash)
+
+    @inlineCallbacks
+    def test_known_vote_dropped(self):
+        yield self.node.overlay._ingest_vote_blocks(self.blocks[:1])
+        yield self.node.overlay._ingest_vote_blocks(self.blocks[:1])
+
+        self.assertTrue(self.node.overlay._is_known_vote_block(self.blocks[0]))
+        self.assertEqual(0, self.node.overlay.get_vote_filter_statistics()['false_positives'])
+
+    @inlineCallbacks
+    def test_false_positive_recorded(self):
+        # The filter takes the new vote for a known one
+        identifier = self.get_identifier(self.blocks[1])
+        self.node.overlay.vote_filter.add(self.node.overlay._get_vote_filter_key(self.public_key, identifier.creator,
+                                                                                 identifier.content_hash))
+
+        yield self.node.overlay._ingest_vote_blocks(self.blocks[1:])
+
+        self.assertTrue(self.node.overlay.persistence.did_vote(self.public_key, identifier))
+        self.assertEqual(1, self.node.overlay.get_vote_filter_statistics()['false_positives'])
+
+
+class TestModuleAnnouncement(unittest.TestCase):
+    """
+    Processing received module announcements
+    """
+
+    def setUp(self):
+        self.node = MockModuleNode()
+        self.sender = MockModuleNode()
+
+        # The first vote on the module carries its name, the second one only the digest of the creator key
+        self.generator = VoteBlockGenerator(voters=2, creators=1, modules=1, seed=1)
+        self.blocks = self.generator.create_vote_blocks(2, version=MODULE_VOTE_VERSION_COMPACT)
+        self.module = self.generator.modules[0]
+
+        # Announcements the node forwards
+        self.forwarded = []
+        self.node.overlay._send_announcement = lambda payload, exclude=(): self.forwarded.append(payload)
+
+    def tearDown(self):
+        self.node.unload()
+        self.sender.unload()
+
+    def receive_announcement(self, ttl=ANNOUNCEMENT_TTL):
+        creator_key, = self.generator.creator_keys
+        info_hash = unhexlify(self.module.id.content_hash)
+        signed_data = ModuleAnnouncementPayload.get_signed_data(self.module.id.creator, info_hash, self.module.name, 0)
+        signature = self.sender.overlay.crypto.create_signature(creator_key, signed_data)
+
+        payload = ModuleAnnouncementPayload(self.module.id.creator, info_hash, self.module.name, 0, signature, ttl)
+        packet = self.sender.overlay._create_packet(MODULE_ANNOUNCEMENT_MESSAGE, payload)
+        self.node.overlay.on_module_announcement(self.sender.endpoint.wan_address, packet)
+
+    def did_vote(self, block):
+        return self.node.overlay.persistence.did_vote(block.public_key, self.module.id)
+
+    @inlineCallbacks
+    def test_announcement_waits_for_vote(self):
+        self.receive_announcement()
+
+        self.assertFalse(self.node.overlay.persistence.has_module_in_catalog(self.module.id))
+
+        # The announcement tells the name and creator key the compact vote leaves out
+        yield self.node.overlay._ingest_vote_blocks(self.blocks[1:])
+
+        self.assertEqual(self.module.name, self.node.overlay.persistence.get_module_from_catalog(self.module.id).name)
+        self.assertTrue(self.did_vote(self.blocks[1]))
+        self.assertEqual(1, self.node.overlay.get_announcement_statistics()['added'])
+
+    @inlineCallbacks
+    def test_announcement_after_vote(self):
+        yield self.node.overlay._ingest_vote_blocks(self.blocks[1:])
+
+        self.assertFalse(self.node.overlay.persistence.has_module_in_catalog(self.module.id))
+
+        # The kept vote is recorded once the announcement tells which module it is on
+        self.receive_announcement()
+
+        self.assertTrue(self.node.overlay.persistence.has_module_in_catalog(self.module.id))
+        self.assertTrue(self.did_vote(self.blocks[1]))
+        self.assertEqual(1, self.node.overlay.get_announcement_statistics()['added'])
+
+    def test_duplicate_announcement(self):
+        self.receive_announcement()
+        self.receive_announcement()
+
+        self.assertEqual(1, self.node.overlay.get_announcement_statistics()['duplicates'])
+        self.assertEqual(1, len(self.forwarded))
+
+    def test_announcement_ttl_capped(self):
+        self.receive_announcement(ttl=255)
+
+        self.assertEqual([ANNOUNCEMENT_TTL - 1], [payload.ttl for payload in self.forwarded])
+
+
+class TestVotingAsyncPersistence(TestVoting):
+    """
+    Voting on modules in the catalog, with the persistence layer on the database thread. The catalog lookup of a vote
+    request is still running when the next request arrives.
+    """
+
+    async_persistence = True
@@ -0,0 +1,84 @@
+from __future__ import absolute_import
+
+# Third party imports
+from ipv8.peer import Peer
+from twisted.internet.defer import inlineCallbacks, succeed
+from twisted.trial import unittest
+
+# Project imports
+from module_loader.community.module.crawler import ChainCrawler, CrawlScheduler
+from module_loader.test.generator import VoteBlockGenerator
+from module_loader.test.mocking import MockModuleNode
+
+
+class TestChainCrawler(unittest.TestCase):
+    """
+    Crawling the chain of a peer above its crawl cursor
+    """
+
+    def setUp(self):
+        self.node = MockModuleNode()
+        self.generator = VoteBlockGenerator(voters=1, modules=50, seed=1)
+        self.blocks = self.generator.create_vote_blocks(25)
+        self.peer = Peer(self.generator.voter_keys[0])
+        self.public_key = self.peer.public_key.key_to_bin()
+
+        # Sequence numbers of the blocks trustchain rejects when they are received
+        self.rejected = set()
+        self.node.trustchain.send_crawl_request = self.send_crawl_request
+
+        self.crawler = ChainCrawler(self.node.trustchain, self.node.overlay.run_persistence)
+
+    def tearDown(self):
+        self.node.unload()
+
+    def send_crawl_request(self, peer, public_key, start_seq_num, end_seq_num):
+        blocks = [block for block in self.blocks if start_seq_num <= block.sequence_number <= end_seq_num]
+        for block in blocks:
+            if block.sequence_number not in self.rejected and not self.node.trustchain.persistence.contains(block):
+                self.node.trustchain.persistence.add_block(block)
+        return succeed(blocks)
+
+    def get_crawl_cursor(self):
+        return self.node.overlay.persistence.get_crawl_cursor(self.public_key)
+
+    @inlineCallbacks
+    def test_crawl(self):
+        votes = yield self.crawler.crawl(self.peer)
+
+        self.assertEqual(25, votes)
+        self.assertEqual(25, self.get_crawl_cursor())
+        self.assertEqual(3, self.crawler.requests)
+
+    @inlineCallbacks
+    def test_crawl_rejected_block(self):
+        self.rejected.add(4)
+
+        votes = yield self.crawler.crawl(self.peer)
+
+        # The cursor stays below the rejected block, the blocks after it are requested again
+        self.assertEqual(3, votes)
+        self.assertEqual(3, self.get_crawl_cursor())
+        self.assertEqual(7, self.crawler.rejected_blocks)
+
+        self.rejected.clear()
+        votes = yield self.crawler.crawl(self.peer)
+
+        self.assertEqual(22, votes)
+        self.assertEqual(25, self.get_crawl_cursor())
+
+    @inlineCallbacks
+    def test_crawl_within_budget(self):
+        scheduler = CrawlScheduler(budget=2)
+        self.crawler.may_request = scheduler.request
+
+        self.assertEqual([self.peer], scheduler.select([self.peer]))
+        votes = yield self.crawler.crawl(self.peer)
+
+        # The selection took the first request and the second range the last one, the third range waits
+        self.assertEqual(20, votes)
+        self.assertEqual(20, self.get_crawl_cursor())
+        self.assertEqual(2, self.crawler.requests)
+        self.assertEqual(1, self.crawler.interrupted_crawls)
+        self.assertLess(scheduler.tokens, 1)
+        self.assertGreaterEqual(scheduler.tokens, 0)
@@ -0,0 +1,99 @@
+from __future__ import absolute_import
+
+# Default library imports
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+# Project imports
+from module_loader.community.module.module_database import CATALOG_PAGE_QUERIES, DATABASE_DIRECTORY, \
+    MODULE_VOTES_QUERY, ModuleDatabase
+from module_loader.community.module.storage import CATALOG_ORDER_VOTES
+
+# Constants
+DB_NAME = u"modules"  # Name of the database under test
+
+# Schema of the first database version, before the lookup indexes were added
+SCHEMA_V1 = u"""
+CREATE TABLE module_cache (public_key TEXT NOT NULL, info_hash TEXT NOT NULL, PRIMARY KEY (public_key, info_hash));
+CREATE TABLE module_catalog (public_key TEXT NOT NULL, info_hash TEXT NOT NULL, name TEXT NOT NULL,
+                             votes INTEGER NOT NULL, PRIMARY KEY (public_key, info_hash));
+CREATE TABLE module_library (public_key TEXT NOT NULL, info_hash TEXT NOT NULL, PRIMARY KEY (public_key, info_hash));
+CREATE TABLE module_votes (voter_public_key TEXT NOT NULL, public_key TEXT NOT NULL, info_hash TEXT NOT NULL,
+                           PRIMARY KEY (voter_public_key, public_key, info_hash));
+CREATE TABLE option(key TEXT PRIMARY KEY, value BLOB);
+INSERT INTO option(key, value) VALUES('database_version', '1');
+"""
+MODULE_VOTES_QUERY_V1 = "SELECT voter_public_key FROM module_votes WHERE public_key = ? AND info_hash = ?;"
+CATALOG_VOTES_QUERY_V1 = "SELECT public_key, info_hash, name, votes FROM module_catalog ORDER BY votes DESC " \
+                         "LIMIT ? OFFSET ?;"
+
+
+def get_query_plan(connection, sql, bindings):
+    """
+    Get the query plan sqlite uses for a query
+
+    :param connection: Connection to the database
+    :type connection: sqlite3.Connection
+    :param sql: SQL query
+    :type sql: str
+    :param bindings: Values for the query placeholders
+    :type bindings: tuple
+    :return: the details of the plan steps joined into one string
+    """
+    return u" | ".join(row[-1] for row in connection.execute(u"EXPLAIN QUERY PLAN " + sql, bindings))
+
+
+class TestModuleDatabaseQueryPlans(unittest.TestCase):
+    """
+    The per-module vote lookup and the catalog ordering by votes scan their table in a version 1 database, and search
+    the lookup indexes once it is migrated to the latest version
+    """
+
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.working_directory, DATABASE_DIRECTORY))
+        self.file_path = os.path.join(self.working_directory, DATABASE_DIRECTORY, u"{0}.db".format(DB_NAME))
+
+        connection = sqlite3.connect(self.file_path)
+        connection.executescript(SCHEMA_V1)
+        connection.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def _get_query_plans(self, module_votes_query, catalog_votes_query):
+        """
+        Get the query plans of the per-module vote lookup and the catalog ordering by votes
+
+        :return: tuple of the two query plans
+        """
+        connection = sqlite3.connect(self.file_path)
+        try:
+            return (get_query_plan(connection, module_votes_query, (1,) * module_votes_query.count(u"?")),
+                    get_query_plan(connection, catalog_votes_query, (10, 0)))
+        finally:
+            connection.close()
+
+    def test_query_plans_before_migration(self):
+        module_votes_plan, catalog_votes_plan = self._get_query_plans(MODULE_VOTES_QUERY_V1, CATALOG_VOTES_QUERY_V1)
+
+        self.assertIn(u"SCAN", module_votes_plan)
+        self.assertIn(u"USE TEMP B-TREE FOR ORDER BY", catalog_votes_plan)
+
+    def test_query_plans_after_migration(self):
+        database = ModuleDatabase(self.working_directory, DB_NAME)
+        database.close()
+
+        module_votes_plan, catalog_votes_plan = self._get_query_plans(MODULE_VOTES_QUERY,
+                                                                      CATALOG_PAGE_QUERIES[CATALOG_ORDER_VOTES])
+
+        self.assertIn(u"INDEX module_votes_module_ind (module_id=?)", module_votes_plan)
+        self.assertIn(u"INDEX module_catalog_votes_ind", catalog_votes_plan)
+        self.assertNotIn(u"TEMP B-TREE", catalog_votes_plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
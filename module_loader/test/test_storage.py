@@ -0,0 +1,334 @@
+from __future__ import absolute_import
+
+# Default library imports
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+# Third party imports
+try:
+    import lmdb
+except ImportError:
+    lmdb = None
+
+# Project imports
+from module_loader.community.module.async_module_database import AsyncModuleDatabase
+from module_loader.community.module.core.module import Module
+from module_loader.community.module.core.module_identifier import ModuleIdentifier, get_creator_digest
+from module_loader.community.module.module_database import ModuleDatabase
+from module_loader.community.module.storage import create_module_storage, CATALOG_ORDER_NAME, \
+    CATALOG_ORDER_TRENDING, CATALOG_ORDER_VOTES, STORAGE_BACKEND_HYBRID, STORAGE_BACKEND_LMDB, STORAGE_BACKEND_SQLITE
+
+# Constants
+DB_NAME = u"modules"  # Name of the storage under test
+CREATOR = b"creator-public-key"  # Public key of the creator of the test modules
+VOTERS = [b"voter-public-key-%d" % i for i in range(3)]  # Public keys of the test voters
+
+
+def make_module(index, name):
+    """
+    Create a test module
+
+    :param index: Number of the module, which determines its content hash
+    :type index: int
+    :param name: Name of the module
+    :type name: str
+    :return: module with no votes
+    """
+    return Module(ModuleIdentifier(CREATOR, "%040x" % index), name)
+
+
+class StorageConformanceTests(object):
+    """
+    Behaviour every module storage backend has to share, run against each backend by the test cases below
+    """
+
+    backend = None  # type: str
+
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+        self.storage = self.open_storage()
+
+        self.modules = [make_module(1, "hello world"), make_module(2, "world peace"), make_module(3, "another module")]
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.working_directory)
+
+    def open_storage(self, working_directory=None):
+        """
+        Open the storage of the backend under test
+
+        :param working_directory: Working directory of the storage, the one of the test if None
+        :type working_directory: str
+        :return: the opened storage
+        """
+        return create_module_storage(self.backend, working_directory or self.working_directory, DB_NAME)
+
+    def reopen_storage(self):
+        """
+        Close the storage and open it again from disk
+
+        :return: None
+        """
+        self.storage.close()
+        self.storage = self.open_storage()
+
+    def add_modules(self):
+        """
+        Add the test modules to the catalog
+
+        :return: None
+        """
+        for module in self.modules:
+            self.storage.add_module_to_catalog(module)
+
+    def test_cache(self):
+        module_identifier = self.modules[0].id
+
+        self.assertFalse(self.storage.has_module_in_cache(module_identifier))
+        self.assertIsNone(self.storage.get_module_from_cache(module_identifier))
+
+        self.storage.add_module_to_cache(module_identifier)
+
+        self.assertTrue(self.storage.has_module_in_cache(module_identifier))
+        self.assertEqual(module_identifier, self.storage.get_module_from_cache(module_identifier))
+        self.assertEqual([module_identifier], self.storage.get_modules_from_cache())
+        self.assertEqual([module_identifier], list(self.storage.iter_cache()))
+
+    def test_library(self):
+        module_identifier = self.modules[0].id
+
+        self.assertFalse(self.storage.has_module_in_library(module_identifier))
+        self.assertIsNone(self.storage.get_module_from_library(module_identifier))
+
+        self.storage.add_module_to_library(module_identifier)
+
+        self.assertTrue(self.storage.has_module_in_library(module_identifier))
+        self.assertEqual(module_identifier, self.storage.get_module_from_library(module_identifier))
+        self.assertEqual([module_identifier], self.storage.get_modules_from_library())
+        self.assertEqual([module_identifier], list(self.storage.iter_library()))
+
+    def test_catalog(self):
+        self.assertIsNone(self.storage.get_module_from_catalog(self.modules[0].id))
+
+        self.add_modules()
+
+        self.assertEqual(3, self.storage.count_modules_in_catalog())
+        self.assertTrue(self.storage.has_module_in_catalog(self.modules[1].id))
+        module = self.storage.get_module_from_catalog(self.modules[1].id)
+        self.assertEqual((self.modules[1], "world peace", 0), (module, module.name, module.votes))
+        self.assertEqual(self.modules, self.storage.get_modules_from_catalog())
+        self.assertEqual(self.modules[1:], list(self.storage.iter_catalog(limit=2, offset=1)))
+        self.assertEqual([self.modules[2], self.modules[0], self.modules[1]],
+                         list(self.storage.iter_catalog(order_by=CATALOG_ORDER_NAME)))
+
+    def test_catalog_unknown_order(self):
+        self.assertRaises(ValueError, lambda: list(self.storage.iter_catalog(order_by="unknown")))
+
+    def test_search_catalog(self):
+        self.add_modules()
+
+        self.assertEqual({self.modules[0], self.modules[1]}, set(self.storage.search_catalog("wor")))
+        self.assertEqual([self.modules[0]], list(self.storage.search_catalog("hel wor")))
+        self.assertEqual([], list(self.storage.search_catalog("peace hello")))
+        self.assertEqual([], list(self.storage.search_catalog("orld")))
+
+    def test_record_vote(self):
+        now = int(time.time() * 1000)
+        self.add_modules()
+
+        self.assertTrue(self.storage.record_vote(VOTERS[0], self.modules[1].id, now, 1))
+        self.assertFalse(self.storage.record_vote(VOTERS[0], self.modules[1].id, now, 1))
+        self.assertTrue(self.storage.record_vote(VOTERS[1], self.modules[1].id, now, 1))
+        self.assertTrue(self.storage.record_vote(VOTERS[1], self.modules[2].id, now, 2))
+
+        self.assertTrue(self.storage.did_vote(VOTERS[0], self.modules[1].id))
+        self.assertFalse(self.storage.did_vote(VOTERS[0], self.modules[2].id))
+        self.assertEqual(2, self.storage.get_module_from_catalog(self.modules[1].id).votes)
+        self.assertEqual([self.modules[1], self.modules[2], self.modules[0]],
+                         list(self.storage.iter_catalog(order_by=CATALOG_ORDER_VOTES)))
+        self.assertEqual([self.modules[1], self.modules[2], self.modules[0]],
+                         list(self.storage.iter_catalog(order_by=CATALOG_ORDER_TRENDING)))
+        self.assertAlmostEqual(2.0, self.storage.get_trending_score(self.modules[1].id), places=3)
+
+        votes = self.storage.get_votes_for_module(self.modules[1].id)
+        self.assertEqual({(VOTERS[0], now, 1), (VOTERS[1], now, 1)},
+                         {(vote['voter'], vote['timestamp'], vote['sequence_number']) for vote in votes})
+        self.assertEqual({self.modules[1].id, self.modules[2].id},
+                         {vote['identifier'] for vote in self.storage.get_votes_for_peer(VOTERS[1])})
+        self.assertEqual({(VOTERS[0], self.modules[1].id), (VOTERS[1], self.modules[1].id),
+                          (VOTERS[1], self.modules[2].id)}, set(self.storage.iter_votes()))
+
+    def test_iter_votes_pages(self):
+        self.add_modules()
+        for voter in VOTERS:
+            for module in self.modules:
+                self.storage.record_vote(voter, module.id)
+        self.storage.flush()
+
+        votes = list(self.storage.iter_votes())
+        self.assertEqual(9, len(set(votes)))
+
+        for queries in (self.storage, self.storage.replica):
+            pages, after = [], None
+            while True:
+                page = list(queries.iter_votes(2, after))
+                pages.extend(page)
+                if len(page) < 2:
+                    break
+                after = page[-1]
+            self.assertEqual(votes, pages)
+
+        self.assertRaises(ValueError, self.storage.iter_votes, 2, (b"unknown-voter", self.modules[0].id))
+
+    def test_votes_before_catalog(self):
+        self.storage.record_vote(VOTERS[0], self.modules[0].id)
+        self.storage.record_vote(VOTERS[1], self.modules[0].id)
+
+        self.assertIsNone(self.storage.get_votes_for_module(self.modules[0].id))
+
+        self.storage.add_module_to_catalog(self.modules[0])
+
+        self.assertEqual(2, self.storage.get_module_from_catalog(self.modules[0].id).votes)
+        self.assertEqual(2, self.storage.count_votes_without_history())
+        self.assertTrue(self.storage.add_vote_history(VOTERS[0], self.modules[0].id, 1000, 1))
+        self.assertFalse(self.storage.add_vote_history(VOTERS[0], self.modules[0].id, 1000, 1))
+        self.assertEqual(1, self.storage.count_votes_without_history())
+
+    def test_pending_votes(self):
+        creator_digest = get_creator_digest(CREATOR)
+        content_hash = self.modules[0].id.content_hash
+
+        self.assertTrue(self.storage.add_pending_vote(creator_digest, content_hash, VOTERS[0], 1000, 1))
+        self.assertFalse(self.storage.add_pending_vote(creator_digest, content_hash, VOTERS[0], 1000, 1))
+        self.assertTrue(self.storage.add_pending_vote(creator_digest, content_hash, VOTERS[1], 2000, 3))
+        self.assertTrue(self.storage.add_pending_vote(creator_digest, self.modules[1].id.content_hash, VOTERS[0],
+                                                      1000, 1))
+        self.reopen_storage()
+
+        self.assertEqual(3, self.storage.count_pending_votes())
+        self.assertEqual({(VOTERS[0], 1000, 1), (VOTERS[1], 2000, 3)},
+                         set(self.storage.pop_pending_votes(creator_digest, content_hash)))
+        self.assertEqual([], self.storage.pop_pending_votes(creator_digest, content_hash))
+        self.assertEqual(1, self.storage.count_pending_votes())
+
+    def test_resolve_creator(self):
+        self.assertIsNone(self.storage.resolve_creator(get_creator_digest(CREATOR)))
+
+        self.add_modules()
+
+        self.assertEqual(CREATOR, self.storage.resolve_creator(get_creator_digest(CREATOR)))
+
+    def test_transaction_rollback(self):
+        def add_and_fail():
+            with self.storage.transaction():
+                self.storage.add_module_to_catalog(self.modules[0])
+                raise RuntimeError()
+
+        self.assertRaises(RuntimeError, add_and_fail)
+        self.assertFalse(self.storage.has_module_in_catalog(self.modules[0].id))
+        self.assertEqual(0, self.storage.count_modules_in_catalog())
+
+    def test_checkpoint_and_crawl_cursors(self):
+        self.assertEqual(0, self.storage.get_vote_checkpoint(VOTERS[0]))
+        self.assertEqual(0, self.storage.get_crawl_cursor(VOTERS[0]))
+
+        self.storage.set_vote_checkpoint(VOTERS[0], 42)
+        self.storage.set_crawl_cursor(VOTERS[0], 7)
+        self.reopen_storage()
+
+        self.assertEqual(42, self.storage.get_vote_checkpoint(VOTERS[0]))
+        self.assertEqual(0, self.storage.get_vote_checkpoint(VOTERS[1]))
+        self.assertEqual(7, self.storage.get_crawl_cursor(VOTERS[0]))
+        self.assertEqual(0, self.storage.get_crawl_cursor(VOTERS[1]))
+
+    def test_reopen(self):
+        self.add_modules()
+        self.storage.record_vote(VOTERS[0], self.modules[0].id, 1000, 1)
+        self.storage.add_module_to_library(self.modules[1].id)
+        self.reopen_storage()
+
+        self.assertEqual(self.modules, self.storage.get_modules_from_catalog())
+        self.assertEqual(1, self.storage.get_module_from_catalog(self.modules[0].id).votes)
+        self.assertTrue(self.storage.did_vote(VOTERS[0], self.modules[0].id))
+        self.assertTrue(self.storage.has_module_in_library(self.modules[1].id))
+        self.assertEqual(CREATOR, self.storage.resolve_creator(get_creator_digest(CREATOR)))
+
+    def test_snapshot(self):
+        self.add_modules()
+        self.storage.record_vote(VOTERS[0], self.modules[0].id, 1000, 1)
+        self.storage.add_module_to_cache(self.modules[2].id)
+        file_path = os.path.join(self.working_directory, "catalog.snapshot")
+        self.storage.export_snapshot(file_path)
+
+        other = self.open_storage(tempfile.mkdtemp(dir=self.working_directory))
+        try:
+            other.import_snapshot(file_path)
+
+            self.assertEqual(self.modules, other.get_modules_from_catalog())
+            self.assertEqual(1, other.get_module_from_catalog(self.modules[0].id).votes)
+            self.assertTrue(other.did_vote(VOTERS[0], self.modules[0].id))
+            self.assertTrue(other.has_module_in_cache(self.modules[2].id))
+        finally:
+            other.close()
+
+    def test_replica(self):
+        self.add_modules()
+        self.storage.record_vote(VOTERS[0], self.modules[0].id)
+        self.storage.flush()
+
+        self.assertEqual(3, self.storage.replica.count_modules_in_catalog())
+        self.assertEqual(1, self.storage.replica.get_module_from_catalog(self.modules[0].id).votes)
+        self.assertEqual([(VOTERS[0], self.modules[0].id)], list(self.storage.replica.iter_votes()))
+
+
+class TestSQLiteStorage(StorageConformanceTests, unittest.TestCase):
+    backend = STORAGE_BACKEND_SQLITE
+
+
+class ModuleDatabaseWithoutFTS5(ModuleDatabase):
+    """
+    SQLite module storage on an SQLite build without the FTS5 extension
+    """
+
+    def _detect_full_text_search(self):
+        return False
+
+
+class TestSQLiteStorageWithoutFTS5(TestSQLiteStorage):
+
+    def open_storage(self, working_directory=None):
+        return ModuleDatabaseWithoutFTS5(working_directory or self.working_directory, DB_NAME)
+
+    def test_search_index_rebuilt(self):
+        self.add_modules()
+
+        # The index is built from the catalog once SQLite supports it
+        self.storage.close()
+        self.storage = ModuleDatabase(self.working_directory, DB_NAME)
+        self.assertTrue(self.storage.full_text_search)
+        self.assertEqual([self.modules[0]], list(self.storage.search_catalog("hel wor")))
+
+        # Without FTS5 the index is no longer maintained and the catalog is still writable
+        self.reopen_storage()
+        self.storage.add_module_to_catalog(make_module(4, "hello again"))
+        self.assertEqual(2, len(list(self.storage.search_catalog("hello"))))
+
+
+@unittest.skipIf(lmdb is None, "lmdb is not installed")
+class TestLMDBStorage(StorageConformanceTests, unittest.TestCase):
+    backend = STORAGE_BACKEND_LMDB
+
+
+class TestHybridStorage(StorageConformanceTests, unittest.TestCase):
+    backend = STORAGE_BACKEND_HYBRID
+
+    def test_async_persistence(self):
+        self.assertRaises(ValueError, AsyncModuleDatabase, self.storage)
+
+
+if __name__ == '__main__':
+    unittest.main()
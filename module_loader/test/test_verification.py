@@ -0,0 +1,110 @@
+from __future__ import absolute_import
+
+# Third party imports
+from ipv8.attestation.trustchain.payload import CrawlResponsePayload
+from ipv8.messaging.payload_headers import GlobalTimeDistributionPayload
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+# Project imports
+from module_loader.community.module.verification import CRAWL_RESPONSE_MESSAGE
+from module_loader.test.generator import VoteBlockGenerator
+from module_loader.test.mocking import MockModuleNode
+
+# Constants
+SENDER_ADDRESS = ("1.2.3.4", 5)  # Address of the peer sending the crawl responses
+INVALID_BLOCKS = [3, 7]  # Indexes of the crawled blocks with an invalid signature
+
+
+class TestCrawlVerification(unittest.TestCase):
+    """
+    Crawled vote blocks, of which trustchain verifies the signatures itself
+    """
+
+    verify_processes = 0  # type: int
+
+    def setUp(self):
+        self.node = MockModuleNode(verify_processes=self.verify_processes)
+
+        generator = VoteBlockGenerator(voters=5, modules=20, seed=1)
+        self.blocks = generator.create_vote_blocks(10)
+        for index in INVALID_BLOCKS:
+            signature = self.blocks[index].signature
+            self.blocks[index].signature = signature[:-1] + chr(ord(signature[-1]) ^ 1)
+
+    def tearDown(self):
+        self.node.unload()
+
+    def receive_crawl_responses(self):
+        trustchain = self.node.trustchain
+        for index, block in enumerate(self.blocks):
+            payload = CrawlResponsePayload.from_crawl(block, 1, index + 1, len(self.blocks))
+            packet = trustchain._ez_pack(trustchain._prefix, ord(CRAWL_RESPONSE_MESSAGE),
+                                         [GlobalTimeDistributionPayload(1).to_pack_list(), payload.to_pack_list()],
+                                         False)
+            trustchain.on_packet((SENDER_ADDRESS, packet))
+
+    def get_stored(self):
+        return [index for index, block in enumerate(self.blocks) if self.node.trustchain.persistence.contains(block)]
+
+    def assertStored(self):
+        self.assertEqual([index for index in range(len(self.blocks)) if index not in INVALID_BLOCKS],
+                         self.get_stored())
+
+    def test_crawl_responses(self):
+        self.receive_crawl_responses()
+
+        # Trustchain keeps its own handler and stores the crawled blocks right away
+        self.assertIsNone(self.node.overlay.crawl_verifier)
+        self.assertIsNone(self.node.overlay.signature_verifier)
+        self.assertStored()
+        self.assertEqual({}, self.node.overlay.get_verification_statistics())
+
+
+class TestCrawlVerificationProcesses(TestCrawlVerification):
+    """
+    Crawled vote blocks, of which the signatures are verified in batches before trustchain sees them
+    """
+
+    verify_processes = 1  # type: int
+
+    def test_workers_started(self):
+        # The workers are forked when the community is created, not when the first batch arrives
+        self.assertIsNotNone(self.node.overlay.signature_verifier._pool)
+
+    @inlineCallbacks
+    def test_crawl_responses(self):
+        self.receive_crawl_responses()
+
+        # The crawled blocks wait for their batch to fill up
+        self.assertEqual([], self.get_stored())
+
+        yield self.node.overlay.crawl_verifier.flush()
+
+        self.assertStored()
+        statistics = self.node.overlay.get_verification_statistics()
+        self.assertEqual(1, statistics['inline_batches'])
+        self.assertEqual(len(self.blocks), statistics['verified_blocks'])
+        self.assertEqual(len(INVALID_BLOCKS), statistics['invalid_blocks'])
+
+    @inlineCallbacks
+    def test_crawl_responses_in_workers(self):
+        self.node.overlay.signature_verifier.inline_threshold = 1
+        self.receive_crawl_responses()
+
+        yield self.node.overlay.crawl_verifier.flush()
+
+        self.assertStored()
+        statistics = self.node.overlay.get_verification_statistics()
+        self.assertEqual(0, statistics['inline_batches'])
+        self.assertEqual(len(INVALID_BLOCKS), statistics['invalid_blocks'])
+
+    def test_unload(self):
+        self.receive_crawl_responses()
+        handler = self.node.overlay.crawl_verifier._handler
+
+        # The waiting crawl responses go to trustchain, which takes its handler back
+        self.node.overlay.crawl_verifier.stop()
+
+        self.assertStored()
+        self.assertEqual(handler, self.node.trustchain.decode_map[CRAWL_RESPONSE_MESSAGE])
@@ -20,5 +20,8 @@ setup(
         "service_identity",
         "yappi",
         "six"
-    ]
+    ],
+    extras_require={
+        'lmdb': ["lmdb"]
+    }
 )
@@ -32,7 +32,13 @@ from ipv8_service import IPv8
 
 # Project imports
 from module_loader import util
-from module_loader.community.module.community import ModuleCommunity
+from module_loader.community.module.community import ModuleCommunity, VOTE_FILTER_ERROR_RATE
+from module_loader.community.module.block import MODULE_VOTE_VERSION_COMPACT, MODULE_VOTE_VERSION_FULL
+from module_loader.community.module.crawler import CRAWL_BUDGET, CRAWL_MAX_IN_FLIGHT
+from module_loader.community.module.hybrid_module_database import HYBRID_BACKUP_INTERVAL
+from module_loader.community.module.maintenance import MAINTENANCE_TIME_BUDGET
+from module_loader.community.module.storage import STORAGE_BACKEND_HYBRID, STORAGE_BACKEND_SQLITE, STORAGE_BACKENDS
+from module_loader.community.module.verification import VERIFY_PROCESSES
 from module_loader.event.bus import EventBus
 from module_loader.REST.root_endpoint import ModuleRootEndpoint
 
@@ -41,12 +47,49 @@ class Options(usage.Options):
     optParameters = [
         ['port', 'p', 8090, "Use an alternative port for IPv8", int],
         ['statedir', 's', "./data", "Use an alternate statedir", str],
+        ['flushinterval', 'f', None, "Batch module database commits and flush them every N milliseconds "
+                                     "(0 flushes once per reactor iteration)", int],
+        ['storage', 'b', STORAGE_BACKEND_SQLITE, "Module database storage backend: {0}".format(
+            ", ".join(STORAGE_BACKENDS)), str],
+        ['backupinterval', None, HYBRID_BACKUP_INTERVAL, "Minimum seconds between backups of the in-memory module "
+                                                         "database to disk (hybrid storage)", float],
+        ['maxdataloss', None, None, "Maximum seconds a write to the in-memory module database goes without backup "
+                                    "(hybrid storage)", float],
+        ['maintenancebudget', None, int(MAINTENANCE_TIME_BUDGET * 1000), "Milliseconds per reactor iteration that long "
+                                                                         "maintenance jobs may run", int],
+        ['votefiltererror', None, VOTE_FILTER_ERROR_RATE, "False positive rate of the filter of known votes, the share "
+                                                          "of new received votes it sends to a lookup", float],
+        ['maxcrawls', None, CRAWL_MAX_IN_FLIGHT, "Maximum number of peers whose chains are crawled at the same time",
+         int],
+        ['crawlbudget', None, CRAWL_BUDGET, "Maximum number of crawl requests per minute", int],
+        ['verifyprocesses', None, VERIFY_PROCESSES, "Number of processes that verify the signatures of crawled votes, "
+                                                    "0 to verify them on the main thread", int],
     ]
     optFlags = [
         ['testnet', 't', "Join the testnet"],
-        ['verbose', 'v', "Verbose output"]
+        ['verbose', 'v', "Verbose output"],
+        ['asyncdb', 'a', "Run module database queries on a dedicated database thread"],
+        ['compactvotes', None, "Sign votes in the compact encoding, only on networks where every node reads it"]
     ]
 
+    def postOptions(self):
+        if self['storage'] not in STORAGE_BACKENDS:
+            raise usage.UsageError("Unknown storage backend: {0}".format(self['storage']))
+        if self['asyncdb'] and self['storage'] == STORAGE_BACKEND_HYBRID:
+            raise usage.UsageError("The asynchronous database can't be used with hybrid storage, the in-memory "
+                                   "database has no separate read connection")
+        if self['asyncdb'] and self['flushinterval'] is not None:
+            raise usage.UsageError("The flush interval can't be used with the asynchronous database, it commits every "
+                                   "interaction on the database thread")
+        if not 0 < self['votefiltererror'] < 1:
+            raise usage.UsageError("The vote filter false positive rate must be between 0 and 1")
+        if self['maxcrawls'] < 1:
+            raise usage.UsageError("At least one peer must be crawled at a time")
+        if self['crawlbudget'] < 1:
+            raise usage.UsageError("The crawl budget must allow at least one crawl request per minute")
+        if self['verifyprocesses'] < 0:
+            raise usage.UsageError("The number of verification processes can't be negative")
+
 
 class AndroidServiceMaker(object):
     implements(IServiceMaker, IPlugin)
@@ -98,6 +141,14 @@ class AndroidServiceMaker(object):
         # port
         network_port = options['port']
 
+        # Module database flush interval
+        flush_interval = options['flushinterval'] / 1000.0 if options['flushinterval'] is not None else None
+
+        # Module database storage options
+        storage_options = {}
+        if options['storage'] == STORAGE_BACKEND_HYBRID:
+            storage_options = {'backup_interval': options['backupinterval'], 'max_data_loss': options['maxdataloss']}
+
         # Initial configuration
         configuration = get_default_configuration()
         configuration['address'] = "0.0.0.0"
@@ -158,7 +209,17 @@ class AndroidServiceMaker(object):
         # module community
         self.module_community = ModuleCommunity(self.my_peer, self.ipv8.endpoint, self.ipv8.network,
                                             trustchain=self.trustchain_community, bus=self.bus,
-                                            working_directory=state_directory, ipv8=self.ipv8, service=self.service)
+                                            working_directory=state_directory, ipv8=self.ipv8, service=self.service,
+                                            persistence_flush_interval=flush_interval,
+                                            async_persistence=options['asyncdb'],
+                                            storage_backend=options['storage'], storage_options=storage_options,
+                                            maintenance_time_budget=options['maintenancebudget'] / 1000.0,
+                                            vote_filter_error_rate=options['votefiltererror'],
+                                            crawl_max_in_flight=options['maxcrawls'],
+                                            crawl_budget=options['crawlbudget'],
+                                            verify_processes=options['verifyprocesses'],
+                                            vote_version=MODULE_VOTE_VERSION_COMPACT if options['compactvotes']
+                                            else MODULE_VOTE_VERSION_FULL)
         self.ipv8.overlays.append(self.module_community)
         self.ipv8.strategies.append((RandomWalk(self.module_community), 10))
 